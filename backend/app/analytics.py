@@ -0,0 +1,315 @@
+"""
+占卜会话的分析快照：把 divination_sessions_v2 导出为列式 Parquet，离线分析卦象/牌面分布、
+降级解读比例和各语言的耗时，不用再直接查线上库里的 JSON。
+
+    python -m app.analytics export [--out data/analytics] [--full] [--batch-size 1000]
+    python -m app.analytics import data/archive/sessions-*.jsonl.gz data/analytics/*.parquet
+
+导出按 (created_at, id) 顺序分批读取（生成器，内存占用与总行数无关），每批写成一个 row group。
+默认增量导出：只导出水位线（<out>/_watermark.json）之后的会话，每次生成一个新文件；
+水位线只推进到 MAINTENANCE_ABANDONED_AFTER_HOURS 之前，那之后的会话状态不会再变化。
+导入用于恢复维护任务的 jsonl.gz 归档或本模块导出的 parquet，已存在的会话会跳过。
+需要安装 pyarrow（pip install -e "backend[analytics]"）。
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from .config import settings
+from .db import DATA_DIR, init_db
+from .interpretation import FALLBACK_TEXTS
+from .storage import close_storage, get_storage
+
+DEFAULT_OUT_DIR = DATA_DIR / "analytics"
+WATERMARK_FILE = "_watermark.json"
+
+# 降级解读的结束语是固定文本，用来识别 fallback
+FALLBACK_ENDINGS = {texts["ending"] for texts in FALLBACK_TEXTS.values()}
+
+# 恢复时需要原样写回的字段
+RAW_FIELDS = ("question", "seed")
+JSON_COLUMNS = {
+    "result": "result_json",
+    "interpretation": "interpretation_json",
+    "manual_steps": "manual_steps_json",
+}
+
+
+def _require_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def _schema(pa: Any) -> Any:
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("user_id", pa.int64()),
+            ("mode", pa.string()),
+            ("method", pa.string()),
+            ("status", pa.string()),
+            ("lang", pa.string()),
+            ("created_at", pa.timestamp("us")),
+            ("completed_at", pa.timestamp("us")),
+            ("duration_ms", pa.float64()),
+            ("primary_hexagram_id", pa.int8()),
+            ("relating_hexagram_id", pa.int8()),
+            ("changing_mask", pa.int8()),
+            ("card_ids", pa.list_(pa.int8())),
+            ("card_upright", pa.list_(pa.bool_())),
+            ("confidence", pa.string()),
+            ("fallback", pa.bool_()),
+            ("question", pa.string()),
+            ("seed", pa.string()),
+            ("result_json", pa.string()),
+            ("interpretation_json", pa.string()),
+            ("manual_steps_json", pa.string()),
+        ]
+    )
+
+
+def _parse_time(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _dumps(value: object | None) -> str | None:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def flatten_session(row: dict[str, Any]) -> dict[str, Any]:
+    """把一行会话展开成分析用的扁平列。"""
+    result = row.get("result") if isinstance(row.get("result"), dict) else {}
+    interpretation = row.get("interpretation")
+    if not isinstance(interpretation, dict):
+        interpretation = {}
+    created_at = _parse_time(row["created_at"])
+    completed_at = _parse_time(row.get("completed_at"))
+
+    primary = result.get("primary_hexagram") or {}
+    relating = result.get("relating_hexagram") or {}
+    changing_mask = None
+    if row["method"] == "liuyao" and result:
+        # 第 n 爻为动爻时置第 n-1 位
+        changing_mask = sum(1 << (position - 1) for position in result.get("changing_lines", []))
+    cards = result.get("cards") or []
+
+    flat = {
+        "id": row["id"],
+        "user_id": row.get("user_id"),
+        "mode": row["mode"],
+        "method": row["method"],
+        "status": row["status"],
+        "lang": row.get("lang") or "zh",
+        "created_at": created_at,
+        "completed_at": completed_at,
+        "duration_ms": (
+            (completed_at - created_at).total_seconds() * 1000
+            if created_at and completed_at
+            else None
+        ),
+        "primary_hexagram_id": primary.get("id"),
+        "relating_hexagram_id": relating.get("id"),
+        "changing_mask": changing_mask,
+        "card_ids": [draw["card"]["id"] for draw in cards] if cards else None,
+        "card_upright": [draw["is_upright"] for draw in cards] if cards else None,
+        "confidence": interpretation.get("confidence"),
+        "fallback": (
+            interpretation.get("ritual_ending") in FALLBACK_ENDINGS if interpretation else None
+        ),
+    }
+    for field in RAW_FIELDS:
+        flat[field] = row.get(field)
+    for field, column in JSON_COLUMNS.items():
+        flat[column] = _dumps(row.get(field))
+    return flat
+
+
+def unflatten_session(flat: dict[str, Any]) -> dict[str, Any]:
+    """从导出的扁平列还原出可以写回数据库的会话。"""
+    session = {
+        "id": flat["id"],
+        "user_id": flat.get("user_id"),
+        "mode": flat["mode"],
+        "method": flat["method"],
+        "status": flat["status"],
+        "lang": flat.get("lang") or "zh",
+        "created_at": flat["created_at"].isoformat(),
+        "completed_at": flat["completed_at"].isoformat() if flat.get("completed_at") else None,
+    }
+    for field in RAW_FIELDS:
+        session[field] = flat.get(field)
+    for field, column in JSON_COLUMNS.items():
+        value = flat.get(column)
+        session[field] = json.loads(value) if value is not None else None
+    return session
+
+
+# ===== 导出 =====
+
+
+async def iter_session_batches(
+    after: tuple[str, str] | None, until: datetime | None, batch_size: int
+) -> AsyncIterator[list[dict]]:
+    """按 (created_at, id) 顺序逐批产出 after 之后、until 之前创建的会话。"""
+    storage = get_storage()
+    cutoff = until.isoformat() if until else None
+    while True:
+        rows = await storage.scan_divination_sessions_v2(after=after, limit=batch_size)
+        done = len(rows) < batch_size
+        if cutoff is not None and rows and rows[-1]["created_at"] >= cutoff:
+            rows = [row for row in rows if row["created_at"] < cutoff]
+            done = True
+        if rows:
+            yield rows
+        if done:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def read_watermark(out_dir: Path) -> tuple[str, str] | None:
+    path = out_dir / WATERMARK_FILE
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return data["created_at"], data["id"]
+
+
+def _write_watermark(out_dir: Path, position: tuple[str, str]) -> None:
+    path = out_dir / WATERMARK_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(
+        json.dumps({"created_at": position[0], "id": position[1]}), encoding="utf-8"
+    )
+    os.replace(tmp, path)
+
+
+@dataclass
+class ExportResult:
+    path: Path | None
+    rows: int
+    watermark: tuple[str, str] | None
+
+
+async def export_sessions(
+    out_dir: Path = DEFAULT_OUT_DIR,
+    *,
+    full: bool = False,
+    batch_size: int = 1000,
+    settle: timedelta | None = None,
+) -> ExportResult:
+    """导出一个 parquet 文件；full=True 时忽略水位线从头导出（不更新水位线）。"""
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    if settle is None:
+        settle = timedelta(hours=settings.maintenance_abandoned_after_hours)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    after = None if full else read_watermark(out_dir)
+    until = datetime.utcnow() - settle
+
+    schema = _schema(pa)
+    path = out_dir / f"sessions-{datetime.utcnow():%Y%m%d-%H%M%S}{'-full' if full else ''}.parquet"
+    tmp = path.with_suffix(".parquet.tmp")
+    writer = None
+    rows = 0
+    last = after
+    try:
+        async for batch in iter_session_batches(after, until, batch_size):
+            table = pa.Table.from_pylist([flatten_session(row) for row in batch], schema=schema)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+            await asyncio.to_thread(writer.write_table, table)
+            rows += len(batch)
+            last = (batch[-1]["created_at"], batch[-1]["id"])
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return ExportResult(None, 0, after)
+    os.replace(tmp, path)
+    if not full and last is not None:
+        _write_watermark(out_dir, last)
+    print(f"[ANALYTICS] Exported {rows} sessions to {path}")
+    return ExportResult(path, rows, last)
+
+
+# ===== 导入 =====
+
+
+def _iter_archive(path: Path, batch_size: int) -> Iterator[list[dict]]:
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield [unflatten_session(row) for row in record_batch.to_pylist()]
+        return
+
+    batch: list[dict] = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def import_sessions(paths: list[Path], batch_size: int = 1000) -> int:
+    """把归档（jsonl.gz）或导出文件（parquet）写回数据库，返回新写入的行数。"""
+    if any(path.suffix == ".parquet" for path in paths):
+        _require_pyarrow()
+    storage = get_storage()
+    total = 0
+    for path in paths:
+        count = 0
+        batches = _iter_archive(path, batch_size)
+        # 文件读取/解压在线程中进行，逐批拉取，不把整个文件读进内存
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            count += await storage.insert_divination_sessions_v2(batch)
+        print(f"[ANALYTICS] Imported {count} sessions from {path}")
+        total += count
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export/import divination sessions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Write a Parquet analytics snapshot")
+    export.add_argument("--out", type=Path, default=DEFAULT_OUT_DIR)
+    export.add_argument("--full", action="store_true", help="Ignore the watermark")
+    export.add_argument("--batch-size", type=int, default=1000)
+    restore = commands.add_parser("import", help="Restore sessions from archives/exports")
+    restore.add_argument("paths", type=Path, nargs="+")
+    restore.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        try:
+            await init_db()
+            if args.command == "export":
+                await export_sessions(args.out, full=args.full, batch_size=args.batch_size)
+            else:
+                await import_sessions(args.paths, args.batch_size)
+        finally:
+            await close_storage()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,69 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta
 from uuid import uuid4
 
-from passlib.context import CryptContext
-
 from .config import settings
-from .db import get_connection
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .db import instrumented
+from .passwords import get_pwd_context
+from .storage import get_storage
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    return get_pwd_context().verify(password, password_hash)
+
+
+@instrumented
+async def get_user_by_email(email: str) -> dict | None:
+    return await get_storage().get_user_by_email(email)
 
 
-def get_user_by_email(email: str) -> dict | None:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT id, email, birth_date, created_at FROM users WHERE email = ? LIMIT 1",
-        (email,),
-    ).fetchone()
-    conn.close()
-    return dict(row) if row else None
+@instrumented
+async def get_user_by_id(user_id: int) -> dict | None:
+    return await get_storage().get_user_by_id(user_id)
 
 
-def get_user_password_hash(email: str) -> str | None:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT password_hash FROM users WHERE email = ? LIMIT 1",
-        (email,),
-    ).fetchone()
-    conn.close()
-    return row["password_hash"] if row else None
+@instrumented
+async def get_user_password_hash(email: str) -> str | None:
+    return await get_storage().get_user_password_hash(email)
 
 
-def create_user(email: str, password_hash: str, birth_date: str | None) -> dict:
+@instrumented
+async def create_user(email: str, password_hash: str, birth_date: str | None) -> dict:
     created_at = datetime.utcnow().isoformat()
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (email, password_hash, birth_date, created_at) VALUES (?, ?, ?, ?)",
-        (email, password_hash, birth_date, created_at),
-    )
-    conn.commit()
-    user_id = cursor.lastrowid
-    conn.close()
+    user_id = await get_storage().create_user(email, password_hash, birth_date, created_at)
     return {"id": user_id, "email": email, "birth_date": birth_date, "created_at": created_at}
 
 
-def update_user_birth_date(user_id: int, birth_date: str | None) -> None:
-    conn = get_connection()
-    conn.execute(
-        "UPDATE users SET birth_date = ? WHERE id = ?",
-        (birth_date, user_id),
-    )
-    conn.commit()
-    conn.close()
+@instrumented
+async def update_user_birth_date(user_id: int, birth_date: str | None) -> None:
+    await get_storage().update_user_birth_date(user_id, birth_date)
+
+
+@instrumented
+async def update_user_password_hash(user_id: int, password_hash: str) -> None:
+    await get_storage().update_user_password_hash(user_id, password_hash)
 
 
-def create_session(user_id: int) -> dict:
+@instrumented
+async def list_users() -> list[dict]:
+    return await get_storage().list_users()
+
+
+@instrumented
+async def create_session(user_id: int) -> dict:
     created_at = datetime.utcnow()
     expires_at = created_at + timedelta(days=settings.session_ttl_days)
     token = uuid4().hex
 
-    conn = get_connection()
-    conn.execute(
-        "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
-        (token, user_id, created_at.isoformat(), expires_at.isoformat()),
+    await get_storage().create_session(
+        token, user_id, created_at.isoformat(), expires_at.isoformat()
     )
-    conn.commit()
-    conn.close()
     return {
         "token": token,
         "user_id": user_id,
@@ -83,24 +72,20 @@ def create_session(user_id: int) -> dict:
     }
 
 
-def get_user_by_session(token: str) -> dict | None:
-    conn = get_connection()
-    row = conn.execute(
-        """
-        SELECT u.id, u.email, u.birth_date, u.created_at
-        FROM sessions s
-        JOIN users u ON u.id = s.user_id
-        WHERE s.token = ? AND s.expires_at > ?
-        LIMIT 1
-        """,
-        (token, datetime.utcnow().isoformat()),
-    ).fetchone()
-    conn.close()
-    return dict(row) if row else None
-
-
-def delete_session(token: str) -> None:
-    conn = get_connection()
-    conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
-    conn.commit()
-    conn.close()
+@instrumented
+async def get_user_by_session(token: str) -> dict | None:
+    return await get_storage().get_user_by_session(token, datetime.utcnow().isoformat())
+
+
+@instrumented
+async def get_session_user(token: str) -> dict | None:
+    """只查 sessions 表，返回 user_id 和过期时间（供会话缓存使用）。"""
+    return await get_storage().get_session_user(token, datetime.utcnow().isoformat())
+
+
+@instrumented
+async def delete_session(token: str) -> None:
+    from .session_cache import get_session_cache
+
+    await get_storage().delete_session(token)
+    await asyncio.to_thread(get_session_cache().revoke, token)
@@ -13,10 +13,95 @@ class Settings(BaseModel):
     )
     ai_builder_api_key: str | None = os.getenv("AI_BUILDER_TOKEN") or os.getenv("AI_BUILDER_API_KEY")
     ai_builder_model: str = os.getenv("AI_BUILDER_MODEL", "grok-4-fast")
+    # 备用模型/端点：主上游失败或过慢时使用，未设置则只用主上游
+    ai_builder_fallback_model: str | None = os.getenv("AI_BUILDER_FALLBACK_MODEL")
+    ai_builder_fallback_api_url: str | None = os.getenv("AI_BUILDER_FALLBACK_API_URL")
+    ai_builder_fallback_api_key: str | None = os.getenv("AI_BUILDER_FALLBACK_API_KEY")
+    horoscope_api_url: str = os.getenv("HOROSCOPE_API_URL", "https://ohmanda.com/api/horoscope")
+    llm_latency_budget: float = float(os.getenv("LLM_LATENCY_BUDGET", "40"))
+    llm_hedge_enabled: bool = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    llm_hedge_default_delay: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+    llm_hedge_min_delay: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    llm_breaker_cooldown: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+    llm_concurrency_initial: int = int(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+    llm_concurrency_min: int = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+    llm_concurrency_max: int = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+    llm_max_queue_wait: float = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+    # 响应只缺少不超过该数量的字段时追问补齐，0 表示不追问
+    llm_repair_max_fields: int = int(os.getenv("LLM_REPAIR_MAX_FIELDS", "3"))
+    prompt_input_token_budget: int = int(os.getenv("PROMPT_INPUT_TOKEN_BUDGET", "1500"))
+    prompt_question_max_tokens: int = int(os.getenv("PROMPT_QUESTION_MAX_TOKENS", "300"))
+    # 由 python -m app.method_classifier eval 在留出集上测得（见 method_classifier 模块说明）
+    method_classifier_threshold: float = float(os.getenv("METHOD_CLASSIFIER_THRESHOLD", "0.65"))
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+    semantic_cache_per_key: int = int(os.getenv("SEMANTIC_CACHE_PER_KEY", "32"))
+    semantic_cache_max_keys: int = int(os.getenv("SEMANTIC_CACHE_MAX_KEYS", "20000"))
+    semantic_cache_file: str = os.getenv("SEMANTIC_CACHE_FILE", "")
+    # 手动模式倒数第二步提交后为最后一步的所有候选结果预取解读
+    prefetch_enabled: bool = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    prefetch_max_candidates: int = int(os.getenv("PREFETCH_MAX_CANDIDATES", "4"))
+    prefetch_max_inflight: int = int(os.getenv("PREFETCH_MAX_INFLIGHT", "64"))
+    prefetch_ttl: float = float(os.getenv("PREFETCH_TTL", "600"))
+    # 上游 token 用量：进程内聚合后批量写入 llm_usage 的间隔（秒）
+    usage_flush_interval: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+    # token 配额（进程内令牌桶，0 表示不限制）：每个用户/IP 每小时、全局每分钟
+    usage_user_tokens_per_hour: int = int(os.getenv("USAGE_USER_TOKENS_PER_HOUR", "100000"))
+    usage_global_tokens_per_minute: int = int(os.getenv("USAGE_GLOBAL_TOKENS_PER_MINUTE", "0"))
+    # 调用前按估算的 prompt 加上该数量的 completion 预留额度
+    usage_reserve_completion_tokens: int = int(os.getenv("USAGE_RESERVE_COMPLETION_TOKENS", "800"))
+    usage_max_subjects: int = int(os.getenv("USAGE_MAX_SUBJECTS", "10000"))
+    seed_result_cache_size: int = int(os.getenv("SEED_RESULT_CACHE_SIZE", "20000"))
+    seed_result_cache_file: str = os.getenv("SEED_RESULT_CACHE_FILE", "")
     preload_secret: str | None = os.getenv("PRELOAD_SECRET")
     allow_debug_users: bool = os.getenv("ALLOW_DEBUG_USERS", "false").lower() == "true"
+    # 采样分析接口的口令（请求头 x-profiling-secret），未设置则接口关闭
+    profiling_secret: str | None = os.getenv("PROFILING_SECRET")
+    # 请求超过该秒数仍未完成时记录调用栈，0 表示关闭看门狗
+    slow_request_threshold: float = float(os.getenv("SLOW_REQUEST_THRESHOLD", "0"))
+    slow_request_dumps: int = int(os.getenv("SLOW_REQUEST_DUMPS", "50"))
+    # 事件循环阻塞检测：心跳间隔（秒）和归因阈值（毫秒）
+    loop_monitor_enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    loop_monitor_interval: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))
+    loop_block_threshold_ms: float = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+    # /ready 是否要求 Redis 可用（默认 Redis 只是可选的加速层）
+    readiness_require_redis: bool = os.getenv("READINESS_REQUIRE_REDIS", "false").lower() == "true"
+    # 关闭时等待进行中的 LLM 调用的最长秒数
+    shutdown_drain_timeout: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+    # 收到 SIGTERM 后 /ready 先返回 503，等这么多秒再停止接收新连接
+    shutdown_ready_delay: float = float(os.getenv("SHUTDOWN_READY_DELAY", "0"))
+    database_url: str = os.getenv("DATABASE_URL", "")
+    database_pool_min: int = int(os.getenv("DATABASE_POOL_MIN", "1"))
+    database_pool_max: int = int(os.getenv("DATABASE_POOL_MAX", "10"))
+    database_statement_cache_size: int = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))
     session_ttl_days: int = int(os.getenv("SESSION_TTL_DAYS", "7"))
+    session_cache_size: int = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+    session_cache_ttl: float = float(os.getenv("SESSION_CACHE_TTL", "300"))
+    session_cache_negative_ttl: float = float(os.getenv("SESSION_CACHE_NEGATIVE_TTL", "30"))
+    session_revocation_poll: float = float(os.getenv("SESSION_REVOCATION_POLL", "1"))
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+    password_hash_per_key_limit: int = int(os.getenv("PASSWORD_HASH_PER_KEY_LIMIT", "2"))
+    maintenance_enabled: bool = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+    maintenance_interval: float = float(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+    maintenance_initial_delay: float = float(os.getenv("MAINTENANCE_INITIAL_DELAY", "300"))
+    maintenance_batch_size: int = int(os.getenv("MAINTENANCE_BATCH_SIZE", "500"))
+    maintenance_batch_pause: float = float(os.getenv("MAINTENANCE_BATCH_PAUSE", "0.05"))
+    maintenance_stuck_after_minutes: int = int(os.getenv("MAINTENANCE_STUCK_AFTER_MINUTES", "15"))
+    maintenance_abandoned_after_hours: int = int(os.getenv("MAINTENANCE_ABANDONED_AFTER_HOURS", "24"))
+    maintenance_retry_stuck: bool = os.getenv("MAINTENANCE_RETRY_STUCK", "false").lower() == "true"
+    maintenance_retention_days: int = int(os.getenv("MAINTENANCE_RETENTION_DAYS", "30"))
+    maintenance_archive_after_days: int = int(os.getenv("MAINTENANCE_ARCHIVE_AFTER_DAYS", "365"))
+    maintenance_vacuum_pages: int = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "1000"))
     frontend_origin: str = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
+    # 可信代理（逗号分隔的 IP/网段）：只有直连地址在其中时才采用 X-Forwarded-For 里的客户端 IP
+    forwarded_allow_ips: str = os.getenv(
+        "FORWARDED_ALLOW_IPS", "127.0.0.1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+    )
+    tracing_exporter: str = os.getenv("TRACING_EXPORTER", "")
+    tracing_file: str = os.getenv("TRACING_FILE", "data/traces.jsonl")
+    tracing_buffer_size: int = int(os.getenv("TRACING_BUFFER_SIZE", "2000"))
 
 
 settings = Settings()
@@ -1,98 +1,25 @@
-import json
-import sqlite3
 from datetime import datetime
-from pathlib import Path
 
-BASE_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = BASE_DIR / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-DB_PATH = DATA_DIR / "app.db"
+from .metrics import db_timed
+from .storage import DATA_DIR, DB_PATH, get_storage
+from .storage.sqlite import serialize_payload as _serialize_payload
+from .tracing import traced
 
-print(f"[DB] BASE_DIR: {BASE_DIR}")
-print(f"[DB] DATA_DIR: {DATA_DIR}")
-print(f"[DB] DB_PATH: {DB_PATH}")
+__all__ = ["DATA_DIR", "DB_PATH", "instrumented"]
 
 
-def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def instrumented(func):
+    """持久化函数的统一埋点：耗时直方图 + trace span。"""
+    return db_timed(traced(f"db.{func.__name__}")(func))
 
 
-def init_db() -> None:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            birth_date TEXT,
-            created_at TEXT NOT NULL
-        );
+@instrumented
+async def init_db() -> None:
+    await get_storage().init()
 
-        CREATE TABLE IF NOT EXISTS sessions (
-            token TEXT PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            expires_at TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        );
 
-        CREATE TABLE IF NOT EXISTS divination_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_id TEXT NULL,
-            question TEXT NOT NULL,
-            mode TEXT NOT NULL,
-            method TEXT NOT NULL,
-            raw_result TEXT NOT NULL,
-            interpretation TEXT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        );
-
-        CREATE TABLE IF NOT EXISTS divination_sessions_v2 (
-            id TEXT PRIMARY KEY,
-            user_id INTEGER NULL,
-            question TEXT NOT NULL,
-            mode TEXT NOT NULL,
-            method TEXT NOT NULL,
-            seed TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'pending',
-            result TEXT NULL,
-            interpretation TEXT NULL,
-            manual_steps TEXT NULL,
-            lang TEXT NOT NULL DEFAULT 'zh',
-            created_at TEXT NOT NULL,
-            completed_at TEXT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-        );
-        """
-    )
-    conn.commit()
-    
-    # 迁移：为旧表添加 lang 列（如果不存在）
-    try:
-        cursor.execute("ALTER TABLE divination_sessions_v2 ADD COLUMN lang TEXT NOT NULL DEFAULT 'zh'")
-        conn.commit()
-    except Exception:
-        # 列已存在，忽略
-        pass
-    
-    conn.close()
-
-
-def _serialize_payload(value: object | None) -> str | None:
-    if value is None:
-        return None
-    if isinstance(value, str):
-        return value
-    return json.dumps(value)
-
-
-def create_divination_record(
+@instrumented
+async def create_divination_record(
     *,
     user_id: int,
     session_id: str | None,
@@ -102,65 +29,30 @@ def create_divination_record(
     raw_result: object,
     interpretation: object | None,
 ) -> dict:
-    created_at = datetime.utcnow().isoformat()
-    raw_payload = _serialize_payload(raw_result)
-    interpretation_payload = _serialize_payload(interpretation)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO divination_records
-            (user_id, session_id, question, mode, method, raw_result, interpretation, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            user_id,
-            session_id,
-            question,
-            mode,
-            method,
-            raw_payload,
-            interpretation_payload,
-            created_at,
-        ),
-    )
-    conn.commit()
-    record_id = cursor.lastrowid
-    conn.close()
-    return {
-        "id": record_id,
+    record = {
         "user_id": user_id,
         "session_id": session_id,
         "question": question,
         "mode": mode,
         "method": method,
-        "raw_result": raw_payload,
-        "interpretation": interpretation_payload,
-        "created_at": created_at,
+        "raw_result": _serialize_payload(raw_result),
+        "interpretation": _serialize_payload(interpretation),
+        "created_at": datetime.utcnow().isoformat(),
     }
+    record_id = await get_storage().create_divination_record(record)
+    return {"id": record_id, **record}
 
 
-def get_divination_records_by_user(user_id: int, limit: int = 20) -> list[dict]:
-    conn = get_connection()
-    rows = conn.execute(
-        """
-        SELECT id, question, mode, method, raw_result, interpretation, created_at
-        FROM divination_records
-        WHERE user_id = ?
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (user_id, limit),
-    ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+@instrumented
+async def get_divination_records_by_user(user_id: int, limit: int = 20) -> list[dict]:
+    return await get_storage().get_divination_records_by_user(user_id, limit)
 
 
 # ===== V2 Session Functions =====
 
 
-def create_divination_session_v2(
+@instrumented
+async def create_divination_session_v2(
     *,
     session_id: str,
     user_id: int | None,
@@ -169,22 +61,10 @@ def create_divination_session_v2(
     method: str,
     seed: str,
     lang: str = "zh",
+    created_at: str | None = None,
 ) -> dict:
     """Create a new v2 divination session."""
-    created_at = datetime.utcnow().isoformat()
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO divination_sessions_v2
-            (id, user_id, question, mode, method, seed, lang, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
-        """,
-        (session_id, user_id, question, mode, method, seed, lang, created_at),
-    )
-    conn.commit()
-    conn.close()
-    return {
+    session = {
         "id": session_id,
         "user_id": user_id,
         "question": question,
@@ -193,37 +73,20 @@ def create_divination_session_v2(
         "seed": seed,
         "lang": lang,
         "status": "pending",
-        "created_at": created_at,
+        "created_at": created_at or datetime.utcnow().isoformat(),
     }
+    await get_storage().create_divination_session_v2(session)
+    return session
 
 
-def get_divination_session_v2(session_id: str) -> dict | None:
+@instrumented
+async def get_divination_session_v2(session_id: str) -> dict | None:
     """Get a v2 divination session by ID."""
-    conn = get_connection()
-    row = conn.execute(
-        """
-        SELECT id, user_id, question, mode, method, seed, lang, status,
-               result, interpretation, manual_steps, created_at, completed_at
-        FROM divination_sessions_v2
-        WHERE id = ?
-        """,
-        (session_id,),
-    ).fetchone()
-    conn.close()
-    if row is None:
-        return None
-    result = dict(row)
-    # Parse JSON fields
-    for field in ("result", "interpretation", "manual_steps"):
-        if result[field]:
-            try:
-                result[field] = json.loads(result[field])
-            except json.JSONDecodeError:
-                pass
-    return result
+    return await get_storage().get_divination_session_v2(session_id)
 
 
-def update_divination_session_v2(
+@instrumented
+async def update_divination_session_v2(
     session_id: str,
     *,
     status: str | None = None,
@@ -231,54 +94,72 @@ def update_divination_session_v2(
     interpretation: object | None = None,
     manual_steps: object | None = None,
     completed_at: str | None = None,
+    idempotency_key: str | None = None,
+    expect_status: str | None = None,
+    expect_no_interpretation: bool = False,
 ) -> bool:
-    """Update a v2 divination session."""
-    updates = []
-    values = []
-
-    if status is not None:
-        updates.append("status = ?")
-        values.append(status)
-    if result is not None:
-        updates.append("result = ?")
-        values.append(_serialize_payload(result))
-    if interpretation is not None:
-        updates.append("interpretation = ?")
-        values.append(_serialize_payload(interpretation))
-    if manual_steps is not None:
-        updates.append("manual_steps = ?")
-        values.append(_serialize_payload(manual_steps))
-    if completed_at is not None:
-        updates.append("completed_at = ?")
-        values.append(completed_at)
-
-    if not updates:
+    """Update a v2 divination session.
+
+    With expect_status / expect_no_interpretation the update only applies if the
+    row still matches (compare-and-set); returns False when another writer won.
+    """
+    fields = {
+        key: value
+        for key, value in (
+            ("status", status),
+            ("result", result),
+            ("interpretation", interpretation),
+            ("manual_steps", manual_steps),
+            ("completed_at", completed_at),
+            ("idempotency_key", idempotency_key),
+        )
+        if value is not None
+    }
+    if not fields:
         return False
+    expect: dict[str, object] = {}
+    if expect_status is not None:
+        expect["status"] = expect_status
+    if expect_no_interpretation:
+        expect["interpretation"] = None
+    return await get_storage().update_divination_session_v2(session_id, fields, expect or None)
 
-    values.append(session_id)
-    sql = f"UPDATE divination_sessions_v2 SET {', '.join(updates)} WHERE id = ?"
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(sql, values)
-    conn.commit()
-    affected = cursor.rowcount
-    conn.close()
-    return affected > 0
+@instrumented
+async def list_divination_sessions_v2(
+    user_id: int,
+    *,
+    limit: int = 20,
+    before: tuple[str, str] | None = None,
+    method: str | None = None,
+    status: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    full: bool = False,
+) -> tuple[list[dict], tuple[str, str] | None]:
+    """按 (created_at, id) 倒序分页查询用户的会话。
+
+    before 为上一页最后一条的 (created_at, id)；返回本页记录和下一页的游标（没有更多时为 None）。
+    摘要字段全部落在 idx_sessions_v2_user_history 覆盖索引里，翻到多深都不需要回表。
+    """
+    rows = await get_storage().list_divination_sessions_v2(
+        user_id,
+        limit=limit + 1,
+        before=before,
+        method=method,
+        status=status,
+        since=since,
+        until=until,
+        full=full,
+    )
+    records = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and records:
+        next_cursor = (records[-1]["created_at"], records[-1]["id"])
+    return records, next_cursor
 
 
-def get_divination_sessions_by_user_v2(user_id: int, limit: int = 20) -> list[dict]:
+async def get_divination_sessions_by_user_v2(user_id: int, limit: int = 20) -> list[dict]:
     """Get v2 divination sessions for a user."""
-    conn = get_connection()
-    rows = conn.execute(
-        """
-        SELECT id, question, mode, method, status, created_at, completed_at
-        FROM divination_sessions_v2
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT ?
-        """,
-        (user_id, limit),
-    ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    records, _ = await list_divination_sessions_v2(user_id, limit=limit)
+    return records
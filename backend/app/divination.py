@@ -4,11 +4,15 @@ import random
 import re
 from typing import Any
 
-import httpx
-
 from .config import settings
+from .limiter import Priority
+from .llm import get_router
+from .method_classifier import get_classifier
+from .metrics import METHOD_SELECTIONS
+from .response_decoding import decode_json
 
 DIVINATION_METHODS = ("tarot", "liuyao")
+AI_BUILDER_BUDGET = 20
 
 TAROT_CARDS = [
     {
@@ -154,41 +158,19 @@ def draw_liuyao(question: str, user_seed: str | None) -> dict[str, Any]:
     }
 
 
-async def _call_ai_builder(messages: list[dict[str, str]], temperature: float) -> str:
-    if not settings.ai_builder_api_key:
+async def _call_ai_builder(
+    messages: list[dict[str, str]], temperature: float, caller: str = "choose_method"
+) -> str:
+    if not get_router().upstreams:
         raise RuntimeError("AI Builder key missing")
-    payload = {
-        "model": settings.ai_builder_model,
-        "messages": messages,
-        "temperature": temperature,
-    }
-    async with httpx.AsyncClient(timeout=20) as client:
-        response = await client.post(
-            settings.ai_builder_api_url,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {settings.ai_builder_api_key}",
-            },
-            json=payload,
-        )
-    if response.status_code >= 400:
-        raise RuntimeError(f"AI Builder API failed: {response.status_code} {response.text}")
-    data = response.json()
-    return data.get("choices", [{}])[0].get("message", {}).get("content", "")
-
-
-def _safe_parse_json(content: str) -> dict[str, Any]:
-    try:
-        parsed = json.loads(content)
-    except json.JSONDecodeError:
-        match = re.search(r"\{.*\}", content, re.S)
-        if not match:
-            return {}
-        try:
-            parsed = json.loads(match.group(0))
-        except json.JSONDecodeError:
-            return {}
-    return parsed if isinstance(parsed, dict) else {}
+    response = await get_router().complete(
+        messages,
+        temperature=temperature,
+        caller=caller,
+        budget=AI_BUILDER_BUDGET,
+        priority=Priority.STANDARD,
+    )
+    return response.content
 
 
 def _fallback_method(question: str) -> str:
@@ -198,7 +180,13 @@ def _fallback_method(question: str) -> str:
     return "tarot"
 
 
-async def choose_method(question: str) -> dict[str, str]:
+METHOD_REASONS = {
+    "liuyao": "问题偏向是非判断或具体决策，适合六爻",
+    "tarot": "问题偏向情感、关系或方向探索，适合塔罗牌",
+}
+
+
+async def _llm_choose_method(question: str) -> dict[str, str]:
     prompt = (
         "你是占卜方式选择器。根据用户问题选择最合适的占卜方式。\n"
         "可选方式: tarot, liuyao。\n"
@@ -206,23 +194,34 @@ async def choose_method(question: str) -> dict[str, str]:
         "liuyao（六爻）适合是非判断、重大决策、事业选择等具体问题。\n"
         "只返回 JSON，例如: {\"method\": \"tarot\", \"reason\": \"...\"}"
     )
+    content = await _call_ai_builder(
+        [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": question.strip()},
+        ],
+        temperature=0.2,
+    )
+    parsed = decode_json(content)
+    method = str(parsed.get("method", "")).lower()
+    if method not in DIVINATION_METHODS:
+        method = _fallback_method(question)
+    reason = str(parsed.get("reason", "")).strip() or "根据问题类型选择"
+    return {"method": method, "reason": reason}
+
+
+async def choose_method(question: str) -> dict[str, str]:
+    # 本地分类器足够确定时不再调用 LLM
+    prediction = get_classifier().predict(question)
+    if prediction.confidence >= settings.method_classifier_threshold:
+        METHOD_SELECTIONS.labels(source="classifier").inc()
+        return {"method": prediction.method, "reason": METHOD_REASONS[prediction.method]}
     try:
-        content = await _call_ai_builder(
-            [
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": question.strip()},
-            ],
-            temperature=0.2,
-        )
-        parsed = _safe_parse_json(content)
-        method = str(parsed.get("method", "")).lower()
-        if method not in DIVINATION_METHODS:
-            method = _fallback_method(question)
-        reason = str(parsed.get("reason", "")).strip() or "根据问题类型选择"
-        return {"method": method, "reason": reason}
+        choice = await _llm_choose_method(question)
+        METHOD_SELECTIONS.labels(source="llm").inc()
+        return choice
     except Exception:
-        method = _fallback_method(question)
-        return {"method": method, "reason": "未能调用模型，使用默认规则"}
+        METHOD_SELECTIONS.labels(source="fallback").inc()
+        return {"method": prediction.method, "reason": "未能调用模型，使用本地分类结果"}
 
 
 def generate_result(method: str, question: str, user_seed: str | None) -> dict[str, Any]:
@@ -248,8 +247,9 @@ async def generate_interpretation(question: str, method: str, result: dict[str,
                 {"role": "user", "content": user_payload},
             ],
             temperature=0.5,
+            caller="interpretation_v1",
         )
-        parsed = _safe_parse_json(content)
+        parsed = decode_json(content)
         if {"summary", "explanation", "advice", "ritual_ending"} <= parsed.keys():
             return {
                 "summary": str(parsed["summary"]).strip(),
@@ -3,116 +3,33 @@ LLM解读提示词模板和调用逻辑。
 """
 
 import json
-import re
+from collections.abc import Callable
 from typing import Any
 
-import httpx
-
 from .config import settings
+from .limiter import Priority
+from .llm import LLMError, get_router
+from .metrics import INTERPRETATIONS, LLM_RESPONSE_DECODES
+from .prompts import (  # noqa: F401  (SYSTEM_PROMPTS 保留旧的导入路径)
+    SYSTEM_PROMPT,
+    SYSTEM_PROMPTS,
+    compile_liuyao_prompt,
+    compile_prompt,
+    compile_tarot_prompt,
+)
+from .response_decoding import (  # noqa: F401  (REQUIRED_FIELDS 保留旧的导入路径)
+    REQUIRED_FIELDS,
+    LIST_FIELDS,
+    DecodedInterpretation,
+    decode_interpretation,
+    decode_json,
+)
+from .tracing import current_span, traced
 from .models.divination_v2 import (
     Confidence,
     DivinationInterpretation,
 )
 
-# ===== System Prompts by Language =====
-SYSTEM_PROMPTS = {
-    "zh": """你是一位温和、睿智的占卜解读者。你的任务是基于占卜结果为用户提供洞察和建议。
-
-【核心原则】
-1. 不做绝对化断言，使用"可能"、"倾向于"、"值得考虑"等措辞
-2. 占卜是自我反思的工具，不是命运的裁决
-3. 站在用户角度，提供情绪共鸣和实用建议
-4. 不承诺准确率，强调占卜的启发性而非预测性
-
-【语言风格】
-- 简洁清晰，避免故弄玄虚
-- 温暖但不油腻，专业但不冷漠
-- 使用现代中文，避免过度古风
-
-【输出格式】
-必须返回有效JSON，包含以下字段：
-{
-  "summary": "一句话核心结论（15-25字）",
-  "advice": "具体可执行的建议（30-50字）",
-  "timing": "时机提示（10-20字）",
-  "confidence": "low/medium/high",
-  "reasoning_bullets": ["要点1", "要点2", "要点3"],
-  "follow_up_questions": ["追问1", "追问2"],
-  "ritual_ending": "温暖的结束语（15-25字）"
-}
-
-【关于reasoning_bullets】
-- 提供3-5条简短的解释要点
-- 每条10-20字
-- 连接占卜结果与用户问题
-- 不要暴露复杂的推理过程，只展示关键洞察""",
-
-    "ja": """あなたは穏やかで賢明な占い師です。占いの結果に基づいて、ユーザーに洞察とアドバイスを提供することがあなたの役割です。
-
-【基本原則】
-1. 断定的な表現を避け、「かもしれない」「傾向がある」「検討する価値がある」などの言葉を使う
-2. 占いは自己省察のツールであり、運命の審判ではない
-3. ユーザーの立場に立って、感情的な共感と実用的なアドバイスを提供する
-4. 正確さを約束せず、占いの啓発的な側面を強調する
-
-【言語スタイル】
-- 簡潔明瞭で、神秘的にしすぎない
-- 温かみがありながらも節度を保ち、専門的でありながらも冷たくない
-- 現代の日本語を使用し、過度に古風な表現を避ける
-
-【出力形式】
-必ず有効なJSONを返してください。以下のフィールドを含めてください：
-{
-  "summary": "一文の核心的な結論（15-25文字）",
-  "advice": "具体的で実行可能なアドバイス（30-50文字）",
-  "timing": "タイミングのヒント（10-20文字）",
-  "confidence": "low/medium/high",
-  "reasoning_bullets": ["ポイント1", "ポイント2", "ポイント3"],
-  "follow_up_questions": ["追加質問1", "追加質問2"],
-  "ritual_ending": "温かい締めの言葉（15-25文字）"
-}
-
-【reasoning_bulletsについて】
-- 3-5個の簡潔な説明ポイントを提供
-- 各10-20文字
-- 占いの結果とユーザーの質問を結びつける
-- 複雑な推論過程は見せず、重要な洞察のみを示す""",
-
-    "en": """You are a gentle and wise divination reader. Your task is to provide insights and advice based on divination results.
-
-【Core Principles】
-1. Avoid absolute statements; use words like "may," "tends to," "worth considering"
-2. Divination is a tool for self-reflection, not a verdict of fate
-3. Stand in the user's shoes, providing emotional resonance and practical advice
-4. Don't promise accuracy; emphasize the inspirational nature of divination
-
-【Language Style】
-- Clear and concise, avoid being overly mystical
-- Warm but not excessive, professional but not cold
-- Use modern English, avoid archaic expressions
-
-【Output Format】
-Must return valid JSON with the following fields:
-{
-  "summary": "One-sentence core conclusion (10-20 words)",
-  "advice": "Specific actionable advice (20-40 words)",
-  "timing": "Timing hint (5-15 words)",
-  "confidence": "low/medium/high",
-  "reasoning_bullets": ["Point 1", "Point 2", "Point 3"],
-  "follow_up_questions": ["Follow-up 1", "Follow-up 2"],
-  "ritual_ending": "Warm closing words (10-20 words)"
-}
-
-【About reasoning_bullets】
-- Provide 3-5 brief explanation points
-- Each 5-15 words
-- Connect divination results with user's question
-- Don't expose complex reasoning, only show key insights"""
-}
-
-# Default to Chinese for backward compatibility
-SYSTEM_PROMPT = SYSTEM_PROMPTS["zh"]
-
 
 def _build_liuyao_prompt(
     question: str,
@@ -121,114 +38,7 @@ def _build_liuyao_prompt(
     lang: str = "zh",
 ) -> str:
     """构建六爻解读的用户提示词（支持多语言）。"""
-    primary = result.get("primary_hexagram", {})
-    relating = result.get("relating_hexagram")
-    lines = result.get("lines", [])
-    changing_lines = result.get("changing_lines", [])
-
-    # 多语言文本
-    texts = {
-        "zh": {
-            "line_names": ["初", "二", "三", "四", "五", "上"],
-            "yao_types": {"old_yin": "老阴", "young_yin": "少阴", "young_yang": "少阳", "old_yang": "老阳"},
-            "changing": "（动）",
-            "no_changing": "无动爻",
-            "changing_suffix": "动",
-            "user_question": "用户问题",
-            "divination_method": "占卜方式",
-            "liuyao_method": "六爻起卦",
-            "ai_generated": "AI生成",
-            "manual_cast": "手动投掷",
-            "hexagram_result": "卦象结果",
-            "primary_hexagram": "本卦",
-            "relating_hexagram": "变卦",
-            "changing_lines": "动爻",
-            "line_details": "六爻详情",
-            "interpretation_request": "请根据以上信息，结合用户的问题，提供占卜解读。",
-        },
-        "ja": {
-            "line_names": ["初", "二", "三", "四", "五", "上"],
-            "yao_types": {"old_yin": "老陰", "young_yin": "少陰", "young_yang": "少陽", "old_yang": "老陽"},
-            "changing": "（動）",
-            "no_changing": "動爻なし",
-            "changing_suffix": "動",
-            "user_question": "ユーザーの質問",
-            "divination_method": "占い方法",
-            "liuyao_method": "六爻占い",
-            "ai_generated": "AI生成",
-            "manual_cast": "手動投擲",
-            "hexagram_result": "卦象結果",
-            "primary_hexagram": "本卦",
-            "relating_hexagram": "変卦",
-            "changing_lines": "動爻",
-            "line_details": "六爻詳細",
-            "interpretation_request": "上記の情報とユーザーの質問に基づいて、占い解読を日本語で提供してください。",
-        },
-        "en": {
-            "line_names": ["1st", "2nd", "3rd", "4th", "5th", "6th"],
-            "yao_types": {"old_yin": "Old Yin", "young_yin": "Young Yin", "young_yang": "Young Yang", "old_yang": "Old Yang"},
-            "changing": " (changing)",
-            "no_changing": "No changing lines",
-            "changing_suffix": " changing",
-            "user_question": "User Question",
-            "divination_method": "Divination Method",
-            "liuyao_method": "Liu Yao (Six Lines)",
-            "ai_generated": "AI Generated",
-            "manual_cast": "Manual Cast",
-            "hexagram_result": "Hexagram Result",
-            "primary_hexagram": "Primary Hexagram",
-            "relating_hexagram": "Relating Hexagram",
-            "changing_lines": "Changing Lines",
-            "line_details": "Line Details",
-            "interpretation_request": "Based on the above information and the user's question, please provide the divination interpretation in English.",
-        },
-    }
-    t = texts.get(lang, texts["zh"])
-
-    # 构建六爻详情
-    lines_detail = []
-    for i, line in enumerate(lines):
-        yao_type = line.get("yao_type", "")
-        is_changing = line.get("is_changing", False)
-        yao_name = t["yao_types"].get(yao_type, yao_type)
-        changing_mark = t["changing"] if is_changing else ""
-        lines_detail.append(f"{t['line_names'][i]} line: {yao_name}{changing_mark}")
-
-    # 动爻描述
-    if changing_lines:
-        if lang == "en":
-            changing_desc = ", ".join(f"{t['line_names'][pos-1]} line" for pos in changing_lines) + t["changing_suffix"]
-        else:
-            changing_desc = "、".join(f"{t['line_names'][pos-1]}爻" for pos in changing_lines) + t["changing_suffix"]
-    else:
-        changing_desc = t["no_changing"]
-
-    # 变卦部分
-    relating_text = ""
-    if relating:
-        relating_text = f"""
-{t['relating_hexagram']}: {relating.get('name', '')} ({relating.get('symbol', '')})
-{relating.get('description', '')}"""
-
-    prompt = f"""【{t['user_question']}】
-{question}
-
-【{t['divination_method']}】
-{t['liuyao_method']} ({t['ai_generated'] if mode == "ai" else t['manual_cast']})
-
-【{t['hexagram_result']}】
-{t['primary_hexagram']}: {primary.get('name', '')} ({primary.get('symbol', '')})
-{primary.get('description', '')}
-{relating_text}
-
-{t['changing_lines']}: {changing_desc}
-
-【{t['line_details']}】
-{chr(10).join(lines_detail)}
-
-{t['interpretation_request']}"""
-
-    return prompt
+    return compile_liuyao_prompt(question, mode, result, lang).user
 
 
 def _build_tarot_prompt(
@@ -238,182 +48,126 @@ def _build_tarot_prompt(
     lang: str = "zh",
 ) -> str:
     """构建塔罗解读的用户提示词（支持多语言）。"""
-    cards = result.get("cards", [])
-
-    # 多语言文本
-    texts = {
-        "zh": {
-            "user_question": "用户问题",
-            "divination_method": "占卜方式",
-            "tarot_spread": "塔罗牌三张牌阵",
-            "ai_generated": "AI生成",
-            "manual_draw": "手动抽牌",
-            "past_present_future": "过去/现在/未来",
-            "draw_result": "抽牌结果",
-            "position": "位置",
-            "upright": "正位",
-            "reversed": "逆位",
-            "keywords": "关键词",
-            "spread_direction": "牌阵解读方向",
-            "past": "过去",
-            "present": "现在",
-            "future": "未来",
-            "past_meaning": "影响当前问题的背景和根源",
-            "present_meaning": "当前状态和面临的核心议题",
-            "future_meaning": "如果保持现状，可能的发展方向",
-            "interpretation_request": "请根据以上信息，结合用户的问题，提供占卜解读。",
-        },
-        "ja": {
-            "user_question": "ユーザーの質問",
-            "divination_method": "占い方法",
-            "tarot_spread": "タロット三枚引き",
-            "ai_generated": "AI生成",
-            "manual_draw": "手動引き",
-            "past_present_future": "過去/現在/未来",
-            "draw_result": "引いたカード",
-            "position": "位置",
-            "upright": "正位置",
-            "reversed": "逆位置",
-            "keywords": "キーワード",
-            "spread_direction": "スプレッド解読方向",
-            "past": "過去",
-            "present": "現在",
-            "future": "未来",
-            "past_meaning": "現在の問題に影響を与えている背景と根源",
-            "present_meaning": "現在の状態と直面している核心的な問題",
-            "future_meaning": "現状を維持した場合の可能な展開",
-            "interpretation_request": "上記の情報とユーザーの質問に基づいて、占い解読を日本語で提供してください。",
-        },
-        "en": {
-            "user_question": "User Question",
-            "divination_method": "Divination Method",
-            "tarot_spread": "Tarot Three-Card Spread",
-            "ai_generated": "AI Generated",
-            "manual_draw": "Manual Draw",
-            "past_present_future": "Past/Present/Future",
-            "draw_result": "Cards Drawn",
-            "position": "Position",
-            "upright": "Upright",
-            "reversed": "Reversed",
-            "keywords": "Keywords",
-            "spread_direction": "Spread Interpretation Guide",
-            "past": "Past",
-            "present": "Present",
-            "future": "Future",
-            "past_meaning": "Background and root causes affecting the current issue",
-            "present_meaning": "Current state and core issues being faced",
-            "future_meaning": "Possible direction if current course is maintained",
-            "interpretation_request": "Based on the above information and the user's question, please provide the divination interpretation in English.",
-        },
-    }
-    t = texts.get(lang, texts["zh"])
-
-    # 位置标签翻译
-    position_labels = [t["past"], t["present"], t["future"]]
-    
-    cards_detail = []
-    for i, card_draw in enumerate(cards):
-        card = card_draw.get("card", {})
-        is_upright = card_draw.get("is_upright", True)
-        orientation = t["upright"] if is_upright else t["reversed"]
-        meaning = card_draw.get("meaning", "")
-        # 根据语言选择牌名（英文和日语使用英文牌名，中文使用中文牌名）
-        card_name = card.get('name_en', card.get('name', '')) if lang in ("en", "ja") else card.get('name', '')
-        # 使用翻译后的位置标签
-        pos_label = position_labels[i] if i < len(position_labels) else card_draw.get("position_label", "")
+    return compile_tarot_prompt(question, mode, result, lang).user
 
-        cards_detail.append(f"""{t['position']}{i+1} - {pos_label}: {card_name} ({orientation})
-  {t['keywords']}: {meaning}""")
 
-    prompt = f"""【{t['user_question']}】
-{question}
-
-【{t['divination_method']}】
-{t['tarot_spread']} ({t['ai_generated'] if mode == "ai" else t['manual_draw']}) - {t['past_present_future']}
-
-【{t['draw_result']}】
-{chr(10).join(cards_detail)}
-
-【{t['spread_direction']}】
-- {t['past']}: {t['past_meaning']}
-- {t['present']}: {t['present_meaning']}
-- {t['future']}: {t['future_meaning']}
-
-{t['interpretation_request']}"""
+@traced("json.parse_llm_response")
+def _safe_parse_json(content: str) -> dict[str, Any]:
+    """安全解析JSON，支持代码块、前后说明文字和被截断的输出。"""
+    return decode_json(content)
 
-    return prompt
 
-
-def _safe_parse_json(content: str) -> dict[str, Any]:
-    """安全解析JSON，支持从文本中提取JSON。"""
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        # 尝试从文本中提取JSON
-        match = re.search(r"\{.*\}", content, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
-    return {}
+def _is_usable(content: str) -> bool:
+    """路由层校验：接受字段齐全、或只缺少少量字段（可以追问补齐）的响应。"""
+    decoded = decode_interpretation(content)
+    return not decoded.missing or decoded.repairable(settings.llm_repair_max_fields)
 
 
+@traced("llm.call")
 async def _call_llm(
     system_prompt: str,
     user_prompt: str,
     temperature: float = 0.5,
+    validate: Callable[[str], bool] | None = None,
+    caller: str = "interpretation",
+    priority: Priority = Priority.INTERACTIVE,
 ) -> str:
-    """调用LLM API。"""
+    """调用LLM API（经路由层：延迟预算、对冲、备用模型、熔断）。"""
     print("[LLM] Starting LLM call...")
-    
-    if not settings.ai_builder_api_key:
+
+    # 只配置了备用上游（AI_BUILDER_FALLBACK_*）时同样可用
+    if not get_router().upstreams:
         print("[LLM] ERROR: API key not configured!")
         raise RuntimeError("AI Builder API key not configured")
 
-    print(f"[LLM] Using model: {settings.ai_builder_model}")
-    print(f"[LLM] API URL: {settings.ai_builder_api_url}")
-
-    payload = {
-        "model": settings.ai_builder_model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        "temperature": temperature,
-    }
+    current_span().set_attributes(
+        {
+            "llm.model": settings.ai_builder_model,
+            "llm.system_prompt.length": len(system_prompt),
+            "llm.user_prompt.length": len(user_prompt),
+        }
+    )
 
     try:
-        print("[LLM] Sending request to AI Builder API...")
-        async with httpx.AsyncClient(timeout=60) as client:  # Increased timeout to 60s
-            response = await client.post(
-                settings.ai_builder_api_url,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {settings.ai_builder_api_key}",
-                },
-                json=payload,
-            )
-        print(f"[LLM] Response status: {response.status_code}")
-    except httpx.TimeoutException:
-        print("[LLM] ERROR: Request timed out after 60 seconds!")
-        raise RuntimeError("LLM API request timed out")
-    except Exception as e:
-        print(f"[LLM] ERROR: Request failed: {e}")
-        raise
-
-    if response.status_code >= 400:
-        print(f"[LLM] ERROR: API returned error: {response.text}")
-        raise RuntimeError(
-            f"LLM API error: {response.status_code} - {response.text}"
+        response = await get_router().complete(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=temperature,
+            caller=caller,
+            validate=validate,
+            priority=priority,
         )
+    except LLMError as e:
+        print(f"[LLM] ERROR: {e}")
+        raise
 
-    data = response.json()
-    content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-    print(f"[LLM] Success! Response length: {len(content)} chars")
+    content = response.content
+    current_span().set_attribute("llm.response.length", len(content))
+    print(
+        f"[LLM] Success via {response.upstream} in {response.latency:.2f}s! "
+        f"Response length: {len(content)} chars"
+    )
     return content
 
 
+REPAIR_SYSTEM_PROMPT = (
+    "You complete a partially generated divination reading. "
+    "Reply with a single JSON object containing exactly the requested keys, "
+    "written in the same language and tone as the existing fields. No other text."
+)
+
+
+def _build_repair_prompt(decoded: DecodedInterpretation) -> str:
+    """只带上已有字段和缺少字段的说明，不重发整份占卜提示词。"""
+    schema = DivinationInterpretation.model_fields
+    wanted = "\n".join(
+        f'- "{key}": {schema[key].description}'
+        + (" (JSON array of strings)" if key in LIST_FIELDS else "")
+        for key in decoded.missing
+    )
+    existing = json.dumps(decoded.fields, ensure_ascii=False)
+    return f"Existing fields:\n{existing}\n\nReturn only these missing keys:\n{wanted}"
+
+
+async def _complete_interpretation(
+    content: str,
+    *,
+    caller: str = "interpretation",
+    priority: Priority = Priority.INTERACTIVE,
+) -> DivinationInterpretation | None:
+    """解码 LLM 响应；只缺少少量字段时追问一次补齐，而不是整份丢弃。"""
+    decoded = decode_interpretation(content)
+    interpretation = decoded.interpretation
+    if interpretation is not None:
+        LLM_RESPONSE_DECODES.labels(
+            caller=caller, outcome="coerced" if decoded.coerced else "ok"
+        ).inc()
+        return interpretation
+    if not decoded.repairable(settings.llm_repair_max_fields):
+        LLM_RESPONSE_DECODES.labels(caller=caller, outcome="invalid").inc()
+        return None
+
+    missing = decoded.missing
+    print(f"[LLM] Response missing {', '.join(missing)}, requesting repair")
+    try:
+        patch = await _call_llm(
+            REPAIR_SYSTEM_PROMPT,
+            _build_repair_prompt(decoded),
+            temperature=0.3,
+            validate=lambda c: not decoded.merge(decode_interpretation(c)).missing,
+            caller=f"{caller}_repair",
+            priority=priority,
+        )
+    except Exception as e:
+        print(f"[LLM] Repair failed: {e}")
+        LLM_RESPONSE_DECODES.labels(caller=caller, outcome="repair_failed").inc()
+        return None
+    LLM_RESPONSE_DECODES.labels(caller=caller, outcome="repaired").inc()
+    return decoded.merge(decode_interpretation(patch)).interpretation
+
+
 FALLBACK_TEXTS = {
     "zh": {
         "liuyao_summary": "本卦{name}，提示你关注当下的选择",
@@ -493,6 +247,7 @@ def _create_fallback_interpretation(
     )
 
 
+@traced("interpretation.generate", record_args=("method", "mode", "lang"))
 async def generate_interpretation_v2(
     question: str,
     method: str,
@@ -506,64 +261,59 @@ async def generate_interpretation_v2(
     print(f"[INTERPRETATION] Method: {method}, Mode: {mode}")
     print(f"[INTERPRETATION] Question: {question[:50]}...")
     
-    # 构建提示词（传递语言参数）
-    if method == "liuyao":
-        user_prompt = _build_liuyao_prompt(question, mode, result, lang)
-    else:
-        user_prompt = _build_tarot_prompt(question, mode, result, lang)
-
-    print(f"[INTERPRETATION] User prompt language markers: {lang}")
+    # 构建提示词（预编译模板 + 输入 token 预算）
+    prompt = compile_prompt(method, question, mode, result, lang)
+    user_prompt = prompt.user
+    system_prompt = prompt.system
+    print(f"[INTERPRETATION] Prompt tokens (estimated): {prompt.total_tokens}")
+    if prompt.trimmed:
+        print(f"[INTERPRETATION] Trimmed to fit budget: {', '.join(prompt.trimmed)}")
     print(f"[INTERPRETATION] User prompt first 200 chars: {user_prompt[:200]}...")
-
-    # 选择对应语言的系统提示词
-    system_prompt = SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["zh"])
-    print(f"[INTERPRETATION] System prompt language: {lang}")
     print(f"[INTERPRETATION] System prompt first 100 chars: {system_prompt[:100]}...")
 
+    # 相同结果下的近似问题直接复用之前的解读
+    semantic_cache = None
+    if settings.semantic_cache_enabled:
+        from .semantic_cache import get_semantic_cache
+
+        semantic_cache = get_semantic_cache()
+        cached = semantic_cache.lookup(question, method, result, lang)
+        if cached is not None:
+            INTERPRETATIONS.labels(method=method, lang=lang, source="semantic_cache").inc()
+            current_span().set_attribute("interpretation.source", "semantic_cache")
+            return cached
+
     try:
         # 调用LLM
         print(f"[INTERPRETATION] Calling LLM...")
-        content = await _call_llm(system_prompt, user_prompt, temperature=0.5)
+        content = await _call_llm(
+            system_prompt, user_prompt, temperature=0.5, validate=_is_usable
+        )
         print(f"[INTERPRETATION] LLM response length: {len(content)}")
         print(f"[INTERPRETATION] LLM response first 300 chars: {content[:300]}...")
 
-        # 解析响应
-        parsed = _safe_parse_json(content)
-
-        if parsed and all(
-            key in parsed
-            for key in [
-                "summary",
-                "advice",
-                "timing",
-                "confidence",
-                "reasoning_bullets",
-                "follow_up_questions",
-                "ritual_ending",
-            ]
-        ):
-            # 验证confidence值
-            confidence_value = parsed.get("confidence", "medium").lower()
-            if confidence_value not in ("low", "medium", "high"):
-                confidence_value = "medium"
-
-            return DivinationInterpretation(
-                summary=str(parsed["summary"]).strip(),
-                advice=str(parsed["advice"]).strip(),
-                timing=str(parsed["timing"]).strip(),
-                confidence=Confidence(confidence_value),
-                reasoning_bullets=[
-                    str(b).strip() for b in parsed["reasoning_bullets"][:5]
-                ],
-                follow_up_questions=[
-                    str(q).strip() for q in parsed["follow_up_questions"][:3]
-                ],
-                ritual_ending=str(parsed["ritual_ending"]).strip(),
-            )
+        # 解析响应（缺少少量字段时追问补齐）
+        interpretation = await _complete_interpretation(content)
+        if interpretation is not None:
+            INTERPRETATIONS.labels(method=method, lang=lang, source="llm").inc()
+            current_span().set_attribute("interpretation.source", "llm")
+            if semantic_cache is not None:
+                semantic_cache.add(question, method, result, lang, interpretation)
+            return interpretation
 
     except Exception as e:
         # 记录错误但不抛出，使用降级解读
         print(f"LLM interpretation error: {e}")
 
-    # 返回降级解读
+    # 优先使用离线预生成的通用解读，没有时才返回模板化的降级解读
+    from .interpretation_pool import lookup_base_interpretation
+
+    base = await lookup_base_interpretation(method, result, lang)
+    if base is not None:
+        INTERPRETATIONS.labels(method=method, lang=lang, source="pregenerated").inc()
+        current_span().set_attribute("interpretation.source", "pregenerated")
+        return base
+
+    INTERPRETATIONS.labels(method=method, lang=lang, source="fallback").inc()
+    current_span().set_attribute("interpretation.source", "fallback")
     return _create_fallback_interpretation(question, method, result, lang)
@@ -0,0 +1,210 @@
+"""
+预生成的通用解读池。
+
+AI 模式的结果空间是有限的：六爻为 64 个本卦 × 64 种动爻组合（4096 种），
+塔罗为 22·21·20 种有序三张牌 × 8 种正逆位组合。离线任务为每个 (结果, 语言) 调用 LLM
+生成一份与具体问题无关的解读，存入 base_interpretations 表：
+
+- LLM 调用失败时，用它代替 _create_fallback_interpretation 的模板文本
+- /api/v2/divination/{session_id}/preview 直接返回它，前端可以在个性化解读生成期间先展示
+
+    python -m app.interpretation_pool --method liuyao --lang zh --lang en [--concurrency 4]
+
+已经生成过的结果会跳过，中断后重新执行即可从断点继续。
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any
+
+from .db import init_db
+from .interpretation import _call_llm, _complete_interpretation, _is_usable
+from .limiter import Priority
+from .llm import get_router
+from .liuyao import HEXAGRAM_LOOKUP, calculate_toss, generate_liuyao_result
+from .metrics import record_cache
+from .models.divination_v2 import DivinationInterpretation
+from .prompts import compile_prompt
+from .storage import close_storage, get_storage
+from .tarot_v2 import create_manual_draw, generate_tarot_result
+from .usage import get_ledger
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("liuyao", "tarot")
+
+# 生成通用解读时代替用户问题
+BASE_QUESTIONS = {
+    "zh": "（通用解读：不针对具体问题，概括这个结果整体的含义与建议）",
+    "ja": "（一般的な解釈：特定の質問ではなく、この結果全体の意味と助言をまとめてください）",
+    "en": (
+        "(General reading: not tied to a specific question; "
+        "summarize what this result means overall)"
+    ),
+}
+
+_HEXAGRAM_BINARY = {hex_id: binary for binary, hex_id in HEXAGRAM_LOOKUP.items()}
+_COINS_BY_SUM = {6: (2, 2, 2), 7: (2, 2, 3), 8: (2, 3, 3), 9: (3, 3, 3)}
+
+
+# ===== 结果空间 =====
+
+
+def outcome_key(method: str, result: dict[str, Any]) -> str | None:
+    """结果的规范化标识：六爻为 "本卦id:动爻掩码"，塔罗为 "牌id+u/r" 按位置用 - 连接。"""
+    try:
+        if method == "liuyao":
+            mask = sum(1 << (position - 1) for position in result.get("changing_lines", []))
+            return f"{result['primary_hexagram']['id']}:{mask}"
+        return "-".join(
+            f"{draw['card']['id']}{'u' if draw['is_upright'] else 'r'}" for draw in result["cards"]
+        )
+    except (KeyError, TypeError):
+        return None
+
+
+def liuyao_outcome(hexagram_id: int, changing_mask: int) -> dict[str, Any]:
+    """由本卦和动爻掩码（第 n 爻对应第 n-1 位）构造完整的六爻结果。"""
+    tosses = []
+    for i, bit in enumerate(_HEXAGRAM_BINARY[hexagram_id]):
+        changing = bool(changing_mask >> i & 1)
+        if bit == "1":
+            total = 9 if changing else 7
+        else:
+            total = 6 if changing else 8
+        tosses.append(calculate_toss(_COINS_BY_SUM[total]))
+    return generate_liuyao_result(tosses).model_dump()
+
+
+def tarot_outcome(card_ids: tuple[int, ...], upright: tuple[bool, ...]) -> dict[str, Any]:
+    draws = [
+        create_manual_draw(card_id, position, is_upright)
+        for position, (card_id, is_upright) in enumerate(zip(card_ids, upright))
+    ]
+    return generate_tarot_result(draws).model_dump()
+
+
+def iter_outcomes(method: str) -> Iterator[tuple[str, dict[str, Any]]]:
+    """按固定顺序逐个产出 (outcome_key, result)，不一次性构造整个结果空间。"""
+    if method == "liuyao":
+        for hexagram_id, mask in itertools.product(sorted(_HEXAGRAM_BINARY), range(64)):
+            yield f"{hexagram_id}:{mask}", liuyao_outcome(hexagram_id, mask)
+        return
+    for card_ids in itertools.permutations(range(22), 3):
+        for upright in itertools.product((True, False), repeat=3):
+            result = tarot_outcome(card_ids, upright)
+            yield outcome_key("tarot", result), result
+
+
+# ===== 在线查询 =====
+
+
+async def lookup_base_interpretation(
+    method: str, result: dict[str, Any], lang: str
+) -> DivinationInterpretation | None:
+    """查询预生成的通用解读；没有或查询出错时返回 None（调用方继续降级）。"""
+    key = outcome_key(method, result)
+    if key is None:
+        return None
+    try:
+        data = await get_storage().get_base_interpretation(method, key, lang)
+    except Exception as e:
+        logger.warning(f"[POOL] Lookup failed for {method} {key}: {e}")
+        return None
+    record_cache("interpretation_pool", data is not None)
+    return DivinationInterpretation(**data) if data else None
+
+
+# ===== 离线预生成 =====
+
+
+async def generate_base_interpretation(
+    method: str, result: dict[str, Any], lang: str
+) -> DivinationInterpretation | None:
+    question = BASE_QUESTIONS.get(lang, BASE_QUESTIONS["zh"])
+    prompt = compile_prompt(method, question, "ai", result, lang)
+    try:
+        content = await _call_llm(
+            prompt.system,
+            prompt.user,
+            temperature=0.5,
+            validate=_is_usable,
+            caller="pregenerate",
+            priority=Priority.BACKGROUND,
+        )
+    except Exception as e:
+        logger.warning(f"[POOL] Generation failed: {e}")
+        return None
+    return await _complete_interpretation(
+        content, caller="pregenerate", priority=Priority.BACKGROUND
+    )
+
+
+async def precompute(
+    method: str, lang: str, *, concurrency: int = 4, limit: int | None = None
+) -> int:
+    """为尚未生成的结果调用 LLM，返回本次新生成的数量。每条生成后立即写库，即断点。"""
+    storage = get_storage()
+    done = await storage.base_interpretation_keys(method, lang)
+    pending = ((key, result) for key, result in iter_outcomes(method) if key not in done)
+    if limit is not None:
+        pending = itertools.islice(pending, limit)
+    print(f"[POOL] {method}/{lang}: {len(done)} already generated")
+
+    generated = failed = 0
+
+    async def worker() -> None:
+        nonlocal generated, failed
+        # 所有 worker 共享同一个生成器，并发数即同时在途的 LLM 调用数
+        for key, result in pending:
+            interpretation = await generate_base_interpretation(method, result, lang)
+            if interpretation is None:
+                failed += 1
+                continue
+            await storage.put_base_interpretation(
+                method,
+                key,
+                lang,
+                interpretation.model_dump(mode="json"),
+                datetime.utcnow().isoformat(),
+            )
+            generated += 1
+            if generated % 100 == 0:
+                print(f"[POOL] {method}/{lang}: {generated} generated, {failed} failed")
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    print(f"[POOL] {method}/{lang} done: {generated} generated, {failed} failed")
+    return generated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate base interpretations")
+    parser.add_argument("--method", choices=METHODS, action="append")
+    parser.add_argument("--lang", choices=sorted(BASE_QUESTIONS), action="append")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, help="Generate at most N outcomes per method/lang")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run() -> None:
+        try:
+            await init_db()
+            for method in args.method or METHODS:
+                for lang in args.lang or ["zh"]:
+                    await precompute(
+                        method, lang, concurrency=args.concurrency, limit=args.limit
+                    )
+        finally:
+            await get_router().aclose()
+            await get_ledger().flush()
+            await close_storage()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+上游 LLM 调用的自适应并发限制与准入控制。
+
+- AIMD：调用成功时并发上限缓慢增加（每个窗口约 +1），遇到 429/503/超时则乘性下降
+- 优先级：交互请求（/generate、/interpret）优先于普通请求，后台任务（/preload）最后
+- 排队时间预计超过调用方的等待上限时直接拒绝，由调用方走降级逻辑
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+
+from .config import settings
+from .metrics import LLM_CONCURRENCY_LIMIT, LLM_INFLIGHT, LLM_QUEUE_SECONDS, LLM_SHED
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+
+class AdmissionRejectedError(RuntimeError):
+    """排队等待会超出预算，请求被拒绝。"""
+
+
+@dataclass
+class Slot:
+    """一次占用的并发名额；overloaded 标记会让上限乘性下降。"""
+
+    overloaded: bool = False
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        backoff: float = 0.7,
+        default_latency: float = 5.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        self._latency = default_latency
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _waiting_ahead(self, priority: Priority) -> int:
+        return sum(1 for p, _, fut in self._waiters if p <= priority and not fut.done())
+
+    def estimate_wait(self, priority: Priority) -> float:
+        """按当前上限和平均延迟估算排队时间。"""
+        if self._has_capacity() and not self._waiting_ahead(priority):
+            return 0.0
+        ahead = self._waiting_ahead(priority) + 1
+        return ahead / max(1, int(self.limit)) * self._latency
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        LLM_INFLIGHT.inc()
+
+    def try_acquire(self) -> bool:
+        """不排队地尝试获取名额（用于对冲请求，负载高时直接放弃对冲）。"""
+        # 超时或取消的等待者可能还留在堆里，只看仍在等待的
+        if self._has_capacity() and not self._waiting_ahead(Priority.BACKGROUND):
+            self._take()
+            return True
+        return False
+
+    async def acquire(self, priority: Priority, max_wait: float) -> None:
+        start = time.perf_counter()
+        label = priority.name.lower()
+        if self._has_capacity() and not self._waiting_ahead(priority):
+            self._take()
+            LLM_QUEUE_SECONDS.labels(priority=label).observe(0)
+            return
+
+        if self.estimate_wait(priority) > max_wait:
+            LLM_SHED.labels(priority=label).inc()
+            raise AdmissionRejectedError("LLM queue wait would exceed the latency budget")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        try:
+            await asyncio.wait({future}, timeout=max_wait)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(0, overloaded=False)
+            else:
+                future.cancel()
+                self._discard(future)
+            raise
+
+        if not future.done():
+            future.cancel()
+            self._discard(future)
+            LLM_SHED.labels(priority=label).inc()
+            raise AdmissionRejectedError("Timed out waiting for an LLM slot")
+        LLM_QUEUE_SECONDS.labels(priority=label).observe(time.perf_counter() - start)
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        self.in_flight -= 1
+        LLM_INFLIGHT.dec()
+        if overloaded:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if latency > 0:
+                self._latency = 0.9 * self._latency + 0.1 * latency
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+        self._wake()
+
+    def _discard(self, future: asyncio.Future) -> None:
+        self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+        heapq.heapify(self._waiters)
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._take()
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, max_wait: float) -> AsyncIterator[Slot]:
+        await self.acquire(priority, max_wait)
+        start = time.perf_counter()
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            self.release(time.perf_counter() - start, slot.overloaded)
+
+
+_limiter: AdaptiveLimiter | None = None
+
+
+def get_limiter() -> AdaptiveLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = AdaptiveLimiter(
+            settings.llm_concurrency_initial,
+            settings.llm_concurrency_min,
+            settings.llm_concurrency_max,
+        )
+    return _limiter
@@ -0,0 +1,456 @@
+"""
+LLM 路由层：延迟预算、对冲请求、备用模型故障转移和熔断。
+
+所有上游 chat-completions 调用（解读、翻译、占卜方式选择）都经过 LLMRouter.complete：
+- 在延迟预算内完成，超出则抛出 LLMTimeoutError，由调用方走降级逻辑
+- 主请求超过 p95 延迟仍未返回时，发出一个对冲请求（优先发给备用上游）
+- 主上游失败时立即转移到备用模型/端点
+- 上游连续失败达到阈值后熔断，冷却期内直接抛出 LLMUnavailableError
+- 谁先返回通过 validate 校验的内容就用谁，其余请求取消
+- 通过全局自适应并发限制器（limiter.py）排队，交互请求优先于后台任务
+- 按请求归属预留 token 配额并记录实际用量（usage.py），超出配额抛出 LLMQuotaExceededError
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from .config import settings
+from .limiter import AdaptiveLimiter, AdmissionRejectedError, Priority, Slot, get_limiter
+from .metrics import (
+    LLM_BREAKER_OPENS,
+    LLM_FAILOVERS,
+    LLM_HEDGES,
+    LLM_QUOTA_REJECTIONS,
+    LLM_ROUTED_SECONDS,
+    LLM_SHORT_CIRCUITS,
+    record_llm_call,
+)
+from .tracing import current_span
+from .usage import QuotaExceededError, get_ledger
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(RuntimeError):
+    """LLM 调用失败。"""
+
+
+class LLMTimeoutError(LLMError):
+    """超出延迟预算。"""
+
+
+class LLMUnavailableError(LLMError):
+    """未配置或所有上游均已熔断。"""
+
+
+class LLMOverloadedError(LLMUnavailableError):
+    """上游返回 429/503，或本地准入控制拒绝了请求。"""
+
+
+class LLMQuotaExceededError(LLMUnavailableError):
+    """当前用户/IP 或全局的 token 配额已用完。"""
+
+
+_OVERLOAD_ERRORS = (LLMTimeoutError, LLMOverloadedError)
+
+
+@dataclass
+class LLMResponse:
+    content: str
+    data: dict[str, Any]
+    upstream: str
+    latency: float
+
+
+class LatencyTracker:
+    """最近成功请求的延迟窗口，用于估算对冲延迟。"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器：closed → open → (冷却后) half_open → closed/open。"""
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                LLM_BREAKER_OPENS.labels(upstream=self.name).inc()
+                logger.warning(f"[LLM] Circuit breaker for {self.name} opened")
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class Upstream:
+    name: str
+    url: str
+    model: str
+    api_key: str | None
+    breaker: CircuitBreaker
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        upstreams: list[Upstream],
+        *,
+        latency_budget: float,
+        hedge_enabled: bool = True,
+        hedge_default_delay: float = 8.0,
+        hedge_min_delay: float = 1.0,
+        limiter: AdaptiveLimiter | None = None,
+        max_queue_wait: float = 10.0,
+    ) -> None:
+        self.upstreams = upstreams
+        self.limiter = limiter
+        self.max_queue_wait = max_queue_wait
+        self.latency_budget = latency_budget
+        self.hedge_enabled = hedge_enabled
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self._client: "httpx.AsyncClient | None" = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        # 进行中的 complete() 调用数，关闭时等待它们完成
+        self.in_flight = 0
+
+    @classmethod
+    def from_settings(cls) -> "LLMRouter":
+        upstreams = []
+        if settings.ai_builder_api_key:
+            upstreams.append(
+                _make_upstream(
+                    "primary",
+                    settings.ai_builder_api_url,
+                    settings.ai_builder_model,
+                    settings.ai_builder_api_key,
+                )
+            )
+        if settings.ai_builder_fallback_model or settings.ai_builder_fallback_api_url:
+            api_key = settings.ai_builder_fallback_api_key or settings.ai_builder_api_key
+            if api_key:
+                upstreams.append(
+                    _make_upstream(
+                        "secondary",
+                        settings.ai_builder_fallback_api_url or settings.ai_builder_api_url,
+                        settings.ai_builder_fallback_model or settings.ai_builder_model,
+                        api_key,
+                    )
+                )
+        return cls(
+            upstreams,
+            latency_budget=settings.llm_latency_budget,
+            hedge_enabled=settings.llm_hedge_enabled,
+            hedge_default_delay=settings.llm_hedge_default_delay,
+            hedge_min_delay=settings.llm_hedge_min_delay,
+            limiter=get_limiter(),
+            max_queue_wait=settings.llm_max_queue_wait,
+        )
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # 连接池绑定在事件循环上，循环变化（如测试中）时重建
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # httpx 首次调用上游时才导入，/health、/ready 和静态页面不需要它
+            import httpx
+
+            self._client = httpx.AsyncClient()
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    async def drain(self, timeout: float) -> int:
+        """等待进行中的调用完成，最多 timeout 秒；返回仍未完成的调用数。"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.in_flight:
+            logger.warning(f"[LLM] Shutting down with {self.in_flight} calls still in flight")
+        return self.in_flight
+
+    def health(self) -> dict[str, Any]:
+        """各上游的熔断状态和并发情况（供 /ready 使用）。"""
+        return {
+            "in_flight": self.in_flight,
+            "limit": round(self.limiter.limit, 1) if self.limiter else None,
+            "upstreams": {u.name: u.breaker.state for u in self.upstreams},
+        }
+
+    def hedge_delay(self, upstream: Upstream, budget: float) -> float:
+        p95 = upstream.latency.percentile(0.95)
+        delay = p95 if p95 is not None else self.hedge_default_delay
+        return max(self.hedge_min_delay, min(delay, budget / 2))
+
+    async def _attempt(
+        self,
+        upstream: Upstream,
+        messages: list[dict[str, str]],
+        temperature: float,
+        timeout: float,
+        caller: str,
+    ) -> LLMResponse:
+        import httpx
+
+        payload = {"model": upstream.model, "messages": messages, "temperature": temperature}
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(
+                upstream.url,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {upstream.api_key}",
+                },
+                json=payload,
+                timeout=timeout,
+            )
+        except asyncio.CancelledError:
+            elapsed = time.perf_counter() - start
+            record_llm_call(caller, "cancelled", elapsed, upstream=upstream.name)
+            raise
+        except httpx.TimeoutException as e:
+            record_llm_call(caller, "timeout", time.perf_counter() - start, upstream=upstream.name)
+            upstream.breaker.record_failure()
+            raise LLMTimeoutError(f"{upstream.name} timed out") from e
+        except httpx.HTTPError as e:
+            record_llm_call(caller, "error", time.perf_counter() - start, upstream=upstream.name)
+            upstream.breaker.record_failure()
+            raise LLMError(f"{upstream.name} request failed: {e}") from e
+
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            record_llm_call(caller, "error", elapsed, upstream=upstream.name)
+            upstream.breaker.record_failure()
+            message = f"LLM API error: {response.status_code} - {response.text[:500]}"
+            if response.status_code in (429, 503):
+                raise LLMOverloadedError(message)
+            raise LLMError(message)
+
+        data = response.json()
+        record_llm_call(caller, "ok", elapsed, data, upstream=upstream.name)
+        upstream.breaker.record_success()
+        upstream.latency.record(elapsed)
+        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        get_ledger().record(caller, elapsed, data, messages, content)
+        return LLMResponse(content=content, data=data, upstream=upstream.name, latency=elapsed)
+
+    async def complete(
+        self,
+        messages: list[dict[str, str]],
+        *,
+        temperature: float,
+        caller: str,
+        budget: float | None = None,
+        validate: Callable[[str], bool] | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> LLMResponse:
+        """在延迟预算内返回第一个通过校验的响应（排队时间也计入预算）。"""
+        if not self.upstreams:
+            raise LLMUnavailableError("AI Builder API key not configured")
+
+        candidates = [u for u in self.upstreams if u.breaker.allow()]
+        if not candidates:
+            LLM_SHORT_CIRCUITS.labels(caller=caller).inc()
+            raise LLMUnavailableError("All LLM upstreams are unhealthy (circuit open)")
+
+        ledger = get_ledger()
+        try:
+            reservation = ledger.reserve(messages)
+        except QuotaExceededError as e:
+            LLM_QUOTA_REJECTIONS.labels(scope=e.scope, caller=caller).inc()
+            current_span().set_attribute("llm.quota_exceeded", e.scope)
+            raise LLMQuotaExceededError(str(e)) from e
+
+        budget = budget or self.latency_budget
+        deadline = asyncio.get_running_loop().time() + budget
+        self.in_flight += 1
+        try:
+            if self.limiter is None:
+                return await self._race(
+                    messages, temperature, caller, candidates, validate, deadline
+                )
+
+            # 后台任务可以一直排队到预算用完；交互请求排队过久不如直接降级
+            if priority is Priority.BACKGROUND:
+                max_wait = budget
+            else:
+                max_wait = min(self.max_queue_wait, budget / 2)
+            try:
+                async with self.limiter.slot(priority, max_wait) as slot:
+                    return await self._race(
+                        messages, temperature, caller, candidates, validate, deadline, slot
+                    )
+            except AdmissionRejectedError as e:
+                current_span().set_attribute("llm.shed", True)
+                raise LLMOverloadedError(str(e)) from e
+        finally:
+            self.in_flight -= 1
+            # 预留只在调用期间占用额度，实际用量已在 _attempt 中扣减
+            ledger.release(reservation)
+
+    async def _race(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        caller: str,
+        candidates: list[Upstream],
+        validate: Callable[[str], bool] | None,
+        deadline: float,
+        slot: Slot | None = None,
+    ) -> LLMResponse:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        budget = deadline - started
+        not_launched = list(candidates)
+        pending: dict[asyncio.Task, Upstream] = {}
+        last_error: Exception | None = None
+        span = current_span()
+
+        def launch(upstream: Upstream) -> asyncio.Task:
+            timeout = max(0.1, deadline - loop.time())
+            task = asyncio.create_task(
+                self._attempt(upstream, messages, temperature, timeout, caller)
+            )
+            pending[task] = upstream
+            return task
+
+        def release_extra(task: asyncio.Task, launched_at: float) -> None:
+            overloaded = not task.cancelled() and isinstance(task.exception(), _OVERLOAD_ERRORS)
+            self.limiter.release(loop.time() - launched_at, overloaded)
+
+        launch(not_launched.pop(0))
+        hedge_at = float("inf")
+        if self.hedge_enabled:
+            hedge_at = started + self.hedge_delay(candidates[0], budget)
+        hedged = False
+        outcome = "error"
+
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    outcome = "timeout"
+                    if slot:
+                        slot.overloaded = True
+                    raise LLMTimeoutError(f"LLM latency budget of {budget:.1f}s exceeded")
+                wait_until = deadline if hedged else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, wait_until - now), return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    if not hedged and loop.time() >= hedge_at:
+                        hedged = True
+                        # 对冲请求需要额外的并发名额，负载高时放弃对冲以免放大压力
+                        if self.limiter is not None and not self.limiter.try_acquire():
+                            span.set_attribute("llm.hedge_skipped", True)
+                            continue
+                        target = not_launched.pop(0) if not_launched else candidates[0]
+                        LLM_HEDGES.labels(caller=caller).inc()
+                        span.set_attribute("llm.hedged", True)
+                        task = launch(target)
+                        if self.limiter is not None:
+                            launched_at = loop.time()
+                            task.add_done_callback(lambda t, at=launched_at: release_extra(t, at))
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        if slot and isinstance(e, _OVERLOAD_ERRORS):
+                            slot.overloaded = True
+                        continue
+                    if validate is None or validate(result.content):
+                        outcome = "ok"
+                        span.set_attributes({"llm.upstream": result.upstream})
+                        return result
+                    last_error = LLMError(f"Invalid response from {result.upstream}")
+
+                if not pending and not_launched:
+                    # 主上游失败：立即转移到下一个健康的上游，不再等待对冲时机
+                    LLM_FAILOVERS.labels(caller=caller).inc()
+                    span.set_attribute("llm.failover", True)
+                    hedged = True
+                    launch(not_launched.pop(0))
+
+            raise last_error or LLMError("LLM request failed")
+        finally:
+            for task in pending:
+                task.cancel()
+            elapsed = loop.time() - started
+            LLM_ROUTED_SECONDS.labels(caller=caller, outcome=outcome).observe(elapsed)
+
+
+def _make_upstream(name: str, url: str, model: str, api_key: str | None) -> Upstream:
+    return Upstream(
+        name=name,
+        url=url,
+        model=model,
+        api_key=api_key,
+        breaker=CircuitBreaker(name, settings.llm_breaker_failures, settings.llm_breaker_cooldown),
+    )
+
+
+_router: LLMRouter | None = None
+
+
+def get_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        _router = LLMRouter.from_settings()
+    return _router
+
+
+def set_router(router: LLMRouter | None) -> None:
+    """替换全局路由（测试或运行时重新配置用）。"""
+    global _router
+    _router = router
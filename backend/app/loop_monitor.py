@@ -0,0 +1,178 @@
+"""
+事件循环阻塞检测。
+
+async 路由里直接调用同步的 Redis、sqlite3 或 CPU 密集代码会卡住整个 worker 的事件循环，
+同一进程里所有并发请求的延迟一起上涨。这里提供两部分：
+
+- LoopMonitor（LOOP_MONITOR_ENABLED=true 时在 lifespan 中启动）：事件循环里的心跳任务
+  每 LOOP_MONITOR_INTERVAL 秒记录一次调度延迟（event_loop_lag_seconds）；监视线程发现心跳
+  停滞超过 LOOP_BLOCK_THRESHOLD_MS 时采样事件循环线程的调用栈，把这次阻塞归因到 app 包内
+  最深的一帧（例如 redis_client.get_redis），阻塞结束后按调用点计入
+  event_loop_blocks_total / event_loop_block_seconds 并写 [LOOP] 日志
+- forbid_blocking_io()：测试用的严格模式，在运行事件循环的线程上调用阻塞 socket、
+  sqlite3.connect 或 time.sleep 时抛出 BlockingCallError 并记录下来
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from types import FrameType
+from typing import Any
+
+from .config import settings
+from .metrics import EVENT_LOOP_BLOCK_SECONDS, EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG_SECONDS
+from .profiler import short_path
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# 监控/采样代码本身不算调用点
+_OWN_FILES = {os.path.abspath(__file__), os.path.join(APP_DIR, "profiler.py")}
+
+
+def call_site(frame: FrameType | None) -> tuple[str, str]:
+    """返回 (调用点, 描述)。调用点是 app 包内最深的一帧，如 routers.horoscope.aztro。"""
+    leaf = frame
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(APP_DIR) and path not in _OWN_FILES:
+            module = path[len(APP_DIR) : -len(".py")].replace(os.sep, ".")
+            site = f"{module}.{frame.f_code.co_qualname}"
+            where = f"{site} (app/{path[len(APP_DIR):]}:{frame.f_lineno})"
+            if leaf is not frame:
+                leaf_path = short_path(leaf.f_code.co_filename)
+                where += f" -> {leaf.f_code.co_qualname} ({leaf_path}:{leaf.f_lineno})"
+            return site, where
+        frame = frame.f_back
+    if leaf is None:
+        return "unknown", "no frame"
+    return "other", f"{leaf.f_code.co_qualname} ({short_path(leaf.f_code.co_filename)})"
+
+
+class LoopMonitor:
+    def __init__(self, threshold: float, interval: float) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self._beat = time.monotonic()
+        self._loop_thread: int | None = None
+        # (心跳时间戳, 调用点, 描述)：监视线程在阻塞期间采到的第一份调用栈
+        self._pending: tuple[float, str, str] | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls) -> "LoopMonitor":
+        return cls(settings.loop_block_threshold_ms / 1000, settings.loop_monitor_interval)
+
+    async def run(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        watcher = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        watcher.start()
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+                lag = max(time.monotonic() - self._beat - self.interval, 0.0)
+                EVENT_LOOP_LAG_SECONDS.observe(lag)
+                if lag >= self.threshold:
+                    self._record(lag)
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        poll = max(min(self.threshold / 2, self.interval), 0.005)
+        while not self._stop.wait(poll):
+            self.sample()
+
+    def sample(self) -> None:
+        """监视线程：心跳停滞超过阈值时采样事件循环线程，每次阻塞只采一次。"""
+        beat = self._beat
+        if time.monotonic() - beat - self.interval < self.threshold:
+            return
+        if self._pending is not None and self._pending[0] == beat:
+            return
+        frame = sys._current_frames().get(self._loop_thread)
+        site, where = call_site(frame)
+        with self._lock:
+            self._pending = (beat, site, where)
+
+    def _record(self, lag: float) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == self._beat:
+            _, site, where = pending
+        else:
+            site, where = "unknown", "not sampled"
+        EVENT_LOOP_BLOCKS.labels(site=site).inc()
+        EVENT_LOOP_BLOCK_SECONDS.labels(site=site).observe(lag)
+        logger.warning(f"[LOOP] Event loop blocked for {lag * 1000:.0f}ms in {where}")
+
+
+# ===== 测试严格模式 =====
+
+
+class BlockingCallError(RuntimeError):
+    """在事件循环线程上执行了阻塞调用。"""
+
+
+def _on_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _blocking_socket(sock: socket.socket, *args: Any, **kwargs: Any) -> bool:
+    # asyncio 自己的 socket 都是非阻塞的（timeout 为 0）
+    return sock.gettimeout() != 0
+
+
+SOCKET_METHODS = ("connect", "accept", "recv", "recv_into", "recvfrom", "send", "sendall", "sendto")
+
+
+@contextmanager
+def forbid_blocking_io() -> Iterator[list[str]]:
+    """在事件循环线程上禁止阻塞 IO，返回违规记录列表。
+
+    被业务代码的 except Exception 吞掉的错误同样会留下记录，调用方应在结束时检查列表为空。
+    """
+    violations: list[str] = []
+    patched: list[tuple[Any, str, Any, bool]] = []
+
+    def guard(owner: Any, name: str, is_blocking: Callable[..., bool]) -> None:
+        original = getattr(owner, name)
+
+        @wraps(original)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _on_loop_thread() and is_blocking(*args, **kwargs):
+                frame = sys._getframe(1)
+                message = f"{owner.__name__}.{name} on the event loop: {call_site(frame)[1]}"
+                violations.append(message)
+                raise BlockingCallError(message)
+            return original(*args, **kwargs)
+
+        patched.append((owner, name, original, name in vars(owner)))
+        setattr(owner, name, wrapper)
+
+    guard(time, "sleep", lambda seconds: seconds > 0)
+    guard(sqlite3, "connect", lambda *args, **kwargs: True)
+    for name in SOCKET_METHODS:
+        guard(socket.socket, name, _blocking_socket)
+    try:
+        yield violations
+    finally:
+        for owner, name, original, owned in reversed(patched):
+            if owned:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
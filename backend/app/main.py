@@ -1,18 +1,77 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from .config import settings
 from .db import init_db
-from .routers import admin, auth, divination_v2, horoscope, preload
+from .llm import get_router
+from .maintenance import maintenance_loop
+from .metrics import HTTP_REQUEST_SECONDS
+from .passwords import shutdown_hasher
+from .prefetch import get_prefetcher
+from .profiler import SlowRequestMiddleware, start_watchdog, stop_watchdog
+from .readiness import check_readiness, install_drain_handler, set_draining
+from .redis_client import get_redis
+from .routers import admin, auth, divination_v2, horoscope, metrics, preload, profiling
+from .seed_results import load_seed_results, save_seed_results
+from .semantic_cache import load_semantic_cache, save_semantic_cache
+from .session_cache import resolve_user_id
+from .storage import close_storage
+from .tracing import span
+from .usage import get_ledger, start_usage_scope, usage_flush_loop
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    set_draining(False)
+    install_drain_handler(settings.shutdown_ready_delay)
+    # 每个 worker 各自建立数据库连接池；已是最新 schema 时只读一次版本号
+    await init_db()
+    load_semantic_cache()
+    load_seed_results()
+    start_watchdog()
+    # Redis 连接（含导入 redis、连接超时）不阻塞启动，在后台线程里建立
+    background = [
+        asyncio.create_task(asyncio.to_thread(get_redis)),
+        asyncio.create_task(usage_flush_loop()),
+    ]
+    if settings.maintenance_enabled:
+        background.append(asyncio.create_task(maintenance_loop()))
+    if settings.loop_monitor_enabled:
+        from .loop_monitor import LoopMonitor
+
+        background.append(asyncio.create_task(LoopMonitor.from_settings().run()))
+    yield
+    set_draining(True)
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    stop_watchdog()
+    # 预取是投机性的，关闭时不等它们
+    get_prefetcher().cancel_all()
+    # 等进行中的 LLM 调用结束后再关闭路由层共享的连接池
+    await get_router().drain(settings.shutdown_drain_timeout)
+    await get_router().aclose()
+    await get_ledger().flush()
+    shutdown_hasher()
+    save_semantic_cache()
+    save_seed_results()
+    await close_storage()
 
 
 def create_app() -> FastAPI:
-    init_db()
-    app = FastAPI(title="AI Divination Backend", version="0.1.0")
+    app = FastAPI(title="AI Divination Backend", version="0.1.0", lifespan=lifespan)
+
+    # 最先注册即最内层：与路由处理函数同一个任务，看门狗才能抓到它的 await 链
+    app.add_middleware(SlowRequestMiddleware)
 
     # Allow multiple origins for CORS
     allowed_origins = [
@@ -30,17 +89,56 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.middleware("http")
+    async def authenticate(request: Request, call_next):
+        # 每个请求解析一次 session cookie，路由里通过 request.state.user_id 获取
+        with span("auth.resolve_session"):
+            request.state.user_id = await resolve_user_id(request.cookies.get("session"))
+        # 上游 token 用量和配额按登录用户、未登录时按客户端 IP 归属
+        start_usage_scope(request.state.user_id, request.client.host if request.client else None)
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def record_request_duration(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        with span("http.request", **{"http.method": request.method}) as root:
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                return response
+            finally:
+                # 使用路由模板而不是原始路径，避免 session_id 之类的参数撑爆标签基数
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                root.set_attributes({"http.route": route, "http.status_code": status})
+                HTTP_REQUEST_SECONDS.labels(
+                    method=request.method,
+                    route=route,
+                    status=str(status),
+                ).observe(time.perf_counter() - start)
+
+    # 最后注册即最外层：部署平台的代理后面 request.client 是代理地址，这里按可信代理
+    # 转发的 X-Forwarded-For 还原真实客户端 IP，哈希限流和用量归属都依赖它
+    app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=settings.forwarded_allow_ips)
+
     app.include_router(auth.router)
     app.include_router(horoscope.router)
     app.include_router(divination_v2.router)
     app.include_router(preload.router)
     app.include_router(admin.router)
+    app.include_router(profiling.router)
+    app.include_router(metrics.router)
 
     @app.get("/health")
     def health():
         # Simple health check - don't call Redis here to avoid startup delay
         return {"status": "ok"}
 
+    @app.get("/ready")
+    async def ready():
+        is_ready, report = await check_readiness()
+        return JSONResponse(report, status_code=200 if is_ready else 503)
+
     # 部署时：Docker 会把 Next.js 静态产物放到 app/static，挂载到 / 供前端访问
     static_dir = Path(__file__).resolve().parent / "static"
     if static_dir.exists():
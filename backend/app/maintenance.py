@@ -0,0 +1,217 @@
+"""
+数据库后台维护。
+
+- 分批删除过期的登录会话
+- 把卡住的 in_progress 会话标记为 failed（AI 模式可选择重置为 pending 供客户端重试）
+- 删除过期的 pending/failed 会话，把很久以前的 completed 会话归档到 gzip 压缩的 JSON Lines 冷存储
+- 增量 VACUUM + PRAGMA optimize
+
+每批都是独立的短事务，批与批之间暂停 MAINTENANCE_BATCH_PAUSE 秒，避免长时间持有写锁影响前台请求。
+具体的 SQL 由 storage 后端实现（SQLite / PostgreSQL）。
+随应用生命周期定时运行（多 worker 时通过 Redis 锁保证同一时间只有一个在跑），也可以手动执行：
+
+    python -m app.maintenance [--dry-run] [--full-vacuum]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .config import settings
+from .db import DATA_DIR, init_db
+from .metrics import MAINTENANCE_ROWS, MAINTENANCE_SECONDS, observe
+from .redis_client import get_redis
+from .storage import close_storage, get_storage
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = DATA_DIR / "archive"
+LOCK_KEY = "maintenance:lock"
+
+
+@dataclass
+class MaintenanceReport:
+    rows: dict[str, int] = field(default_factory=dict)
+
+    def add(self, task: str, count: int) -> None:
+        self.rows[task] = self.rows.get(task, 0) + count
+        MAINTENANCE_ROWS.labels(task=task).inc(count)
+
+
+async def _in_batches(
+    select: Callable[[int], Awaitable[list]],
+    apply: Callable[[list], Awaitable[int]],
+    *,
+    dry_run: bool,
+) -> int:
+    """反复取一批主键并处理，直到没有匹配的行。每批单独提交。"""
+    batch_size = settings.maintenance_batch_size
+    total = 0
+    while True:
+        keys = await select(batch_size)
+        if not keys:
+            return total
+        if dry_run:
+            # 只统计，不修改；dry-run 下无法翻页，最多统计一批
+            return total + len(keys)
+        total += await apply(keys)
+        if len(keys) < batch_size:
+            return total
+        await asyncio.sleep(settings.maintenance_batch_pause)
+
+
+async def purge_expired_sessions(now: datetime, dry_run: bool = False) -> int:
+    storage = get_storage()
+    return await _in_batches(
+        lambda limit: storage.expired_session_tokens(now.isoformat(), limit),
+        storage.delete_sessions,
+        dry_run=dry_run,
+    )
+
+
+async def expire_stuck_sessions(now: datetime, dry_run: bool = False) -> int:
+    """AI 模式生成中断、手动模式被放弃的 in_progress 会话。"""
+    storage = get_storage()
+    ai_cutoff = now - timedelta(minutes=settings.maintenance_stuck_after_minutes)
+    manual_cutoff = now - timedelta(hours=settings.maintenance_abandoned_after_hours)
+    # AI 模式的种子是确定的，重置为 pending 后客户端可以重新调用 /generate
+    ai_status = "pending" if settings.maintenance_retry_stuck else "failed"
+
+    total = 0
+    for mode, cutoff, status in (
+        ("ai", ai_cutoff, ai_status),
+        ("manual", manual_cutoff, "failed"),
+    ):
+        total += await _in_batches(
+            lambda limit, mode=mode, cutoff=cutoff: storage.stuck_session_ids(
+                mode, cutoff.isoformat(), limit
+            ),
+            lambda ids, status=status: storage.set_in_progress_status(ids, status),
+            dry_run=dry_run,
+        )
+    return total
+
+
+async def purge_unfinished_sessions(now: datetime, dry_run: bool = False) -> int:
+    storage = get_storage()
+    cutoff = now - timedelta(days=settings.maintenance_retention_days)
+    return await _in_batches(
+        lambda limit: storage.unfinished_session_ids(cutoff.isoformat(), limit),
+        storage.delete_divination_sessions,
+        dry_run=dry_run,
+    )
+
+
+def _write_archive(rows: list[dict], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def archive_completed_sessions(now: datetime, dry_run: bool = False) -> int:
+    if settings.maintenance_archive_after_days <= 0:
+        return 0
+    storage = get_storage()
+    cutoff = now - timedelta(days=settings.maintenance_archive_after_days)
+    path = ARCHIVE_DIR / f"sessions-{now:%Y%m%d-%H%M%S}.jsonl.gz"
+
+    async def archive(rows: list[dict]) -> int:
+        # 先写入并落盘归档文件，再删除数据库中的行；中途失败最多产生重复归档，不会丢数据
+        await asyncio.to_thread(_write_archive, rows, path)
+        return await storage.delete_divination_sessions([row["id"] for row in rows])
+
+    return await _in_batches(
+        lambda limit: storage.completed_sessions(cutoff.isoformat(), limit),
+        archive,
+        dry_run=dry_run,
+    )
+
+
+TASKS: dict[str, Callable[[datetime, bool], Awaitable[int]]] = {
+    "expired_tokens": purge_expired_sessions,
+    "stuck_sessions": expire_stuck_sessions,
+    "unfinished_sessions": purge_unfinished_sessions,
+    "archived_sessions": archive_completed_sessions,
+}
+
+
+async def run_maintenance(dry_run: bool = False, full_vacuum: bool = False) -> MaintenanceReport:
+    report = MaintenanceReport()
+    now = datetime.utcnow()
+    for task, func in TASKS.items():
+        with span(f"maintenance.{task}"), observe(MAINTENANCE_SECONDS, task=task):
+            try:
+                report.add(task, await func(now, dry_run))
+            except Exception as e:
+                logger.error(f"[MAINTENANCE] {task} failed: {e}")
+    if not dry_run:
+        with span("maintenance.compact"), observe(MAINTENANCE_SECONDS, task="compact"):
+            try:
+                free_pages = await get_storage().compact(full_vacuum)
+                if free_pages is not None:
+                    report.rows["free_pages"] = free_pages
+            except Exception as e:
+                logger.error(f"[MAINTENANCE] compact failed: {e}")
+    logger.info(f"[MAINTENANCE] Done: {report.rows}")
+    return report
+
+
+def _acquire_lock() -> bool:
+    """多 worker 时只让一个进程执行；没有 Redis 时依赖 SQLite 自身的写锁。"""
+    client = get_redis()
+    if client is None:
+        return True
+    try:
+        ttl = max(60, int(settings.maintenance_interval))
+        return bool(client.set(LOCK_KEY, os.getpid(), nx=True, ex=ttl))
+    except Exception:
+        return True
+
+
+async def maintenance_loop() -> None:
+    """应用生命周期内的定时任务；首次执行前先等待一个启动延迟。"""
+    await asyncio.sleep(settings.maintenance_initial_delay)
+    while True:
+        if await asyncio.to_thread(_acquire_lock):
+            try:
+                await run_maintenance()
+            except Exception as e:
+                logger.error(f"[MAINTENANCE] Run failed: {e}")
+        await asyncio.sleep(settings.maintenance_interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run database maintenance once.")
+    parser.add_argument("--dry-run", action="store_true", help="only count matching rows")
+    parser.add_argument(
+        "--full-vacuum",
+        action="store_true",
+        help="switch to incremental auto_vacuum with a full VACUUM (locks the database)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run() -> MaintenanceReport:
+        try:
+            await init_db()
+            return await run_maintenance(dry_run=args.dry_run, full_vacuum=args.full_vacuum)
+        finally:
+            await close_storage()
+
+    report = asyncio.run(run())
+    print(json.dumps(report.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Prometheus 指标定义与埋点工具。
+
+多 worker 部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（每次启动前清空），
+各进程把样本写入该目录下的 mmap 文件，/metrics 通过 MultiProcessCollector 汇总。
+"""
+
+import functools
+import inspect
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# ===== Buckets =====
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 45, 60, 90)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+REDIS_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 2)
+LOOP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# ===== HTTP =====
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration by route template",
+    ["method", "route", "status"],
+    buckets=HTTP_BUCKETS,
+)
+
+SLOW_REQUESTS = Counter(
+    "slow_requests_total",
+    "Requests that exceeded SLOW_REQUEST_THRESHOLD and had their stacks dumped",
+    ["route"],
+)
+
+# ===== Event loop =====
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the loop monitor heartbeat was scheduled",
+    buckets=LOOP_BUCKETS,
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "event_loop_blocks_total",
+    "Times the event loop was blocked past LOOP_BLOCK_THRESHOLD_MS, by app call site",
+    ["site"],
+)
+EVENT_LOOP_BLOCK_SECONDS = Histogram(
+    "event_loop_block_seconds",
+    "Duration of event loop blocks, by app call site",
+    ["site"],
+    buckets=LOOP_BUCKETS,
+)
+
+# ===== LLM =====
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds",
+    "Upstream chat-completions latency per attempt",
+    ["caller", "upstream", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_ROUTED_SECONDS = Histogram(
+    "llm_routed_duration_seconds",
+    "End-to-end LLM latency including hedging and failover",
+    ["caller", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Hedged second requests sent", ["caller"])
+LLM_FAILOVERS = Counter("llm_failovers_total", "Failovers to the next upstream", ["caller"])
+LLM_SHORT_CIRCUITS = Counter(
+    "llm_short_circuits_total",
+    "Calls rejected because every upstream circuit breaker was open",
+    ["caller"],
+)
+LLM_BREAKER_OPENS = Counter(
+    "llm_circuit_breaker_opened_total", "Circuit breaker transitions to open", ["upstream"]
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "llm_limiter_queue_seconds",
+    "Time spent waiting for an upstream concurrency slot",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+LLM_SHED = Counter(
+    "llm_limiter_shed_total", "Calls rejected by admission control", ["priority"]
+)
+LLM_INFLIGHT = Gauge(
+    "llm_limiter_in_flight", "Upstream LLM calls in flight", multiprocess_mode="livesum"
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "llm_limiter_limit", "Current adaptive concurrency limit", multiprocess_mode="livesum"
+)
+LLM_TOKENS = Histogram(
+    "llm_tokens",
+    "Tokens reported in the upstream usage block",
+    ["caller", "kind"],
+    buckets=TOKEN_BUCKETS,
+)
+LLM_RESPONSE_DECODES = Counter(
+    "llm_response_decodes_total",
+    "Interpretation responses by decode outcome "
+    "(ok/coerced/repaired/repair_failed/invalid)",
+    ["caller", "outcome"],
+)
+LLM_USAGE_TOKENS = Counter(
+    "llm_usage_tokens_total",
+    "Upstream tokens billed, by divination method/lang (empty for non-session calls)",
+    ["method", "lang", "kind"],
+)
+LLM_QUOTA_REJECTIONS = Counter(
+    "llm_quota_rejections_total",
+    "LLM calls refused by token budgets, by exhausted scope (subject/global)",
+    ["scope", "caller"],
+)
+PROMPT_TOKENS = Histogram(
+    "prompt_tokens_estimated",
+    "Estimated prompt size per interpretation request",
+    ["method", "lang", "part"],
+    buckets=TOKEN_BUCKETS,
+)
+PROMPT_TRIMS = Counter(
+    "prompt_trimmed_sections_total",
+    "Prompt sections trimmed to fit the input token budget",
+    ["method", "section"],
+)
+
+# ===== Storage =====
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "SQLite latency per persistence function",
+    ["function"],
+    buckets=DB_BUCKETS,
+)
+REDIS_OP_SECONDS = Histogram(
+    "redis_op_duration_seconds",
+    "Redis command latency",
+    ["op"],
+    buckets=REDIS_BUCKETS,
+)
+AUTH_LOOKUP_SECONDS = Histogram(
+    "auth_session_lookup_seconds",
+    "Session cookie resolution latency, by source (cache/db)",
+    ["source"],
+    buckets=DB_BUCKETS,
+)
+MAINTENANCE_ROWS = Counter(
+    "maintenance_rows_total",
+    "Rows deleted, expired or archived by background maintenance",
+    ["task"],
+)
+MAINTENANCE_SECONDS = Histogram(
+    "maintenance_task_duration_seconds",
+    "Duration of each background maintenance task",
+    ["task"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 60, 300),
+)
+
+# ===== Password hashing =====
+HASH_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2, 5)
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    "password_hash_queue_seconds",
+    "Time a bcrypt job waited for a hashing worker",
+    ["op"],
+    buckets=HASH_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash/verify CPU time on the hashing pool",
+    ["op"],
+    buckets=HASH_BUCKETS,
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password operations rejected by the per-IP/per-account cap",
+    ["op"],
+)
+
+# ===== Cache / fallback =====
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    ["cache", "result"],
+)
+INTERPRETATIONS = Counter(
+    "interpretations_total",
+    "Interpretations produced, by source (llm/prefetch/semantic_cache/pregenerated/fallback)",
+    ["method", "lang", "source"],
+)
+PREFETCHES = Counter(
+    "prefetch_total",
+    "Manual-mode speculative interpretations, by outcome "
+    "(started/cancelled/hit/miss/failed/skipped)",
+    ["method", "outcome"],
+)
+DEDUPLICATED_REQUESTS = Counter(
+    "deduplicated_requests_total",
+    "Duplicate generate/interpret calls that shared another call's result, "
+    "by how (inflight: same process, stored: first writer in the database)",
+    ["endpoint", "via"],
+)
+METHOD_SELECTIONS = Counter(
+    "method_selections_total",
+    "Divination method choices, by source (classifier/llm/fallback)",
+    ["source"],
+)
+
+
+def is_multiprocess() -> bool:
+    """是否启用了多进程采集目录。"""
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_latest() -> tuple[bytes, str]:
+    """生成 /metrics 响应体和 Content-Type。"""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """worker 退出时清理其 live gauge 文件（供进程管理器调用）。"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """记录代码块耗时。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def timed(histogram: Histogram, **labels: str) -> Callable[[F], F]:
+    """函数耗时装饰器，同时支持同步和异步函数。"""
+
+    def decorator(func: F) -> F:
+        child = histogram.labels(**labels)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def db_timed(func: F) -> F:
+    """按函数名记录 SQLite 耗时。"""
+    return timed(DB_QUERY_SECONDS, function=func.__name__)(func)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_llm_call(
+    caller: str,
+    outcome: str,
+    seconds: float,
+    data: dict | None = None,
+    upstream: str = "primary",
+) -> None:
+    """记录一次 LLM 调用的耗时以及 usage 中的 token 数。"""
+    LLM_REQUEST_SECONDS.labels(caller=caller, upstream=upstream, outcome=outcome).observe(seconds)
+    usage = (data or {}).get("usage") or {}
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind)
+        if isinstance(value, int | float):
+            LLM_TOKENS.labels(caller=caller, kind=kind.removesuffix("_tokens")).observe(value)
@@ -249,3 +249,10 @@ class SessionDetailResponse(BaseModel):
     """会话详情响应"""
 
     session: DivinationSession
+
+
+class SessionHistoryResponse(BaseModel):
+    """历史记录分页响应"""
+
+    records: list[dict[str, Any]]
+    next_cursor: str | None = Field(None, description="下一页游标，没有更多记录时为空")
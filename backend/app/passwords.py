@@ -0,0 +1,110 @@
+"""
+密码哈希服务。
+
+bcrypt 每次计算需要 100~300ms CPU，如果直接在 FastAPI 的共享线程池里执行，
+一波登录请求就会占满线程池，拖慢所有同步路由。这里用独立的线程池（bcrypt 计算时会释放 GIL，
+线程数默认等于 CPU 核数）执行哈希，并按 IP / 账号限制同时进行的计算数，防止恶意刷哈希。
+"""
+
+import asyncio
+import functools
+import os
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from .config import settings
+from .metrics import PASSWORD_HASH_QUEUE_SECONDS, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+T = TypeVar("T")
+
+
+@functools.cache
+def get_pwd_context():
+    """passlib/bcrypt 只有注册、登录时才用到，首次使用时再导入，缩短启动时间。"""
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds
+    )
+
+
+class HashRateLimitedError(RuntimeError):
+    """同一 IP 或账号同时进行的哈希计算过多。"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, per_key_limit: int) -> None:
+        self.workers = workers
+        self.per_key_limit = per_key_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # 只在事件循环线程中修改，不需要加锁
+        self._in_flight: dict[str, int] = {}
+
+    @contextmanager
+    def _admit(self, keys: tuple[str, ...], op: str) -> Iterator[None]:
+        if any(self._in_flight.get(key, 0) >= self.per_key_limit for key in keys):
+            PASSWORD_HASH_REJECTED.labels(op=op).inc()
+            raise HashRateLimitedError("Too many concurrent password operations")
+        for key in keys:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            for key in keys:
+                remaining = self._in_flight[key] - 1
+                if remaining:
+                    self._in_flight[key] = remaining
+                else:
+                    del self._in_flight[key]
+
+    async def _run(self, op: str, func: Callable[..., T], *args: Any) -> T:
+        submitted = time.perf_counter()
+
+        def job() -> T:
+            started = time.perf_counter()
+            PASSWORD_HASH_QUEUE_SECONDS.labels(op=op).observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                PASSWORD_HASH_SECONDS.labels(op=op).observe(time.perf_counter() - started)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+
+    async def hash(self, password: str, keys: tuple[str, ...] = ()) -> str:
+        with self._admit(keys, "hash"):
+            return await self._run("hash", get_pwd_context().hash, password)
+
+    async def verify(
+        self, password: str, password_hash: str, keys: tuple[str, ...] = ()
+    ) -> tuple[bool, str | None]:
+        """校验密码；如果旧哈希的参数已过时，同时返回按当前参数重新计算的哈希。"""
+        with self._admit(keys, "verify"):
+            return await self._run(
+                "verify", get_pwd_context().verify_and_update, password, password_hash
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher: PasswordHasher | None = None
+
+
+def get_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            workers=settings.password_hash_workers or os.cpu_count() or 1,
+            per_key_limit=settings.password_hash_per_key_limit,
+        )
+    return _hasher
+
+
+def shutdown_hasher() -> None:
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
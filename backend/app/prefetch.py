@@ -0,0 +1,231 @@
+"""
+手动模式的预取解读。
+
+手动模式下 /interpret 要等最后一步提交之后才调用 LLM。倒数第二步提交时剩余的可能结果
+已经很少：六爻第 6 爻只有 6/7/8/9 四种，塔罗第 3 张为剩余 20 张牌 × 正逆位。
+倒数第二步提交后为每个候选结果在后台（Priority.BACKGROUND，过载时最先被拒绝）生成解读；
+最后一步到达后只保留命中的那个，其余立即取消，/interpret 直接等待（通常已完成的）结果。
+
+- 候选数超过 PREFETCH_MAX_CANDIDATES 时不预取（默认 4：只覆盖六爻，塔罗需要 40）
+- 全进程同时在途的预取任务不超过 PREFETCH_MAX_INFLIGHT，超出时跳过
+- 超过 PREFETCH_TTL 秒仍未被领取的预取（用户中途离开）在下一次预取时清理
+- 登记表只在本进程内；多 worker 下最后一步或 /interpret 落到其他 worker 时照常实时生成
+- 预取的用量记在 system 名下（仍带 session_id / method / lang），不占用户的配额：
+  每次最多只有一个候选被领取，其余都是投机消耗
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from .config import settings
+from .interpretation import _call_llm, _complete_interpretation, _is_usable
+from .interpretation_pool import _COINS_BY_SUM, outcome_key
+from .limiter import Priority
+from .liuyao import calculate_toss, generate_liuyao_result
+from .metrics import PREFETCHES
+from .models.divination_v2 import CoinToss, DivinationInterpretation
+from .prompts import compile_prompt
+from .tarot_v2 import MAJOR_ARCANA_DATA, create_manual_draw, generate_tarot_result
+from .usage import SYSTEM_SUBJECT, bind_usage
+
+logger = logging.getLogger(__name__)
+
+
+def manual_result(method: str, steps: list[dict[str, Any]]) -> dict[str, Any]:
+    """由手动模式的全部步骤生成占卜结果。"""
+    if method == "liuyao":
+        tosses = [CoinToss(**step["data"]) for step in steps]
+        return generate_liuyao_result(tosses).model_dump()
+    draws = [
+        create_manual_draw(
+            card_id=step["data"]["card_id"],
+            position_index=i,
+            is_upright=step["data"]["is_upright"],
+        )
+        for i, step in enumerate(steps)
+    ]
+    return generate_tarot_result(draws).model_dump()
+
+
+def candidate_steps(method: str, steps: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """倒数第二步之后，最后一步所有可能的取值。"""
+    step_number = len(steps) + 1
+    if method == "liuyao":
+        return [
+            {
+                "step_number": step_number,
+                "action": "coin_toss",
+                "data": calculate_toss(coins).model_dump(),
+            }
+            for coins in _COINS_BY_SUM.values()
+        ]
+    drawn = {step["data"]["card_id"] for step in steps}
+    return [
+        {
+            "step_number": step_number,
+            "action": "card_draw",
+            "data": {"card_id": card["id"], "is_upright": is_upright},
+        }
+        for card in MAJOR_ARCANA_DATA
+        if card["id"] not in drawn
+        for is_upright in (True, False)
+    ]
+
+
+async def speculate(
+    question: str, method: str, result: dict[str, Any], lang: str
+) -> DivinationInterpretation | None:
+    """为一个候选结果生成解读；失败（包括被限流拒绝）时返回 None，由 /interpret 实时生成。"""
+    # 任务复制了请求的上下文，这里改归属只影响本任务
+    bind_usage(subject=SYSTEM_SUBJECT)
+    prompt = compile_prompt(method, question, "manual", result, lang)
+    try:
+        content = await _call_llm(
+            prompt.system,
+            prompt.user,
+            temperature=0.5,
+            validate=_is_usable,
+            caller="prefetch",
+            priority=Priority.BACKGROUND,
+        )
+    except Exception as e:
+        logger.info(f"[PREFETCH] Speculative interpretation failed: {e}")
+        return None
+    return await _complete_interpretation(
+        content, caller="prefetch", priority=Priority.BACKGROUND
+    )
+
+
+@dataclass
+class _Entry:
+    method: str
+    tasks: dict[str, asyncio.Task]
+    created: float = field(default_factory=time.monotonic)
+
+
+class Prefetcher:
+    """按会话登记预取任务：start() 启动候选，resolve() 取消落选者，claim() 取走命中者。"""
+
+    def __init__(self, max_candidates: int, max_inflight: int, ttl: float) -> None:
+        self.max_candidates = max_candidates
+        self.max_inflight = max_inflight
+        self.ttl = ttl
+        self._entries: dict[str, _Entry] = {}
+
+    @classmethod
+    def from_settings(cls) -> "Prefetcher":
+        return cls(
+            max_candidates=settings.prefetch_max_candidates,
+            max_inflight=settings.prefetch_max_inflight,
+            ttl=settings.prefetch_ttl,
+        )
+
+    def inflight(self) -> int:
+        return sum(
+            not task.done() for entry in self._entries.values() for task in entry.tasks.values()
+        )
+
+    def pending(self, session_id: str) -> list[str]:
+        entry = self._entries.get(session_id)
+        return sorted(entry.tasks) if entry else []
+
+    def start(
+        self,
+        session_id: str,
+        question: str,
+        method: str,
+        steps: list[dict[str, Any]],
+        lang: str,
+    ) -> int:
+        """倒数第二步提交后调用，返回启动的预取任务数。"""
+        self._sweep()
+        if session_id in self._entries:
+            return 0
+        candidates = candidate_steps(method, steps)
+        if len(candidates) > self.max_candidates:
+            PREFETCHES.labels(method=method, outcome="skipped").inc()
+            return 0
+        if self.inflight() + len(candidates) > self.max_inflight:
+            PREFETCHES.labels(method=method, outcome="skipped").inc()
+            logger.info(f"[PREFETCH] In-flight budget exhausted, skipping {session_id}")
+            return 0
+
+        tasks: dict[str, asyncio.Task] = {}
+        for step in candidates:
+            result = manual_result(method, [*steps, step])
+            key = outcome_key(method, result)
+            if key is None or key in tasks:
+                continue
+            tasks[key] = asyncio.create_task(speculate(question, method, result, lang))
+        self._entries[session_id] = _Entry(method=method, tasks=tasks)
+        PREFETCHES.labels(method=method, outcome="started").inc(len(tasks))
+        logger.info(f"[PREFETCH] Started {len(tasks)} candidates for {session_id}")
+        return len(tasks)
+
+    def resolve(self, session_id: str, key: str | None) -> None:
+        """最后一步到达：取消所有不等于 key 的候选。"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        for other in [k for k in entry.tasks if k != key]:
+            self._cancel(entry.method, entry.tasks.pop(other))
+
+    def claim(self, session_id: str, key: str | None) -> asyncio.Task | None:
+        """取走与最终结果一致的预取任务；没有预取过返回 None。"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        self.resolve(session_id, key)
+        del self._entries[session_id]
+        task = entry.tasks.get(key) if key is not None else None
+        PREFETCHES.labels(method=entry.method, outcome="hit" if task else "miss").inc()
+        return task
+
+    def cancel_all(self) -> None:
+        for entry in self._entries.values():
+            for task in entry.tasks.values():
+                self._cancel(entry.method, task)
+        self._entries.clear()
+
+    def _cancel(self, method: str, task: asyncio.Task) -> None:
+        if not task.done():
+            task.cancel()
+            PREFETCHES.labels(method=method, outcome="cancelled").inc()
+
+    def _sweep(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [s for s, e in self._entries.items() if e.created < cutoff]:
+            entry = self._entries.pop(session_id)
+            for task in entry.tasks.values():
+                self._cancel(entry.method, task)
+
+
+_prefetcher: Prefetcher | None = None
+
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher.from_settings()
+    return _prefetcher
+
+
+def set_prefetcher(prefetcher: Prefetcher | None) -> None:
+    global _prefetcher
+    _prefetcher = prefetcher
+
+
+async def take_prefetched(
+    session_id: str, method: str, result: dict[str, Any]
+) -> DivinationInterpretation | None:
+    """/interpret 调用：等待命中的预取任务；未命中或预取失败返回 None。"""
+    task = get_prefetcher().claim(session_id, outcome_key(method, result))
+    if task is None:
+        return None
+    interpretation = await task
+    if interpretation is None:
+        PREFETCHES.labels(method=method, outcome="failed").inc()
+    return interpretation
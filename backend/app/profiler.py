@@ -0,0 +1,371 @@
+"""
+进程内采样分析器与慢请求看门狗。
+
+线上延迟回退时没法给 uvicorn worker 挂外部 profiler，这里提供两种手段：
+
+- profile()：后台线程每隔 interval 读取 sys._current_frames() 采样线程调用栈，
+  同时在事件循环里定期记录所有 asyncio 任务挂起在哪一层 await，以及事件循环延迟
+  （sleep 的实际超时量）。结果可以导出为 collapsed stacks（flamegraph.pl / speedscope 均可读取）
+  或 speedscope JSON
+- SlowRequestWatchdog：看门狗线程检查进行中的请求，超过 SLOW_REQUEST_THRESHOLD 秒
+  仍未完成时，抓取事件循环线程当前的调用栈（循环被阻塞时就是罪魁）和该请求任务的 await 链，
+  写日志并保留最近 SLOW_REQUEST_DUMPS 条
+
+采样只读取帧对象，不安装 trace/profile 钩子，未采样时没有任何开销。
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import CoroutineType, FrameType, GeneratorType
+from typing import Any
+
+from .config import settings
+from .metrics import SLOW_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# (函数限定名, 文件, 首行号)
+FrameKey = tuple[str, str, int]
+Stack = tuple[FrameKey, ...]
+
+# 事件循环侧的任务采样/延迟测量间隔
+LOOP_SAMPLE_INTERVAL = 0.05
+
+
+def short_path(path: str) -> str:
+    parts = path.replace(os.sep, "/").split("/")
+    for marker in ("site-packages", "app", "lib"):
+        if marker in parts:
+            index = len(parts) - 1 - parts[::-1].index(marker)
+            return "/".join(parts[index:] if marker == "app" else parts[index + 1 :])
+    return "/".join(parts[-2:])
+
+
+def _frame_key(frame: FrameType) -> FrameKey:
+    code = frame.f_code
+    return (code.co_qualname, short_path(code.co_filename), code.co_firstlineno)
+
+
+def frame_stack(frame: FrameType | None) -> Stack:
+    """线程当前帧 -> 调用栈（根在前）。"""
+    keys = []
+    while frame is not None:
+        keys.append(_frame_key(frame))
+        frame = frame.f_back
+    return tuple(reversed(keys))
+
+
+def coroutine_stack(coro: Any) -> Stack:
+    """沿 cr_await 链展开一个挂起的协程（Task.get_stack 只返回最外层一帧）。"""
+    keys = []
+    while coro is not None:
+        if isinstance(coro, CoroutineType):
+            frame, coro = coro.cr_frame, coro.cr_await
+        elif isinstance(coro, GeneratorType):
+            frame, coro = coro.gi_frame, coro.gi_yieldfrom
+        else:
+            # Future 或其他可等待对象：到此为止
+            keys.append((type(coro).__qualname__, "<awaitable>", 0))
+            break
+        if frame is None:
+            break
+        keys.append(_frame_key(frame))
+    return tuple(keys)
+
+
+def format_frame(key: FrameKey) -> str:
+    name, path, line = key
+    return f"{name} ({path}:{line})"
+
+
+# ===== 采样分析 =====
+
+
+@dataclass
+class Profile:
+    interval: float
+    duration: float = 0.0
+    samples: int = 0
+    stacks: Counter[Stack] = field(default_factory=Counter)
+    task_stacks: Counter[Stack] = field(default_factory=Counter)
+    loop_lag: list[float] = field(default_factory=list)
+
+    def collapsed(self, tasks: bool = False) -> str:
+        """Brendan Gregg 的 collapsed 格式：每行 "a;b;c 次数"。"""
+        stacks = self.task_stacks if tasks else self.stacks
+        lines = [
+            f"{';'.join(format_frame(key) for key in stack)} {count}"
+            for stack, count in stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict[str, Any]:
+        frames: list[dict[str, Any]] = []
+        index: dict[FrameKey, int] = {}
+
+        def frame_ids(stack: Stack) -> list[int]:
+            ids = []
+            for key in stack:
+                if key not in index:
+                    index[key] = len(frames)
+                    name, path, line = key
+                    frames.append({"name": name, "file": path, "line": line})
+                ids.append(index[key])
+            return ids
+
+        def sampled(name: str, stacks: Counter[Stack], weight: float) -> dict[str, Any]:
+            items = stacks.most_common()
+            return {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(count for _, count in items) * weight, 3),
+                "samples": [frame_ids(stack) for stack, _ in items],
+                "weights": [round(count * weight, 3) for _, count in items],
+            }
+
+        profiles = [sampled("threads", self.stacks, self.interval * 1000)]
+        if self.task_stacks:
+            profiles.append(
+                sampled("asyncio tasks", self.task_stacks, LOOP_SAMPLE_INTERVAL * 1000)
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"ai-divination {datetime.utcnow().isoformat(timespec='seconds')}",
+            "exporter": "ai-divination profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self, top: int = 20) -> dict[str, Any]:
+        lag = sorted(self.loop_lag)
+        leaf = Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                leaf[format_frame(stack[-1])] += count
+        return {
+            "duration": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "loop_lag_ms": {
+                "mean": round(statistics.fmean(lag) * 1000, 3) if lag else 0.0,
+                "p99": round(lag[int(len(lag) * 0.99) - 1] * 1000, 3) if lag else 0.0,
+                "max": round(lag[-1] * 1000, 3) if lag else 0.0,
+            },
+            "top_functions": [
+                {"frame": frame, "samples": count} for frame, count in leaf.most_common(top)
+            ],
+            "top_stacks": [
+                {"stack": [format_frame(key) for key in stack], "samples": count}
+                for stack, count in self.stacks.most_common(top)
+            ],
+            "task_stacks": [
+                {"stack": [format_frame(key) for key in stack], "samples": count}
+                for stack, count in self.task_stacks.most_common(top)
+            ],
+        }
+
+
+class ProfilerBusyError(Exception):
+    """同一进程同时只允许一个采样任务。"""
+
+
+_profiling = threading.Lock()
+
+
+def _sample_threads(
+    profile: Profile, thread_ids: set[int] | None, stop: threading.Event
+) -> None:
+    own = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    while not stop.wait(profile.interval):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            root = (f"thread:{names.get(thread_id, thread_id)}", "", 0)
+            profile.stacks[(root, *frame_stack(frame))] += 1
+        profile.samples += 1
+
+
+async def profile(seconds: float, interval: float = 0.01, threads: str = "loop") -> Profile:
+    """采样 seconds 秒。threads="loop" 只采事件循环线程，"all" 采所有线程（含线程池）。"""
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        result = Profile(interval=interval)
+        loop = asyncio.get_running_loop()
+        current = asyncio.current_task()
+        thread_ids = {threading.get_ident()} if threads == "loop" else None
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=_sample_threads, args=(result, thread_ids, stop), name="profiler", daemon=True
+        )
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            deadline = loop.time() + seconds
+            while loop.time() < deadline:
+                before = loop.time()
+                await asyncio.sleep(LOOP_SAMPLE_INTERVAL)
+                result.loop_lag.append(max(loop.time() - before - LOOP_SAMPLE_INTERVAL, 0.0))
+                for task in asyncio.all_tasks(loop):
+                    if task is not current:
+                        result.task_stacks[coroutine_stack(task.get_coro())] += 1
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+        result.duration = time.perf_counter() - start
+        return result
+    finally:
+        _profiling.release()
+
+
+# ===== 慢请求看门狗 =====
+
+
+@dataclass
+class _InFlight:
+    method: str
+    path: str
+    started: float
+    thread_id: int
+    task: asyncio.Task | None
+    scope: dict
+    dumped: bool = False
+
+
+class SlowRequestWatchdog:
+    def __init__(self, threshold: float, keep: int) -> None:
+        self.threshold = threshold
+        self.dumps: deque[dict[str, Any]] = deque(maxlen=keep)
+        self._inflight: dict[int, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._ids = iter(range(sys.maxsize))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="slow-request-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def begin(self, scope: dict) -> int:
+        entry = _InFlight(
+            method=scope.get("method", ""),
+            path=scope.get("path", ""),
+            started=time.monotonic(),
+            thread_id=threading.get_ident(),
+            task=asyncio.current_task(),
+            scope=scope,
+        )
+        with self._lock:
+            request_id = next(self._ids)
+            self._inflight[request_id] = entry
+        return request_id
+
+    def end(self, request_id: int) -> None:
+        with self._lock:
+            self._inflight.pop(request_id, None)
+
+    def _run(self) -> None:
+        interval = max(min(self.threshold / 4, 1.0), 0.05)
+        while not self._stop.wait(interval):
+            self.check()
+
+    def check(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                entry
+                for entry in self._inflight.values()
+                if not entry.dumped and now - entry.started >= self.threshold
+            ]
+            for entry in due:
+                entry.dumped = True
+        for entry in due:
+            self._dump(entry, now)
+
+    def _dump(self, entry: _InFlight, now: float) -> None:
+        frame = sys._current_frames().get(entry.thread_id)
+        # 只读遍历帧对象；与事件循环线程并发时偶尔可能取到不完整的栈，足够定位问题
+        try:
+            task_stack = coroutine_stack(entry.task.get_coro()) if entry.task else ()
+        except Exception:
+            task_stack = ()
+        route = getattr(entry.scope.get("route"), "path", entry.path)
+        dump = {
+            "at": datetime.utcnow().isoformat(),
+            "method": entry.method,
+            "path": entry.path,
+            "route": route,
+            "elapsed_ms": round((now - entry.started) * 1000, 1),
+            "loop_thread_stack": [format_frame(key) for key in frame_stack(frame)],
+            "task_stack": [format_frame(key) for key in task_stack],
+        }
+        self.dumps.append(dump)
+        SLOW_REQUESTS.labels(route=route).inc()
+        logger.warning(
+            f"[PROFILE] Slow request {entry.method} {entry.path} "
+            f"({dump['elapsed_ms']}ms): await chain "
+            f"{' -> '.join(dump['task_stack'][-4:]) or '?'}; "
+            f"loop thread in {dump['loop_thread_stack'][-1] if frame else '?'}"
+        )
+
+
+class SlowRequestMiddleware:
+    """纯 ASGI 中间件，必须是最内层：与路由处理函数运行在同一个任务里，才能抓到它的 await 链。"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        watchdog = _watchdog
+        if scope["type"] != "http" or watchdog is None:
+            await self.app(scope, receive, send)
+            return
+        request_id = watchdog.begin(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            watchdog.end(request_id)
+
+
+_watchdog: SlowRequestWatchdog | None = None
+
+
+def get_watchdog() -> SlowRequestWatchdog | None:
+    return _watchdog
+
+
+def start_watchdog() -> None:
+    global _watchdog
+    if settings.slow_request_threshold <= 0:
+        return
+    if _watchdog is None:
+        _watchdog = SlowRequestWatchdog(
+            settings.slow_request_threshold, settings.slow_request_dumps
+        )
+    _watchdog.start()
+
+
+def stop_watchdog() -> None:
+    if _watchdog is not None:
+        _watchdog.stop()
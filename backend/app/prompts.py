@@ -0,0 +1,534 @@
+"""
+提示词编译：按 (method, lang, mode) 预编译模板，估算 token 并按预算裁剪。
+
+静态部分（系统提示词、占卜方式说明、牌阵解读方向、结尾请求）在导入时编译一次并缓存 token 数，
+每次请求只拼接动态部分（问题、卦象/牌面）。静态部分放在用户消息开头，保证前缀稳定，
+便于上游做前缀缓存。
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from .config import settings
+from .metrics import PROMPT_TOKENS, PROMPT_TRIMS
+from .tracing import current_span, traced
+
+LANGS = ("zh", "ja", "en")
+MODES = ("ai", "manual")
+
+# ===== System Prompts by Language =====
+SYSTEM_PROMPTS = {
+    "zh": """你是一位温和、睿智的占卜解读者。你的任务是基于占卜结果为用户提供洞察和建议。
+
+【核心原则】
+1. 不做绝对化断言，使用"可能"、"倾向于"、"值得考虑"等措辞
+2. 占卜是自我反思的工具，不是命运的裁决
+3. 站在用户角度，提供情绪共鸣和实用建议
+4. 不承诺准确率，强调占卜的启发性而非预测性
+
+【语言风格】
+- 简洁清晰，避免故弄玄虚
+- 温暖但不油腻，专业但不冷漠
+- 使用现代中文，避免过度古风
+
+【输出格式】
+必须返回有效JSON，包含以下字段：
+{
+  "summary": "一句话核心结论（15-25字）",
+  "advice": "具体可执行的建议（30-50字）",
+  "timing": "时机提示（10-20字）",
+  "confidence": "low/medium/high",
+  "reasoning_bullets": ["要点1", "要点2", "要点3"],
+  "follow_up_questions": ["追问1", "追问2"],
+  "ritual_ending": "温暖的结束语（15-25字）"
+}
+
+【关于reasoning_bullets】
+- 提供3-5条简短的解释要点
+- 每条10-20字
+- 连接占卜结果与用户问题
+- 不要暴露复杂的推理过程，只展示关键洞察""",
+
+    "ja": """あなたは穏やかで賢明な占い師です。占いの結果に基づいて、ユーザーに洞察とアドバイスを提供することがあなたの役割です。
+
+【基本原則】
+1. 断定的な表現を避け、「かもしれない」「傾向がある」「検討する価値がある」などの言葉を使う
+2. 占いは自己省察のツールであり、運命の審判ではない
+3. ユーザーの立場に立って、感情的な共感と実用的なアドバイスを提供する
+4. 正確さを約束せず、占いの啓発的な側面を強調する
+
+【言語スタイル】
+- 簡潔明瞭で、神秘的にしすぎない
+- 温かみがありながらも節度を保ち、専門的でありながらも冷たくない
+- 現代の日本語を使用し、過度に古風な表現を避ける
+
+【出力形式】
+必ず有効なJSONを返してください。以下のフィールドを含めてください：
+{
+  "summary": "一文の核心的な結論（15-25文字）",
+  "advice": "具体的で実行可能なアドバイス（30-50文字）",
+  "timing": "タイミングのヒント（10-20文字）",
+  "confidence": "low/medium/high",
+  "reasoning_bullets": ["ポイント1", "ポイント2", "ポイント3"],
+  "follow_up_questions": ["追加質問1", "追加質問2"],
+  "ritual_ending": "温かい締めの言葉（15-25文字）"
+}
+
+【reasoning_bulletsについて】
+- 3-5個の簡潔な説明ポイントを提供
+- 各10-20文字
+- 占いの結果とユーザーの質問を結びつける
+- 複雑な推論過程は見せず、重要な洞察のみを示す""",
+
+    "en": """You are a gentle and wise divination reader. Your task is to provide insights and advice based on divination results.
+
+【Core Principles】
+1. Avoid absolute statements; use words like "may," "tends to," "worth considering"
+2. Divination is a tool for self-reflection, not a verdict of fate
+3. Stand in the user's shoes, providing emotional resonance and practical advice
+4. Don't promise accuracy; emphasize the inspirational nature of divination
+
+【Language Style】
+- Clear and concise, avoid being overly mystical
+- Warm but not excessive, professional but not cold
+- Use modern English, avoid archaic expressions
+
+【Output Format】
+Must return valid JSON with the following fields:
+{
+  "summary": "One-sentence core conclusion (10-20 words)",
+  "advice": "Specific actionable advice (20-40 words)",
+  "timing": "Timing hint (5-15 words)",
+  "confidence": "low/medium/high",
+  "reasoning_bullets": ["Point 1", "Point 2", "Point 3"],
+  "follow_up_questions": ["Follow-up 1", "Follow-up 2"],
+  "ritual_ending": "Warm closing words (10-20 words)"
+}
+
+【About reasoning_bullets】
+- Provide 3-5 brief explanation points
+- Each 5-15 words
+- Connect divination results with user's question
+- Don't expose complex reasoning, only show key insights"""
+}
+
+# Default to Chinese for backward compatibility
+SYSTEM_PROMPT = SYSTEM_PROMPTS["zh"]
+
+# ===== 用户提示词标签 =====
+LIUYAO_LABELS: dict[str, dict[str, Any]] = {
+    "zh": {
+        "line_names": ["初", "二", "三", "四", "五", "上"],
+        "yao_types": {"old_yin": "老阴", "young_yin": "少阴", "young_yang": "少阳", "old_yang": "老阳"},
+        "changing": "（动）",
+        "no_changing": "无动爻",
+        "changing_suffix": "动",
+        "user_question": "用户问题",
+        "divination_method": "占卜方式",
+        "liuyao_method": "六爻起卦",
+        "ai_generated": "AI生成",
+        "manual_cast": "手动投掷",
+        "hexagram_result": "卦象结果",
+        "primary_hexagram": "本卦",
+        "relating_hexagram": "变卦",
+        "changing_lines": "动爻",
+        "line_details": "六爻详情",
+        "interpretation_request": "请根据以上信息，结合用户的问题，提供占卜解读。",
+    },
+    "ja": {
+        "line_names": ["初", "二", "三", "四", "五", "上"],
+        "yao_types": {"old_yin": "老陰", "young_yin": "少陰", "young_yang": "少陽", "old_yang": "老陽"},
+        "changing": "（動）",
+        "no_changing": "動爻なし",
+        "changing_suffix": "動",
+        "user_question": "ユーザーの質問",
+        "divination_method": "占い方法",
+        "liuyao_method": "六爻占い",
+        "ai_generated": "AI生成",
+        "manual_cast": "手動投擲",
+        "hexagram_result": "卦象結果",
+        "primary_hexagram": "本卦",
+        "relating_hexagram": "変卦",
+        "changing_lines": "動爻",
+        "line_details": "六爻詳細",
+        "interpretation_request": "上記の情報とユーザーの質問に基づいて、占い解読を日本語で提供してください。",
+    },
+    "en": {
+        "line_names": ["1st", "2nd", "3rd", "4th", "5th", "6th"],
+        "yao_types": {"old_yin": "Old Yin", "young_yin": "Young Yin", "young_yang": "Young Yang", "old_yang": "Old Yang"},
+        "changing": " (changing)",
+        "no_changing": "No changing lines",
+        "changing_suffix": " changing",
+        "user_question": "User Question",
+        "divination_method": "Divination Method",
+        "liuyao_method": "Liu Yao (Six Lines)",
+        "ai_generated": "AI Generated",
+        "manual_cast": "Manual Cast",
+        "hexagram_result": "Hexagram Result",
+        "primary_hexagram": "Primary Hexagram",
+        "relating_hexagram": "Relating Hexagram",
+        "changing_lines": "Changing Lines",
+        "line_details": "Line Details",
+        "interpretation_request": "Based on the above information and the user's question, please provide the divination interpretation in English.",
+    },
+}
+
+TAROT_LABELS: dict[str, dict[str, str]] = {
+    "zh": {
+        "user_question": "用户问题",
+        "divination_method": "占卜方式",
+        "tarot_spread": "塔罗牌三张牌阵",
+        "ai_generated": "AI生成",
+        "manual_draw": "手动抽牌",
+        "past_present_future": "过去/现在/未来",
+        "draw_result": "抽牌结果",
+        "position": "位置",
+        "upright": "正位",
+        "reversed": "逆位",
+        "keywords": "关键词",
+        "spread_direction": "牌阵解读方向",
+        "past": "过去",
+        "present": "现在",
+        "future": "未来",
+        "past_meaning": "影响当前问题的背景和根源",
+        "present_meaning": "当前状态和面临的核心议题",
+        "future_meaning": "如果保持现状，可能的发展方向",
+        "interpretation_request": "请根据以上信息，结合用户的问题，提供占卜解读。",
+    },
+    "ja": {
+        "user_question": "ユーザーの質問",
+        "divination_method": "占い方法",
+        "tarot_spread": "タロット三枚引き",
+        "ai_generated": "AI生成",
+        "manual_draw": "手動引き",
+        "past_present_future": "過去/現在/未来",
+        "draw_result": "引いたカード",
+        "position": "位置",
+        "upright": "正位置",
+        "reversed": "逆位置",
+        "keywords": "キーワード",
+        "spread_direction": "スプレッド解読方向",
+        "past": "過去",
+        "present": "現在",
+        "future": "未来",
+        "past_meaning": "現在の問題に影響を与えている背景と根源",
+        "present_meaning": "現在の状態と直面している核心的な問題",
+        "future_meaning": "現状を維持した場合の可能な展開",
+        "interpretation_request": "上記の情報とユーザーの質問に基づいて、占い解読を日本語で提供してください。",
+    },
+    "en": {
+        "user_question": "User Question",
+        "divination_method": "Divination Method",
+        "tarot_spread": "Tarot Three-Card Spread",
+        "ai_generated": "AI Generated",
+        "manual_draw": "Manual Draw",
+        "past_present_future": "Past/Present/Future",
+        "draw_result": "Cards Drawn",
+        "position": "Position",
+        "upright": "Upright",
+        "reversed": "Reversed",
+        "keywords": "Keywords",
+        "spread_direction": "Spread Interpretation Guide",
+        "past": "Past",
+        "present": "Present",
+        "future": "Future",
+        "past_meaning": "Background and root causes affecting the current issue",
+        "present_meaning": "Current state and core issues being faced",
+        "future_meaning": "Possible direction if current course is maintained",
+        "interpretation_request": "Based on the above information and the user's question, please provide the divination interpretation in English.",
+    },
+}
+
+# ===== Token 估算 =====
+# 不依赖具体 tokenizer：CJK 字符约 1 token，其余字符约 4 个 1 token
+_WIDE_RE = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    wide = len(_WIDE_RE.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """按估算 token 数截断文本，截断时追加省略号。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens * 4
+    for i, ch in enumerate(text):
+        budget -= 4 if _WIDE_RE.match(ch) else 1
+        if budget < 4:  # 预留省略号
+            return text[:i] + "…"
+    return text
+
+
+# ===== 预编译模板 =====
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    text: str
+    tokens: int
+    optional: bool = False
+
+    @classmethod
+    def of(cls, name: str, text: str, optional: bool = False) -> "Section":
+        return cls(name, text, estimate_tokens(text), optional)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    method: str
+    lang: str
+    mode: str
+    system: Section
+    header: Section
+    guide: Section | None
+    request: Section
+    labels: dict[str, Any]
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    system: str
+    user: str
+    system_tokens: int
+    user_tokens: int
+    trimmed: tuple[str, ...] = ()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.user_tokens
+
+
+def _compile_liuyao(lang: str, mode: str) -> PromptTemplate:
+    t = LIUYAO_LABELS[lang]
+    mode_label = t["ai_generated"] if mode == "ai" else t["manual_cast"]
+    return PromptTemplate(
+        method="liuyao",
+        lang=lang,
+        mode=mode,
+        system=Section.of("system", SYSTEM_PROMPTS[lang]),
+        header=Section.of(
+            "header", f"【{t['divination_method']}】\n{t['liuyao_method']} ({mode_label})"
+        ),
+        guide=None,
+        request=Section.of("request", t["interpretation_request"]),
+        labels=t,
+    )
+
+
+def _compile_tarot(lang: str, mode: str) -> PromptTemplate:
+    t = TAROT_LABELS[lang]
+    mode_label = t["ai_generated"] if mode == "ai" else t["manual_draw"]
+    guide = (
+        f"【{t['spread_direction']}】\n"
+        f"- {t['past']}: {t['past_meaning']}\n"
+        f"- {t['present']}: {t['present_meaning']}\n"
+        f"- {t['future']}: {t['future_meaning']}"
+    )
+    return PromptTemplate(
+        method="tarot",
+        lang=lang,
+        mode=mode,
+        system=Section.of("system", SYSTEM_PROMPTS[lang]),
+        header=Section.of(
+            "header",
+            f"【{t['divination_method']}】\n"
+            f"{t['tarot_spread']} ({mode_label}) - {t['past_present_future']}",
+        ),
+        guide=Section.of("spread_direction", guide, optional=True),
+        request=Section.of("request", t["interpretation_request"]),
+        labels=t,
+    )
+
+
+TEMPLATES: dict[tuple[str, str, str], PromptTemplate] = {
+    **{("liuyao", lang, mode): _compile_liuyao(lang, mode) for lang in LANGS for mode in MODES},
+    **{("tarot", lang, mode): _compile_tarot(lang, mode) for lang in LANGS for mode in MODES},
+}
+
+
+def get_template(method: str, lang: str, mode: str) -> PromptTemplate:
+    lang = lang if lang in LANGS else "zh"
+    mode = mode if mode in MODES else "manual"
+    return TEMPLATES[(method, lang, mode)]
+
+
+# ===== 动态部分 =====
+
+
+def _liuyao_sections(t: dict[str, Any], lang: str, result: dict[str, Any]) -> list[Section]:
+    primary = result.get("primary_hexagram", {})
+    relating = result.get("relating_hexagram")
+    lines = result.get("lines", [])
+    changing_lines = result.get("changing_lines", [])
+
+    # 动爻描述
+    if changing_lines:
+        if lang == "en":
+            changing_desc = ", ".join(f"{t['line_names'][pos-1]} line" for pos in changing_lines) + t["changing_suffix"]
+        else:
+            changing_desc = "、".join(f"{t['line_names'][pos-1]}爻" for pos in changing_lines) + t["changing_suffix"]
+    else:
+        changing_desc = t["no_changing"]
+
+    hexagram = (
+        f"【{t['hexagram_result']}】\n"
+        f"{t['primary_hexagram']}: {primary.get('name', '')} ({primary.get('symbol', '')})\n"
+        f"{primary.get('description', '')}"
+    )
+    if relating:
+        hexagram += (
+            f"\n{t['relating_hexagram']}: {relating.get('name', '')} ({relating.get('symbol', '')})\n"
+            f"{relating.get('description', '')}"
+        )
+    hexagram += f"\n\n{t['changing_lines']}: {changing_desc}"
+
+    # 六爻详情
+    lines_detail = []
+    for i, line in enumerate(lines):
+        yao_type = line.get("yao_type", "")
+        yao_name = t["yao_types"].get(yao_type, yao_type)
+        changing_mark = t["changing"] if line.get("is_changing", False) else ""
+        lines_detail.append(f"{t['line_names'][i]} line: {yao_name}{changing_mark}")
+
+    return [
+        Section.of("hexagram", hexagram),
+        Section.of("line_details", f"【{t['line_details']}】\n" + "\n".join(lines_detail), optional=True),
+    ]
+
+
+def _tarot_sections(t: dict[str, str], lang: str, result: dict[str, Any]) -> list[Section]:
+    position_labels = [t["past"], t["present"], t["future"]]
+    cards_detail = []
+    for i, card_draw in enumerate(result.get("cards", [])):
+        card = card_draw.get("card", {})
+        orientation = t["upright"] if card_draw.get("is_upright", True) else t["reversed"]
+        # 英文和日语使用英文牌名，中文使用中文牌名
+        if lang in ("en", "ja"):
+            card_name = card.get("name_en", card.get("name", ""))
+        else:
+            card_name = card.get("name", "")
+        pos_label = position_labels[i] if i < len(position_labels) else card_draw.get("position_label", "")
+        cards_detail.append(
+            f"{t['position']}{i+1} - {pos_label}: {card_name} ({orientation})\n"
+            f"  {t['keywords']}: {card_draw.get('meaning', '')}"
+        )
+    return [Section.of("cards", f"【{t['draw_result']}】\n" + "\n".join(cards_detail))]
+
+
+def _assemble(
+    template: PromptTemplate,
+    question: str,
+    dynamic: list[Section],
+    budget: int | None,
+) -> CompiledPrompt:
+    t = template.labels
+    trimmed: list[str] = []
+
+    capped = truncate_to_tokens(question, settings.prompt_question_max_tokens)
+    if capped != question:
+        trimmed.append("question")
+    question_header = f"【{t['user_question']}】\n"
+    question_section = Section.of("question", question_header + capped)
+
+    # 静态前缀在前，动态内容在后
+    sections = [template.header]
+    if template.guide:
+        sections.append(template.guide)
+    sections.append(question_section)
+    sections.extend(dynamic)
+    sections.append(template.request)
+
+    budget = budget if budget is not None else settings.prompt_input_token_budget
+    separators = len(sections) - 1
+    total = template.system.tokens + sum(s.tokens for s in sections) + separators
+
+    # 超出预算：先去掉可选段落，再继续缩短问题
+    for optional in [s for s in sections if s.optional]:
+        if total <= budget:
+            break
+        sections.remove(optional)
+        total -= optional.tokens + 1
+        trimmed.append(optional.name)
+
+    if total > budget:
+        # 问题段落的标题也计入预算，只缩短标题之后的问题本身；
+        # 只有固定段落本身就超出预算时才会超出（问题最少保留一个省略号）
+        allowed = question_section.tokens - (total - budget) - estimate_tokens(question_header)
+        shorter = truncate_to_tokens(capped, max(1, allowed))
+        if shorter != capped:
+            index = sections.index(question_section)
+            question_section = Section.of("question", question_header + shorter)
+            sections[index] = question_section
+            if "question" not in trimmed:
+                trimmed.append("question")
+
+    user = "\n\n".join(s.text for s in sections)
+    compiled = CompiledPrompt(
+        system=template.system.text,
+        user=user,
+        system_tokens=template.system.tokens,
+        user_tokens=sum(s.tokens for s in sections) + len(sections) - 1,
+        trimmed=tuple(trimmed),
+    )
+
+    PROMPT_TOKENS.labels(method=template.method, lang=template.lang, part="system").observe(
+        compiled.system_tokens
+    )
+    PROMPT_TOKENS.labels(method=template.method, lang=template.lang, part="user").observe(
+        compiled.user_tokens
+    )
+    for name in trimmed:
+        PROMPT_TRIMS.labels(method=template.method, section=name).inc()
+    current_span().set_attributes(
+        {
+            "prompt.length": len(user),
+            "prompt.tokens": compiled.total_tokens,
+            "prompt.trimmed": ",".join(trimmed),
+        }
+    )
+    return compiled
+
+
+@traced("prompt.build_liuyao", record_args=("mode", "lang"))
+def compile_liuyao_prompt(
+    question: str,
+    mode: str,
+    result: dict[str, Any],
+    lang: str = "zh",
+    budget: int | None = None,
+) -> CompiledPrompt:
+    """编译六爻解读提示词。"""
+    template = get_template("liuyao", lang, mode)
+    dynamic = _liuyao_sections(template.labels, template.lang, result)
+    return _assemble(template, question, dynamic, budget)
+
+
+@traced("prompt.build_tarot", record_args=("mode", "lang"))
+def compile_tarot_prompt(
+    question: str,
+    mode: str,
+    result: dict[str, Any],
+    lang: str = "zh",
+    budget: int | None = None,
+) -> CompiledPrompt:
+    """编译塔罗解读提示词。"""
+    template = get_template("tarot", lang, mode)
+    dynamic = _tarot_sections(template.labels, template.lang, result)
+    return _assemble(template, question, dynamic, budget)
+
+
+def compile_prompt(
+    method: str,
+    question: str,
+    mode: str,
+    result: dict[str, Any],
+    lang: str = "zh",
+    budget: int | None = None,
+) -> CompiledPrompt:
+    if method == "liuyao":
+        return compile_liuyao_prompt(question, mode, result, lang, budget)
+    return compile_tarot_prompt(question, mode, result, lang, budget)
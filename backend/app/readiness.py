@@ -0,0 +1,104 @@
+"""
+就绪检查（/ready）。
+
+/health 只说明进程还活着；/ready 检查这个 worker 现在能否正常处理请求：
+数据库必须可用，Redis 和 LLM 上游只在响应里报告状态（都有降级路径，不应因此把 worker
+摘出负载均衡），收到 SIGTERM 后返回 503，让负载均衡尽快停止转发新请求。
+
+uvicorn（包括 gunicorn 的 UvicornWorker）收到 SIGTERM 就关闭监听并开始退出，lifespan
+的关闭阶段要等进行中的请求结束才运行，在那里标记已经太晚。install_drain_handler 在
+启动时包住服务器自己的 SIGTERM 处理函数：先标记 draining，SHUTDOWN_READY_DELAY 秒后
+再交给服务器开始关闭，这段时间里照常处理请求，只有 /ready 返回 503。
+"""
+
+import asyncio
+import os
+import signal
+import threading
+from types import FrameType
+from typing import Any
+
+from .config import settings
+from .llm import get_router
+from .redis_client import get_redis
+from .storage import get_storage
+
+CHECK_TIMEOUT = 2.0
+
+_draining = False
+
+
+def set_draining(draining: bool) -> None:
+    global _draining
+    _draining = draining
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def install_drain_handler(delay: float) -> None:
+    """在 lifespan 启动时调用：SIGTERM 先标记 draining，delay 秒后再交给服务器原来的处理函数。"""
+    # 信号处理函数只能在主线程安装（TestClient 在其他线程里运行 lifespan）
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+    loop = asyncio.get_running_loop()
+
+    def handle(signum: int, frame: FrameType | None) -> None:
+        # 重复收到 SIGTERM 时不再等待
+        if _draining or delay <= 0:
+            set_draining(True)
+            previous(signum, frame)
+            return
+        set_draining(True)
+        loop.call_soon_threadsafe(loop.call_later, delay, previous, signum, frame)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+def _ping_redis() -> str:
+    client = get_redis()
+    if client is None:
+        return "unavailable"
+    client.ping()
+    return "ok"
+
+
+async def _check(coro: Any) -> dict[str, Any]:
+    try:
+        result = await asyncio.wait_for(coro, CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"status": "timeout"}
+    except Exception as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    if isinstance(result, str):
+        return {"status": result}
+    return {"status": "ok", **result}
+
+
+async def check_readiness() -> tuple[bool, dict[str, Any]]:
+    """返回 (是否就绪, 各依赖状态)。"""
+    database, redis = await asyncio.gather(
+        _check(get_storage().ping()),
+        _check(asyncio.to_thread(_ping_redis)),
+    )
+    llm = get_router().health()
+    states = set(llm["upstreams"].values())
+    if not states:
+        llm["status"] = "not_configured"
+    else:
+        llm["status"] = "degraded" if states == {"open"} else "ok"
+
+    ready = not _draining and database["status"] == "ok"
+    if settings.readiness_require_redis and redis["status"] != "ok":
+        ready = False
+    return ready, {
+        "status": "draining" if _draining else ("ready" if ready else "not_ready"),
+        "pid": os.getpid(),
+        "database": {"backend": get_storage().name, **database},
+        "redis": redis,
+        "llm": llm,
+    }
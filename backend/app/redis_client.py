@@ -1,13 +1,17 @@
-from redis import Redis
+from typing import TYPE_CHECKING
 
 from .config import settings
+from .metrics import REDIS_OP_SECONDS, observe
 
+if TYPE_CHECKING:
+    from redis import Redis
 
-_redis_client: Redis | None = None
+
+_redis_client: "Redis | None" = None
 _redis_available: bool | None = None
 
 
-def get_redis() -> Redis | None:
+def get_redis() -> "Redis | None":
     """Get Redis client. Returns None if Redis is not available."""
     global _redis_client, _redis_available
 
@@ -16,6 +20,9 @@ def get_redis() -> Redis | None:
 
     if _redis_client is None:
         try:
+            # 没有配置 Redis 的部署不必为导入 redis 付出启动时间
+            from redis import Redis
+
             _redis_client = Redis.from_url(
                 settings.redis_url,
                 decode_responses=True,
@@ -23,7 +30,8 @@ def get_redis() -> Redis | None:
                 socket_timeout=2,
             )
             # Test connection
-            _redis_client.ping()
+            with observe(REDIS_OP_SECONDS, op="ping"):
+                _redis_client.ping()
             _redis_available = True
         except Exception:
             _redis_available = False
@@ -33,6 +41,13 @@ def get_redis() -> Redis | None:
     return _redis_client
 
 
+def reset_redis() -> None:
+    """丢弃当前客户端和可用性判断（fork 出的 worker 不能复用父进程的连接）。"""
+    global _redis_client, _redis_available
+    _redis_client = None
+    _redis_available = None
+
+
 def is_redis_available() -> bool:
     """Check if Redis is available."""
     global _redis_available
@@ -0,0 +1,281 @@
+"""
+LLM 响应解码：从模型输出中尽量取回结构化的解读，而不是一处格式问题就整份丢弃。
+
+- decode_json()：快速路径直接 json.loads；否则去掉代码块围栏、跳过前后的说明文字，
+  对被截断的输出（流式中断、超出 max_tokens）补齐引号和括号，退回到最后一个完整的值
+- decode_interpretation()：按 DivinationInterpretation 的字段规范化键名、转换类型
+  （列表写成了字符串、置信度写成了"高"或 0.8 等），并列出仍然缺少的字段；
+  缺得不多时由调用方用一次小的追问补齐（见 interpretation._complete_interpretation）
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from .models.divination_v2 import Confidence, DivinationInterpretation
+
+REQUIRED_FIELDS = (
+    "summary",
+    "advice",
+    "timing",
+    "confidence",
+    "reasoning_bullets",
+    "follow_up_questions",
+    "ritual_ending",
+)
+TEXT_FIELDS = ("summary", "advice", "timing", "ritual_ending")
+# 列表字段及保留的最大条数
+LIST_FIELDS = {"reasoning_bullets": 5, "follow_up_questions": 3}
+
+KEY_ALIASES = {
+    "reasoning": "reasoning_bullets",
+    "reasons": "reasoning_bullets",
+    "bullets": "reasoning_bullets",
+    "follow_up": "follow_up_questions",
+    "follow_ups": "follow_up_questions",
+    "followups": "follow_up_questions",
+    "questions": "follow_up_questions",
+    "ending": "ritual_ending",
+    "closing": "ritual_ending",
+}
+CONFIDENCE_ALIASES = {
+    "高": "high",
+    "中": "medium",
+    "低": "low",
+    "较高": "high",
+    "中等": "medium",
+    "较低": "low",
+    "高い": "high",
+    "普通": "medium",
+    "低い": "low",
+    "mid": "medium",
+    "moderate": "medium",
+}
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CAMEL = re.compile(r"(?<=[a-z0-9])([A-Z])")
+_BULLET = re.compile(r"^\s*(?:[-*•·]|\d+[.)、]|[（(]?\d+[）)])\s*")
+
+# 在说明文字里最多尝试多少个 "{" 作为 JSON 的起点
+MAX_OBJECT_STARTS = 8
+
+
+# ===== JSON =====
+
+
+def _loads_object(text: str) -> dict[str, Any] | None:
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            parsed = json.loads(_TRAILING_COMMA.sub(r"\1", text))
+        except json.JSONDecodeError:
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _scan(text: str, start: int) -> tuple[int | None, list[str], bool, list[tuple[int, str]]]:
+    """从 start 处的 "{" 开始扫描到根对象结束。
+
+    返回 (根对象结束位置或 None, 未闭合的括号栈, 是否停在字符串中, 可截断点)；
+    可截断点是每个顶层以下的逗号位置及当时需要补上的闭合符。
+    """
+    stack: list[str] = []
+    cuts: list[tuple[int, str]] = []
+    in_string = escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            stack.append("}")
+        elif ch == "[":
+            stack.append("]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                return None, stack, False, cuts
+            stack.pop()
+            if not stack:
+                return i, stack, False, cuts
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+    return None, stack, in_string, cuts
+
+
+def _decode_from(text: str, start: int) -> dict[str, Any] | None:
+    end, stack, in_string, cuts = _scan(text, start)
+    if end is not None:
+        return _loads_object(text[start : end + 1])
+    # 截断：停在两个值之间时原地补齐括号；停在字符串中间时丢掉这半个值
+    # （半句话不如让调用方追问补齐），退回到最后一个完整的值
+    if not in_string:
+        parsed = _loads_object(text[start:].rstrip().rstrip(",") + "".join(reversed(stack)))
+        if parsed is not None:
+            return parsed
+    for position, closers in reversed(cuts):
+        parsed = _loads_object(text[start:position] + closers)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def decode_json(content: str) -> dict[str, Any]:
+    """从 LLM 输出中解码出 JSON 对象；没有可用的对象时返回 {}。"""
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError:
+        parsed = None
+    if isinstance(parsed, dict):
+        return parsed
+    first = content.find("{")
+    if first < 0:
+        return {}
+    # 与旧实现相同的贪婪匹配：第一个 "{" 到最后一个 "}"，覆盖代码块和前后说明文字
+    last = content.rfind("}")
+    if last > first:
+        parsed = _loads_object(content[first : last + 1])
+        if parsed is not None:
+            return parsed
+    text = content
+    if "```" in text:
+        fenced = _FENCE.search(text)
+        if fenced and "{" in fenced.group(1):
+            text = fenced.group(1)
+    start = text.find("{")
+    for _ in range(MAX_OBJECT_STARTS):
+        parsed = _decode_from(text, start)
+        if parsed:
+            return parsed
+        start = text.find("{", start + 1)
+        if start < 0:
+            break
+    return {}
+
+
+# ===== 解读字段 =====
+
+
+def _normalize_key(key: str) -> str:
+    key = _CAMEL.sub(r"_\1", str(key).strip()).lower().replace("-", "_").replace(" ", "_")
+    return KEY_ALIASES.get(key, key)
+
+
+def _text(value: Any) -> str | None:
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, bool) or value is None or isinstance(value, dict):
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, list):
+        parts = [part for part in (_text(item) for item in value) if part]
+        return " ".join(parts) or None
+    return None
+
+
+def _items(value: Any, limit: int) -> list[str] | None:
+    if isinstance(value, str):
+        value = [line for line in value.splitlines() if line.strip()]
+    elif not isinstance(value, list):
+        value = [value]
+    items = []
+    for item in value:
+        text = _text(item)
+        if text:
+            items.append(_BULLET.sub("", text).strip() or text)
+    return items[:limit] or None
+
+
+def _confidence(value: Any) -> str:
+    """无法识别时按 medium 处理（与旧实现一致），不为它单独追问。"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        score = value / 100 if value > 1 else value
+        return "low" if score < 0.4 else "medium" if score < 0.7 else "high"
+    text = str(value or "").strip().lower()
+    text = CONFIDENCE_ALIASES.get(text, text)
+    for level in ("high", "medium", "low"):
+        if level in text:
+            return level
+    return "medium"
+
+
+@dataclass
+class DecodedInterpretation:
+    fields: dict[str, Any] = field(default_factory=dict)
+    missing: list[str] = field(default_factory=lambda: list(REQUIRED_FIELDS))
+    # 是否做过键名/类型转换或截断修复（用于统计）
+    coerced: bool = False
+
+    @property
+    def interpretation(self) -> DivinationInterpretation | None:
+        if self.missing:
+            return None
+        return DivinationInterpretation(
+            summary=self.fields["summary"],
+            advice=self.fields["advice"],
+            timing=self.fields["timing"],
+            confidence=Confidence(self.fields["confidence"]),
+            reasoning_bullets=self.fields["reasoning_bullets"],
+            follow_up_questions=self.fields["follow_up_questions"],
+            ritual_ending=self.fields["ritual_ending"],
+        )
+
+    def repairable(self, max_missing: int) -> bool:
+        """已有一部分字段、缺的不超过 max_missing 个时值得追问补齐。"""
+        return bool(self.fields) and 0 < len(self.missing) <= max_missing
+
+    def merge(self, patch: "DecodedInterpretation") -> "DecodedInterpretation":
+        """用 patch 补上缺少的字段，已有字段不覆盖。"""
+        fields = {**patch.fields, **self.fields}
+        return DecodedInterpretation(
+            fields=fields,
+            missing=[key for key in REQUIRED_FIELDS if key not in fields],
+            coerced=True,
+        )
+
+
+def coerce_interpretation(parsed: dict[str, Any]) -> DecodedInterpretation:
+    """按 DivinationInterpretation 的字段规范化一个已解码的对象。"""
+    fields: dict[str, Any] = {}
+    coerced = False
+    for raw_key, value in parsed.items():
+        key = _normalize_key(raw_key)
+        if key != raw_key:
+            coerced = True
+        if key in fields:
+            continue
+        if key in TEXT_FIELDS:
+            text = _text(value)
+            if text is not None:
+                fields[key] = text
+                coerced |= not isinstance(value, str)
+        elif key in LIST_FIELDS:
+            items = _items(value, LIST_FIELDS[key])
+            if items is not None:
+                fields[key] = items
+                coerced |= not isinstance(value, list)
+        elif key == "confidence":
+            fields[key] = _confidence(value)
+            coerced |= fields[key] != value
+    if fields and "confidence" not in fields:
+        fields["confidence"] = "medium"
+        coerced = True
+    missing = [key for key in REQUIRED_FIELDS if key not in fields]
+    return DecodedInterpretation(fields=fields, missing=missing, coerced=coerced)
+
+
+def decode_interpretation(content: str) -> DecodedInterpretation:
+    text = content.strip()
+    decoded = coerce_interpretation(decode_json(text))
+    if decoded.fields and not (text.startswith("{") and text.endswith("}")):
+        decoded.coerced = True
+    return decoded
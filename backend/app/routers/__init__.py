@@ -1,3 +1,3 @@
-from . import admin, auth, divination_v2, horoscope, preload
+from . import admin, auth, divination_v2, horoscope, metrics, preload
 
-__all__ = ["admin", "auth", "divination_v2", "horoscope", "preload"]
+__all__ = ["admin", "auth", "divination_v2", "horoscope", "metrics", "preload"]
@@ -1,17 +1,69 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
 from fastapi import APIRouter, HTTPException
 
+from ..auth import list_users as list_all_users
 from ..config import settings
-from ..db import get_connection
+from ..storage import get_storage
+from ..storage.base import USAGE_DIMENSIONS
+from ..tracing import InMemorySpanExporter, get_exporter
+from ..usage import get_ledger
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
 @router.get("/users")
-def list_users():
+async def list_users():
+    if not settings.allow_debug_users:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return {"users": await list_all_users()}
+
+
+@router.get("/traces")
+def list_traces(limit: int = 20, min_duration_ms: float = 0):
+    """最近的请求链路（需 TRACING_EXPORTER=memory），按根 span 耗时过滤。"""
+    if not settings.allow_debug_users:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    exporter = get_exporter()
+    if not isinstance(exporter, InMemorySpanExporter):
+        raise HTTPException(status_code=404, detail="In-memory tracing not enabled")
+
+    traces: dict[str, list[dict]] = defaultdict(list)
+    for span in exporter.get_finished_spans():
+        traces[span.trace_id].append(span.to_dict())
+
+    result = []
+    for trace_id, spans in traces.items():
+        spans.sort(key=lambda s: s["start_ns"])
+        root = next((s for s in spans if s["parent_id"] is None), spans[0])
+        if root["duration_ms"] < min_duration_ms:
+            continue
+        result.append(
+            {
+                "trace_id": trace_id,
+                "name": root["name"],
+                "duration_ms": root["duration_ms"],
+                "start_ns": root["start_ns"],
+                "spans": spans,
+            }
+        )
+    result.sort(key=lambda t: t["start_ns"], reverse=True)
+    return {"traces": result[:limit]}
+
+
+@router.get("/usage")
+async def llm_usage(group_by: str = "subject", days: int = 7, limit: int = 50):
+    """最近 days 天的上游 token 用量，按 group_by 汇总（subject 为 user:<id> 或 ip:<addr>）。"""
     if not settings.allow_debug_users:
         raise HTTPException(status_code=403, detail="Forbidden")
+    if group_by not in USAGE_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {USAGE_DIMENSIONS}")
 
-    conn = get_connection()
-    rows = conn.execute("SELECT id, email, birth_date, created_at FROM users ORDER BY id DESC").fetchall()
-    conn.close()
-    return {"users": [dict(row) for row in rows]}
+    # 先写入本进程尚未落库的部分；其他 worker 的最多晚 USAGE_FLUSH_INTERVAL 秒
+    await get_ledger().flush()
+    since = (datetime.utcnow().date() - timedelta(days=max(0, days - 1))).isoformat()
+    rows = await get_storage().llm_usage_summary(since, group_by, max(1, min(limit, 500)))
+    return {"since": since, "group_by": group_by, "rows": rows}
@@ -5,12 +5,12 @@ from ..auth import (
     create_session,
     create_user,
     get_user_by_email,
+    get_user_by_id,
     get_user_password_hash,
-    get_user_by_session,
-    hash_password,
     update_user_birth_date,
-    verify_password,
+    update_user_password_hash,
 )
+from ..passwords import HashRateLimitedError, get_hasher
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -30,15 +30,24 @@ class ProfilePayload(BaseModel):
     birthDate: str | None = None
 
 
+def _hash_keys(request: Request, email: str) -> tuple[str, ...]:
+    """按客户端 IP（经可信代理还原，见 main.create_app）和账号限制并发哈希计算。"""
+    ip = request.client.host if request.client else "unknown"
+    return (f"ip:{ip}", f"account:{email}")
+
+
 @router.post("/register")
-def register(payload: RegisterPayload, response: Response):
+async def register(payload: RegisterPayload, request: Request, response: Response):
     email = payload.email.lower().strip()
-    if get_user_by_email(email):
+    if await get_user_by_email(email):
         raise HTTPException(status_code=409, detail="Email already exists")
 
-    password_hash = hash_password(payload.password)
-    user = create_user(email, password_hash, payload.birthDate)
-    session = create_session(user["id"])
+    try:
+        password_hash = await get_hasher().hash(payload.password, _hash_keys(request, email))
+    except HashRateLimitedError:
+        raise HTTPException(status_code=429, detail="Too many requests")
+    user = await create_user(email, password_hash, payload.birthDate)
+    session = await create_session(user["id"])
 
     response.set_cookie(
         "session",
@@ -52,17 +61,26 @@ def register(payload: RegisterPayload, response: Response):
 
 
 @router.post("/login")
-def login(payload: LoginPayload, response: Response):
+async def login(payload: LoginPayload, request: Request, response: Response):
     email = payload.email.lower().strip()
-    password_hash = get_user_password_hash(email)
-    user = get_user_by_email(email)
+    password_hash = await get_user_password_hash(email)
+    user = await get_user_by_email(email)
     if not user or not password_hash:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not verify_password(payload.password, password_hash):
+    try:
+        valid, new_hash = await get_hasher().verify(
+            payload.password, password_hash, _hash_keys(request, email)
+        )
+    except HashRateLimitedError:
+        raise HTTPException(status_code=429, detail="Too many requests")
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # 工作因子调整后，用户下次登录时透明地升级哈希
+        await update_user_password_hash(user["id"], new_hash)
 
-    session = create_session(user["id"])
+    session = await create_session(user["id"])
     response.set_cookie(
         "session",
         session["token"],
@@ -75,37 +93,34 @@ def login(payload: LoginPayload, response: Response):
 
 
 @router.get("/me")
-def me(request: Request):
-    token = request.cookies.get("session")
-    if not token:
+async def me(request: Request):
+    # authenticate 中间件已经通过会话缓存解析出 user_id，这里只按主键查用户
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
         return {"user": None}
 
-    user = get_user_by_session(token)
+    user = await get_user_by_id(user_id)
     if not user:
         return {"user": None}
     return {"user": {"id": user["id"], "email": user["email"], "birthDate": user["birth_date"]}}
 
 
 @router.post("/logout")
-def logout(request: Request, response: Response):
+async def logout(request: Request, response: Response):
     token = request.cookies.get("session")
     if token:
         from ..auth import delete_session
 
-        delete_session(token)
+        await delete_session(token)
     response.delete_cookie("session", path="/")
     return {"ok": True}
 
 
 @router.patch("/profile")
-def update_profile(payload: ProfilePayload, request: Request):
-    token = request.cookies.get("session")
-    if not token:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    user = get_user_by_session(token)
-    if not user:
+async def update_profile(payload: ProfilePayload, request: Request):
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    update_user_birth_date(user["id"], payload.birthDate)
+    await update_user_birth_date(user_id, payload.birthDate)
     return {"ok": True}
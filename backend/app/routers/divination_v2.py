@@ -3,28 +3,33 @@
 支持六爻（起卦）和塔罗牌占卜，AI模式和手动模式。
 """
 
+import asyncio
+import base64
+import binascii
+import json
+import time
 import uuid
-from datetime import datetime
-from typing import Any
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from typing import Any, Literal
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
 
+from ..config import settings
 from ..db import (
     create_divination_session_v2,
     get_divination_session_v2,
-    get_divination_sessions_by_user_v2,
+    list_divination_sessions_v2,
     update_divination_session_v2,
 )
+from ..interpretation_pool import lookup_base_interpretation, outcome_key
 from ..liuyao import (
-    ai_generate_liuyao,
     calculate_toss,
-    generate_liuyao_result,
     generate_session_seed,
 )
 from ..tarot_v2 import (
-    ai_generate_tarot,
     create_manual_draw,
-    generate_tarot_result,
 )
 from ..models.divination_v2 import (
     CoinToss,
@@ -41,9 +46,17 @@ from ..models.divination_v2 import (
     ManualStepRequest,
     ManualStepResponse,
     SessionDetailResponse,
+    SessionHistoryResponse,
     TarotDrawStep,
 )
 from ..interpretation import generate_interpretation_v2
+from ..metrics import DEDUPLICATED_REQUESTS, INTERPRETATIONS, record_cache
+from ..prefetch import get_prefetcher, manual_result, take_prefetched
+from ..seed_results import seed_result
+from ..singleflight import SingleFlight
+from ..storage import get_storage
+from ..tracing import current_span, traced
+from ..usage import bind_usage
 
 router = APIRouter(prefix="/api/v2/divination", tags=["divination-v2"])
 
@@ -53,10 +66,19 @@ def _get_user_id_from_request(request: Request) -> int | None:
     return getattr(request.state, "user_id", None)
 
 
+def _bind_usage(session: dict[str, Any]) -> None:
+    """本请求触发的上游 token 用量记到这个会话上。"""
+    bind_usage(session_id=session["id"], method=session["method"], lang=session.get("lang", "zh"))
+
+
 @router.post("/session", response_model=CreateSessionResponse, status_code=201)
+@traced("route.create_session")
 async def create_session(request: Request, payload: CreateSessionRequest):
     """创建占卜会话。"""
     print(f"[CREATE_SESSION] Received lang from payload: {payload.lang}")
+    current_span().set_attributes(
+        {"method": payload.method, "mode": payload.mode, "lang": payload.lang}
+    )
     
     user_id = _get_user_id_from_request(request)
 
@@ -65,7 +87,7 @@ async def create_session(request: Request, payload: CreateSessionRequest):
 
     print(f"[CREATE_SESSION] Creating session {session_id} with lang={payload.lang}")
     
-    create_divination_session_v2(
+    await create_divination_session_v2(
         session_id=session_id,
         user_id=user_id,
         question=payload.question,
@@ -76,7 +98,7 @@ async def create_session(request: Request, payload: CreateSessionRequest):
     )
     
     # 验证 session 创建成功
-    verify_session = get_divination_session_v2(session_id)
+    verify_session = await get_divination_session_v2(session_id)
     if verify_session:
         print(f"[CREATE_SESSION] Session {session_id} created and verified successfully")
     else:
@@ -90,60 +112,170 @@ async def create_session(request: Request, payload: CreateSessionRequest):
     )
 
 
+# ===== 请求合并 =====
+
+# 同一会话同时只有一次解读生成：/generate 与 /interpret 共用，值为 (结果, 解读)
+_flights: SingleFlight[tuple[dict[str, Any], DivinationInterpretation]] = SingleFlight()
+
+# 另一个 worker 正在生成时，轮询数据库等待它写入的间隔（秒）
+WAIT_POLL_INTERVAL = 0.25
+
+
+async def _dedup(
+    endpoint: str,
+    session_id: str,
+    func: Callable[[], Awaitable[tuple[dict[str, Any], DivinationInterpretation]]],
+) -> tuple[dict[str, Any], DivinationInterpretation]:
+    value, shared = await _flights.do(session_id, func)
+    if shared:
+        DEDUPLICATED_REQUESTS.labels(endpoint=endpoint, via="inflight").inc()
+    return value
+
+
+async def _wait_for_interpretation(
+    session_id: str,
+) -> tuple[dict[str, Any], DivinationInterpretation]:
+    """等待其他请求（可能在其他 worker 上）把解读写入数据库。"""
+    deadline = time.monotonic() + settings.llm_latency_budget + 10
+    while True:
+        session = await get_divination_session_v2(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if session.get("interpretation"):
+            return session["result"], DivinationInterpretation(**session["interpretation"])
+        if session["status"] == "failed":
+            raise HTTPException(status_code=500, detail="Generation failed")
+        if session["status"] == "pending" or time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409, detail=f"Session status is {session['status']}, retry later"
+            )
+        await asyncio.sleep(WAIT_POLL_INTERVAL)
+
+
+async def _save_interpretation(
+    session_id: str, interpretation: DivinationInterpretation, endpoint: str, **fields: Any
+) -> DivinationInterpretation:
+    """只在会话还没有解读时写入（先写者胜）；已被其他请求写入时返回已有的那份。"""
+    saved = await update_divination_session_v2(
+        session_id,
+        interpretation=interpretation.model_dump(),
+        completed_at=datetime.utcnow().isoformat(),
+        expect_no_interpretation=True,
+        **fields,
+    )
+    if saved:
+        return interpretation
+    if fields:
+        await update_divination_session_v2(session_id, **fields)
+    stored = await get_divination_session_v2(session_id)
+    if stored and stored.get("interpretation"):
+        print(f"[DEDUP] Session {session_id} already interpreted, keeping the first result")
+        DEDUPLICATED_REQUESTS.labels(endpoint=endpoint, via="stored").inc()
+        return DivinationInterpretation(**stored["interpretation"])
+    return interpretation
+
+
 @router.post("/generate", response_model=GenerateResponse)
-async def generate_divination(payload: GenerateRequest):
+@traced("route.generate_divination")
+async def generate_divination(
+    payload: GenerateRequest,
+    idempotency_key: str | None = Header(default=None, max_length=200),
+):
     """AI模式生成占卜结果。"""
-    session = get_divination_session_v2(payload.session_id)
+    session = await get_divination_session_v2(payload.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    _bind_usage(session)
+    current_span().set_attributes(
+        {"method": session["method"], "mode": session["mode"], "lang": session.get("lang", "zh")}
+    )
 
-    if session["status"] != "pending":
+    if session["mode"] != DivinationMode.AI.value:
         raise HTTPException(
-            status_code=400, detail=f"Session status is {session['status']}, expected pending"
+            status_code=400, detail="This endpoint is only for AI mode"
         )
+    # 会话已经开始生成（本进程的双击、其他 worker 上的请求或客户端重试）时不再调用 LLM：
+    # _generate 的比较并交换失败后等待那次生成写入，已完成的直接返回存下的结果
+    _check_idempotency_key(session, idempotency_key)
 
-    if session["mode"] != DivinationMode.AI.value:
+    result, interpretation = await _dedup(
+        "generate", session["id"], lambda: _generate(session, idempotency_key)
+    )
+    return GenerateResponse(
+        session_id=session["id"],
+        status=DivinationStatus.COMPLETED,
+        result=result,
+        interpretation=interpretation,
+    )
+
+
+def _check_idempotency_key(session: dict[str, Any], idempotency_key: str | None) -> None:
+    """同一个键重试时重放那次生成；换了键的请求不能接管进行中或已完成的生成。"""
+    stored = session.get("idempotency_key")
+    if (
+        idempotency_key
+        and stored
+        and idempotency_key != stored
+        and session["status"] in ("in_progress", "completed")
+    ):
         raise HTTPException(
-            status_code=400, detail="This endpoint is only for AI mode"
+            status_code=409,
+            detail=f"Session is {session['status']} under a different Idempotency-Key",
         )
 
-    # 更新状态为进行中
-    update_divination_session_v2(session["id"], status="in_progress")
 
-    try:
-        # 根据方法生成结果
-        if session["method"] == DivinationMethod.LIUYAO.value:
-            result = ai_generate_liuyao(session["seed"])
+async def _generate(
+    session: dict[str, Any], idempotency_key: str | None
+) -> tuple[dict[str, Any], DivinationInterpretation]:
+    # 比较并交换：只有把 pending 改成 in_progress 的那个请求调用 LLM
+    claimed = await update_divination_session_v2(
+        session["id"],
+        status="in_progress",
+        idempotency_key=idempotency_key,
+        expect_status="pending",
+    )
+    if not claimed:
+        current = await get_divination_session_v2(session["id"]) or session
+        if (
+            idempotency_key
+            and current["status"] == "failed"
+            and idempotency_key != current.get("idempotency_key")
+        ):
+            # 新的键表示一次新的尝试：可以重新抢占失败的会话
+            claimed = await update_divination_session_v2(
+                session["id"],
+                status="in_progress",
+                idempotency_key=idempotency_key,
+                expect_status="failed",
+            )
         else:
-            result = ai_generate_tarot(session["seed"])
+            # 并发到达时另一个请求可能刚用别的键抢到
+            _check_idempotency_key(current, idempotency_key)
+    if not claimed:
+        DEDUPLICATED_REQUESTS.labels(endpoint="generate", via="stored").inc()
+        return await _wait_for_interpretation(session["id"])
+
+    try:
+        # 根据方法生成结果（seed 的纯函数，走种子缓存）
+        result = seed_result(session["method"], session["seed"])
 
         # 生成LLM解读
         interpretation = await generate_interpretation_v2(
             question=session["question"],
             method=session["method"],
             mode=session["mode"],
-            result=result.model_dump(),
+            result=result,
             lang=session.get("lang", "zh"),
         )
 
         # 更新会话
-        update_divination_session_v2(
-            session["id"],
-            status="completed",
-            result=result.model_dump(),
-            interpretation=interpretation.model_dump() if interpretation else None,
-            completed_at=datetime.utcnow().isoformat(),
-        )
-
-        return GenerateResponse(
-            session_id=session["id"],
-            status=DivinationStatus.COMPLETED,
-            result=result,
-            interpretation=interpretation,
+        interpretation = await _save_interpretation(
+            session["id"], interpretation, "generate", status="completed", result=result
         )
+        return result, interpretation
 
     except Exception as e:
-        update_divination_session_v2(session["id"], status="failed")
+        await update_divination_session_v2(session["id"], status="failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -152,9 +284,10 @@ async def submit_manual_step(payload: ManualStepRequest):
     """手动模式上报步骤。"""
     print(f"[MANUAL_STEP] Received step {payload.step_number} for session {payload.session_id}")
     
-    session = get_divination_session_v2(payload.session_id)
+    session = await get_divination_session_v2(payload.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    _bind_usage(session)
 
     if session["mode"] != DivinationMode.MANUAL.value:
         raise HTTPException(
@@ -202,12 +335,26 @@ async def submit_manual_step(payload: ManualStepRequest):
 
     # 更新状态
     new_status = "completed" if is_complete else "in_progress"
-    update_divination_session_v2(
+    await update_divination_session_v2(
         session["id"],
         status=new_status,
         manual_steps=manual_steps,
     )
 
+    # 倒数第二步：为最后一步的所有候选结果预取解读；最后一步：取消落选的候选
+    if settings.prefetch_enabled:
+        if is_complete:
+            final = manual_result(session["method"], manual_steps)
+            get_prefetcher().resolve(session["id"], outcome_key(session["method"], final))
+        elif len(manual_steps) == total_steps - 1:
+            get_prefetcher().start(
+                session["id"],
+                session["question"],
+                session["method"],
+                manual_steps,
+                session.get("lang", "zh"),
+            )
+
     # 构建部分结果
     partial_result = None
     if session["method"] == DivinationMethod.LIUYAO.value:
@@ -244,28 +391,34 @@ async def submit_manual_step(payload: ManualStepRequest):
 
 
 @router.post("/interpret", response_model=InterpretResponse)
+@traced("route.get_interpretation")
 async def get_interpretation(payload: InterpretRequest):
     """获取LLM解读。"""
     print(f"[INTERPRET] Received request for session: {payload.session_id}")
     
-    # 添加数据库路径日志
-    from ..db import DB_PATH, get_connection
-    print(f"[INTERPRET] Database path: {DB_PATH}, exists: {DB_PATH.exists()}")
-    
-    session = get_divination_session_v2(payload.session_id)
+    session = await get_divination_session_v2(payload.session_id)
     if not session:
-        print(f"[INTERPRET] ERROR: Session not found: {payload.session_id}")
-        # 列出所有 sessions 帮助诊断
-        conn = get_connection()
-        all_sessions = conn.execute("SELECT id FROM divination_sessions_v2 LIMIT 10").fetchall()
-        conn.close()
-        print(f"[INTERPRET] Available sessions (first 10): {[s['id'] for s in all_sessions]}")
+        print(
+            f"[INTERPRET] ERROR: Session not found: {payload.session_id} "
+            f"(storage: {get_storage().name})"
+        )
         raise HTTPException(status_code=404, detail="Session not found")
+    _bind_usage(session)
     
     print(f"[INTERPRET] Session found: mode={session['mode']}, method={session['method']}")
 
     # 检查是否已经有结果
-    if session.get("interpretation"):
+    cache_hit = bool(session.get("interpretation"))
+    record_cache("interpretation", cache_hit)
+    current_span().set_attributes(
+        {
+            "method": session["method"],
+            "mode": session["mode"],
+            "lang": session.get("lang", "zh"),
+            "cache.hit": cache_hit,
+        }
+    )
+    if cache_hit:
         return InterpretResponse(
             session_id=session["id"],
             interpretation=DivinationInterpretation(**session["interpretation"]),
@@ -285,27 +438,9 @@ async def get_interpretation(payload: InterpretRequest):
                 detail=f"Manual steps not complete: {len(manual_steps)}/{total_steps}",
             )
 
-        # 根据手动步骤生成结果
-        if session["method"] == DivinationMethod.LIUYAO.value:
-            tosses = [CoinToss(**step["data"]) for step in manual_steps]
-            result = generate_liuyao_result(tosses)
-        else:
-            draws = [
-                create_manual_draw(
-                    card_id=step["data"]["card_id"],
-                    position_index=i,
-                    is_upright=step["data"]["is_upright"],
-                )
-                for i, step in enumerate(manual_steps)
-            ]
-            result = generate_tarot_result(draws)
-
-        # 保存结果
-        update_divination_session_v2(
-            session["id"],
-            result=result.model_dump(),
-        )
-        result_data = result.model_dump()
+        # 根据手动步骤生成结果并保存
+        result_data = manual_result(session["method"], manual_steps)
+        await update_divination_session_v2(session["id"], result=result_data)
     else:
         # AI模式：从session获取result，如果没有则根据seed生成
         result_data = session.get("result")
@@ -313,101 +448,160 @@ async def get_interpretation(payload: InterpretRequest):
             # AI模式下可以根据seed重新生成相同的结果
             if session["mode"] == DivinationMode.AI.value and session.get("seed"):
                 print(f"[INTERPRET] AI mode: generating result from seed {session['seed']}")
-                if session["method"] == DivinationMethod.LIUYAO.value:
-                    result = ai_generate_liuyao(session["seed"])
-                else:
-                    result = ai_generate_tarot(session["seed"])
-                result_data = result.model_dump()
+                result_data = seed_result(session["method"], session["seed"])
                 # 保存到session以便后续使用
-                update_divination_session_v2(session["id"], result=result_data)
+                await update_divination_session_v2(session["id"], result=result_data)
             else:
                 raise HTTPException(
                     status_code=400, detail="No result available for interpretation"
                 )
 
+    result_data, interpretation = await _dedup(
+        "interpret", session["id"], lambda: _interpret(session, result_data)
+    )
+    return InterpretResponse(
+        session_id=session["id"],
+        interpretation=interpretation,
+    )
+
+
+async def _interpret(
+    session: dict[str, Any], result_data: dict[str, Any]
+) -> tuple[dict[str, Any], DivinationInterpretation]:
     # 生成LLM解读
     session_lang = session.get("lang", "zh")
     print(f"[INTERPRET_ROUTE] Session lang value: {session_lang}")
     print(f"[INTERPRET_ROUTE] Full session data keys: {list(session.keys())}")
     
-    interpretation = await generate_interpretation_v2(
-        question=session["question"],
-        method=session["method"],
-        mode=session["mode"],
-        result=result_data,
-        lang=session_lang,
-    )
+    # 手动模式优先使用倒数第二步时预取的解读
+    interpretation = None
+    if session["mode"] == DivinationMode.MANUAL.value:
+        interpretation = await take_prefetched(session["id"], session["method"], result_data)
+    if interpretation is not None:
+        INTERPRETATIONS.labels(method=session["method"], lang=session_lang, source="prefetch").inc()
+        current_span().set_attribute("interpretation.source", "prefetch")
+    else:
+        interpretation = await generate_interpretation_v2(
+            question=session["question"],
+            method=session["method"],
+            mode=session["mode"],
+            result=result_data,
+            lang=session_lang,
+        )
 
     # 保存解读
-    update_divination_session_v2(
-        session["id"],
-        interpretation=interpretation.model_dump() if interpretation else None,
-        completed_at=datetime.utcnow().isoformat(),
-    )
+    interpretation = await _save_interpretation(session["id"], interpretation, "interpret")
+    return result_data, interpretation
 
-    return InterpretResponse(
-        session_id=session["id"],
-        interpretation=interpretation,
+
+def _encode_cursor(position: tuple[str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(session_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _utc_iso(value: datetime) -> str:
+    """created_at 存的是不带时区的 UTC 时间字符串，比较前先统一格式。"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+# 必须注册在 /{session_id} 之前，否则 "records" 会被当作会话 ID
+@router.get("/records", response_model=SessionHistoryResponse)
+async def get_records(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    fields: Literal["summary", "full"] = "summary",
+    method: DivinationMethod | None = None,
+    status: DivinationStatus | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """获取用户的占卜历史记录（按时间倒序，游标分页）。"""
+    user_id = _get_user_id_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    records, next_position = await list_divination_sessions_v2(
+        user_id,
+        limit=limit,
+        before=_decode_cursor(cursor) if cursor else None,
+        method=method.value if method else None,
+        status=status.value if status else None,
+        since=_utc_iso(since) if since else None,
+        until=_utc_iso(until) if until else None,
+        full=fields == "full",
+    )
+    return SessionHistoryResponse(
+        records=records,
+        next_cursor=_encode_cursor(next_position) if next_position else None,
     )
 
 
-@router.get("/{session_id}", response_model=SessionDetailResponse)
-async def get_session_detail(session_id: str):
-    """获取会话详情（回放）。"""
-    session = get_divination_session_v2(session_id)
+@router.get("/{session_id}/preview", response_model=InterpretResponse)
+async def get_interpretation_preview(session_id: str):
+    """预生成的通用解读，前端在个性化解读生成期间先展示；没有时返回404。"""
+    session = await get_divination_session_v2(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    # 前端在 /interpret 之前请求预览，此时结果通常还没写入会话：按 seed 或手动步骤推出来
+    result = session.get("result")
+    if not result and session["mode"] == DivinationMode.AI.value and session.get("seed"):
+        result = seed_result(session["method"], session["seed"])
+    elif not result and session["mode"] == DivinationMode.MANUAL.value:
+        manual_steps = session.get("manual_steps") or []
+        total_steps = 6 if session["method"] == DivinationMethod.LIUYAO.value else 3
+        if len(manual_steps) >= total_steps:
+            result = manual_result(session["method"], manual_steps)
+    if not result:
+        raise HTTPException(status_code=404, detail="No result available for preview")
 
-    # 构建响应
-    from ..models.divination_v2 import (
-        DivinationSession,
-        Question,
-        LiuyaoResult,
-        TarotResult,
+    interpretation = await lookup_base_interpretation(
+        session["method"], result, session.get("lang", "zh")
     )
+    if interpretation is None:
+        raise HTTPException(status_code=404, detail="Preview not available")
+    return InterpretResponse(session_id=session["id"], interpretation=interpretation)
 
-    question = Question(
-        text=session["question"],
-        created_at=datetime.fromisoformat(session["created_at"]),
-    )
 
-    result = None
-    if session.get("result"):
-        if session["method"] == DivinationMethod.LIUYAO.value:
-            result = LiuyaoResult(**session["result"])
-        else:
-            result = TarotResult(**session["result"])
+@router.get("/{session_id}", response_model=SessionDetailResponse)
+async def get_session_detail(session_id: str):
+    """获取会话详情（回放）。
+
+    结果、手动步骤在写入时已经校验过，这里直接拼装 JSON 返回，
+    不再逐层构建 pydantic 模型（FastAPI 对返回的模型还会再校验一遍）。
+    """
+    session = await get_divination_session_v2(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
 
     interpretation = None
     if session.get("interpretation"):
-        interpretation = DivinationInterpretation(**session["interpretation"])
-
-    session_obj = DivinationSession(
-        id=session["id"],
-        user_id=str(session["user_id"]) if session.get("user_id") else None,
-        question=question,
-        mode=DivinationMode(session["mode"]),
-        method=DivinationMethod(session["method"]),
-        seed=session["seed"],
-        status=DivinationStatus(session["status"]),
-        result=result,
-        interpretation=interpretation,
-        manual_steps=session.get("manual_steps"),
-        created_at=datetime.fromisoformat(session["created_at"]),
-        completed_at=datetime.fromisoformat(session["completed_at"])
-        if session.get("completed_at")
-        else None,
-    )
-
-    return SessionDetailResponse(session=session_obj)
-
-
-@router.get("/records", response_model=dict)
-async def get_records(request: Request):
-    """获取用户的占卜历史记录。"""
-    user_id = _get_user_id_from_request(request)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+        interpretation = DivinationInterpretation(**session["interpretation"]).model_dump(
+            mode="json"
+        )
 
-    records = get_divination_sessions_by_user_v2(user_id)
-    return {"records": records}
+    session_data = {
+        "id": session["id"],
+        "user_id": str(session["user_id"]) if session.get("user_id") else None,
+        "question": {"text": session["question"], "created_at": session["created_at"]},
+        "mode": session["mode"],
+        "method": session["method"],
+        "seed": session["seed"],
+        "status": session["status"],
+        "result": session.get("result") or None,
+        "interpretation": interpretation,
+        "manual_steps": session.get("manual_steps"),
+        "created_at": session["created_at"],
+        "completed_at": session.get("completed_at") or None,
+    }
+    return JSONResponse({"session": session_data})
@@ -1,7 +1,7 @@
+import asyncio
 import json
 
 from fastapi import APIRouter, HTTPException
-import httpx
 
 from ..config import settings
 from ..horoscope import (
@@ -13,12 +13,12 @@ from ..horoscope import (
     get_horoscope_fields,
     get_target_date,
 )
+from ..metrics import REDIS_OP_SECONDS, observe, record_cache
 from ..redis_client import get_redis
 from ..translate import translate_texts
 
 router = APIRouter(prefix="/api", tags=["horoscope"])
 
-EXTERNAL_HOROSCOPE_BASE = "https://ohmanda.com/api/horoscope"
 CACHE_TTL = 60 * 60 * 24
 
 
@@ -33,12 +33,15 @@ async def aztro(payload: dict):
 
     target_date = get_target_date(day)
     cache_key = get_cache_key(lang, sign, target_date)
-    redis = get_redis()
+    # redis 客户端是同步的，所有调用（包括首次连接）都放到线程池，避免卡住事件循环
+    redis = await asyncio.to_thread(get_redis)
 
     # Try cache first if Redis is available
     if redis:
         try:
-            cached = redis.get(cache_key)
+            with observe(REDIS_OP_SECONDS, op="get"):
+                cached = await asyncio.to_thread(redis.get, cache_key)
+            record_cache("horoscope", bool(cached))
             if cached:
                 return json.loads(cached)
         except Exception:
@@ -47,9 +50,11 @@ async def aztro(payload: dict):
     horoscope = generate_horoscope(sign, day)
 
     if day == "today":
+        import httpx
+
         try:
             async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(f"{EXTERNAL_HOROSCOPE_BASE}/{sign}")
+                response = await client.get(f"{settings.horoscope_api_url}/{sign}")
             if response.status_code == 200:
                 external = response.json()
                 if external.get("horoscope"):
@@ -66,7 +71,10 @@ async def aztro(payload: dict):
     # Cache if Redis is available
     if redis:
         try:
-            redis.set(cache_key, json.dumps(horoscope), ex=CACHE_TTL)
+            with observe(REDIS_OP_SECONDS, op="set"):
+                await asyncio.to_thread(
+                    redis.set, cache_key, json.dumps(horoscope), ex=CACHE_TTL
+                )
         except Exception:
             pass
 
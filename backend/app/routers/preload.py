@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 from fastapi import APIRouter, HTTPException, Request
@@ -11,6 +12,8 @@ from ..horoscope import (
     get_horoscope_fields,
     get_target_date,
 )
+from ..limiter import Priority
+from ..metrics import REDIS_OP_SECONDS, observe
 from ..redis_client import get_redis
 from ..translate import translate_texts
 
@@ -26,7 +29,7 @@ async def preload(request: Request):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     target_date = get_target_date("today")
-    redis = get_redis()
+    redis = await asyncio.to_thread(get_redis)
 
     if not redis:
         raise HTTPException(status_code=503, detail="Redis not available")
@@ -42,11 +45,21 @@ async def preload(request: Request):
             try:
                 horoscope = base
                 if lang != "en":
-                    translated, used = await translate_texts(get_horoscope_fields(base), lang)
-                    if used:
-                        horoscope = apply_translated_fields(base, translated)
+                    translated, used = await translate_texts(
+                        get_horoscope_fields(base), lang, priority=Priority.BACKGROUND
+                    )
+                    if not used:
+                        # 翻译被限流或失败时不缓存英文内容，留给 /aztro 按需翻译
+                        sign_result["languages"].append(
+                            {"lang": lang, "success": False, "error": "translation unavailable"}
+                        )
+                        continue
+                    horoscope = apply_translated_fields(base, translated)
                 cache_key = get_cache_key(lang, sign, target_date)
-                redis.set(cache_key, json.dumps(horoscope), ex=CACHE_TTL)
+                with observe(REDIS_OP_SECONDS, op="set"):
+                    await asyncio.to_thread(
+                        redis.set, cache_key, json.dumps(horoscope), ex=CACHE_TTL
+                    )
                 sign_result["languages"].append({"lang": lang, "success": True})
             except Exception as exc:
                 sign_result["languages"].append({"lang": lang, "success": False, "error": str(exc)})
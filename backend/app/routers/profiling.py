@@ -0,0 +1,56 @@
+import hmac
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from ..config import settings
+from ..profiler import ProfilerBusyError, get_watchdog, profile
+
+router = APIRouter(prefix="/api/admin/profile", tags=["admin"])
+
+MAX_PROFILE_SECONDS = 60
+
+
+def _check_secret(request: Request) -> None:
+    secret = request.headers.get("x-profiling-secret") or ""
+    # 常数时间比较，避免按响应耗时逐字节猜出口令
+    if not settings.profiling_secret or not hmac.compare_digest(
+        secret.encode(), settings.profiling_secret.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.post("")
+async def run_profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    threads: Literal["loop", "all"] = "loop",
+    format: Literal["collapsed", "tasks", "speedscope", "json"] = "json",
+):
+    """采样当前 worker seconds 秒；其他请求照常处理，这个请求在采样结束后返回。"""
+    _check_secret(request)
+    try:
+        result = await profile(seconds, interval_ms / 1000, threads)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    if format == "collapsed":
+        return PlainTextResponse(result.collapsed())
+    if format == "tasks":
+        return PlainTextResponse(result.collapsed(tasks=True))
+    if format == "speedscope":
+        return result.speedscope()
+    return result.summary()
+
+
+@router.get("/slow")
+async def slow_requests(request: Request, limit: int = Query(20, ge=1, le=500)):
+    """看门狗记录的最近慢请求调用栈（新的在前）。"""
+    _check_secret(request)
+    watchdog = get_watchdog()
+    if watchdog is None:
+        raise HTTPException(status_code=404, detail="Slow request watchdog not enabled")
+    dumps = list(watchdog.dumps)[-limit:]
+    return {"threshold": watchdog.threshold, "requests": dumps[::-1]}
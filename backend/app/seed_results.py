@@ -0,0 +1,224 @@
+"""
+AI 模式结果的种子缓存。
+
+AI 模式的结果是 seed 的纯函数，但 ai_generate_liuyao / ai_generate_tarot 每次都要做
+SHA-256、构造 Random、再逐层构建 pydantic 模型。这里用有界 LRU 记住 seed -> 紧凑结果：
+
+- 六爻：18 位铜钱数字（每爻三枚，2/3），如 "233223333222233223"
+- 塔罗：与 interpretation_pool.outcome_key 相同的 "牌id+u/r"，如 "5u-12r-0u"
+
+展开时直接用预先生成的卦象/铜钱/牌面字典拼装结果（等价于 model_dump(mode="json")），
+不再经过 pydantic 校验。generate、interpret 两条路径共用同一个缓存，
+回放接口则直接返回库里已经校验过的结果 JSON。
+设置 SEED_RESULT_CACHE_FILE 后，启动时加载、关闭时保存。
+"""
+
+import functools
+import itertools
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from .config import settings
+from .liuyao import (
+    HEXAGRAM_LOOKUP,
+    _get_hexagram_by_id,
+    ai_generate_liuyao,
+    calculate_toss,
+)
+from .metrics import record_cache
+from .tarot_v2 import MAJOR_ARCANA_DATA, SPREAD_POSITIONS, ai_generate_tarot, create_manual_draw
+
+logger = logging.getLogger(__name__)
+
+
+# ===== 紧凑表示 =====
+
+
+def compact_result(method: str, result: dict[str, Any]) -> str:
+    """完整结果 -> 紧凑字符串。"""
+    if method == "liuyao":
+        return "".join(str(coin) for toss in result["raw_tosses"] for coin in toss["coins"])
+    return "-".join(
+        f"{draw['card']['id']}{'u' if draw['is_upright'] else 'r'}" for draw in result["cards"]
+    )
+
+
+@functools.cache
+def _toss(coins: tuple[int, int, int]) -> dict[str, Any]:
+    return calculate_toss(coins).model_dump(mode="json")
+
+
+@functools.cache
+def _hexagram(binary: str) -> dict[str, Any]:
+    return _get_hexagram_by_id(HEXAGRAM_LOOKUP[binary]).model_dump(mode="json")
+
+
+@functools.cache
+def _draw(card_id: int, position: int, is_upright: bool) -> dict[str, Any]:
+    return create_manual_draw(card_id, position, is_upright).model_dump(mode="json")
+
+
+def warm_leaf_cache() -> None:
+    """预先构建全部叶子字典：8 种投掷、64 卦、每张牌在每个位置的正逆位。"""
+    for coins in itertools.product((2, 3), repeat=3):
+        _toss(coins)
+    for binary in HEXAGRAM_LOOKUP:
+        _hexagram(binary)
+    for card in MAJOR_ARCANA_DATA:
+        for position in range(len(SPREAD_POSITIONS)):
+            _draw(card["id"], position, True)
+            _draw(card["id"], position, False)
+
+
+def _expand_liuyao(compact: str) -> dict[str, Any]:
+    coins = [int(c) for c in compact]
+    tosses = [_toss(tuple(coins[i : i + 3])) for i in range(0, 18, 3)]
+    lines = []
+    primary = relating = ""
+    for position, toss in enumerate(tosses, start=1):
+        is_yang = toss["sum"] % 2 == 1
+        changing = toss["is_changing"]
+        lines.append(
+            {
+                "position": position,
+                "yao_type": toss["yao_type"],
+                "is_yang": is_yang,
+                "is_changing": changing,
+                "changed_yang": not is_yang if changing else None,
+            }
+        )
+        primary += "1" if is_yang else "0"
+        relating += "1" if is_yang != changing else "0"
+    changing_lines = [line["position"] for line in lines if line["is_changing"]]
+    return {
+        "type": "liuyao",
+        "lines": lines,
+        "changing_lines": changing_lines,
+        "primary_hexagram": dict(_hexagram(primary)),
+        "relating_hexagram": dict(_hexagram(relating)) if changing_lines else None,
+        "raw_tosses": [{**toss, "coins": list(toss["coins"])} for toss in tosses],
+    }
+
+
+def _expand_tarot(compact: str) -> dict[str, Any]:
+    cards = []
+    for position, token in enumerate(compact.split("-")):
+        draw = _draw(int(token[:-1]), position, token[-1] == "u")
+        card = draw["card"]
+        cards.append(
+            {
+                **draw,
+                "card": {
+                    **card,
+                    "upright_keywords": list(card["upright_keywords"]),
+                    "reversed_keywords": list(card["reversed_keywords"]),
+                },
+            }
+        )
+    return {
+        "type": "tarot",
+        "spread_type": "three_card",
+        "spread_name": "过去-现在-未来",
+        "cards": cards,
+        "deck_version": "major_22",
+        "draw_sequence": [draw["card"]["id"] for draw in cards],
+    }
+
+
+def expand_result(method: str, compact: str) -> dict[str, Any]:
+    """紧凑字符串 -> 完整结果字典（每次返回新对象，调用方可以修改）。"""
+    if method == "liuyao":
+        return _expand_liuyao(compact)
+    return _expand_tarot(compact)
+
+
+# ===== 缓存 =====
+
+
+class SeedResultCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, method: str, seed: str) -> str | None:
+        compact = self._entries.get((method, seed))
+        if compact is not None:
+            self._entries.move_to_end((method, seed))
+        return compact
+
+    def put(self, method: str, seed: str, compact: str) -> None:
+        self._entries[(method, seed)] = compact
+        self._entries.move_to_end((method, seed))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def save(self, path: Path) -> None:
+        # 多个 worker 可能同时退出，各自写自己的临时文件再原子替换
+        tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for (method, seed), compact in self._entries.items():
+                record = {"method": method, "seed": seed, "result": compact}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> int:
+        if not path.exists():
+            return 0
+        with open(path, encoding="utf-8") as f:
+            # 文件按最近使用顺序写出，超过 maxsize 时自然保留末尾（最近使用）的条目
+            for line in f:
+                record = json.loads(line)
+                self.put(record["method"], record["seed"], record["result"])
+        return len(self)
+
+
+_cache: SeedResultCache | None = None
+
+
+def get_seed_result_cache() -> SeedResultCache:
+    global _cache
+    if _cache is None:
+        _cache = SeedResultCache(maxsize=settings.seed_result_cache_size)
+    return _cache
+
+
+def seed_result(method: str, seed: str) -> dict[str, Any]:
+    """AI 模式下 seed 对应的结果（与 ai_generate_* 的 model_dump 等价）。"""
+    cache = get_seed_result_cache()
+    compact = cache.get(method, seed)
+    record_cache("seed_result", compact is not None)
+    if compact is None:
+        if method == "liuyao":
+            result = ai_generate_liuyao(seed).model_dump(mode="json")
+        else:
+            result = ai_generate_tarot(seed).model_dump(mode="json")
+        cache.put(method, seed, compact_result(method, result))
+        return result
+    return expand_result(method, compact)
+
+
+def load_seed_results() -> None:
+    if not settings.seed_result_cache_file:
+        return
+    try:
+        count = get_seed_result_cache().load(Path(settings.seed_result_cache_file))
+        logger.info(f"[SEED_RESULT] Loaded {count} entries")
+    except Exception as e:
+        logger.warning(f"[SEED_RESULT] Failed to load: {e}")
+
+
+def save_seed_results() -> None:
+    if not settings.seed_result_cache_file or _cache is None:
+        return
+    try:
+        _cache.save(Path(settings.seed_result_cache_file))
+    except Exception as e:
+        logger.warning(f"[SEED_RESULT] Failed to save: {e}")
@@ -0,0 +1,246 @@
+"""
+语义解读缓存：很多用户的问题只是换了个说法（"我要不要换工作" / "我应该换工作吗"），
+又恰好得到同一个卦或牌阵，这时直接复用之前的解读，不再调用 LLM。
+
+- 问题先做规范化（NFKC、小写、去标点和常见虚词），再用字符 n-gram 特征哈希成稀疏向量，
+  不依赖任何模型文件，CPU 上每条只需几十微秒
+- 按 (method, outcome_key, lang) 分桶，每个桶最多保留 SEMANTIC_CACHE_PER_KEY 条，
+  桶本身很小，直接做精确的余弦相似度比较，比近似索引更快也更准
+- 相似度达到 SEMANTIC_CACHE_THRESHOLD 且否定词个数相同时命中："我应该换工作吗" 和
+  "我不应该换工作吗" 只差一个字，相似度超过阈值，意思却相反
+- 设置 SEMANTIC_CACHE_FILE 后，启动时加载、关闭时保存（JSON Lines，向量在加载时重新计算）
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .config import settings
+from .interpretation_pool import outcome_key
+from .metrics import record_cache
+from .models.divination_v2 import DivinationInterpretation
+
+logger = logging.getLogger(__name__)
+
+# 哈希空间大小（稀疏向量，冲突概率可以忽略）
+HASH_BUCKETS = 1 << 20
+
+STOP_WORDS = set(
+    "a am an and are be can could do does for how i if in is it me my now of on or should "
+    "that the this to what will would you your".split()
+)
+
+# 中文/日文没有空格分词，按最长优先直接删除常见的疑问、人称和语气成分
+STOP_PHRASES = sorted(
+    "要不要 该不该 会不会 能不能 是不是 应该 是否 可以 怎么样 如何 我们 我 你 他 她 该 "
+    "吗 呢 吧 啊 呀 的 了 个 "
+    "すべきですか したほうがいいですか ほうがいいですか でしょうか ですか ますか すべき した "
+    "私 の は が を に か ね よ と も".split(),
+    key=len,
+    reverse=True,
+)
+_STOP_RE = re.compile("|".join(map(re.escape, STOP_PHRASES)))
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# 否定词：英文的 n't 规范化后变成 "n t"；"要不要" 之类的正反问已在 STOP_PHRASES 中去掉，
+# "别人"、"特别" 等含否定字的常见词先排除
+_NEGATION_RE = re.compile(
+    r"\b(?:not|no|never|nor|cannot|without)\b|n t\b|[不没沒别別无無勿]|ない|ません"
+)
+_NOT_NEGATION_RE = re.compile("别人|別人|别的|特别|特別|区别|区別|分别|差别|性别|告别")
+
+
+def normalize_question(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]|_", " ", text)
+    return " ".join(text.split())
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def negations(normalized: str) -> int:
+    """规范化后的问题里否定词的个数。"""
+    return len(_NEGATION_RE.findall(_NOT_NEGATION_RE.sub(" ", _STOP_RE.sub(" ", normalized))))
+
+
+def _features(normalized: str) -> Counter:
+    features: Counter = Counter()
+    words = [_stem(w) for w in _WORD_RE.findall(normalized) if w not in STOP_WORDS]
+    for word in words:
+        features[f"w:{word}"] += 1
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            features[f"c:{padded[i:i + 3]}"] += 1
+    # 去掉拉丁字符后剩下的 CJK 部分：单字 + 相邻两字
+    cjk = _STOP_RE.sub(" ", _WORD_RE.sub(" ", normalized))
+    for run in cjk.split():
+        for char in run:
+            features[f"u:{char}"] += 1
+        for i in range(len(run) - 1):
+            features[f"b:{run[i:i + 2]}"] += 1
+    return features
+
+
+def embed(text: str) -> dict[int, float]:
+    """问题 -> L2 归一化的稀疏向量（特征哈希 + 次线性词频）。"""
+    vector: dict[int, float] = {}
+    for feature, count in _features(normalize_question(text)).items():
+        bucket = zlib.crc32(feature.encode()) % HASH_BUCKETS
+        vector[bucket] = vector.get(bucket, 0.0) + 1 + math.log(count)
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else {}
+
+
+def cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(key, 0.0) for key, value in a.items())
+
+
+@dataclass
+class Entry:
+    question: str
+    vector: dict[int, float]
+    interpretation: dict[str, Any]
+    negations: int = 0
+
+
+class SemanticCache:
+    def __init__(self, threshold: float, per_key: int, max_keys: int) -> None:
+        self.threshold = threshold
+        self.per_key = per_key
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[tuple[str, str, str], list[Entry]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._buckets.values())
+
+    def lookup(
+        self, question: str, method: str, result: dict[str, Any], lang: str
+    ) -> DivinationInterpretation | None:
+        key = outcome_key(method, result)
+        entries = self._buckets.get((method, key, lang)) if key else None
+        if not entries:
+            record_cache("semantic", False)
+            return None
+
+        vector = embed(question)
+        negated = negations(normalize_question(question))
+        best, score = None, 0.0
+        for entry in entries:
+            if entry.negations != negated:
+                continue
+            similarity = cosine(vector, entry.vector)
+            if similarity > score:
+                best, score = entry, similarity
+        hit = best is not None and score >= self.threshold
+        record_cache("semantic", hit)
+        if not hit:
+            return None
+        self._buckets.move_to_end((method, key, lang))
+        # 命中的条目移到桶尾，桶满时先淘汰最久未命中的
+        entries.remove(best)
+        entries.append(best)
+        return DivinationInterpretation(**best.interpretation)
+
+    def add(
+        self,
+        question: str,
+        method: str,
+        result: dict[str, Any],
+        lang: str,
+        interpretation: DivinationInterpretation | dict[str, Any],
+    ) -> None:
+        key = outcome_key(method, result)
+        if key is None:
+            return
+        if isinstance(interpretation, DivinationInterpretation):
+            interpretation = interpretation.model_dump(mode="json")
+        self._add((method, key, lang), question, interpretation)
+
+    def _add(
+        self, bucket: tuple[str, str, str], question: str, interpretation: dict[str, Any]
+    ) -> None:
+        vector = embed(question)
+        if not vector:
+            return
+        entries = self._buckets.setdefault(bucket, [])
+        self._buckets.move_to_end(bucket)
+        normalized = normalize_question(question)
+        entries.append(Entry(normalized, vector, interpretation, negations(normalized)))
+        if len(entries) > self.per_key:
+            del entries[0]
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def save(self, path: Path) -> None:
+        # 多个 worker 可能同时退出，各自写自己的临时文件再原子替换
+        tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for (method, key, lang), entries in self._buckets.items():
+                for entry in entries:
+                    record = {
+                        "method": method,
+                        "outcome": key,
+                        "lang": lang,
+                        "question": entry.question,
+                        "interpretation": entry.interpretation,
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> int:
+        if not path.exists():
+            return 0
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                bucket = (record["method"], record["outcome"], record["lang"])
+                self._add(bucket, record["question"], record["interpretation"])
+                count += 1
+        return count
+
+
+_cache: SemanticCache | None = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        _cache = SemanticCache(
+            threshold=settings.semantic_cache_threshold,
+            per_key=settings.semantic_cache_per_key,
+            max_keys=settings.semantic_cache_max_keys,
+        )
+    return _cache
+
+
+def load_semantic_cache() -> None:
+    if not settings.semantic_cache_file:
+        return
+    try:
+        count = get_semantic_cache().load(Path(settings.semantic_cache_file))
+        logger.info(f"[SEMANTIC_CACHE] Loaded {count} entries")
+    except Exception as e:
+        logger.warning(f"[SEMANTIC_CACHE] Failed to load: {e}")
+
+
+def save_semantic_cache() -> None:
+    if not settings.semantic_cache_file or _cache is None:
+        return
+    try:
+        _cache.save(Path(settings.semantic_cache_file))
+    except Exception as e:
+        logger.warning(f"[SEMANTIC_CACHE] Failed to save: {e}")
@@ -0,0 +1,181 @@
+"""
+登录会话的进程内缓存。
+
+中间件每个请求都要把 session cookie 解析成 user_id，直接查库意味着每次都做一次
+sessions/users JOIN。这里用带 TTL 的 LRU 缓存解析结果（包括无效 token 的负缓存），
+条目过期时间不超过会话本身的 expires_at。
+
+登出/删除会话时除了清掉本进程的条目，还会把 token 的哈希写进 Redis 的有序集合；
+其他 worker 每隔 SESSION_REVOCATION_POLL 秒最多拉取一次新增的吊销记录，
+因此被吊销的会话最多在这个间隔内仍然有效。Redis 不可用时退化为单进程吊销 + TTL。
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from .auth import get_session_user
+from .config import settings
+from .metrics import AUTH_LOOKUP_SECONDS, record_cache
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "session:revoked"
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class SessionCache:
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        negative_ttl: float,
+        poll_interval: float,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.poll_interval = poll_interval
+        self._entries: OrderedDict[str, tuple[int | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self._revoked_since = time.time()
+        # 每次失效操作递增，用于丢弃查库期间被吊销的结果
+        self.generation = 0
+
+    def lookup(self, token: str) -> tuple[bool, int | None]:
+        """返回 (是否命中, user_id)；无效 token 命中时 user_id 为 None。"""
+        key = _digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            user_id, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, user_id
+
+    def put(
+        self,
+        token: str,
+        user_id: int | None,
+        expires_at: str | None = None,
+        generation: int | None = None,
+    ) -> None:
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        if expires_at:
+            remaining = (datetime.fromisoformat(expires_at) - datetime.utcnow()).total_seconds()
+            ttl = min(ttl, remaining)
+        if ttl <= 0:
+            return
+        key = _digest(token)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (user_id, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(_digest(token), None)
+            self.generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def revoke(self, token: str) -> None:
+        """吊销会话：清除本进程缓存，并通知其他 worker。"""
+        self.invalidate(token)
+        client = get_redis()
+        if client is None:
+            return
+        now = time.time()
+        try:
+            pipe = client.pipeline()
+            pipe.zadd(REVOKED_KEY, {_digest(token): now})
+            # 超过缓存 TTL 的吊销记录已经没有意义
+            pipe.zremrangebyscore(REVOKED_KEY, "-inf", now - self.ttl * 2)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[SESSION] Failed to publish revocation: {e}")
+
+    def claim_revocation_poll(self) -> bool:
+        """到了拉取间隔时返回 True 并记下本次拉取，避免并发请求重复拉取。"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_poll < self.poll_interval:
+                return False
+            self._last_poll = now
+            return True
+
+    def sync_revocations(self) -> None:
+        """拉取其他 worker 发布的吊销记录（同步 Redis 调用，应在线程池中执行）。"""
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            revoked = client.zrangebyscore(
+                REVOKED_KEY, f"({self._revoked_since}", "+inf", withscores=True
+            )
+        except Exception as e:
+            logger.warning(f"[SESSION] Failed to fetch revocations: {e}")
+            return
+        if not revoked:
+            return
+        with self._lock:
+            for key, _ in revoked:
+                self._entries.pop(key, None)
+            self.generation += 1
+        self._revoked_since = max(score for _, score in revoked)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: SessionCache | None = None
+
+
+def get_session_cache() -> SessionCache:
+    global _cache
+    if _cache is None:
+        _cache = SessionCache(
+            maxsize=settings.session_cache_size,
+            ttl=settings.session_cache_ttl,
+            negative_ttl=settings.session_cache_negative_ttl,
+            poll_interval=settings.session_revocation_poll,
+        )
+    return _cache
+
+
+async def resolve_user_id(token: str | None) -> int | None:
+    """把 session cookie 解析为 user_id，缓存未命中时才查库。"""
+    if not token:
+        return None
+    start = time.perf_counter()
+    cache = get_session_cache()
+    if cache.claim_revocation_poll():
+        await asyncio.to_thread(cache.sync_revocations)
+    hit, user_id = cache.lookup(token)
+    if not hit:
+        generation = cache.generation
+        row = await get_session_user(token)
+        user_id = row["user_id"] if row else None
+        cache.put(token, user_id, row["expires_at"] if row else None, generation)
+    record_cache("session", hit)
+    AUTH_LOOKUP_SECONDS.labels(source="cache" if hit else "db").observe(
+        time.perf_counter() - start
+    )
+    return user_id
@@ -0,0 +1,41 @@
+"""
+进程内的请求合并：同一个 key 同时只执行一次，并发的调用者等待并共享同一个结果。
+
+占卜会话以 session_id 为 key：双击、客户端重试、/generate 与 /interpret 同时到达时
+只发起一次 LLM 调用。跨 worker 的并发由数据库的比较并交换（见 db.update_divination_session_v2）
+兜底，这里只负责省掉同一进程内的重复调用。
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Task[T]] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """返回 (结果, 是否与进行中的调用合并)。
+
+        执行放在独立的任务里并用 shield 等待：发起者断开连接不会中断其他等待者共享的调用。
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda task: self._finish(key, task))
+        return await asyncio.shield(flight), shared
+
+    def _finish(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # 所有等待者都已离开时，避免 "exception was never retrieved" 警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"[DEDUP] Flight {key} failed: {task.exception()!r}")
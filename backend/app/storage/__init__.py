@@ -0,0 +1,56 @@
+"""
+持久化层：db.py / auth.py 中的函数都通过这里的 Storage 访问数据库。
+
+DATABASE_URL 为空或以 sqlite:/// 开头时使用本地 SQLite 文件（默认 backend/data/app.db），
+以 postgres:// 或 postgresql:// 开头时使用 PostgreSQL（需要安装 asyncpg），
+这样多个容器可以共享同一份数据。
+"""
+
+from ..config import settings
+from .base import Storage
+from .sqlite import DATA_DIR, DB_PATH, SQLiteStorage
+
+__all__ = [
+    "DATA_DIR",
+    "DB_PATH",
+    "SQLiteStorage",
+    "Storage",
+    "close_storage",
+    "create_storage",
+    "get_storage",
+    "set_storage",
+]
+
+
+def create_storage(url: str | None = None) -> Storage:
+    url = settings.database_url if url is None else url
+    if url.startswith(("postgres://", "postgresql://")):
+        from .postgres import PostgresStorage
+
+        return PostgresStorage(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteStorage(url.removeprefix("sqlite:///"))
+    if url:
+        raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]}")
+    return SQLiteStorage(DB_PATH)
+
+
+_storage: Storage | None = None
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage: Storage | None) -> None:
+    """替换全局存储后端（测试、数据迁移用）。"""
+    global _storage
+    _storage = storage
+
+
+async def close_storage() -> None:
+    if _storage is not None:
+        await _storage.close()
@@ -0,0 +1,184 @@
+from abc import ABC, abstractmethod
+from typing import Any
+
+JSON_FIELDS = ("result", "interpretation", "manual_steps")
+
+HISTORY_SUMMARY_COLUMNS = (
+    "id", "question", "mode", "method", "status", "lang", "created_at", "completed_at"
+)
+HISTORY_FULL_COLUMNS = (*HISTORY_SUMMARY_COLUMNS, "seed", *JSON_FIELDS)
+
+SESSION_V2_COLUMNS = (
+    "id", "user_id", "question", "mode", "method", "seed", "lang", "status",
+    *JSON_FIELDS, "created_at", "completed_at",
+)
+# 单条读取时额外返回的内部列（不参与导出/导入）
+SESSION_V2_DETAIL_COLUMNS = (*SESSION_V2_COLUMNS, "idempotency_key")
+
+# llm_usage 的聚合维度（主键）和累加的计数列；未知的维度存空字符串
+USAGE_DIMENSIONS = ("day", "subject", "session_id", "method", "lang", "caller")
+USAGE_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "latency_ms")
+
+
+class Storage(ABC):
+    """持久化后端接口。
+
+    时间统一以不带时区的 UTC ISO 字符串传入和返回；result/interpretation/manual_steps
+    以 Python 对象传入（字符串视为已序列化的 JSON），读取时返回解码后的对象。
+    """
+
+    name: str
+
+    @abstractmethod
+    async def init(self) -> None:
+        """建表/执行迁移。可重复调用。"""
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    @abstractmethod
+    async def ping(self) -> dict[str, Any]:
+        """执行一条最简单的查询确认数据库可用，返回连接池状态（供 /ready 使用）。"""
+
+    # ===== 用户 =====
+
+    @abstractmethod
+    async def get_user_by_email(self, email: str) -> dict | None: ...
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: int) -> dict | None: ...
+
+    @abstractmethod
+    async def get_user_password_hash(self, email: str) -> str | None: ...
+
+    @abstractmethod
+    async def create_user(
+        self, email: str, password_hash: str, birth_date: str | None, created_at: str
+    ) -> int: ...
+
+    @abstractmethod
+    async def update_user_birth_date(self, user_id: int, birth_date: str | None) -> None: ...
+
+    @abstractmethod
+    async def update_user_password_hash(self, user_id: int, password_hash: str) -> None: ...
+
+    @abstractmethod
+    async def list_users(self) -> list[dict]: ...
+
+    # ===== 登录会话 =====
+
+    @abstractmethod
+    async def create_session(
+        self, token: str, user_id: int, created_at: str, expires_at: str
+    ) -> None: ...
+
+    @abstractmethod
+    async def get_user_by_session(self, token: str, now: str) -> dict | None: ...
+
+    @abstractmethod
+    async def get_session_user(self, token: str, now: str) -> dict | None: ...
+
+    @abstractmethod
+    async def delete_session(self, token: str) -> None: ...
+
+    # ===== 占卜记录 =====
+
+    @abstractmethod
+    async def create_divination_record(self, record: dict[str, Any]) -> int: ...
+
+    @abstractmethod
+    async def get_divination_records_by_user(self, user_id: int, limit: int) -> list[dict]: ...
+
+    @abstractmethod
+    async def create_divination_session_v2(self, session: dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def get_divination_session_v2(self, session_id: str) -> dict | None: ...
+
+    @abstractmethod
+    async def update_divination_session_v2(
+        self, session_id: str, fields: dict[str, Any], expect: dict[str, Any] | None = None
+    ) -> bool:
+        """expect 中的列与当前值一致时才更新（值为 None 表示要求为 NULL），即比较并交换。"""
+
+    @abstractmethod
+    async def list_divination_sessions_v2(
+        self,
+        user_id: int,
+        *,
+        limit: int,
+        before: tuple[str, str] | None,
+        method: str | None,
+        status: str | None,
+        since: str | None,
+        until: str | None,
+        full: bool,
+    ) -> list[dict]:
+        """按 (created_at, id) 倒序返回最多 limit 条。"""
+
+    # ===== 预生成解读 =====
+
+    @abstractmethod
+    async def get_base_interpretation(
+        self, method: str, outcome_key: str, lang: str
+    ) -> dict | None: ...
+
+    @abstractmethod
+    async def put_base_interpretation(
+        self, method: str, outcome_key: str, lang: str, interpretation: dict, created_at: str
+    ) -> None:
+        """写入（或覆盖）某个结果的通用解读。"""
+
+    @abstractmethod
+    async def base_interpretation_keys(self, method: str, lang: str) -> set[str]:
+        """已经生成过的 outcome_key，预生成任务据此断点续跑。"""
+
+    # ===== 导出 / 导入 =====
+
+    @abstractmethod
+    async def scan_divination_sessions_v2(
+        self, *, after: tuple[str, str] | None, limit: int
+    ) -> list[dict]:
+        """按 (created_at, id) 正序返回 after 之后的一批完整会话，供分批流式导出。"""
+
+    @abstractmethod
+    async def insert_divination_sessions_v2(self, sessions: list[dict[str, Any]]) -> int:
+        """批量写入完整会话（已存在的 id 跳过，已删除用户的 user_id 置空），返回写入的行数。"""
+
+    # ===== 用量记账 =====
+
+    @abstractmethod
+    async def add_llm_usage(self, rows: list[dict[str, Any]]) -> None:
+        """按 USAGE_DIMENSIONS 把一批聚合行的 USAGE_COUNTERS 累加到 llm_usage。"""
+
+    @abstractmethod
+    async def llm_usage_summary(self, since: str, group_by: str, limit: int) -> list[dict]:
+        """since（YYYY-MM-DD，含）以来按 group_by 维度汇总，按总 token 数倒序。"""
+
+    # ===== 后台维护 =====
+
+    @abstractmethod
+    async def expired_session_tokens(self, now: str, limit: int) -> list[str]: ...
+
+    @abstractmethod
+    async def delete_sessions(self, tokens: list[str]) -> int: ...
+
+    @abstractmethod
+    async def stuck_session_ids(self, mode: str, before: str, limit: int) -> list[str]: ...
+
+    @abstractmethod
+    async def set_in_progress_status(self, session_ids: list[str], status: str) -> int:
+        """只修改仍处于 in_progress 的会话。"""
+
+    @abstractmethod
+    async def unfinished_session_ids(self, before: str, limit: int) -> list[str]: ...
+
+    @abstractmethod
+    async def completed_sessions(self, before: str, limit: int) -> list[dict]: ...
+
+    @abstractmethod
+    async def delete_divination_sessions(self, session_ids: list[str]) -> int: ...
+
+    @abstractmethod
+    async def compact(self, full: bool = False) -> int | None:
+        """回收空间/更新统计信息；返回回收前的空闲页数（不适用时为 None）。"""
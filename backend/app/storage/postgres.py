@@ -0,0 +1,683 @@
+"""
+PostgreSQL 后端（asyncpg）。
+
+- 连接池：DATABASE_POOL_MIN / DATABASE_POOL_MAX
+- 预编译语句：asyncpg 会按连接缓存 prepare 过的语句（DATABASE_STATEMENT_CACHE_SIZE，
+  经过 pgbouncer 的 transaction 模式时需要设为 0）
+- result / interpretation / manual_steps 使用 JSONB；时间列使用 timestamp（UTC，不带时区）
+- 表结构通过 MIGRATIONS 按版本号顺序执行，记录在 schema_migrations 中
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any
+
+from ..config import settings
+from .base import (
+    HISTORY_FULL_COLUMNS,
+    HISTORY_SUMMARY_COLUMNS,
+    JSON_FIELDS,
+    SESSION_V2_COLUMNS,
+    SESSION_V2_DETAIL_COLUMNS,
+    USAGE_COUNTERS,
+    USAGE_DIMENSIONS,
+    Storage,
+)
+
+MIGRATIONS: list[tuple[int, str]] = [
+    (
+        1,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGSERIAL PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            birth_date TEXT,
+            created_at TIMESTAMP NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS sessions (
+            token TEXT PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+
+        CREATE TABLE IF NOT EXISTS divination_records (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            session_id TEXT NULL,
+            question TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            method TEXT NOT NULL,
+            raw_result TEXT NOT NULL,
+            interpretation TEXT NULL,
+            created_at TIMESTAMP NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS divination_sessions_v2 (
+            id TEXT PRIMARY KEY,
+            user_id BIGINT NULL REFERENCES users(id) ON DELETE SET NULL,
+            question TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            method TEXT NOT NULL,
+            seed TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            result JSONB NULL,
+            interpretation JSONB NULL,
+            manual_steps JSONB NULL,
+            lang TEXT NOT NULL DEFAULT 'zh',
+            created_at TIMESTAMP NOT NULL,
+            completed_at TIMESTAMP NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_v2_status_created
+            ON divination_sessions_v2 (status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_sessions_v2_user_history
+            ON divination_sessions_v2 (user_id, created_at DESC, id DESC)
+            INCLUDE (method, status, mode, lang, completed_at, question);
+        """,
+    ),
+    (
+        2,
+        """
+        CREATE INDEX IF NOT EXISTS idx_sessions_v2_created
+            ON divination_sessions_v2 (created_at, id);
+        """,
+    ),
+    (
+        3,
+        """
+        CREATE TABLE IF NOT EXISTS base_interpretations (
+            method TEXT NOT NULL,
+            outcome_key TEXT NOT NULL,
+            lang TEXT NOT NULL,
+            interpretation JSONB NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (method, outcome_key, lang)
+        );
+        """,
+    ),
+    (
+        4,
+        """
+        ALTER TABLE divination_sessions_v2 ADD COLUMN IF NOT EXISTS idempotency_key TEXT NULL;
+        """,
+    ),
+    (
+        5,
+        """
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            day DATE NOT NULL,
+            subject TEXT NOT NULL,
+            session_id TEXT NOT NULL DEFAULT '',
+            method TEXT NOT NULL DEFAULT '',
+            lang TEXT NOT NULL DEFAULT '',
+            caller TEXT NOT NULL,
+            calls BIGINT NOT NULL DEFAULT 0,
+            prompt_tokens BIGINT NOT NULL DEFAULT 0,
+            completion_tokens BIGINT NOT NULL DEFAULT 0,
+            latency_ms BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, subject, session_id, method, lang, caller)
+        );
+        """,
+    ),
+]
+
+TIMESTAMP_FIELDS = ("created_at", "completed_at", "expires_at")
+
+_ARRAY_TYPES = {
+    "user_id": "bigint[]",
+    "created_at": "timestamp[]",
+    "completed_at": "timestamp[]",
+}
+
+
+def _select_column(column: str) -> str:
+    return f"s.{column}::jsonb" if column in JSON_FIELDS else f"s.{column}"
+
+
+# 防止多个 worker 同时执行迁移
+MIGRATION_LOCK_ID = 7_305_214
+
+
+def to_timestamp(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def to_json(value: object | None) -> object | None:
+    """与 SQLite 后端保持一致：字符串视为已经序列化好的 JSON。"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def _text(value: object | None) -> str | None:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _dump_json(value: object | None) -> str | None:
+    value = to_json(value)
+    return None if value is None else json.dumps(value)
+
+
+def _row(record: Any) -> dict:
+    row = dict(record)
+    for field in TIMESTAMP_FIELDS:
+        if isinstance(row.get(field), datetime):
+            row[field] = row[field].isoformat()
+    return row
+
+
+async def _init_connection(conn: Any) -> None:
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def __init__(self, dsn: str) -> None:
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError(
+                "DATABASE_URL points to PostgreSQL but asyncpg is not installed"
+            ) from e
+        self._asyncpg = asyncpg
+        self.dsn = dsn
+        self._pool: Any = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = asyncio.Lock()
+
+    async def _get_pool(self) -> Any:
+        # 连接池绑定事件循环；测试里每个事件循环各自建池
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pool, self._lock = loop, None, asyncio.Lock()
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await self._asyncpg.create_pool(
+                        self.dsn,
+                        min_size=settings.database_pool_min,
+                        max_size=settings.database_pool_max,
+                        statement_cache_size=settings.database_statement_cache_size,
+                        init=_init_connection,
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            yield conn
+
+    async def _fetchrow(self, sql: str, *args: Any) -> dict | None:
+        pool = await self._get_pool()
+        record = await pool.fetchrow(sql, *args)
+        return _row(record) if record else None
+
+    async def _fetch(self, sql: str, *args: Any) -> list[dict]:
+        pool = await self._get_pool()
+        return [_row(record) for record in await pool.fetch(sql, *args)]
+
+    async def _execute(self, sql: str, *args: Any) -> int:
+        """执行写语句，返回影响的行数。"""
+        pool = await self._get_pool()
+        status = await pool.execute(sql, *args)
+        return int(status.rsplit(" ", 1)[-1]) if status[-1:].isdigit() else 0
+
+    async def init(self) -> None:
+        async with self.acquire() as conn, conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_ID)
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+                )
+                """
+            )
+            rows = await conn.fetch("SELECT version FROM schema_migrations")
+            applied = {row["version"] for row in rows}
+            for version, sql in MIGRATIONS:
+                if version in applied:
+                    continue
+                await conn.execute(sql)
+                await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+
+    async def close(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None and self._loop is asyncio.get_running_loop():
+            await pool.close()
+
+    async def ping(self) -> dict[str, Any]:
+        pool = await self._get_pool()
+        await pool.fetchval("SELECT 1")
+        return {"pool_size": pool.get_size(), "pool_idle": pool.get_idle_size()}
+
+    # ===== 用户 =====
+
+    async def get_user_by_email(self, email: str) -> dict | None:
+        return await self._fetchrow(
+            "SELECT id, email, birth_date, created_at FROM users WHERE email = $1 LIMIT 1", email
+        )
+
+    async def get_user_by_id(self, user_id: int) -> dict | None:
+        return await self._fetchrow(
+            "SELECT id, email, birth_date, created_at FROM users WHERE id = $1", user_id
+        )
+
+    async def get_user_password_hash(self, email: str) -> str | None:
+        row = await self._fetchrow("SELECT password_hash FROM users WHERE email = $1", email)
+        return row["password_hash"] if row else None
+
+    async def create_user(
+        self, email: str, password_hash: str, birth_date: str | None, created_at: str
+    ) -> int:
+        row = await self._fetchrow(
+            """
+            INSERT INTO users (email, password_hash, birth_date, created_at)
+            VALUES ($1, $2, $3, $4) RETURNING id
+            """,
+            email,
+            password_hash,
+            birth_date,
+            to_timestamp(created_at),
+        )
+        return row["id"]
+
+    async def update_user_birth_date(self, user_id: int, birth_date: str | None) -> None:
+        await self._execute("UPDATE users SET birth_date = $1 WHERE id = $2", birth_date, user_id)
+
+    async def update_user_password_hash(self, user_id: int, password_hash: str) -> None:
+        await self._execute(
+            "UPDATE users SET password_hash = $1 WHERE id = $2", password_hash, user_id
+        )
+
+    async def list_users(self) -> list[dict]:
+        return await self._fetch(
+            "SELECT id, email, birth_date, created_at FROM users ORDER BY id DESC"
+        )
+
+    # ===== 登录会话 =====
+
+    async def create_session(
+        self, token: str, user_id: int, created_at: str, expires_at: str
+    ) -> None:
+        await self._execute(
+            "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES ($1, $2, $3, $4)",
+            token,
+            user_id,
+            to_timestamp(created_at),
+            to_timestamp(expires_at),
+        )
+
+    async def get_user_by_session(self, token: str, now: str) -> dict | None:
+        return await self._fetchrow(
+            """
+            SELECT u.id, u.email, u.birth_date, u.created_at
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.token = $1 AND s.expires_at > $2
+            LIMIT 1
+            """,
+            token,
+            to_timestamp(now),
+        )
+
+    async def get_session_user(self, token: str, now: str) -> dict | None:
+        return await self._fetchrow(
+            "SELECT user_id, expires_at FROM sessions WHERE token = $1 AND expires_at > $2",
+            token,
+            to_timestamp(now),
+        )
+
+    async def delete_session(self, token: str) -> None:
+        await self._execute("DELETE FROM sessions WHERE token = $1", token)
+
+    # ===== 占卜记录 =====
+
+    async def create_divination_record(self, record: dict[str, Any]) -> int:
+        row = await self._fetchrow(
+            """
+            INSERT INTO divination_records
+                (user_id, session_id, question, mode, method, raw_result, interpretation,
+                 created_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8) RETURNING id
+            """,
+            record["user_id"],
+            record["session_id"],
+            record["question"],
+            record["mode"],
+            record["method"],
+            _text(record["raw_result"]),
+            _text(record["interpretation"]),
+            to_timestamp(record["created_at"]),
+        )
+        return row["id"]
+
+    async def get_divination_records_by_user(self, user_id: int, limit: int) -> list[dict]:
+        return await self._fetch(
+            """
+            SELECT id, question, mode, method, raw_result, interpretation, created_at
+            FROM divination_records
+            WHERE user_id = $1
+            ORDER BY id DESC
+            LIMIT $2
+            """,
+            user_id,
+            limit,
+        )
+
+    async def create_divination_session_v2(self, session: dict[str, Any]) -> None:
+        await self._execute(
+            """
+            INSERT INTO divination_sessions_v2
+                (id, user_id, question, mode, method, seed, lang, status, created_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            """,
+            session["id"],
+            session["user_id"],
+            session["question"],
+            session["mode"],
+            session["method"],
+            session["seed"],
+            session["lang"],
+            session["status"],
+            to_timestamp(session["created_at"]),
+        )
+
+    async def get_divination_session_v2(self, session_id: str) -> dict | None:
+        return await self._fetchrow(
+            f"SELECT {', '.join(SESSION_V2_DETAIL_COLUMNS)} FROM divination_sessions_v2 "
+            "WHERE id = $1",
+            session_id,
+        )
+
+    async def update_divination_session_v2(
+        self, session_id: str, fields: dict[str, Any], expect: dict[str, Any] | None = None
+    ) -> bool:
+        values = []
+        for key, value in fields.items():
+            if key in JSON_FIELDS:
+                value = to_json(value)
+            elif key in TIMESTAMP_FIELDS:
+                value = to_timestamp(value)
+            values.append(value)
+        assignments = ", ".join(f"{key} = ${i}" for i, key in enumerate(fields, start=1))
+        values.append(session_id)
+        conditions = [f"id = ${len(values)}"]
+        for key, value in (expect or {}).items():
+            if value is None:
+                conditions.append(f"{key} IS NULL")
+            else:
+                values.append(value)
+                conditions.append(f"{key} = ${len(values)}")
+        affected = await self._execute(
+            f"UPDATE divination_sessions_v2 SET {assignments} WHERE {' AND '.join(conditions)}",
+            *values,
+        )
+        return affected > 0
+
+    async def list_divination_sessions_v2(
+        self,
+        user_id: int,
+        *,
+        limit: int,
+        before: tuple[str, str] | None,
+        method: str | None,
+        status: str | None,
+        since: str | None,
+        until: str | None,
+        full: bool,
+    ) -> list[dict]:
+        values: list[object] = [user_id]
+        conditions = ["user_id = $1"]
+
+        def param(value: object) -> str:
+            values.append(value)
+            return f"${len(values)}"
+
+        if method is not None:
+            conditions.append(f"method = {param(method)}")
+        if status is not None:
+            conditions.append(f"status = {param(status)}")
+        if since is not None:
+            conditions.append(f"created_at >= {param(to_timestamp(since))}")
+        if until is not None:
+            conditions.append(f"created_at < {param(to_timestamp(until))}")
+        if before is not None:
+            created_at, session_id = before
+            conditions.append(
+                f"(created_at, id) < ({param(to_timestamp(created_at))}, {param(session_id)})"
+            )
+
+        columns = HISTORY_FULL_COLUMNS if full else HISTORY_SUMMARY_COLUMNS
+        return await self._fetch(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM divination_sessions_v2
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT {param(limit)}
+            """,
+            *values,
+        )
+
+    # ===== 预生成解读 =====
+
+    async def get_base_interpretation(
+        self, method: str, outcome_key: str, lang: str
+    ) -> dict | None:
+        row = await self._fetchrow(
+            """
+            SELECT interpretation FROM base_interpretations
+            WHERE method = $1 AND outcome_key = $2 AND lang = $3
+            """,
+            method,
+            outcome_key,
+            lang,
+        )
+        return row["interpretation"] if row else None
+
+    async def put_base_interpretation(
+        self, method: str, outcome_key: str, lang: str, interpretation: dict, created_at: str
+    ) -> None:
+        await self._execute(
+            """
+            INSERT INTO base_interpretations (method, outcome_key, lang, interpretation, created_at)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (method, outcome_key, lang)
+            DO UPDATE SET interpretation = EXCLUDED.interpretation,
+                          created_at = EXCLUDED.created_at
+            """,
+            method,
+            outcome_key,
+            lang,
+            interpretation,
+            to_timestamp(created_at),
+        )
+
+    async def base_interpretation_keys(self, method: str, lang: str) -> set[str]:
+        rows = await self._fetch(
+            "SELECT outcome_key FROM base_interpretations WHERE method = $1 AND lang = $2",
+            method,
+            lang,
+        )
+        return {row["outcome_key"] for row in rows}
+
+    # ===== 导出 / 导入 =====
+
+    async def scan_divination_sessions_v2(
+        self, *, after: tuple[str, str] | None, limit: int
+    ) -> list[dict]:
+        columns = ", ".join(SESSION_V2_COLUMNS)
+        if after is None:
+            return await self._fetch(
+                f"SELECT {columns} FROM divination_sessions_v2 ORDER BY created_at, id LIMIT $1",
+                limit,
+            )
+        created_at, session_id = after
+        return await self._fetch(
+            f"""
+            SELECT {columns} FROM divination_sessions_v2
+            WHERE (created_at, id) > ($1, $2)
+            ORDER BY created_at, id
+            LIMIT $3
+            """,
+            to_timestamp(created_at),
+            session_id,
+            limit,
+        )
+
+    async def insert_divination_sessions_v2(self, sessions: list[dict[str, Any]]) -> int:
+        if not sessions:
+            return 0
+        columns = SESSION_V2_COLUMNS
+        rows = [
+            [
+                to_timestamp(session.get(column))
+                if column in TIMESTAMP_FIELDS
+                else _dump_json(session.get(column))
+                if column in JSON_FIELDS
+                else session.get(column)
+                for column in columns
+            ]
+            for session in sessions
+        ]
+        # 按列传入数组，一条语句写入整批；JSON 先序列化成文本，避免列表被当成多维数组
+        arrays = [list(column) for column in zip(*rows)]
+        types = [_ARRAY_TYPES.get(column, "text[]") for column in columns]
+        unnest = ", ".join(f"${i}::{t}" for i, t in enumerate(types, start=1))
+        return await self._execute(
+            f"""
+            INSERT INTO divination_sessions_v2 ({", ".join(columns)})
+            SELECT s.id, u.id, {", ".join(_select_column(c) for c in columns[2:])}
+            FROM unnest({unnest}) AS s ({", ".join(columns)})
+            LEFT JOIN users u ON u.id = s.user_id
+            ON CONFLICT (id) DO NOTHING
+            """,
+            *arrays,
+        )
+
+    # ===== 用量记账 =====
+
+    async def add_llm_usage(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        columns = (*USAGE_DIMENSIONS, *USAGE_COUNTERS)
+        arrays = [[row[column] for row in rows] for column in columns]
+        arrays[0] = [date.fromisoformat(day) for day in arrays[0]]
+        types = ["date[]"] + ["text[]"] * (len(USAGE_DIMENSIONS) - 1)
+        types += ["bigint[]"] * len(USAGE_COUNTERS)
+        unnest = ", ".join(f"${i}::{t}" for i, t in enumerate(types, start=1))
+        increments = ", ".join(f"{c} = llm_usage.{c} + EXCLUDED.{c}" for c in USAGE_COUNTERS)
+        # 一条语句写入整批；同一批内的维度互不相同（由调用方在内存中聚合）
+        await self._execute(
+            f"""
+            INSERT INTO llm_usage ({", ".join(columns)})
+            SELECT * FROM unnest({unnest})
+            ON CONFLICT ({", ".join(USAGE_DIMENSIONS)}) DO UPDATE SET {increments}
+            """,
+            *arrays,
+        )
+
+    async def llm_usage_summary(self, since: str, group_by: str, limit: int) -> list[dict]:
+        if group_by not in USAGE_DIMENSIONS:
+            raise ValueError(f"Unknown usage dimension: {group_by}")
+        sums = ", ".join(f"SUM({c})::bigint AS {c}" for c in USAGE_COUNTERS)
+        return await self._fetch(
+            f"""
+            SELECT {group_by}::text AS key, {sums} FROM llm_usage
+            WHERE day >= $1
+            GROUP BY {group_by}
+            ORDER BY SUM(prompt_tokens) + SUM(completion_tokens) DESC
+            LIMIT $2
+            """,
+            date.fromisoformat(since),
+            limit,
+        )
+
+    # ===== 后台维护 =====
+
+    async def expired_session_tokens(self, now: str, limit: int) -> list[str]:
+        rows = await self._fetch(
+            "SELECT token FROM sessions WHERE expires_at <= $1 LIMIT $2", to_timestamp(now), limit
+        )
+        return [row["token"] for row in rows]
+
+    async def delete_sessions(self, tokens: list[str]) -> int:
+        return await self._execute("DELETE FROM sessions WHERE token = ANY($1::text[])", tokens)
+
+    async def stuck_session_ids(self, mode: str, before: str, limit: int) -> list[str]:
+        rows = await self._fetch(
+            """
+            SELECT id FROM divination_sessions_v2
+            WHERE status = 'in_progress' AND mode = $1 AND created_at < $2
+            LIMIT $3
+            """,
+            mode,
+            to_timestamp(before),
+            limit,
+        )
+        return [row["id"] for row in rows]
+
+    async def set_in_progress_status(self, session_ids: list[str], status: str) -> int:
+        return await self._execute(
+            """
+            UPDATE divination_sessions_v2 SET status = $1
+            WHERE status = 'in_progress' AND id = ANY($2::text[])
+            """,
+            status,
+            session_ids,
+        )
+
+    async def unfinished_session_ids(self, before: str, limit: int) -> list[str]:
+        rows = await self._fetch(
+            """
+            SELECT id FROM divination_sessions_v2
+            WHERE status IN ('pending', 'failed') AND created_at < $1
+            LIMIT $2
+            """,
+            to_timestamp(before),
+            limit,
+        )
+        return [row["id"] for row in rows]
+
+    async def completed_sessions(self, before: str, limit: int) -> list[dict]:
+        return await self._fetch(
+            f"""
+            SELECT {", ".join(SESSION_V2_COLUMNS)} FROM divination_sessions_v2
+            WHERE status = 'completed' AND created_at < $1
+            ORDER BY created_at
+            LIMIT $2
+            """,
+            to_timestamp(before),
+            limit,
+        )
+
+    async def delete_divination_sessions(self, session_ids: list[str]) -> int:
+        return await self._execute(
+            "DELETE FROM divination_sessions_v2 WHERE id = ANY($1::text[])", session_ids
+        )
+
+    async def compact(self, full: bool = False) -> int | None:
+        # 日常回收交给 autovacuum，这里只刷新统计信息；VACUUM FULL 会锁表，只在 CLI 中执行
+        async with self.acquire() as conn:
+            if full:
+                await conn.execute("VACUUM (FULL, ANALYZE)")
+            else:
+                await conn.execute("ANALYZE")
+        return None
@@ -0,0 +1,628 @@
+"""
+SQLite 后端（默认）。
+
+sqlite3 是同步的，所有语句在线程池中执行，不阻塞事件循环；每次调用使用独立连接。
+表结构按 MIGRATIONS 的版本号顺序迁移，当前版本记录在 PRAGMA user_version 中，
+已是最新版本的库启动时只需读一次 user_version。
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, TypeVar
+
+from ..config import settings
+from .base import (
+    HISTORY_FULL_COLUMNS,
+    HISTORY_SUMMARY_COLUMNS,
+    JSON_FIELDS,
+    SESSION_V2_COLUMNS,
+    SESSION_V2_DETAIL_COLUMNS,
+    USAGE_COUNTERS,
+    USAGE_DIMENSIONS,
+    Storage,
+)
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DATA_DIR = BASE_DIR / "data"
+DB_PATH = DATA_DIR / "app.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    birth_date TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS divination_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    session_id TEXT NULL,
+    question TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    method TEXT NOT NULL,
+    raw_result TEXT NOT NULL,
+    interpretation TEXT NULL,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS divination_sessions_v2 (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NULL,
+    question TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    method TEXT NOT NULL,
+    seed TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT NULL,
+    interpretation TEXT NULL,
+    manual_steps TEXT NULL,
+    lang TEXT NOT NULL DEFAULT 'zh',
+    created_at TEXT NOT NULL,
+    completed_at TEXT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS base_interpretations (
+    method TEXT NOT NULL,
+    outcome_key TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    interpretation TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (method, outcome_key, lang)
+);
+"""
+
+# 后台维护按过期时间、状态清理；导出按 (created_at, id) 顺序扫描；
+# 历史记录分页用覆盖索引，摘要查询只读索引、不回表
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_v2_status_created
+    ON divination_sessions_v2 (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_v2_created
+    ON divination_sessions_v2 (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_sessions_v2_user_history
+    ON divination_sessions_v2 (
+        user_id, created_at DESC, id DESC, method, status, mode, lang, completed_at, question
+    );
+"""
+
+# LLM 用量按天和归属聚合，批量写入时在主键冲突处累加计数
+USAGE_TABLE = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    day TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    session_id TEXT NOT NULL DEFAULT '',
+    method TEXT NOT NULL DEFAULT '',
+    lang TEXT NOT NULL DEFAULT '',
+    caller TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, subject, session_id, method, lang, caller)
+);
+"""
+
+def _add_lang_column(conn: sqlite3.Connection) -> None:
+    """旧库的 divination_sessions_v2 没有 lang 列。"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(divination_sessions_v2)")}
+    if "lang" not in columns:
+        conn.execute(
+            "ALTER TABLE divination_sessions_v2 ADD COLUMN lang TEXT NOT NULL DEFAULT 'zh'"
+        )
+
+
+MIGRATIONS: list[tuple[int, str | Callable[[sqlite3.Connection], None]]] = [
+    (1, SCHEMA),
+    (2, _add_lang_column),
+    (3, INDEXES),
+    (4, "ALTER TABLE divination_sessions_v2 ADD COLUMN idempotency_key TEXT NULL;"),
+    (5, USAGE_TABLE),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _statements(script: str) -> Iterator[str]:
+    """按完整语句切分脚本（executescript 会先提交当前事务，不能用在迁移事务里）。"""
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            yield buffer.strip()
+            buffer = ""
+
+
+def serialize_payload(value: object | None) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def decode_json_fields(row: dict) -> dict:
+    for field in JSON_FIELDS:
+        if row.get(field):
+            try:
+                row[field] = json.loads(row[field])
+            except json.JSONDecodeError:
+                pass
+    return row
+
+
+def _placeholders(values: list) -> str:
+    return ", ".join("?" for _ in values)
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path: str | Path = DB_PATH) -> None:
+        self.path = Path(path)
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    async def _run(self, func: Callable[[sqlite3.Connection], T], commit: bool = False) -> T:
+        def job() -> T:
+            conn = self.connect()
+            try:
+                value = func(conn)
+                if commit:
+                    conn.commit()
+                return value
+            finally:
+                conn.close()
+
+        return await asyncio.to_thread(job)
+
+    async def _fetchone(self, sql: str, params: tuple = ()) -> dict | None:
+        row = await self._run(lambda conn: conn.execute(sql, params).fetchone())
+        return dict(row) if row else None
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> list[dict]:
+        rows = await self._run(lambda conn: conn.execute(sql, params).fetchall())
+        return [dict(row) for row in rows]
+
+    async def _execute(self, sql: str, params: tuple = ()) -> tuple[int, int | None]:
+        """执行写语句，返回 (rowcount, lastrowid)。"""
+
+        def run(conn: sqlite3.Connection) -> tuple[int, int | None]:
+            cursor = conn.execute(sql, params)
+            return cursor.rowcount, cursor.lastrowid
+
+        return await self._run(run, commit=True)
+
+    async def init(self) -> None:
+        def migrate(conn: sqlite3.Connection) -> int:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return version
+            if version == 0:
+                # 只对新建的库生效；旧库需要 `python -m app.maintenance --full-vacuum` 切换
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("BEGIN IMMEDIATE")
+            # 多个 worker 同时启动时，拿到写锁后再确认一次版本
+            start = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, step in MIGRATIONS:
+                if target <= start:
+                    continue
+                if callable(step):
+                    step(conn)
+                else:
+                    for statement in _statements(step):
+                        conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            return start
+
+        await asyncio.to_thread(self.path.parent.mkdir, parents=True, exist_ok=True)
+        previous = await self._run(migrate, commit=True)
+        if previous < SCHEMA_VERSION:
+            logger.info(f"[DB] Migrated {self.path} from schema v{previous} to v{SCHEMA_VERSION}")
+
+    async def close(self) -> None:
+        pass
+
+    async def ping(self) -> dict[str, Any]:
+        await self._run(lambda conn: conn.execute("SELECT 1").fetchone())
+        return {}
+
+    # ===== 用户 =====
+
+    async def get_user_by_email(self, email: str) -> dict | None:
+        return await self._fetchone(
+            "SELECT id, email, birth_date, created_at FROM users WHERE email = ? LIMIT 1",
+            (email,),
+        )
+
+    async def get_user_by_id(self, user_id: int) -> dict | None:
+        return await self._fetchone(
+            "SELECT id, email, birth_date, created_at FROM users WHERE id = ? LIMIT 1",
+            (user_id,),
+        )
+
+    async def get_user_password_hash(self, email: str) -> str | None:
+        row = await self._fetchone(
+            "SELECT password_hash FROM users WHERE email = ? LIMIT 1", (email,)
+        )
+        return row["password_hash"] if row else None
+
+    async def create_user(
+        self, email: str, password_hash: str, birth_date: str | None, created_at: str
+    ) -> int:
+        _, lastrowid = await self._execute(
+            "INSERT INTO users (email, password_hash, birth_date, created_at) VALUES (?, ?, ?, ?)",
+            (email, password_hash, birth_date, created_at),
+        )
+        return lastrowid
+
+    async def update_user_birth_date(self, user_id: int, birth_date: str | None) -> None:
+        await self._execute("UPDATE users SET birth_date = ? WHERE id = ?", (birth_date, user_id))
+
+    async def update_user_password_hash(self, user_id: int, password_hash: str) -> None:
+        await self._execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id)
+        )
+
+    async def list_users(self) -> list[dict]:
+        return await self._fetchall(
+            "SELECT id, email, birth_date, created_at FROM users ORDER BY id DESC"
+        )
+
+    # ===== 登录会话 =====
+
+    async def create_session(
+        self, token: str, user_id: int, created_at: str, expires_at: str
+    ) -> None:
+        await self._execute(
+            "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (token, user_id, created_at, expires_at),
+        )
+
+    async def get_user_by_session(self, token: str, now: str) -> dict | None:
+        return await self._fetchone(
+            """
+            SELECT u.id, u.email, u.birth_date, u.created_at
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.token = ? AND s.expires_at > ?
+            LIMIT 1
+            """,
+            (token, now),
+        )
+
+    async def get_session_user(self, token: str, now: str) -> dict | None:
+        return await self._fetchone(
+            "SELECT user_id, expires_at FROM sessions WHERE token = ? AND expires_at > ? LIMIT 1",
+            (token, now),
+        )
+
+    async def delete_session(self, token: str) -> None:
+        await self._execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    # ===== 占卜记录 =====
+
+    async def create_divination_record(self, record: dict[str, Any]) -> int:
+        _, lastrowid = await self._execute(
+            """
+            INSERT INTO divination_records
+                (user_id, session_id, question, mode, method, raw_result, interpretation,
+                 created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record["user_id"],
+                record["session_id"],
+                record["question"],
+                record["mode"],
+                record["method"],
+                serialize_payload(record["raw_result"]),
+                serialize_payload(record["interpretation"]),
+                record["created_at"],
+            ),
+        )
+        return lastrowid
+
+    async def get_divination_records_by_user(self, user_id: int, limit: int) -> list[dict]:
+        return await self._fetchall(
+            """
+            SELECT id, question, mode, method, raw_result, interpretation, created_at
+            FROM divination_records
+            WHERE user_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (user_id, limit),
+        )
+
+    async def create_divination_session_v2(self, session: dict[str, Any]) -> None:
+        await self._execute(
+            """
+            INSERT INTO divination_sessions_v2
+                (id, user_id, question, mode, method, seed, lang, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                session["id"],
+                session["user_id"],
+                session["question"],
+                session["mode"],
+                session["method"],
+                session["seed"],
+                session["lang"],
+                session["status"],
+                session["created_at"],
+            ),
+        )
+
+    async def get_divination_session_v2(self, session_id: str) -> dict | None:
+        row = await self._fetchone(
+            f"SELECT {', '.join(SESSION_V2_DETAIL_COLUMNS)} FROM divination_sessions_v2 "
+            "WHERE id = ?",
+            (session_id,),
+        )
+        return decode_json_fields(row) if row else None
+
+    async def update_divination_session_v2(
+        self, session_id: str, fields: dict[str, Any], expect: dict[str, Any] | None = None
+    ) -> bool:
+        values = [
+            serialize_payload(value) if key in JSON_FIELDS else value
+            for key, value in fields.items()
+        ]
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conditions = ["id = ?"]
+        values.append(session_id)
+        for key, value in (expect or {}).items():
+            if value is None:
+                conditions.append(f"{key} IS NULL")
+            else:
+                conditions.append(f"{key} = ?")
+                values.append(value)
+        rowcount, _ = await self._execute(
+            f"UPDATE divination_sessions_v2 SET {assignments} WHERE {' AND '.join(conditions)}",
+            tuple(values),
+        )
+        return rowcount > 0
+
+    async def list_divination_sessions_v2(
+        self,
+        user_id: int,
+        *,
+        limit: int,
+        before: tuple[str, str] | None,
+        method: str | None,
+        status: str | None,
+        since: str | None,
+        until: str | None,
+        full: bool,
+    ) -> list[dict]:
+        conditions = ["user_id = ?"]
+        values: list[object] = [user_id]
+        for condition, value in (
+            ("method = ?", method),
+            ("status = ?", status),
+            ("created_at >= ?", since),
+            ("created_at < ?", until),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                values.append(value)
+        if before is not None:
+            conditions.append("(created_at, id) < (?, ?)")
+            values.extend(before)
+
+        columns = HISTORY_FULL_COLUMNS if full else HISTORY_SUMMARY_COLUMNS
+        rows = await self._fetchall(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM divination_sessions_v2
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            """,
+            (*values, limit),
+        )
+        return [decode_json_fields(row) for row in rows] if full else rows
+
+    # ===== 预生成解读 =====
+
+    async def get_base_interpretation(
+        self, method: str, outcome_key: str, lang: str
+    ) -> dict | None:
+        row = await self._fetchone(
+            """
+            SELECT interpretation FROM base_interpretations
+            WHERE method = ? AND outcome_key = ? AND lang = ?
+            """,
+            (method, outcome_key, lang),
+        )
+        return json.loads(row["interpretation"]) if row else None
+
+    async def put_base_interpretation(
+        self, method: str, outcome_key: str, lang: str, interpretation: dict, created_at: str
+    ) -> None:
+        await self._execute(
+            """
+            INSERT OR REPLACE INTO base_interpretations
+                (method, outcome_key, lang, interpretation, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (method, outcome_key, lang, json.dumps(interpretation, ensure_ascii=False), created_at),
+        )
+
+    async def base_interpretation_keys(self, method: str, lang: str) -> set[str]:
+        rows = await self._fetchall(
+            "SELECT outcome_key FROM base_interpretations WHERE method = ? AND lang = ?",
+            (method, lang),
+        )
+        return {row["outcome_key"] for row in rows}
+
+    # ===== 导出 / 导入 =====
+
+    async def scan_divination_sessions_v2(
+        self, *, after: tuple[str, str] | None, limit: int
+    ) -> list[dict]:
+        condition, values = ("WHERE (created_at, id) > (?, ?)", after) if after else ("", ())
+        rows = await self._fetchall(
+            f"""
+            SELECT {", ".join(SESSION_V2_COLUMNS)} FROM divination_sessions_v2
+            {condition}
+            ORDER BY created_at, id
+            LIMIT ?
+            """,
+            (*values, limit),
+        )
+        return [decode_json_fields(row) for row in rows]
+
+    async def insert_divination_sessions_v2(self, sessions: list[dict[str, Any]]) -> int:
+        rest = _placeholders(SESSION_V2_COLUMNS[2:])
+
+        def run(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            conn.executemany(
+                f"""
+                INSERT OR IGNORE INTO divination_sessions_v2 ({", ".join(SESSION_V2_COLUMNS)})
+                VALUES (?, (SELECT id FROM users WHERE id = ?), {rest})
+                """,
+                [
+                    tuple(
+                        serialize_payload(session.get(column))
+                        if column in JSON_FIELDS
+                        else session.get(column)
+                        for column in SESSION_V2_COLUMNS
+                    )
+                    for session in sessions
+                ],
+            )
+            return conn.total_changes - before
+
+        return await self._run(run, commit=True)
+
+    # ===== 用量记账 =====
+
+    async def add_llm_usage(self, rows: list[dict[str, Any]]) -> None:
+        columns = (*USAGE_DIMENSIONS, *USAGE_COUNTERS)
+        increments = ", ".join(f"{c} = {c} + excluded.{c}" for c in USAGE_COUNTERS)
+        sql = f"""
+            INSERT INTO llm_usage ({", ".join(columns)}) VALUES ({_placeholders(list(columns))})
+            ON CONFLICT ({", ".join(USAGE_DIMENSIONS)}) DO UPDATE SET {increments}
+        """
+        params = [tuple(row[column] for column in columns) for row in rows]
+        await self._run(lambda conn: conn.executemany(sql, params), commit=True)
+
+    async def llm_usage_summary(self, since: str, group_by: str, limit: int) -> list[dict]:
+        if group_by not in USAGE_DIMENSIONS:
+            raise ValueError(f"Unknown usage dimension: {group_by}")
+        sums = ", ".join(f"SUM({c}) AS {c}" for c in USAGE_COUNTERS)
+        return await self._fetchall(
+            f"""
+            SELECT {group_by} AS key, {sums} FROM llm_usage
+            WHERE day >= ?
+            GROUP BY {group_by}
+            ORDER BY SUM(prompt_tokens) + SUM(completion_tokens) DESC
+            LIMIT ?
+            """,
+            (since, limit),
+        )
+
+    # ===== 后台维护 =====
+
+    async def expired_session_tokens(self, now: str, limit: int) -> list[str]:
+        rows = await self._fetchall(
+            "SELECT token FROM sessions WHERE expires_at <= ? LIMIT ?", (now, limit)
+        )
+        return [row["token"] for row in rows]
+
+    async def delete_sessions(self, tokens: list[str]) -> int:
+        rowcount, _ = await self._execute(
+            f"DELETE FROM sessions WHERE token IN ({_placeholders(tokens)})", tuple(tokens)
+        )
+        return rowcount
+
+    async def stuck_session_ids(self, mode: str, before: str, limit: int) -> list[str]:
+        rows = await self._fetchall(
+            """
+            SELECT id FROM divination_sessions_v2
+            WHERE status = 'in_progress' AND mode = ? AND created_at < ?
+            LIMIT ?
+            """,
+            (mode, before, limit),
+        )
+        return [row["id"] for row in rows]
+
+    async def set_in_progress_status(self, session_ids: list[str], status: str) -> int:
+        rowcount, _ = await self._execute(
+            f"""
+            UPDATE divination_sessions_v2 SET status = ?
+            WHERE status = 'in_progress' AND id IN ({_placeholders(session_ids)})
+            """,
+            (status, *session_ids),
+        )
+        return rowcount
+
+    async def unfinished_session_ids(self, before: str, limit: int) -> list[str]:
+        rows = await self._fetchall(
+            """
+            SELECT id FROM divination_sessions_v2
+            WHERE status IN ('pending', 'failed') AND created_at < ?
+            LIMIT ?
+            """,
+            (before, limit),
+        )
+        return [row["id"] for row in rows]
+
+    async def completed_sessions(self, before: str, limit: int) -> list[dict]:
+        rows = await self._fetchall(
+            f"""
+            SELECT {", ".join(SESSION_V2_COLUMNS)} FROM divination_sessions_v2
+            WHERE status = 'completed' AND created_at < ?
+            ORDER BY created_at
+            LIMIT ?
+            """,
+            (before, limit),
+        )
+        return [decode_json_fields(row) for row in rows]
+
+    async def delete_divination_sessions(self, session_ids: list[str]) -> int:
+        rowcount, _ = await self._execute(
+            f"DELETE FROM divination_sessions_v2 WHERE id IN ({_placeholders(session_ids)})",
+            tuple(session_ids),
+        )
+        return rowcount
+
+    async def compact(self, full: bool = False) -> int | None:
+        def run(conn: sqlite3.Connection) -> int:
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if full:
+                # 旧库需要一次完整 VACUUM 才能切换到增量模式（会锁库，只在 CLI 中执行）
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            elif auto_vacuum == 2:
+                conn.execute(f"PRAGMA incremental_vacuum({settings.maintenance_vacuum_pages})")
+            conn.execute("PRAGMA optimize")
+            return freelist
+
+        return await self._run(run, commit=True)
@@ -0,0 +1,289 @@
+"""
+轻量级链路追踪（默认关闭）。
+
+接口保持为 OpenTelemetry Tracer/Span 的一个子集（start_as_current_span、set_attribute、
+record_exception），通过环境变量 TRACING_EXPORTER 开启：
+- memory：保存在进程内环形缓冲区，可通过 /api/admin/traces 查看
+- file：以 JSON Lines 追加写入 TRACING_FILE，离线也能分析
+- otel：转交给已安装并配置好的 opentelemetry SDK
+"""
+
+import functools
+import inspect
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Protocol, TypeVar
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+AttributeValue = str | bool | int | float
+
+
+@dataclass
+class Span:
+    """一次被追踪的操作。"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, AttributeValue] = field(default_factory=dict)
+    status: str = "ok"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = _coerce(value)
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        for key, value in attributes.items():
+            self.attributes[key] = _coerce(value)
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:500]
+
+    @property
+    def duration_ms(self) -> float:
+        if self.end_ns is None:
+            return 0.0
+        return (self.end_ns - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """关闭追踪时返回的空 span，所有操作都是无开销的空实现。"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _coerce(value: Any) -> AttributeValue:
+    if isinstance(value, str | bool | int | float):
+        return value
+    if hasattr(value, "value"):  # Enum
+        return _coerce(value.value)
+    return str(value)
+
+
+# ===== Exporters =====
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemorySpanExporter:
+    """保存最近 N 个 span 的环形缓冲区。"""
+
+    def __init__(self, max_spans: int = 2000) -> None:
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileSpanExporter:
+    """以 JSON Lines 格式追加写入文件。"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ===== Tracer =====
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+
+    @contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: dict[str, Any] | None = None
+    ) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+        )
+        if attributes:
+            span.set_attributes(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.warning(f"[TRACING] Export failed: {e}")
+
+    def current_span(self) -> Any:
+        return _current_span.get() or NOOP_SPAN
+
+
+class _OtelTracer(Tracer):
+    """委托给 opentelemetry-api 的 Tracer。"""
+
+    def __init__(self) -> None:
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer("ai_divination")
+
+    @contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: dict[str, Any] | None = None
+    ) -> Iterator[Any]:
+        attrs = {k: _coerce(v) for k, v in (attributes or {}).items()}
+        with self._tracer.start_as_current_span(name, attributes=attrs) as span:
+            yield span
+
+    def current_span(self) -> Any:
+        return self._trace.get_current_span()
+
+
+_tracer: Tracer | None = None
+
+
+def configure(exporter: str | None = None) -> Tracer | None:
+    """根据配置初始化全局 tracer；exporter 为空时关闭追踪。"""
+    global _tracer
+    name = (exporter if exporter is not None else settings.tracing_exporter).lower()
+    if name == "memory":
+        _tracer = Tracer(InMemorySpanExporter(settings.tracing_buffer_size))
+    elif name == "file":
+        _tracer = Tracer(FileSpanExporter(settings.tracing_file))
+    elif name == "otel":
+        try:
+            _tracer = _OtelTracer()
+        except ImportError:
+            logger.warning("[TRACING] opentelemetry not installed, tracing disabled")
+            _tracer = None
+    else:
+        _tracer = None
+    return _tracer
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def get_exporter() -> SpanExporter | None:
+    return _tracer.exporter if _tracer and not isinstance(_tracer, _OtelTracer) else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """开启一个子 span；追踪关闭时返回空 span。"""
+    if _tracer is None:
+        yield NOOP_SPAN
+        return
+    with _tracer.start_as_current_span(name, attributes) as s:
+        yield s
+
+
+def current_span() -> Any:
+    """返回当前 span（未开启追踪时为空 span）。"""
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.current_span()
+
+
+def traced(name: str, record_args: tuple[str, ...] = ()) -> Callable[[F], F]:
+    """用 span 包裹函数调用；record_args 中列出的参数会记录为 span 属性。"""
+
+    def decorator(func: F) -> F:
+        signature = inspect.signature(func) if record_args else None
+
+        def _attributes(args: tuple, kwargs: dict) -> dict[str, Any]:
+            if signature is None:
+                return {}
+            bound = signature.bind_partial(*args, **kwargs)
+            return {key: bound.arguments[key] for key in record_args if key in bound.arguments}
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _tracer is None:
+                    return await func(*args, **kwargs)
+                with _tracer.start_as_current_span(name, _attributes(args, kwargs)):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.start_as_current_span(name, _attributes(args, kwargs)):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+configure()
@@ -1,22 +1,37 @@
 import json
 import logging
 
-import httpx
-
-from .config import settings
+from .limiter import Priority
+from .llm import LLMError, get_router
 
 logger = logging.getLogger(__name__)
 
+TRANSLATE_BUDGET = 20
+
+
+def _is_translation_of(texts: list[str]):
+    def validate(content: str) -> bool:
+        try:
+            translated = json.loads(content)
+        except json.JSONDecodeError:
+            return False
+        return isinstance(translated, list) and len(translated) == len(texts)
+
+    return validate
 
-async def translate_texts(texts: list[str], target: str) -> tuple[list[str], bool]:
+
+async def translate_texts(
+    texts: list[str], target: str, priority: Priority = Priority.INTERACTIVE
+) -> tuple[list[str], bool]:
     if target == "en":
         logger.info("[TRANSLATE] Target is English, skipping translation")
         return texts, False
-    if not settings.ai_builder_api_key:
+    upstreams = [upstream.name for upstream in get_router().upstreams]
+    if not upstreams:
         logger.warning("[TRANSLATE] AI_BUILDER_TOKEN/API_KEY not configured, skipping translation")
         return texts, False
     
-    logger.info(f"[TRANSLATE] Translating to {target}, API key present: {bool(settings.ai_builder_api_key)}")
+    logger.info(f"[TRANSLATE] Translating to {target} via {', '.join(upstreams)}")
 
     prompt = "\n".join(
         [
@@ -26,38 +41,24 @@ async def translate_texts(texts: list[str], target: str) -> tuple[list[str], boo
         ]
     )
 
-    payload = {
-        "model": settings.ai_builder_model,
-        "messages": [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": json.dumps(texts)},
-        ],
-        "temperature": 0.2,
-    }
-
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.post(
-                settings.ai_builder_api_url,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {settings.ai_builder_api_key}",
-                },
-                json=payload,
-            )
-            if response.status_code >= 400:
-                logger.error(f"[TRANSLATE] API failed: {response.status_code} {response.text}")
-                return texts, False
-            data = response.json()
-
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        translated = json.loads(content)
-        if not isinstance(translated, list) or len(translated) != len(texts):
-            logger.error(f"[TRANSLATE] Unexpected format: {content[:200]}")
-            return texts, False
-        
+        response = await get_router().complete(
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": json.dumps(texts)},
+            ],
+            temperature=0.2,
+            caller="translate",
+            budget=TRANSLATE_BUDGET,
+            validate=_is_translation_of(texts),
+            priority=priority,
+        )
+        translated = json.loads(response.content)
         logger.info(f"[TRANSLATE] Success! Translated {len(translated)} fields to {target}")
         return translated, True
+    except LLMError as e:
+        logger.error(f"[TRANSLATE] LLM failed: {e}")
+        return texts, False
     except Exception as e:
         logger.error(f"[TRANSLATE] Exception: {e}")
         return texts, False
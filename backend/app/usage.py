@@ -0,0 +1,265 @@
+"""
+上游 token 用量记账与配额。
+
+上游按 token 计费。每次 chat-completions 调用成功后（LLMRouter._attempt）按响应里的
+usage 块记下 prompt/completion token 数和耗时，归到当前请求的 UsageScope 上：
+- 归属由 main.authenticate 按登录用户（user:<id>）或客户端 IP（ip:<addr>，代理后面
+  按 FORWARDED_ALLOW_IPS 从 X-Forwarded-For 还原）设置，占卜路由再补上 session_id /
+  method / lang；没有请求上下文的后台任务和手动模式的预取记为 system
+- 用量先在进程内按 (日期, 归属, 会话, 方法, 语言, 调用方) 聚合，由 usage_flush_loop
+  每 USAGE_FLUSH_INTERVAL 秒批量累加到 llm_usage 表，关闭时再写一次
+- 配额是进程内的令牌桶：每个用户/IP 每小时 USAGE_USER_TOKENS_PER_HOUR、全局每分钟
+  USAGE_GLOBAL_TOKENS_PER_MINUTE（0 表示不限制）。LLMRouter.complete 调用前按估算的
+  prompt 加 USAGE_RESERVE_COMPLETION_TOKENS 预留额度，不足时抛出 LLMQuotaExceededError，
+  调用方照常降级到语义缓存、预生成或模板解读；调用结束后退回预留，改按实际用量扣减
+- 令牌桶和待写入的聚合只在本进程内：多 worker 时每个 worker 各自限额
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any
+
+from .config import settings
+from .metrics import LLM_USAGE_TOKENS
+from .prompts import estimate_tokens
+from .storage import get_storage
+from .storage.base import USAGE_COUNTERS, USAGE_DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SUBJECT = "system"
+
+
+# ===== 归属 =====
+
+
+@dataclass(frozen=True)
+class UsageScope:
+    subject: str = SYSTEM_SUBJECT
+    session_id: str = ""
+    method: str = ""
+    lang: str = ""
+
+
+_scope: ContextVar[UsageScope] = ContextVar("usage_scope", default=UsageScope())
+
+
+def current_scope() -> UsageScope:
+    return _scope.get()
+
+
+def start_usage_scope(user_id: int | None, client_ip: str | None) -> None:
+    """每个请求开始时调用；之后创建的任务（对冲、请求合并）都继承这个归属。"""
+    subject = f"user:{user_id}" if user_id is not None else f"ip:{client_ip or 'unknown'}"
+    _scope.set(UsageScope(subject=subject))
+
+
+def bind_usage(**fields: str) -> None:
+    """在当前归属上补充 session_id / method / lang。"""
+    _scope.set(replace(_scope.get(), **fields))
+
+
+# ===== 配额 =====
+
+
+class QuotaExceededError(RuntimeError):
+    def __init__(self, scope: str, subject: str) -> None:
+        super().__init__(f"Token budget exhausted ({scope}: {subject})")
+        self.scope = scope
+
+
+class TokenBucket:
+    """容量 capacity、每秒补充 rate 个 token；实际用量超出预留时余额可以为负（欠账）。"""
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def level(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def charge(self, amount: float) -> None:
+        """扣减 amount 个 token（为负时退回）。"""
+        self.tokens = min(self.capacity, self.level() - amount)
+
+
+@dataclass
+class Reservation:
+    amount: int
+    buckets: list[TokenBucket] = field(default_factory=list)
+
+
+# ===== 记账 =====
+
+
+def _count(value: Any) -> int | None:
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    return max(0, int(value))
+
+
+class UsageLedger:
+    def __init__(
+        self,
+        user_tokens_per_hour: int = 0,
+        global_tokens_per_minute: int = 0,
+        reserve_completion_tokens: int = 0,
+        max_subjects: int = 10000,
+    ) -> None:
+        self.user_tokens_per_hour = user_tokens_per_hour
+        self.reserve_completion_tokens = reserve_completion_tokens
+        self.max_subjects = max_subjects
+        self._global = (
+            TokenBucket(global_tokens_per_minute, global_tokens_per_minute / 60)
+            if global_tokens_per_minute > 0
+            else None
+        )
+        self._subjects: OrderedDict[str, TokenBucket] = OrderedDict()
+        # 维度元组 -> [calls, prompt_tokens, completion_tokens, latency_ms]
+        self._pending: dict[tuple[str, ...], list[int]] = {}
+
+    @classmethod
+    def from_settings(cls) -> "UsageLedger":
+        return cls(
+            user_tokens_per_hour=settings.usage_user_tokens_per_hour,
+            global_tokens_per_minute=settings.usage_global_tokens_per_minute,
+            reserve_completion_tokens=settings.usage_reserve_completion_tokens,
+            max_subjects=settings.usage_max_subjects,
+        )
+
+    def _subject_bucket(self, subject: str) -> TokenBucket | None:
+        if self.user_tokens_per_hour <= 0 or subject == SYSTEM_SUBJECT:
+            return None
+        bucket = self._subjects.get(subject)
+        if bucket is not None:
+            self._subjects.move_to_end(subject)
+            return bucket
+        bucket = TokenBucket(self.user_tokens_per_hour, self.user_tokens_per_hour / 3600)
+        self._subjects[subject] = bucket
+        # 最久未用的桶通常已经补满，淘汰它等于重置成满额
+        if len(self._subjects) > self.max_subjects:
+            self._subjects.popitem(last=False)
+        return bucket
+
+    def _buckets(self, subject: str) -> list[tuple[str, TokenBucket]]:
+        buckets = []
+        bucket = self._subject_bucket(subject)
+        if bucket is not None:
+            buckets.append(("subject", bucket))
+        if self._global is not None:
+            buckets.append(("global", self._global))
+        return buckets
+
+    def reserve(self, messages: list[dict[str, str]]) -> Reservation:
+        """调用前按估算用量预留额度；任何一级余额不足时抛出 QuotaExceededError。"""
+        subject = _scope.get().subject
+        buckets = self._buckets(subject)
+        if not buckets:
+            return Reservation(amount=0)
+        amount = self.reserve_completion_tokens + sum(
+            estimate_tokens(message.get("content", "")) for message in messages
+        )
+        for scope, bucket in buckets:
+            if bucket.level() < amount:
+                raise QuotaExceededError(scope, subject)
+        for _, bucket in buckets:
+            bucket.charge(amount)
+        return Reservation(amount=amount, buckets=[bucket for _, bucket in buckets])
+
+    def release(self, reservation: Reservation) -> None:
+        for bucket in reservation.buckets:
+            bucket.charge(-reservation.amount)
+
+    def record(
+        self,
+        caller: str,
+        seconds: float,
+        data: dict | None,
+        messages: list[dict[str, str]],
+        content: str,
+    ) -> None:
+        """记下一次成功调用的用量；上游没有返回 usage 时按估算值记账。"""
+        usage = (data or {}).get("usage") or {}
+        prompt = _count(usage.get("prompt_tokens"))
+        if prompt is None:
+            prompt = sum(estimate_tokens(message.get("content", "")) for message in messages)
+        completion = _count(usage.get("completion_tokens"))
+        if completion is None:
+            completion = estimate_tokens(content)
+
+        scope = _scope.get()
+        for _, bucket in self._buckets(scope.subject):
+            bucket.charge(prompt + completion)
+        LLM_USAGE_TOKENS.labels(method=scope.method, lang=scope.lang, kind="prompt").inc(prompt)
+        LLM_USAGE_TOKENS.labels(
+            method=scope.method, lang=scope.lang, kind="completion"
+        ).inc(completion)
+
+        day = datetime.utcnow().date().isoformat()
+        key = (day, scope.subject, scope.session_id, scope.method, scope.lang, caller)
+        totals = self._pending.setdefault(key, [0, 0, 0, 0])
+        for i, value in enumerate((1, prompt, completion, round(seconds * 1000))):
+            totals[i] += value
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _merge(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            totals = self._pending.setdefault(
+                tuple(row[column] for column in USAGE_DIMENSIONS), [0, 0, 0, 0]
+            )
+            for i, column in enumerate(USAGE_COUNTERS):
+                totals[i] += row[column]
+
+    async def flush(self) -> int:
+        """把聚合好的用量写入数据库，返回写入的行数；失败时留到下一次再写。"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        rows = [
+            {**dict(zip(USAGE_DIMENSIONS, key)), **dict(zip(USAGE_COUNTERS, totals))}
+            for key, totals in pending.items()
+        ]
+        try:
+            await get_storage().add_llm_usage(rows)
+        except asyncio.CancelledError:
+            self._merge(rows)
+            raise
+        except Exception as e:
+            logger.error(f"[USAGE] Failed to flush {len(rows)} rows: {e}")
+            self._merge(rows)
+            return 0
+        return len(rows)
+
+
+_ledger: UsageLedger | None = None
+
+
+def get_ledger() -> UsageLedger:
+    global _ledger
+    if _ledger is None:
+        _ledger = UsageLedger.from_settings()
+    return _ledger
+
+
+def set_ledger(ledger: UsageLedger | None) -> None:
+    global _ledger
+    _ledger = ledger
+
+
+async def usage_flush_loop() -> None:
+    """应用生命周期内定时写入用量；取消时（关闭）由 lifespan 再做最后一次 flush。"""
+    while True:
+        await asyncio.sleep(settings.usage_flush_interval)
+        await get_ledger().flush()
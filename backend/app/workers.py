@@ -0,0 +1,35 @@
+"""
+多 worker 部署（gunicorn 管理 uvicorn worker）的进程级钩子，由 backend/gunicorn.conf.py 调用。
+
+- preload_static_tables()：master 在 fork 之前加载只读的静态表（方式分类器权重、
+  卦象/牌面叶子字典），然后 gc.freeze() 把它们移出 GC 跟踪，避免垃圾回收扫描时写脏共享页；
+  worker 通过写时复制共享这些内存
+- reset_after_fork()：worker 启动时丢弃可能从 master 继承来的连接类单例；
+  连接池、Redis 连接、LLM HTTP 客户端都在各 worker 的 lifespan 里重新建立
+"""
+
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def preload_static_tables() -> None:
+    from .method_classifier import get_classifier
+    from .seed_results import warm_leaf_cache
+
+    get_classifier()
+    warm_leaf_cache()
+    gc.collect()
+    gc.freeze()
+    logger.info(f"[WORKERS] Preloaded static tables ({gc.get_freeze_count()} objects frozen)")
+
+
+def reset_after_fork() -> None:
+    from .llm import set_router
+    from .redis_client import reset_redis
+    from .storage import set_storage
+
+    reset_redis()
+    set_router(None)
+    set_storage(None)
@@ -0,0 +1 @@
+"""性能测试工具：端到端压测（loadtest）及其依赖的本地上游桩服务（stubs）。"""
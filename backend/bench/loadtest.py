@@ -0,0 +1,494 @@
+"""
+端到端压测：启动后端 + 本地上游桩服务，用异步虚拟用户按比例混合跑真实的请求流程，
+输出 RPS、p50/p95/p99 和错误分布（JSON），可以按提交记录下来对比。
+
+流程：
+- ai_generate：创建 AI 会话 -> /generate -> 回放
+- ai_interpret：创建 AI 会话 -> /interpret（按 seed 生成结果）-> 回放
+- manual：创建手动会话 -> 逐步上报（六爻 6 步 / 塔罗 3 步）-> /interpret
+- aztro：/api/aztro（随机星座、日期、语言）
+- auth：注册 -> /me -> 登出 -> 登录 -> 登出
+
+    cd backend
+    python -m bench.loadtest --duration 30 --concurrency 32 --llm-latency 1.5 --out results.json
+    python -m bench.loadtest --mix ai_generate=3,aztro=1 --llm-error-rate 0.1
+    python -m bench.loadtest --target http://127.0.0.1:8000   # 压已经在运行的服务
+
+不指定 --target 时，桩服务和后端（uvicorn app.main:app）各自在子进程中启动，
+使用临时目录里的 SQLite；后端日志写在临时目录的 app.log。
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+SIGNS = (
+    "aries taurus gemini cancer leo virgo libra scorpio sagittarius capricorn aquarius pisces"
+).split()
+
+QUESTIONS = {
+    "zh": ["我该换工作吗？", "这段感情会有结果吗？", "下个月适合搬家吗？", "和朋友的矛盾该怎么处理？"],
+    "ja": ["転職するべきですか？", "この恋はうまくいきますか？", "来月引っ越すのはいいですか？"],
+    "en": [
+        "Should I take the new job?",
+        "Will this relationship last?",
+        "Is now a good time to move?",
+    ],
+}
+
+MIXES: dict[str, dict[str, float]] = {
+    "mixed": {"ai_generate": 4, "ai_interpret": 2, "manual": 2, "aztro": 3, "auth": 1},
+    "divination": {"ai_generate": 2, "ai_interpret": 1, "manual": 1},
+    "aztro": {"aztro": 1},
+    "auth": {"auth": 1},
+}
+
+YAO_TYPES = {6: "old_yin", 7: "young_yang", 8: "young_yin", 9: "old_yang"}
+TAROT_POSITIONS = ("past", "present", "future")
+
+
+# ===== 记录 =====
+
+
+class FlowAborted(Exception):
+    """流程中某一步失败（已经记录），放弃本轮剩余步骤。"""
+
+
+@dataclass
+class Recorder:
+    # 预热期内的样本不计入结果
+    record_after: float = 0.0
+    samples: dict[str, list[tuple[float, str | None]]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+
+    def add(self, name: str, seconds: float, error: str | None) -> None:
+        if time.monotonic() >= self.record_after:
+            self.samples[name].append((seconds, error))
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """最近秩百分位数。"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def _stats(samples: list[tuple[float, str | None]], seconds: float) -> dict[str, Any]:
+    ok = sorted(elapsed * 1000 for elapsed, error in samples if error is None)
+    errors = Counter(error for _, error in samples if error is not None)
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / seconds, 2) if seconds else 0.0,
+        "errors": dict(errors.most_common()),
+        "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ok, 50), 2),
+            "p95": round(percentile(ok, 95), 2),
+            "p99": round(percentile(ok, 99), 2),
+            "mean": round(sum(ok) / len(ok), 2) if ok else 0.0,
+            "max": round(ok[-1], 2) if ok else 0.0,
+        },
+    }
+
+
+def summarize(recorder: Recorder, seconds: float) -> dict[str, Any]:
+    endpoints = {k: v for k, v in recorder.samples.items() if not k.startswith("flow:")}
+    flows = {k[5:]: v for k, v in recorder.samples.items() if k.startswith("flow:")}
+    return {
+        "total": _stats([s for samples in endpoints.values() for s in samples], seconds),
+        "endpoints": {
+            name: _stats(samples, seconds) for name, samples in sorted(endpoints.items())
+        },
+        "flows": {name: _stats(samples, seconds) for name, samples in sorted(flows.items())},
+    }
+
+
+# ===== 请求流程 =====
+
+
+async def _call(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    name: str,
+    method: str,
+    path: str,
+    **kwargs: Any,
+) -> Any:
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+    except httpx.HTTPError as e:
+        recorder.add(name, time.perf_counter() - start, type(e).__name__)
+        raise FlowAborted from e
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 400:
+        recorder.add(name, elapsed, f"http_{response.status_code}")
+        raise FlowAborted
+    recorder.add(name, elapsed, None)
+    return response.json()
+
+
+def _question(rng: random.Random) -> tuple[str, str]:
+    lang = rng.choice(sorted(QUESTIONS))
+    return rng.choice(QUESTIONS[lang]), lang
+
+
+async def _create_session(
+    client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, mode: str
+) -> dict[str, Any]:
+    question, lang = _question(rng)
+    payload = {
+        "question": question,
+        "mode": mode,
+        "method": rng.choice(("liuyao", "tarot")),
+        "lang": lang,
+    }
+    session = await _call(
+        client, recorder, "POST /api/v2/divination/session", "POST",
+        "/api/v2/divination/session", json=payload,
+    )
+    return {**session, "method": payload["method"]}
+
+
+async def _replay(client: httpx.AsyncClient, recorder: Recorder, session_id: str) -> None:
+    await _call(
+        client, recorder, "GET /api/v2/divination/{session_id}", "GET",
+        f"/api/v2/divination/{session_id}",
+    )
+
+
+async def _interpret(client: httpx.AsyncClient, recorder: Recorder, session_id: str) -> None:
+    await _call(
+        client, recorder, "POST /api/v2/divination/interpret", "POST",
+        "/api/v2/divination/interpret", json={"session_id": session_id},
+    )
+
+
+async def flow_ai_generate(
+    client: httpx.AsyncClient, recorder: Recorder, rng: random.Random
+) -> None:
+    session = await _create_session(client, recorder, rng, "ai")
+    await _call(
+        client, recorder, "POST /api/v2/divination/generate", "POST",
+        "/api/v2/divination/generate", json={"session_id": session["session_id"]},
+    )
+    await _replay(client, recorder, session["session_id"])
+
+
+async def flow_ai_interpret(
+    client: httpx.AsyncClient, recorder: Recorder, rng: random.Random
+) -> None:
+    session = await _create_session(client, recorder, rng, "ai")
+    await _interpret(client, recorder, session["session_id"])
+    await _replay(client, recorder, session["session_id"])
+
+
+def _manual_steps(method: str, rng: random.Random) -> list[dict[str, Any]]:
+    if method == "liuyao":
+        steps = []
+        for _ in range(6):
+            coins = [rng.choice((2, 3)) for _ in range(3)]
+            total = sum(coins)
+            data = {
+                "coins": coins,
+                "sum": total,
+                "yao_type": YAO_TYPES[total],
+                "is_changing": total in (6, 9),
+            }
+            steps.append({"action": "coin_toss", "data": data})
+        return steps
+    cards = rng.sample(range(22), 3)
+    return [
+        {
+            "action": "card_draw",
+            "data": {"card_id": card, "position": position, "is_upright": rng.random() > 0.5},
+        }
+        for card, position in zip(cards, TAROT_POSITIONS)
+    ]
+
+
+async def flow_manual(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random) -> None:
+    session = await _create_session(client, recorder, rng, "manual")
+    for number, step in enumerate(_manual_steps(session["method"], rng), start=1):
+        await _call(
+            client, recorder, "POST /api/v2/divination/manual/step", "POST",
+            "/api/v2/divination/manual/step",
+            json={"session_id": session["session_id"], "step_number": number, **step},
+        )
+    await _interpret(client, recorder, session["session_id"])
+
+
+async def flow_aztro(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random) -> None:
+    payload = {
+        "sign": rng.choice(SIGNS),
+        "day": rng.choice(("today", "today", "tomorrow", "yesterday")),
+        "lang": rng.choice(("en", "zh", "ja")),
+    }
+    await _call(client, recorder, "POST /api/aztro", "POST", "/api/aztro", json=payload)
+
+
+async def flow_auth(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random) -> None:
+    credentials = {"email": f"lt-{uuid.uuid4().hex[:12]}@example.com", "password": "loadtest-pw"}
+    await _call(
+        client, recorder, "POST /api/auth/register", "POST", "/api/auth/register",
+        json={**credentials, "birthDate": None},
+    )
+    me = await _call(client, recorder, "GET /api/auth/me", "GET", "/api/auth/me")
+    if not me.get("user"):
+        recorder.add("GET /api/auth/me", 0.0, "not_logged_in")
+        raise FlowAborted
+    await _call(client, recorder, "POST /api/auth/logout", "POST", "/api/auth/logout")
+    await _call(
+        client, recorder, "POST /api/auth/login", "POST", "/api/auth/login", json=credentials
+    )
+    await _call(client, recorder, "POST /api/auth/logout", "POST", "/api/auth/logout")
+
+
+Flow = Callable[[httpx.AsyncClient, Recorder, random.Random], Awaitable[None]]
+
+FLOWS: dict[str, Flow] = {
+    "ai_generate": flow_ai_generate,
+    "ai_interpret": flow_ai_interpret,
+    "manual": flow_manual,
+    "aztro": flow_aztro,
+    "auth": flow_auth,
+}
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """预设名（mixed/divination/aztro/auth）或 "ai_generate=3,aztro=1"。"""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in FLOWS:
+            raise argparse.ArgumentTypeError(f"Unknown flow: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# ===== 负载生成 =====
+
+
+async def run_load(
+    base_url: str,
+    mix: dict[str, float],
+    *,
+    duration: float,
+    concurrency: int,
+    warmup: float = 0.0,
+    think_time: float = 0.0,
+    timeout: float = 60.0,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """闭环负载：concurrency 个虚拟用户各自独立的连接和 Cookie，循环执行按权重抽取的流程。"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    start = time.monotonic()
+    recorder = Recorder(record_after=start + warmup)
+    deadline = start + warmup + duration
+
+    async def virtual_user(index: int) -> None:
+        rng = random.Random(seed * 100003 + index)
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                flow_start = time.perf_counter()
+                try:
+                    await FLOWS[name](client, recorder, rng)
+                    recorder.add(f"flow:{name}", time.perf_counter() - flow_start, None)
+                except FlowAborted:
+                    recorder.add(f"flow:{name}", time.perf_counter() - flow_start, "aborted")
+                if think_time:
+                    await asyncio.sleep(rng.expovariate(1 / think_time))
+
+    await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    measured = time.monotonic() - start - warmup
+    return summarize(recorder, measured)
+
+
+# ===== 本地环境 =====
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_ready(url: str, process: subprocess.Popen, log: Path | None) -> None:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            detail = log.read_text(errors="replace")[-2000:] if log and log.exists() else ""
+            raise RuntimeError(f"{url} exited with code {process.returncode}\n{detail}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+@contextmanager
+def local_stack(stub_args: list[str], app_env: dict[str, str]) -> Iterator[str]:
+    """在子进程中启动桩服务和后端，返回后端地址。"""
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    stub_port, app_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    env = {
+        **os.environ,
+        "AI_BUILDER_API_URL": f"{stub_url}/v1/chat/completions",
+        "AI_BUILDER_TOKEN": "loadtest",
+        "HOROSCOPE_API_URL": f"{stub_url}/api/horoscope",
+        "DATABASE_URL": f"sqlite:///{workdir / 'app.db'}",
+        "MAINTENANCE_ENABLED": "false",
+        **app_env,
+    }
+    log = workdir / "app.log"
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stubs", "--port", str(stub_port), *stub_args],
+        cwd=BACKEND_DIR,
+    )
+    app = None
+    try:
+        _wait_until_ready(f"{stub_url}/openapi.json", stub, None)
+        with open(log, "w") as log_file:
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                 "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            )
+        base_url = f"http://127.0.0.1:{app_port}"
+        _wait_until_ready(f"{base_url}/health", app, log)
+        print(f"[LOADTEST] Backend at {base_url}, stubs at {stub_url}, logs in {log}")
+        yield base_url
+    finally:
+        if app is not None:
+            _stop(app)
+        _stop(stub)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test with local upstream stubs")
+    parser.add_argument("--target", help="Load an already running backend instead of starting one")
+    parser.add_argument("--mix", type=parse_mix, default="mixed")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=float, default=0, help="Seconds excluded from results")
+    parser.add_argument("--think-time", type=float, default=0, help="Mean pause between flows")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0,
+                        help="Delay between streamed response chunks")
+    parser.add_argument("--horoscope-latency", type=float, default=0.2)
+    parser.add_argument("--horoscope-error-rate", type=float, default=0.0)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the backend process")
+    parser.add_argument("--out", type=Path, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    upstream = {
+        "llm_latency": args.llm_latency,
+        "llm_error_rate": args.llm_error_rate,
+        "llm_chunk_delay": args.llm_chunk_delay,
+        "horoscope_latency": args.horoscope_latency,
+        "horoscope_error_rate": args.horoscope_error_rate,
+    }
+    stub_args = [f"--{key.replace('_', '-')}={value}" for key, value in upstream.items()]
+    app_env = dict(item.split("=", 1) for item in args.app_env)
+
+    def load(base_url: str) -> dict[str, Any]:
+        return asyncio.run(
+            run_load(
+                base_url,
+                args.mix,
+                duration=args.duration,
+                concurrency=args.concurrency,
+                warmup=args.warmup,
+                think_time=args.think_time,
+                timeout=args.timeout,
+                seed=args.seed,
+            )
+        )
+
+    if args.target:
+        results = load(args.target.rstrip("/"))
+    else:
+        with local_stack(stub_args, app_env) as base_url:
+            results = load(base_url)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "target": args.target or "local",
+            "mix": args.mix,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "think_time": args.think_time,
+            "upstream": None if args.target else upstream,
+            "app_env": app_env,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        **results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
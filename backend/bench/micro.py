@@ -0,0 +1,498 @@
+"""
+热点函数的微基准：起卦/抽牌引擎、提示词构建、LLM 输出解析，以及 db.py 的每个读写函数
+（文件型 SQLite，经过线程池，与线上路径一致）。
+
+每个基准先自动确定每轮的调用次数（单轮不少于 --min-time 秒），再跑 --rounds 轮。
+与 bench/baseline.json 比较的是各轮中最快的一轮（受调度、频率波动的影响最小），
+慢于基线超过 --threshold（默认 25%）的基准会重跑一次确认，仍然超出时以非零状态退出，
+可以直接放进 CI。
+
+    cd backend
+    python -m bench.micro                      # 与基线比较
+    python -m bench.micro -k liuyao -k db.     # 只跑名字包含这些子串的基准
+    python -m bench.micro --save               # 重新记录基线（换机器、有意的性能变化后）
+
+基线与机器相关，应在同一台（或同规格的）机器上记录和比较。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# 基准工厂：返回被测的无参调用；db 基准的工厂是协程，返回无参协程函数
+SyncOp = Callable[[], object]
+AsyncOp = Callable[[], Awaitable[object]]
+
+BENCHMARKS: dict[str, Callable[[], Any]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+    def register(factory: Callable[[], Any]) -> Callable[[], Any]:
+        BENCHMARKS[name] = factory
+        return factory
+
+    return register
+
+
+# ===== 样例数据 =====
+
+QUESTION = "我最近在考虑换工作，新公司的机会看起来不错，但我担心稳定性，应该跳槽吗？"
+
+INTERPRETATION_JSON = json.dumps(
+    {
+        "summary": "时机尚未成熟，宜先稳住再图变",
+        "advice": "先把手头的项目收尾，同时和新公司深入沟通岗位细节，三个月后再做决定。",
+        "timing": "农历下月初前后更为有利",
+        "confidence": "medium",
+        "reasoning_bullets": [
+            "本卦为需，提示等待时机",
+            "九五爻动，代表机会真实存在",
+            "变卦为泰，后续发展趋于通达",
+        ],
+        "follow_up_questions": ["新岗位的成长空间如何？", "现在的团队是否还有上升机会？"],
+        "ritual_ending": "愿你心中更加清晰，步步稳健。",
+    },
+    ensure_ascii=False,
+)
+
+# 真实模型输出的几种常见形态
+LLM_OUTPUTS = {
+    "clean": INTERPRETATION_JSON,
+    "fenced": f"```json\n{INTERPRETATION_JSON}\n```",
+    "prose": f"好的，以下是根据卦象给出的解读：\n\n{INTERPRETATION_JSON}\n\n希望对你有帮助。",
+    "invalid": "抱歉，我无法给出这个问题的解读。" * 8,
+    # 超出 max_tokens 被截断在最后一个字段中间
+    "truncated": INTERPRETATION_JSON[: INTERPRETATION_JSON.rindex('"ritual_ending"') + 20],
+}
+
+
+def _sample_results() -> tuple[dict[str, Any], dict[str, Any]]:
+    from app.liuyao import ai_generate_liuyao
+    from app.tarot_v2 import ai_generate_tarot
+
+    # 选一个有动爻的卦，提示词里会包含变卦部分
+    for i in itertools.count():
+        liuyao = ai_generate_liuyao(f"bench-{i}").model_dump()
+        if liuyao["changing_lines"]:
+            break
+    return liuyao, ai_generate_tarot("bench").model_dump()
+
+
+# ===== 引擎 =====
+
+
+@benchmark("engine.ai_generate_liuyao")
+def _ai_generate_liuyao() -> SyncOp:
+    from app.liuyao import ai_generate_liuyao
+
+    seeds = itertools.cycle([f"seed-{i}" for i in range(1000)])
+    return lambda: ai_generate_liuyao(next(seeds))
+
+
+@benchmark("engine.generate_liuyao_result")
+def _generate_liuyao_result() -> SyncOp:
+    from app.liuyao import calculate_toss, generate_liuyao_result
+
+    tosses = [calculate_toss(coins) for coins in [(2, 3, 3), (3, 3, 3), (2, 2, 3)] * 2]
+    return lambda: generate_liuyao_result(tosses)
+
+
+@benchmark("engine.ai_generate_tarot")
+def _ai_generate_tarot() -> SyncOp:
+    from app.tarot_v2 import ai_generate_tarot
+
+    seeds = itertools.cycle([f"seed-{i}" for i in range(1000)])
+    return lambda: ai_generate_tarot(next(seeds))
+
+
+@benchmark("engine.create_manual_draw")
+def _create_manual_draw() -> SyncOp:
+    from app.tarot_v2 import create_manual_draw
+
+    draws = itertools.cycle([(card, card % 3, card % 2 == 0) for card in range(22)])
+    return lambda: create_manual_draw(*next(draws))
+
+
+@benchmark("engine.generate_horoscope")
+def _generate_horoscope() -> SyncOp:
+    from app.horoscope import allowed_days, allowed_signs, generate_horoscope
+
+    pairs = itertools.cycle(list(itertools.product(sorted(allowed_signs), sorted(allowed_days))))
+    return lambda: generate_horoscope(*next(pairs))
+
+
+# ===== 提示词与解析 =====
+
+
+@benchmark("prompt.build_liuyao")
+def _build_liuyao_prompt() -> SyncOp:
+    from app.interpretation import _build_liuyao_prompt
+
+    liuyao, _ = _sample_results()
+    return lambda: _build_liuyao_prompt(QUESTION, "ai", liuyao, "zh")
+
+
+@benchmark("prompt.build_tarot")
+def _build_tarot_prompt() -> SyncOp:
+    from app.interpretation import _build_tarot_prompt
+
+    _, tarot = _sample_results()
+    return lambda: _build_tarot_prompt(QUESTION, "ai", tarot, "zh")
+
+
+def _parse_benchmark(kind: str) -> Callable[[], SyncOp]:
+    def factory() -> SyncOp:
+        from app.interpretation import _safe_parse_json
+
+        content = LLM_OUTPUTS[kind]
+        return lambda: _safe_parse_json(content)
+
+    return factory
+
+
+for _kind in LLM_OUTPUTS:
+    benchmark(f"parse.safe_parse_json.{_kind}")(_parse_benchmark(_kind))
+
+
+# ===== 持久化（db.py） =====
+
+
+async def _db_fixture(sessions: int = 200) -> tuple[int, list[str]]:
+    """建一个用户和若干已完成的会话/记录，返回 (user_id, session_ids)。"""
+    from app import auth, db
+
+    user = await auth.create_user(f"bench-{time.time_ns()}@example.com", "hash", None)
+    liuyao, tarot = _sample_results()
+    ids = []
+    for i in range(sessions):
+        session_id = f"bench-{time.time_ns()}-{i}"
+        await db.create_divination_session_v2(
+            session_id=session_id,
+            user_id=user["id"],
+            question=QUESTION,
+            mode="ai",
+            method="liuyao" if i % 2 else "tarot",
+            seed=session_id,
+        )
+        await db.update_divination_session_v2(
+            session_id,
+            status="completed",
+            result=liuyao if i % 2 else tarot,
+            interpretation=json.loads(INTERPRETATION_JSON),
+        )
+        await db.create_divination_record(
+            user_id=user["id"],
+            session_id=session_id,
+            question=QUESTION,
+            mode="ai",
+            method="liuyao" if i % 2 else "tarot",
+            raw_result=liuyao if i % 2 else tarot,
+            interpretation=json.loads(INTERPRETATION_JSON),
+        )
+        ids.append(session_id)
+    return user["id"], ids
+
+
+@benchmark("db.create_divination_session_v2")
+async def _db_create_session() -> AsyncOp:
+    from app import db
+
+    user_id, _ = await _db_fixture(0)
+    counter = itertools.count()
+
+    async def op() -> object:
+        return await db.create_divination_session_v2(
+            session_id=f"create-{next(counter)}",
+            user_id=user_id,
+            question=QUESTION,
+            mode="ai",
+            method="liuyao",
+            seed="seed",
+        )
+
+    return op
+
+
+@benchmark("db.get_divination_session_v2")
+async def _db_get_session() -> AsyncOp:
+    from app import db
+
+    _, ids = await _db_fixture()
+    cycle = itertools.cycle(ids)
+    return lambda: db.get_divination_session_v2(next(cycle))
+
+
+@benchmark("db.update_divination_session_v2")
+async def _db_update_session() -> AsyncOp:
+    from app import db
+
+    _, ids = await _db_fixture()
+    liuyao, _ = _sample_results()
+    cycle = itertools.cycle(ids)
+    return lambda: db.update_divination_session_v2(next(cycle), status="completed", result=liuyao)
+
+
+@benchmark("db.list_divination_sessions_v2")
+async def _db_list_sessions() -> AsyncOp:
+    from app import db
+
+    user_id, _ = await _db_fixture()
+    return lambda: db.list_divination_sessions_v2(user_id, limit=20)
+
+
+@benchmark("db.get_divination_sessions_by_user_v2")
+async def _db_sessions_by_user() -> AsyncOp:
+    from app import db
+
+    user_id, _ = await _db_fixture()
+    return lambda: db.get_divination_sessions_by_user_v2(user_id, limit=20)
+
+
+@benchmark("db.create_divination_record")
+async def _db_create_record() -> AsyncOp:
+    from app import db
+
+    user_id, _ = await _db_fixture(0)
+    liuyao, _ = _sample_results()
+    interpretation = json.loads(INTERPRETATION_JSON)
+
+    async def op() -> object:
+        return await db.create_divination_record(
+            user_id=user_id,
+            session_id=None,
+            question=QUESTION,
+            mode="ai",
+            method="liuyao",
+            raw_result=liuyao,
+            interpretation=interpretation,
+        )
+
+    return op
+
+
+@benchmark("db.get_divination_records_by_user")
+async def _db_records_by_user() -> AsyncOp:
+    from app import db
+
+    user_id, _ = await _db_fixture()
+    return lambda: db.get_divination_records_by_user(user_id, limit=20)
+
+
+# ===== 计时 =====
+
+
+@dataclass
+class Result:
+    name: str
+    median_ns: float
+    min_ns: float
+    stdev_ns: float
+    loops: int
+    rounds: int
+
+
+def _summarize(name: str, per_call: list[float], loops: int) -> Result:
+    return Result(
+        name=name,
+        median_ns=statistics.median(per_call) * 1e9,
+        min_ns=min(per_call) * 1e9,
+        stdev_ns=statistics.stdev(per_call) * 1e9 if len(per_call) > 1 else 0.0,
+        loops=loops,
+        rounds=len(per_call),
+    )
+
+
+def _measure_sync(name: str, op: SyncOp, rounds: int, min_time: float) -> Result:
+    def timed(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            op()
+        return time.perf_counter() - start
+
+    loops = 1
+    while (elapsed := timed(loops)) < min_time:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    return _summarize(name, [timed(loops) / loops for _ in range(rounds)], loops)
+
+
+async def _measure_async(name: str, op: AsyncOp, rounds: int, min_time: float) -> Result:
+    async def timed(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            await op()
+        return time.perf_counter() - start
+
+    loops = 1
+    while (elapsed := await timed(loops)) < min_time:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    return _summarize(name, [await timed(loops) / loops for _ in range(rounds)], loops)
+
+
+async def _run_db_benchmark(
+    name: str, factory: Callable[[], Awaitable[AsyncOp]], rounds: int, min_time: float
+) -> Result:
+    from app.storage import SQLiteStorage, close_storage, set_storage
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        storage = SQLiteStorage(Path(tmp) / "app.db")
+        set_storage(storage)
+        try:
+            await storage.init()
+            op = await factory()
+            return await _measure_async(name, op, rounds, min_time)
+        finally:
+            await close_storage()
+            set_storage(None)
+
+
+def run_benchmarks(
+    names: list[str] | None = None, *, rounds: int = 7, min_time: float = 0.05
+) -> list[Result]:
+    results = []
+    for name in names or sorted(BENCHMARKS):
+        factory = BENCHMARKS[name]
+        if asyncio.iscoroutinefunction(factory):
+            result = asyncio.run(_run_db_benchmark(name, factory, rounds, min_time))
+        else:
+            result = _measure_sync(name, factory(), rounds, min_time)
+        results.append(result)
+    return results
+
+
+# ===== 基线 =====
+
+
+def _machine() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict[str, Any]:
+    if not path.exists():
+        return {"meta": {}, "results": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(results: list[Result], path: Path = BASELINE_PATH) -> None:
+    baseline = load_baseline(path)
+    baseline["meta"] = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **_machine(),
+    }
+    # 只跑了部分基准时保留其余基准的旧基线
+    for result in results:
+        entry = asdict(result)
+        del entry["name"]
+        baseline["results"][result.name] = {k: round(v, 1) for k, v in entry.items()}
+    baseline["results"] = dict(sorted(baseline["results"].items()))
+    path.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+
+
+@dataclass
+class Comparison:
+    name: str
+    min_ns: float
+    baseline_ns: float | None
+    change: float | None
+    regressed: bool
+
+
+def compare(
+    results: list[Result], baseline: dict[str, Any], threshold: float
+) -> list[Comparison]:
+    comparisons = []
+    for result in results:
+        base = baseline.get("results", {}).get(result.name, {}).get("min_ns")
+        change = result.min_ns / base - 1 if base else None
+        comparisons.append(
+            Comparison(
+                result.name,
+                result.min_ns,
+                base,
+                change,
+                regressed=change is not None and change > threshold,
+            )
+        )
+    return comparisons
+
+
+def _format_ns(value: float | None) -> str:
+    if value is None:
+        return "-"
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} ms"
+    if value >= 1e3:
+        return f"{value / 1e3:.1f} µs"
+    return f"{value:.0f} ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot paths")
+    parser.add_argument("-k", dest="filters", action="append", help="Substring filter on names")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown (0.25=25%)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Record results as the new baseline")
+    parser.add_argument("--json", type=Path, help="Also write raw results to this file")
+    args = parser.parse_args()
+
+    names = sorted(
+        name for name in BENCHMARKS if not args.filters or any(f in name for f in args.filters)
+    )
+    results = run_benchmarks(names, rounds=args.rounds, min_time=args.min_time)
+    if args.json:
+        args.json.write_text(
+            json.dumps({"meta": _machine(), "results": [asdict(r) for r in results]}, indent=2),
+            encoding="utf-8",
+        )
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get("meta") and {k: baseline["meta"].get(k) for k in _machine()} != _machine():
+        print(f"[BENCH] Warning: baseline was recorded on {baseline['meta']}")
+    comparisons = compare(results, baseline, args.threshold)
+    suspects = [c.name for c in comparisons if c.regressed]
+    if suspects and not args.save:
+        # 疑似回退的基准重跑一次，取两次中较快的结果
+        rerun = run_benchmarks(suspects, rounds=args.rounds, min_time=args.min_time)
+        retry = {r.name: r for r in rerun}
+        results = [min(r, retry.get(r.name, r), key=lambda x: x.min_ns) for r in results]
+        comparisons = compare(results, baseline, args.threshold)
+    width = max(len(name) for name in names)
+    for c in comparisons:
+        change = f"{c.change:+.1%}" if c.change is not None else "new"
+        flag = "  REGRESSION" if c.regressed else ""
+        print(
+            f"{c.name:<{width}}  {_format_ns(c.min_ns):>10}  "
+            f"baseline {_format_ns(c.baseline_ns):>10}  {change:>7}{flag}"
+        )
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"[BENCH] Saved baseline for {len(results)} benchmarks to {args.baseline}")
+        return
+    regressed = [c.name for c in comparisons if c.regressed]
+    if regressed:
+        print(f"[BENCH] {len(regressed)} regression(s) beyond {args.threshold:.0%}: {regressed}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
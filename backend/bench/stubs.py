@@ -0,0 +1,196 @@
+"""
+本地上游桩服务：模拟 AI Builder chat-completions 和 ohmanda.com 星座接口。
+
+- chat-completions 按请求中的 model 名选择行为（延迟、错误率、输出内容），
+  便于在同一个服务上模拟“慢主模型 + 快备用模型”；请求带 stream=true 时按 SSE 分块返回，
+  设置 stream_chunk_delay 后非流式响应也会分块慢慢写出
+- 翻译请求原样回显 JSON 数组，保证 translate_texts 的校验能通过
+- 星座接口返回固定格式的 {"sign", "date", "horoscope"}
+
+单独启动（压测时由 bench.loadtest 自动拉起）：
+
+    python -m bench.stubs --port 9100 --llm-latency 1.5 --llm-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+VALID_INTERPRETATION = {
+    "summary": "保持耐心，顺势而为",
+    "advice": "先观察局势，再做小步尝试，避免一次投入过多。",
+    "timing": "未来两周较为合适",
+    "confidence": "medium",
+    "reasoning_bullets": ["本卦提示积累", "变卦指向转机", "动爻提醒谨慎"],
+    "follow_up_questions": ["你最担心的是什么？", "有哪些资源可以利用？"],
+    "ritual_ending": "愿你心中更加清晰。",
+}
+
+
+@dataclass
+class ModelBehaviour:
+    latency: float = 0.0
+    error_rate: float = 0.0
+    status_code: int = 500
+    content: str = field(default_factory=lambda: json.dumps(VALID_INTERPRETATION, ensure_ascii=False))
+    prompt_tokens: int = 320
+    completion_tokens: int = 180
+    echo_translations: bool = True
+    stream_chunks: int = 8
+    stream_chunk_delay: float = 0.0
+
+
+def _chunks(text: str, count: int) -> list[str]:
+    size = max(len(text) // max(count, 1), 1)
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class StubLLM:
+    def __init__(self) -> None:
+        self.behaviours: dict[str, ModelBehaviour] = {}
+        self.default = ModelBehaviour()
+        self.calls: Counter[str] = Counter()
+        self.base_url = ""
+        self.app = self._build_app()
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
+
+    def reset(self) -> None:
+        self.behaviours.clear()
+        self.default = ModelBehaviour()
+        self.calls.clear()
+
+    def _content(self, behaviour: ModelBehaviour, messages: list[dict]) -> str:
+        system = messages[0].get("content", "") if messages else ""
+        if behaviour.echo_translations and system.startswith("Translate"):
+            return messages[-1].get("content", "[]")
+        return behaviour.content
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            model = body.get("model", "")
+            self.calls[model] += 1
+            behaviour = self.behaviours.get(model, self.default)
+            if behaviour.latency:
+                await asyncio.sleep(behaviour.latency)
+            if behaviour.error_rate and random.random() < behaviour.error_rate:
+                return JSONResponse({"error": "stub failure"}, status_code=behaviour.status_code)
+            content = self._content(behaviour, body.get("messages", []))
+            usage = {
+                "prompt_tokens": behaviour.prompt_tokens,
+                "completion_tokens": behaviour.completion_tokens,
+                "total_tokens": behaviour.prompt_tokens + behaviour.completion_tokens,
+            }
+
+            if body.get("stream"):
+
+                async def events():
+                    for piece in _chunks(content, behaviour.stream_chunks):
+                        if behaviour.stream_chunk_delay:
+                            await asyncio.sleep(behaviour.stream_chunk_delay)
+                        delta = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+                        yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+                    yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+                    yield "data: [DONE]\n\n"
+
+                return StreamingResponse(events(), media_type="text/event-stream")
+
+            payload = {
+                "id": "stub",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }
+            if not behaviour.stream_chunk_delay:
+                return payload
+
+            async def trickle():
+                for piece in _chunks(json.dumps(payload), behaviour.stream_chunks):
+                    await asyncio.sleep(behaviour.stream_chunk_delay)
+                    yield piece
+
+            return StreamingResponse(trickle(), media_type="application/json")
+
+        return app
+
+
+@dataclass
+class HoroscopeBehaviour:
+    latency: float = 0.0
+    error_rate: float = 0.0
+    status_code: int = 503
+
+
+class StubHoroscope:
+    """ohmanda.com/api/horoscope/{sign} 的替身。"""
+
+    def __init__(self) -> None:
+        self.behaviour = HoroscopeBehaviour()
+        self.calls: Counter[str] = Counter()
+        self.app = FastAPI()
+
+        @self.app.get("/api/horoscope/{sign}")
+        async def horoscope(sign: str):
+            self.calls[sign] += 1
+            if self.behaviour.latency:
+                await asyncio.sleep(self.behaviour.latency)
+            if self.behaviour.error_rate and random.random() < self.behaviour.error_rate:
+                return JSONResponse(
+                    {"error": "stub failure"}, status_code=self.behaviour.status_code
+                )
+            return {
+                "sign": sign,
+                "date": date.today().isoformat(),
+                "horoscope": f"A steady day for {sign}. Small, patient steps pay off.",
+            }
+
+
+def build_app(llm: StubLLM, horoscope: StubHoroscope) -> FastAPI:
+    """两个桩挂在同一个服务上：/v1/chat/completions 和 /api/horoscope/{sign}。"""
+    app = FastAPI()
+    app.include_router(llm.app.router)
+    app.include_router(horoscope.app.router)
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run local LLM / horoscope stubs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0)
+    parser.add_argument("--horoscope-latency", type=float, default=0.0)
+    parser.add_argument("--horoscope-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    llm = StubLLM()
+    llm.default = ModelBehaviour(
+        latency=args.llm_latency,
+        error_rate=args.llm_error_rate,
+        stream_chunk_delay=args.llm_chunk_delay,
+    )
+    horoscope = StubHoroscope()
+    horoscope.behaviour = HoroscopeBehaviour(
+        latency=args.horoscope_latency, error_rate=args.horoscope_error_rate
+    )
+    uvicorn.run(build_app(llm, horoscope), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
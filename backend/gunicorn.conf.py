@@ -0,0 +1,60 @@
+"""
+多 worker 生产部署：gunicorn 管理多个 uvicorn worker。
+
+    WEB_CONCURRENCY=auto gunicorn -c gunicorn.conf.py app.main:app
+
+- WEB_CONCURRENCY：worker 数，auto（默认）为 CPU 核数
+- preload_app：master 先导入应用并加载静态表，fork 后各 worker 写时复制共享
+- 收到 SIGTERM 后 worker 的 /ready 先返回 503，SHUTDOWN_READY_DELAY 秒后停止接收新连接，
+  等待进行中的请求（包括 LLM 调用）完成，最长 GRACEFUL_TIMEOUT 秒（默认 LLM 延迟预算
+  + SHUTDOWN_READY_DELAY + 10 秒）
+- Prometheus 指标写入 PROMETHEUS_MULTIPROC_DIR（默认 /tmp/prometheus-multiproc），
+  启动时清空，worker 退出时标记为 dead
+"""
+
+import os
+import shutil
+
+workers_env = os.getenv("WEB_CONCURRENCY", "auto")
+workers = (os.cpu_count() or 1) if workers_env in ("", "auto") else int(workers_env)
+
+# 必须在导入 prometheus_client（即加载应用）之前设置
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+from app.config import settings  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = int(
+    os.getenv("GRACEFUL_TIMEOUT")
+    or settings.llm_latency_budget + settings.shutdown_ready_delay + 10
+)
+timeout = 60
+keepalive = 5
+accesslog = None
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    from app.workers import preload_static_tables
+
+    preload_static_tables()
+    server.log.info(f"[WORKERS] Serving with {workers} workers")
+
+
+def post_fork(server, worker):
+    from app.workers import reset_after_fork
+
+    reset_after_fork()
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
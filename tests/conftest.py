@@ -0,0 +1,135 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+class ServerThread:
+    """在后台线程里运行一个 ASGI 应用（本地桩服务）。"""
+
+    def __init__(self, app) -> None:
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> str:
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+@pytest.fixture(scope="session")
+def stub_llm():
+    from stub_llm import StubLLM
+
+    stub = StubLLM()
+    server = ServerThread(stub.app)
+    stub.base_url = server.start()
+    yield stub
+    server.stop()
+
+
+def arun(coro):
+    """在新的事件循环里运行协程，结束前关闭当前存储后端的连接池。"""
+    from app.storage import close_storage
+
+    async def run():
+        try:
+            return await coro
+        finally:
+            await close_storage()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    """TEST_DATABASE_URL 优先；否则本机有 initdb 时临时起一个 PostgreSQL，都没有则跳过。"""
+    pytest.importorskip("asyncpg")
+    url = os.getenv("TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+    if not shutil.which("initdb") or not shutil.which("pg_ctl") or os.geteuid() == 0:
+        pytest.skip("PostgreSQL is not available (set TEST_DATABASE_URL)")
+
+    data = tmp_path_factory.mktemp("pgdata")
+    subprocess.run(
+        ["initdb", "-D", str(data), "-U", "postgres", "-A", "trust"],
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [
+            "pg_ctl", "-D", str(data), "-w", "-l", str(data / "server.log"),
+            "-o", f"-k {data} -c listen_addresses=''",
+            "start",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    try:
+        yield f"postgresql://postgres@/postgres?host={data}"
+    finally:
+        subprocess.run(["pg_ctl", "-D", str(data), "-m", "fast", "stop"], capture_output=True)
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def storage(request, tmp_path):
+    """同一组测试分别在 SQLite 和 PostgreSQL 后端上运行。"""
+    from app.storage import SQLiteStorage, set_storage
+
+    if request.param == "sqlite":
+        backend = SQLiteStorage(tmp_path / "app.db")
+    else:
+        from app.storage.postgres import PostgresStorage
+
+        backend = PostgresStorage(request.getfixturevalue("postgres_url"))
+    set_storage(backend)
+
+    async def setup():
+        await backend.init()
+        if request.param == "postgres":
+            async with backend.acquire() as conn:
+                await conn.execute(
+                    "TRUNCATE users, sessions, divination_records, divination_sessions_v2, "
+                    "base_interpretations, llm_usage RESTART IDENTITY CASCADE"
+                )
+
+    arun(setup())
+    yield backend
+    set_storage(None)
+
+
+@pytest.fixture(autouse=True)
+def strict_event_loop(request):
+    """默认禁止在事件循环线程上做阻塞 IO；确实需要的测试标记 allow_blocking。"""
+    if request.node.get_closest_marker("allow_blocking"):
+        yield
+        return
+    from app.loop_monitor import forbid_blocking_io
+
+    with forbid_blocking_io() as violations:
+        yield
+    assert not violations, "blocking calls on the event loop:\n" + "\n".join(violations)
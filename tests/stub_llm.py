@@ -0,0 +1,5 @@
+"""测试用的 chat-completions 桩服务（实现与压测共用，见 backend/bench/stubs.py）。"""
+
+from bench.stubs import VALID_INTERPRETATION, ModelBehaviour, StubLLM
+
+__all__ = ["VALID_INTERPRETATION", "ModelBehaviour", "StubLLM"]
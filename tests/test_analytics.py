@@ -0,0 +1,113 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import arun
+
+from app import analytics, auth, db
+from app.interpretation import _create_fallback_interpretation
+from app.liuyao import ai_generate_liuyao
+from app.tarot_v2 import ai_generate_tarot
+
+
+def test_flatten_extracts_outcome_columns():
+    liuyao = ai_generate_liuyao("seed-1").model_dump()
+    flat = analytics.flatten_session(
+        {
+            "id": "a",
+            "mode": "ai",
+            "method": "liuyao",
+            "status": "completed",
+            "lang": "en",
+            "created_at": "2024-01-01T00:00:00",
+            "completed_at": "2024-01-01T00:00:02.500000",
+            "result": liuyao,
+            "interpretation": _create_fallback_interpretation(
+                "q", "liuyao", liuyao, "en"
+            ).model_dump(mode="json"),
+        }
+    )
+    assert flat["primary_hexagram_id"] == liuyao["primary_hexagram"]["id"]
+    assert flat["changing_mask"] == sum(1 << (p - 1) for p in liuyao["changing_lines"])
+    assert flat["duration_ms"] == 2500
+    assert flat["fallback"] is True
+    assert flat["confidence"] == "low"
+    assert flat["card_ids"] is None
+
+
+def _seed_sessions(count, start):
+    async def seed():
+        user = await auth.create_user("analytics@example.com", "hash", None)
+        for i in range(count):
+            method = "tarot" if i % 2 else "liuyao"
+            result = ai_generate_tarot(f"s{i}") if i % 2 else ai_generate_liuyao(f"s{i}")
+            await db.create_divination_session_v2(
+                session_id=f"s{i:02d}",
+                user_id=user["id"],
+                question=f"q{i}",
+                mode="ai",
+                method=method,
+                seed=f"s{i}",
+                created_at=(start + timedelta(minutes=i)).isoformat(),
+            )
+            await db.update_divination_session_v2(
+                f"s{i:02d}", status="completed", result=result.model_dump()
+            )
+
+    arun(seed())
+
+
+def test_incremental_export_and_restore(storage, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _seed_sessions(5, datetime(2024, 1, 1))
+    out = tmp_path / "analytics"
+
+    first = arun(analytics.export_sessions(out, batch_size=2))
+    assert first.rows == 5
+    table = pq.read_table(first.path)
+    assert table.num_rows == 5
+    assert table.column("card_ids").to_pylist()[1] is not None
+    assert pq.ParquetFile(first.path).num_row_groups == 3
+
+    # 水位线之后没有新会话时不生成文件
+    assert arun(analytics.export_sessions(out)).path is None
+
+    async def wipe():
+        await storage.delete_divination_sessions([f"s{i:02d}" for i in range(5)])
+
+    arun(wipe())
+    assert arun(analytics.import_sessions([first.path], batch_size=2)) == 5
+    restored = arun(db.get_divination_session_v2("s01"))
+    assert restored["result"]["type"] == "tarot"
+    assert restored["created_at"].startswith("2024-01-01T00:01")
+    # 重复导入会跳过已存在的会话
+    assert arun(analytics.import_sessions([first.path])) == 0
+
+
+def test_import_maintenance_archive(storage, tmp_path):
+    archive = tmp_path / "sessions.jsonl.gz"
+    with gzip.open(archive, "wt", encoding="utf-8") as f:
+        for i in range(3):
+            row = {
+                "id": f"old{i}",
+                "user_id": 999,
+                "question": "q",
+                "mode": "manual",
+                "method": "liuyao",
+                "seed": "s",
+                "lang": "zh",
+                "status": "completed",
+                "result": {"changing_lines": []},
+                "interpretation": None,
+                "manual_steps": [{"step": 1}],
+                "created_at": "2020-01-01T00:00:00",
+                "completed_at": None,
+            }
+            f.write(json.dumps(row) + "\n")
+
+    assert arun(analytics.import_sessions([archive], batch_size=2)) == 3
+    session = arun(db.get_divination_session_v2("old2"))
+    # 归档里的用户已经不存在时 user_id 置空
+    assert session["user_id"] is None
+    assert session["manual_steps"] == [{"step": 1}]
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from collections import Counter
+
+import httpx
+from conftest import arun
+
+from app import db, interpretation
+
+CALLS = Counter()
+
+
+async def slow_llm(system, user, **kwargs):
+    CALLS[kwargs.get("caller", "interpretation")] += 1
+    await asyncio.sleep(0.2)
+    return json.dumps(
+        {
+            "summary": f"call {sum(CALLS.values())}",
+            "advice": "a",
+            "timing": "t",
+            "confidence": "high",
+            "reasoning_bullets": ["r"],
+            "follow_up_questions": ["f"],
+            "ritual_ending": "e",
+        }
+    )
+
+
+async def _create(client, question):
+    response = await client.post(
+        "/api/v2/divination/session",
+        json={"question": question, "mode": "ai", "method": "tarot"},
+    )
+    return response.json()["session_id"]
+
+
+def test_concurrent_generate_and_interpret_share_one_llm_call(storage, monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(interpretation, "_call_llm", slow_llm)
+    CALLS.clear()
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            session_id = await _create(client, "dedup: should I move abroad this year?")
+            body = {"session_id": session_id}
+            return await asyncio.gather(
+                client.post("/api/v2/divination/generate", json=body),
+                client.post("/api/v2/divination/generate", json=body),
+                client.post("/api/v2/divination/interpret", json=body),
+            )
+
+    responses = arun(run())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert CALLS["interpretation"] == 1
+    assert len({r.json()["interpretation"]["summary"] for r in responses}) == 1
+
+
+def test_idempotency_key_replays_a_completed_generation(storage, monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(interpretation, "_call_llm", slow_llm)
+    CALLS.clear()
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            session_id = await _create(client, "dedup: will the new job work out?")
+            body = {"session_id": session_id}
+
+            async def generate(key=None):
+                headers = {"Idempotency-Key": key} if key else {}
+                return await client.post(
+                    "/api/v2/divination/generate", json=body, headers=headers
+                )
+
+            first, retry = await generate("k1"), await generate("k1")
+            return first, retry, await generate(), await generate("k2")
+
+    first, retry, keyless, other = arun(run())
+    assert first.status_code == retry.status_code == keyless.status_code == 200
+    assert retry.json() == first.json() == keyless.json()
+    assert other.status_code == 409
+    assert CALLS["interpretation"] == 1
+
+
+def test_new_idempotency_key_reclaims_a_failed_generation(storage, monkeypatch):
+    from app.main import create_app
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            session_id = await _create(client, "dedup: should I repaint the house?")
+            body = {"session_id": session_id}
+            await db.update_divination_session_v2(
+                session_id, status="failed", idempotency_key="k1"
+            )
+
+            async def generate(key):
+                return await client.post(
+                    "/api/v2/divination/generate", json=body, headers={"Idempotency-Key": key}
+                )
+
+            monkeypatch.setattr(interpretation, "_call_llm", slow_llm)
+            return await generate("k1"), await generate("k2"), await generate("k1")
+
+    CALLS.clear()
+    same, fresh, stale = arun(run())
+    # 同一个键重放那次失败；新的键重新生成，之后旧键不能再接管
+    assert same.status_code == 500
+    assert fresh.status_code == 200
+    assert stale.status_code == 409
+    assert CALLS["interpretation"] == 1
+
+
+def test_generate_waits_for_a_generation_running_on_another_worker(storage, monkeypatch):
+    from app.main import create_app
+    from app.routers import divination_v2
+    from app.seed_results import seed_result
+
+    monkeypatch.setattr(interpretation, "_call_llm", slow_llm)
+    monkeypatch.setattr(divination_v2, "WAIT_POLL_INTERVAL", 0.02)
+    CALLS.clear()
+
+    async def other_worker(session_id):
+        # 另一个 worker 已经抢到这个会话，稍后写入解读；本进程里没有进行中的调用
+        await asyncio.sleep(0.1)
+        session = await db.get_divination_session_v2(session_id)
+        await db.update_divination_session_v2(
+            session_id,
+            status="completed",
+            result=seed_result(session["method"], session["seed"]),
+            interpretation={
+                "summary": "other worker",
+                "advice": "a",
+                "timing": "t",
+                "confidence": "high",
+                "reasoning_bullets": ["r"],
+                "follow_up_questions": ["f"],
+                "ritual_ending": "e",
+            },
+        )
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            session_id = await _create(client, "dedup: should I adopt a cat?")
+            await db.update_divination_session_v2(
+                session_id, status="in_progress", idempotency_key="other"
+            )
+            response, _ = await asyncio.gather(
+                client.post("/api/v2/divination/generate", json={"session_id": session_id}),
+                other_worker(session_id),
+            )
+            return response
+
+    response = arun(run())
+    assert response.status_code == 200
+    assert response.json()["interpretation"]["summary"] == "other worker"
+    assert CALLS["interpretation"] == 0
+
+
+def test_compare_and_set_update(storage):
+    async def run():
+        await db.create_divination_session_v2(
+            session_id="cas", user_id=None, question="q", mode="ai", method="tarot", seed="s"
+        )
+        claimed = await db.update_divination_session_v2(
+            "cas", status="in_progress", expect_status="pending"
+        )
+        again = await db.update_divination_session_v2(
+            "cas", status="in_progress", expect_status="pending"
+        )
+        first = await db.update_divination_session_v2(
+            "cas", interpretation={"summary": "a"}, expect_no_interpretation=True
+        )
+        second = await db.update_divination_session_v2(
+            "cas", interpretation={"summary": "b"}, expect_no_interpretation=True
+        )
+        return claimed, again, first, second, await db.get_divination_session_v2("cas")
+
+    claimed, again, first, second, session = arun(run())
+    assert (claimed, again, first, second) == (True, False, True, False)
+    assert session["interpretation"] == {"summary": "a"}
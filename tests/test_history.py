@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from conftest import arun
+
+from app import auth, db
+
+
+async def _seed(count):
+    user = await auth.create_user("history@example.com", "hash", None)
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        # 每两条共用一个时间戳，验证游标对同一时刻的记录也不会重复或遗漏
+        await db.create_divination_session_v2(
+            session_id=f"s{i:02d}",
+            user_id=user["id"],
+            question=f"q{i}",
+            mode="ai",
+            method="tarot" if i % 2 else "liuyao",
+            seed="s",
+            created_at=(base + timedelta(days=i // 2)).isoformat(),
+        )
+        await db.update_divination_session_v2(f"s{i:02d}", status="completed", result={"i": i})
+    return user["id"]
+
+
+def test_cursor_pages_cover_every_record_once(storage):
+    async def run():
+        user_id = await _seed(9)
+        seen, before = [], None
+        while True:
+            records, before = await db.list_divination_sessions_v2(user_id, limit=4, before=before)
+            seen += [r["id"] for r in records]
+            if before is None:
+                return seen
+
+    assert arun(run()) == sorted((f"s{i:02d}" for i in range(9)), reverse=True)
+
+
+def test_filters_and_projection(storage):
+    async def run():
+        user_id = await _seed(6)
+        records, cursor = await db.list_divination_sessions_v2(
+            user_id, method="tarot", since="2024-01-02", full=False
+        )
+        assert [r["id"] for r in records] == ["s05", "s03"]
+        assert cursor is None
+        assert "result" not in records[0]
+
+        records, _ = await db.list_divination_sessions_v2(user_id, limit=1, full=True)
+        assert records[0]["result"] == {"i": 5}
+
+    arun(run())
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from collections import Counter
+
+import httpx
+from conftest import arun
+
+from app import interpretation, interpretation_pool
+from app.interpretation_pool import iter_outcomes, liuyao_outcome, outcome_key
+from app.liuyao import ai_generate_liuyao
+from app.seed_results import seed_result
+from app.tarot_v2 import ai_generate_tarot
+
+LLM_RESPONSE = (
+    '{"summary": "s", "advice": "a", "timing": "t", "confidence": "high",'
+    ' "reasoning_bullets": ["r"], "follow_up_questions": ["f"], "ritual_ending": "e"}'
+)
+
+
+def test_outcome_space_matches_generated_results():
+    liuyao = ai_generate_liuyao("seed").model_dump()
+    mask = sum(1 << (p - 1) for p in liuyao["changing_lines"])
+    rebuilt = liuyao_outcome(liuyao["primary_hexagram"]["id"], mask)
+    assert rebuilt["relating_hexagram"] == liuyao["relating_hexagram"]
+    assert outcome_key("liuyao", rebuilt) == outcome_key("liuyao", liuyao)
+
+    keys = [key for key, _ in iter_outcomes("liuyao")]
+    assert len(set(keys)) == 64 * 64
+    tarot = ai_generate_tarot("seed").model_dump()
+    assert outcome_key("tarot", tarot).count("-") == 2
+
+
+def test_precompute_resumes_and_serves_as_fallback(storage, monkeypatch):
+    calls = Counter()
+
+    async def fake_llm(system, user, **kwargs):
+        calls[kwargs["caller"]] += 1
+        if kwargs["caller"] == "interpretation":
+            raise RuntimeError("upstream down")
+        await asyncio.sleep(0)
+        return LLM_RESPONSE
+
+    monkeypatch.setattr(interpretation_pool, "_call_llm", fake_llm)
+    monkeypatch.setattr(interpretation, "_call_llm", fake_llm)
+
+    assert arun(interpretation_pool.precompute("liuyao", "zh", concurrency=3, limit=5)) == 5
+    # 已生成的结果会跳过
+    assert arun(interpretation_pool.precompute("liuyao", "zh", concurrency=3, limit=5)) == 5
+    assert len(arun(storage.base_interpretation_keys("liuyao", "zh"))) == 10
+    assert calls["pregenerate"] == 10
+
+    result = liuyao_outcome(1, 3)
+    served = arun(interpretation.generate_interpretation_v2("q", "liuyao", "ai", result, "zh"))
+    assert served.summary == "s"
+    missing = liuyao_outcome(64, 63)
+    served = arun(interpretation.generate_interpretation_v2("q", "liuyao", "ai", missing, "zh"))
+    assert served.confidence.value == "low"
+
+
+def test_preview_is_served_before_interpret_on_a_fresh_ai_session(storage):
+    from app.main import create_app
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post(
+                "/api/v2/divination/session",
+                json={"question": "preview: will it be sunny?", "mode": "ai", "method": "liuyao"},
+            )
+            session = created.json()
+            missing = await client.get(f"/api/v2/divination/{session['session_id']}/preview")
+
+            # 预生成池里有这个结果的通用解读后，/interpret 之前就能拿到预览
+            result = seed_result("liuyao", session["seed"])
+            await storage.put_base_interpretation(
+                "liuyao", outcome_key("liuyao", result), "zh", json.loads(LLM_RESPONSE), "2024-01-01T00:00:00"
+            )
+            preview = await client.get(f"/api/v2/divination/{session['session_id']}/preview")
+            return missing, preview
+
+    missing, preview = arun(run())
+    assert missing.status_code == 404
+    assert missing.json()["detail"] == "Preview not available"
+    assert preview.status_code == 200
+    assert preview.json()["interpretation"]["summary"] == "s"
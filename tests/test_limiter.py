@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.limiter import AdaptiveLimiter, AdmissionRejectedError, Priority
+
+
+def test_interactive_waiters_are_served_before_background():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+        order = []
+
+        async def waiter(priority, name):
+            await limiter.acquire(priority, max_wait=5)
+            order.append(name)
+            limiter.release(0.01, overloaded=False)
+
+        tasks = [
+            asyncio.create_task(waiter(Priority.BACKGROUND, "preload")),
+            asyncio.create_task(waiter(Priority.INTERACTIVE, "interpret")),
+        ]
+        await asyncio.sleep(0.01)
+        limiter.release(0.01, overloaded=False)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interpret", "preload"]
+
+
+def test_sheds_when_estimated_wait_exceeds_budget():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, default_latency=10)
+        await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+        with pytest.raises(AdmissionRejectedError):
+            await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+
+    asyncio.run(scenario())
+
+
+def test_aimd_adjusts_limit():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=10, min_limit=2, max_limit=20)
+        await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+        limiter.release(0.5, overloaded=True)
+        assert limiter.limit == pytest.approx(7)
+        for _ in range(7):
+            await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+            limiter.release(0.5, overloaded=False)
+        assert 7.9 < limiter.limit < 8.1
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiters_do_not_block_hedges():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=2, default_latency=0.01)
+        await limiter.acquire(Priority.INTERACTIVE, max_wait=1)
+        with pytest.raises(AdmissionRejectedError):
+            await limiter.acquire(Priority.INTERACTIVE, max_wait=0.05)
+        # 名额增加后没有人在排队，对冲应当拿到名额
+        limiter.limit = 2
+        return limiter.try_acquire(), len(limiter._waiters)
+
+    assert asyncio.run(scenario()) == (True, 0)
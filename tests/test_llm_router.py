@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from stub_llm import ModelBehaviour
+
+from app.llm import (
+    CircuitBreaker,
+    LLMRouter,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    Upstream,
+)
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _router(stub, models, *, budget=5.0, hedge_delay=0.2, failures=3, cooldown=30.0):
+    upstreams = [
+        Upstream(
+            name=name,
+            url=stub.url,
+            model=name,
+            api_key="test",
+            breaker=CircuitBreaker(name, failures, cooldown),
+        )
+        for name in models
+    ]
+    return LLMRouter(
+        upstreams,
+        latency_budget=budget,
+        hedge_default_delay=hedge_delay,
+        hedge_min_delay=0.05,
+    )
+
+
+def _is_json(content: str) -> bool:
+    try:
+        json.loads(content)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+@pytest.fixture(autouse=True)
+def _reset(stub_llm):
+    stub_llm.reset()
+    yield
+
+
+def test_returns_primary_response(stub_llm):
+    router = _router(stub_llm, ["primary"])
+    response = asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+    assert response.upstream == "primary"
+    assert json.loads(response.content)["summary"]
+    assert response.data["usage"]["prompt_tokens"] == 320
+
+
+def test_hedges_to_secondary_when_primary_is_slow(stub_llm):
+    stub_llm.behaviours["primary"] = ModelBehaviour(latency=3)
+    router = _router(stub_llm, ["primary", "secondary"], hedge_delay=0.1)
+
+    start = time.perf_counter()
+    response = asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+    elapsed = time.perf_counter() - start
+
+    assert response.upstream == "secondary"
+    assert elapsed < 1.5
+    assert stub_llm.calls["primary"] == 1
+    assert stub_llm.calls["secondary"] == 1
+
+
+def test_fails_over_immediately_on_error(stub_llm):
+    stub_llm.behaviours["primary"] = ModelBehaviour(error_rate=1.0, status_code=503)
+    router = _router(stub_llm, ["primary", "secondary"], hedge_delay=2)
+
+    start = time.perf_counter()
+    response = asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+
+    assert response.upstream == "secondary"
+    assert time.perf_counter() - start < 1.0
+
+
+def test_skips_invalid_response(stub_llm):
+    stub_llm.behaviours["primary"] = ModelBehaviour(content="sorry, I cannot answer")
+    router = _router(stub_llm, ["primary", "secondary"])
+
+    response = asyncio.run(
+        router.complete(MESSAGES, temperature=0.5, caller="test", validate=_is_json)
+    )
+
+    assert response.upstream == "secondary"
+
+
+def test_latency_budget_is_enforced(stub_llm):
+    stub_llm.default = ModelBehaviour(latency=3)
+    router = _router(stub_llm, ["primary"], budget=0.3, hedge_delay=0.1)
+
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+    assert time.perf_counter() - start < 1.0
+
+
+def test_circuit_breaker_short_circuits(stub_llm):
+    stub_llm.default = ModelBehaviour(error_rate=1.0)
+    router = _router(stub_llm, ["primary"], failures=2)
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+    calls = stub_llm.calls["primary"]
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(router.complete(MESSAGES, temperature=0.5, caller="test"))
+    assert stub_llm.calls["primary"] == calls
+
+
+def test_breaker_half_opens_after_cooldown():
+    breaker = CircuitBreaker("primary", failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_drain_waits_for_in_flight_calls(stub_llm):
+    stub_llm.behaviours["slow"] = ModelBehaviour(latency=0.3)
+    router = _router(stub_llm, ["slow"])
+
+    async def scenario():
+        call = asyncio.create_task(router.complete(MESSAGES, temperature=0.5, caller="test"))
+        await asyncio.sleep(0.05)
+        assert router.in_flight == 1
+        assert await router.drain(0.05) == 1
+        assert await router.drain(5) == 0
+        assert call.done() and call.result().upstream == "slow"
+        await router.aclose()
+
+    asyncio.run(scenario())
+    assert router.health()["upstreams"] == {"slow": "closed"}
+
+
+def test_fallback_only_configuration_is_usable(stub_llm, monkeypatch):
+    from app import llm
+    from app.config import settings
+    from app.interpretation import _call_llm
+
+    monkeypatch.setattr(settings, "ai_builder_api_key", "")
+    monkeypatch.setattr(settings, "ai_builder_fallback_api_url", stub_llm.url)
+    monkeypatch.setattr(settings, "ai_builder_fallback_api_key", "test")
+    llm.set_router(None)
+
+    async def run():
+        try:
+            return await _call_llm("system", "user", caller="test")
+        finally:
+            await llm.get_router().aclose()
+
+    # 没有主 key、只配置了备用上游时也应走路由层，而不是直接报未配置
+    assert [u.name for u in llm.get_router().upstreams] == ["secondary"]
+    assert json.loads(asyncio.run(run()))["summary"]
+    llm.set_router(None)
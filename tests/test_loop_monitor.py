@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import redis_client, session_cache
+from app.config import settings
+from app.loop_monitor import BlockingCallError, LoopMonitor, forbid_blocking_io
+from app.metrics import EVENT_LOOP_BLOCKS
+
+
+def slow_redis_from_url(*args, **kwargs):
+    """连接要花 0.3 秒然后失败的 Redis。"""
+    end = time.perf_counter() + 0.3
+    while time.perf_counter() < end:
+        pass
+    raise ConnectionError("unreachable")
+
+
+def _blocks(site: str) -> float:
+    return EVENT_LOOP_BLOCKS.labels(site=site)._value.get()
+
+
+def test_monitor_attributes_block_to_app_call_site(monkeypatch, caplog):
+    monkeypatch.setattr("redis.Redis.from_url", slow_redis_from_url)
+    monkeypatch.setattr(redis_client, "_redis_client", None)
+    monkeypatch.setattr(redis_client, "_redis_available", None)
+    before = _blocks("redis_client.get_redis")
+
+    async def scenario():
+        monitor = asyncio.create_task(LoopMonitor(threshold=0.1, interval=0.02).run())
+        await asyncio.sleep(0.05)
+        assert redis_client.get_redis() is None
+        await asyncio.sleep(0.05)
+        monitor.cancel()
+
+    with caplog.at_level(logging.WARNING, logger="app.loop_monitor"):
+        asyncio.run(scenario())
+
+    assert _blocks("redis_client.get_redis") == before + 1
+    assert "[LOOP] Event loop blocked" in caplog.text
+    assert "app/redis_client.py" in caplog.text
+
+
+@pytest.mark.allow_blocking
+def test_strict_mode_rejects_blocking_calls_only_on_the_loop():
+    async def scenario():
+        with pytest.raises(BlockingCallError):
+            time.sleep(0.01)
+        # 放到线程池里的阻塞调用是允许的
+        await asyncio.to_thread(time.sleep, 0.01)
+
+    with forbid_blocking_io() as violations:
+        asyncio.run(scenario())
+        time.sleep(0.01)
+    assert len(violations) == 1
+    assert "time.sleep" in violations[0]
+    assert time.sleep.__module__ == "time"
+
+
+@pytest.fixture
+def unreachable_redis(monkeypatch):
+    # 端口 1 上没有服务：连接失败，但必须在线程池里失败
+    monkeypatch.setattr(settings, "redis_url", "redis://127.0.0.1:1")
+    monkeypatch.setattr(settings, "horoscope_api_url", "http://127.0.0.1:1/api/horoscope")
+    monkeypatch.setattr(redis_client, "_redis_client", None)
+    monkeypatch.setattr(redis_client, "_redis_available", None)
+    monkeypatch.setattr(session_cache, "_cache", None)
+
+
+def test_aztro_keeps_redis_off_the_loop(storage, unreachable_redis):
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        response = client.post("/api/aztro", json={"sign": "aries", "day": "today"})
+    assert response.status_code == 200
+    assert response.json()["description"]
+
+
+def test_session_lookup_keeps_redis_off_the_loop(storage, unreachable_redis):
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        client.cookies.set("session", "not-a-session")
+        assert client.get("/health").status_code == 200
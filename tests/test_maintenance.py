@@ -0,0 +1,63 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import arun
+
+from app import auth, db, maintenance
+from app.config import settings
+
+
+@pytest.fixture
+def database(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(settings, "maintenance_batch_size", 2)
+    monkeypatch.setattr(settings, "maintenance_batch_pause", 0)
+    return tmp_path
+
+
+async def _session(session_id, *, status, mode="ai", age=timedelta(0)):
+    await db.create_divination_session_v2(
+        session_id=session_id,
+        user_id=None,
+        question="q",
+        mode=mode,
+        method="tarot",
+        seed="s",
+        created_at=(datetime.utcnow() - age).isoformat(),
+    )
+    await db.update_divination_session_v2(session_id, status=status)
+
+
+def test_run_maintenance_cleans_up_in_batches(database, storage):
+    async def run():
+        user = await auth.create_user("maintenance@example.com", "hash", None)
+        for i in range(5):
+            await storage.create_session(f"old{i}", user["id"], "2000-01-01", "2000-01-02")
+        live = await auth.create_session(user["id"])
+
+        await _session("stuck", status="in_progress", age=timedelta(hours=1))
+        await _session("casting", status="in_progress", mode="manual", age=timedelta(hours=1))
+        await _session("abandoned", status="failed", age=timedelta(days=60))
+        await _session("old", status="completed", age=timedelta(days=400))
+        await _session("recent", status="completed")
+
+        report = await maintenance.run_maintenance()
+
+        assert report.rows["expired_tokens"] == 5
+        assert report.rows["stuck_sessions"] == 1
+        assert report.rows["unfinished_sessions"] == 1
+        assert report.rows["archived_sessions"] == 1
+        assert await auth.get_session_user(live["token"]) is not None
+        assert (await db.get_divination_session_v2("stuck"))["status"] == "failed"
+        assert (await db.get_divination_session_v2("casting"))["status"] == "in_progress"
+        assert await db.get_divination_session_v2("abandoned") is None
+        assert await db.get_divination_session_v2("old") is None
+        assert await db.get_divination_session_v2("recent") is not None
+
+    arun(run())
+
+    (archive,) = (database / "archive").iterdir()
+    with gzip.open(archive, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == ["old"]
@@ -0,0 +1,58 @@
+import asyncio
+
+from app import divination
+from app.config import Settings
+from app.method_classifier import (
+    EVAL_PATH,
+    MethodClassifier,
+    evaluate,
+    get_classifier,
+    load_samples,
+    pick_threshold,
+)
+
+
+def test_bundled_model_separates_decisions_from_open_questions():
+    classifier = get_classifier()
+    assert classifier.predict("我要不要辞职？").method == "liuyao"
+    assert classifier.predict("我和他的感情会怎么发展").method == "tarot"
+    assert classifier.predict("Should I sign the contract?").method == "liuyao"
+    assert classifier.predict("彼は私のことをどう思っていますか").method == "tarot"
+
+    # 打包的模型与训练数据一致（修改训练数据后需要重新 train）
+    retrained = MethodClassifier.train(load_samples())
+    question = "今年能不能找到新工作"
+    assert abs(retrained.score(question) - classifier.score(question)) < 1e-2
+
+
+def test_default_threshold_comes_from_the_held_out_set():
+    held_out = load_samples(EVAL_PATH)
+    assert not {q for q, _ in held_out} & {q for q, _ in load_samples()}
+
+    report = evaluate(get_classifier(), held_out)
+    assert report["agreement"] >= 0.85
+    # 重新训练后阈值可能变化：按 eval 的 suggested_threshold 更新 METHOD_CLASSIFIER_THRESHOLD
+    assert pick_threshold(report) == Settings().method_classifier_threshold
+
+
+def test_pick_threshold_requires_every_higher_threshold_to_qualify():
+    rows = [(0.5, 0.9), (0.6, 1.0), (0.7, 0.95), (0.8, 1.0)]
+    report = {"thresholds": [{"threshold": t, "confident_agreement": a} for t, a in rows]}
+    assert pick_threshold(report) == 0.8
+    assert pick_threshold(report, target=0.95) == 0.6
+
+
+def test_llm_only_consulted_when_uncertain(monkeypatch):
+    calls = []
+
+    async def fake_llm(question):
+        calls.append(question)
+        return {"method": "tarot", "reason": "llm"}
+
+    monkeypatch.setattr(divination, "_llm_choose_method", fake_llm)
+    confident = asyncio.run(divination.choose_method("这次面试能通过吗？"))
+    assert confident["method"] == "liuyao" and calls == []
+
+    monkeypatch.setattr(divination.settings, "method_classifier_threshold", 1.01)
+    assert asyncio.run(divination.choose_method("这次面试能通过吗？"))["reason"] == "llm"
+    assert len(calls) == 1
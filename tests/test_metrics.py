@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.main import create_app
+
+
+def _duration_count(client, **labels):
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        if family.name != "http_request_duration_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_count") and sample.labels == labels:
+                return sample.value
+    return 0.0
+
+
+def test_request_duration_is_exported_by_route_template(storage):
+    labels = {"method": "GET", "route": "/api/v2/divination/{session_id}", "status": "404"}
+    with TestClient(create_app()) as client:
+        before = _duration_count(client, **labels)
+        for session_id in ("missing-a", "missing-b"):
+            assert client.get(f"/api/v2/divination/{session_id}").status_code == 404
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        # 两个不同的 session_id 落在同一个路由模板标签下，原始路径不会进标签
+        assert _duration_count(client, **labels) == before + 2
+        assert "missing-a" not in response.text
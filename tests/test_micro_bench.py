@@ -0,0 +1,19 @@
+from bench.micro import BENCHMARKS, Result, compare, load_baseline, run_benchmarks
+
+
+def test_every_benchmark_runs_and_has_a_baseline():
+    results = run_benchmarks(rounds=1, min_time=0.001)
+    assert {r.name for r in results} == set(BENCHMARKS)
+    assert all(r.min_ns > 0 for r in results)
+    assert set(BENCHMARKS) <= set(load_baseline()["results"])
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"results": {"fast": {"min_ns": 100.0}, "slow": {"min_ns": 100.0}}}
+    results = [
+        Result("fast", 120.0, 110.0, 1.0, 10, 3),
+        Result("slow", 150.0, 140.0, 1.0, 10, 3),
+        Result("new", 10.0, 10.0, 1.0, 10, 3),
+    ]
+    flagged = {c.name: c.regressed for c in compare(results, baseline, threshold=0.25)}
+    assert flagged == {"fast": False, "slow": True, "new": False}
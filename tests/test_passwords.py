@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+from conftest import arun
+from passlib.context import CryptContext
+
+from app.passwords import HashRateLimitedError, PasswordHasher
+
+
+def test_concurrent_hashes_for_one_account_are_capped():
+    async def scenario():
+        hasher = PasswordHasher(workers=2, per_key_limit=1)
+        keys = ("ip:1.2.3.4", "account:a@example.com")
+        first = asyncio.create_task(hasher.hash("secret", keys))
+        await asyncio.sleep(0)
+        with pytest.raises(HashRateLimitedError):
+            await hasher.hash("secret", keys)
+        # 其他账号不受影响
+        await hasher.hash("secret", ("ip:5.6.7.8", "account:b@example.com"))
+        await first
+        assert hasher._in_flight == {}
+        hasher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_outdated_work_factor_is_rehashed_on_verify():
+    legacy = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+
+    async def scenario():
+        hasher = PasswordHasher(workers=1, per_key_limit=2)
+        try:
+            return await hasher.verify("secret", legacy)
+        finally:
+            hasher.shutdown()
+
+    valid, new_hash = asyncio.run(scenario())
+    assert valid
+    assert new_hash and "$12$" in new_hash
+
+
+def test_hash_cap_keys_on_the_forwarded_client_ip(storage, monkeypatch):
+    from app.main import create_app
+    from app.routers import auth as auth_router
+
+    seen = []
+
+    class RecordingHasher:
+        async def hash(self, password, keys=()):
+            seen.append(keys[0])
+            return "hash"
+
+    monkeypatch.setattr(auth_router, "get_hasher", lambda: RecordingHasher())
+
+    async def register(peer, email, forwarded):
+        transport = httpx.ASGITransport(app=create_app(), client=(peer, 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/api/auth/register",
+                json={"email": email, "password": "secret"},
+                headers={"x-forwarded-for": forwarded},
+            )
+            assert response.status_code == 200
+
+    # 平台代理（私有网段）转发的请求按真实客户端区分；公网直连时伪造的头被忽略
+    arun(register("10.0.0.5", "a@example.com", "198.51.100.1"))
+    arun(register("10.0.0.5", "b@example.com", "203.0.113.9, 198.51.100.2"))
+    arun(register("192.0.2.7", "c@example.com", "198.51.100.3"))
+    assert seen == ["ip:198.51.100.1", "ip:198.51.100.2", "ip:192.0.2.7"]
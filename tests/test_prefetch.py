@@ -0,0 +1,118 @@
+import asyncio
+import json
+from collections import Counter
+
+from fastapi.testclient import TestClient
+
+from app import interpretation, prefetch, usage
+from app.interpretation_pool import outcome_key
+from app.liuyao import calculate_toss
+from app.prefetch import Prefetcher, candidate_steps, manual_result
+from app.usage import UsageLedger, bind_usage, current_scope, start_usage_scope
+
+TOSSES = [(3, 3, 3), (2, 2, 3), (2, 3, 3), (2, 2, 2), (2, 2, 3)]
+
+
+def _step(n, coins):
+    return {"step_number": n, "action": "coin_toss", "data": calculate_toss(coins).model_dump()}
+
+
+def test_candidates_cover_every_final_outcome():
+    steps = [_step(i + 1, coins) for i, coins in enumerate(TOSSES)]
+    keys = {
+        outcome_key("liuyao", manual_result("liuyao", [*steps, c]))
+        for c in candidate_steps("liuyao", steps)
+    }
+    assert len(keys) == 4
+    final = manual_result("liuyao", [*steps, _step(6, (3, 3, 2))])
+    assert outcome_key("liuyao", final) in keys
+
+    draws = [
+        {"data": {"card_id": 0, "is_upright": True}},
+        {"data": {"card_id": 5, "is_upright": False}},
+    ]
+    assert len(candidate_steps("tarot", draws)) == 20 * 2
+
+
+def test_final_step_keeps_only_the_matching_prefetch(storage, monkeypatch):
+    calls = Counter()
+
+    async def fake_llm(system, user, **kwargs):
+        calls[kwargs["caller"]] += 1
+        await asyncio.sleep(0.2)
+        return json.dumps(
+            {
+                "summary": "prefetched",
+                "advice": "a",
+                "timing": "t",
+                "confidence": "high",
+                "reasoning_bullets": ["r"],
+                "follow_up_questions": ["f"],
+                "ritual_ending": "e",
+            }
+        )
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("/interpret should use the prefetched interpretation")
+
+    monkeypatch.setattr(prefetch, "_call_llm", fake_llm)
+    monkeypatch.setattr(interpretation, "_call_llm", no_llm)
+    prefetch.set_prefetcher(None)
+
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        session_id = client.post(
+            "/api/v2/divination/session",
+            json={"question": "q", "mode": "manual", "method": "liuyao"},
+        ).json()["session_id"]
+        for n, coins in enumerate([*TOSSES, (3, 3, 2)], start=1):
+            response = client.post(
+                "/api/v2/divination/manual/step",
+                json={
+                    "session_id": session_id,
+                    "step_number": n,
+                    "action": "coin_toss",
+                    "data": calculate_toss(coins).model_dump(),
+                },
+            )
+            assert response.status_code == 200
+            if n == 5:
+                assert len(prefetch.get_prefetcher().pending(session_id)) == 4
+        # 最后一步到达后只剩命中的候选
+        assert len(prefetch.get_prefetcher().pending(session_id)) == 1
+
+        response = client.post("/api/v2/divination/interpret", json={"session_id": session_id})
+        assert response.status_code == 200
+        assert response.json()["interpretation"]["summary"] == "prefetched"
+        assert prefetch.get_prefetcher().pending(session_id) == []
+    assert calls["prefetch"] == 4
+    prefetch.set_prefetcher(None)
+
+
+def test_speculative_calls_do_not_charge_the_requesting_user(monkeypatch):
+    ledger = UsageLedger(user_tokens_per_hour=1000)
+    usage.set_ledger(ledger)
+    scopes = []
+
+    async def fake_llm(system, user, **kwargs):
+        scopes.append(current_scope())
+        ledger.record(kwargs["caller"], 0.1, {"usage": {"prompt_tokens": 300}}, [], "")
+        raise RuntimeError("discarded")
+
+    monkeypatch.setattr(prefetch, "_call_llm", fake_llm)
+    prefetcher = Prefetcher(max_candidates=4, max_inflight=64, ttl=600)
+    steps = [_step(i + 1, coins) for i, coins in enumerate(TOSSES)]
+
+    async def run():
+        start_usage_scope(7, "10.0.0.1")
+        bind_usage(session_id="s1", method="liuyao", lang="zh")
+        assert prefetcher.start("s1", "q", "liuyao", steps, "zh") == 4
+        await asyncio.gather(*prefetcher._entries["s1"].tasks.values())
+        return current_scope()
+
+    assert asyncio.run(run()).subject == "user:7"
+    # 四个候选都记在 system 名下，用户的额度一点没动
+    assert {(s.subject, s.session_id) for s in scopes} == {("system", "s1")}
+    assert ledger._subject_bucket("user:7").level() == 1000
+    usage.set_ledger(None)
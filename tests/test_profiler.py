@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiler
+from app.config import settings
+from app.profiler import ProfilerBusyError, SlowRequestMiddleware, SlowRequestWatchdog
+
+
+def _busy_wait(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def _waiting_on_event(event: asyncio.Event) -> None:
+    await event.wait()
+
+
+def test_profile_captures_blocking_code_tasks_and_loop_lag():
+    async def scenario():
+        event = asyncio.Event()
+        waiter = asyncio.create_task(_waiting_on_event(event))
+        running = asyncio.create_task(profiler.profile(0.6, interval=0.005))
+        await asyncio.sleep(0.1)
+        with pytest.raises(ProfilerBusyError):
+            await profiler.profile(0.1)
+        _busy_wait(0.3)
+        result = await running
+        event.set()
+        await waiter
+        return result
+
+    result = asyncio.run(scenario())
+
+    assert result.samples > 0
+    assert "_busy_wait" in result.collapsed()
+    assert "_waiting_on_event" in result.collapsed(tasks=True)
+    assert max(result.loop_lag) > 0.1
+    assert result.summary()["loop_lag_ms"]["max"] > 100
+
+    document = result.speedscope()
+    frames = document["shared"]["frames"]
+    threads = document["profiles"][0]
+    assert threads["type"] == "sampled"
+    assert len(threads["samples"]) == len(threads["weights"])
+    assert all(0 <= i < len(frames) for sample in threads["samples"] for i in sample)
+
+
+def test_watchdog_dumps_stack_of_slow_request(monkeypatch):
+    watchdog = SlowRequestWatchdog(threshold=0.1, keep=10)
+    monkeypatch.setattr(profiler, "_watchdog", watchdog)
+
+    app = FastAPI()
+    app.add_middleware(SlowRequestMiddleware)
+
+    @app.get("/slow/{item}")
+    async def slow(item: str):
+        await asyncio.sleep(0.4)
+        return {"item": item}
+
+    @app.get("/fast")
+    async def fast():
+        return {}
+
+    watchdog.start()
+    try:
+        with TestClient(app) as client:
+            assert client.get("/fast").status_code == 200
+            assert client.get("/slow/1").status_code == 200
+    finally:
+        watchdog.stop()
+
+    assert len(watchdog.dumps) == 1
+    dump = watchdog.dumps[0]
+    assert dump["route"] == "/slow/{item}"
+    assert dump["elapsed_ms"] >= 100
+    assert any(".slow (" in frame for frame in dump["task_stack"])
+
+
+def test_profile_endpoint_requires_secret(storage, monkeypatch):
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        monkeypatch.setattr(settings, "profiling_secret", None)
+        assert client.post("/api/admin/profile?seconds=0.1").status_code == 401
+
+        monkeypatch.setattr(settings, "profiling_secret", "s3cret")
+        headers = {"x-profiling-secret": "s3cret"}
+        assert client.post("/api/admin/profile?seconds=0.1", headers={}).status_code == 401
+        wrong = {"x-profiling-secret": "s3cre"}
+        assert client.post("/api/admin/profile?seconds=0.1", headers=wrong).status_code == 401
+        response = client.post("/api/admin/profile?seconds=0.2&format=json", headers=headers)
+        assert response.status_code == 200
+        assert set(response.json()["loop_lag_ms"]) == {"mean", "p99", "max"}
+        response = client.post("/api/admin/profile?seconds=0.1&format=collapsed", headers=headers)
+        assert response.headers["content-type"].startswith("text/plain")
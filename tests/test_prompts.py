@@ -0,0 +1,116 @@
+import pytest
+
+from app.metrics import PROMPT_TRIMS
+from app.prompts import compile_prompt, estimate_tokens, get_template, truncate_to_tokens
+
+QUESTION = "我应该换工作吗？"
+LIUYAO = {
+    "primary_hexagram": {"name": "乾", "symbol": "䷀", "description": "元亨利贞"},
+    "relating_hexagram": {"name": "姤", "symbol": "䷫", "description": "女壮"},
+    "changing_lines": [1],
+    "lines": [{"yao_type": "old_yang", "is_changing": True}]
+    + [{"yao_type": "young_yang", "is_changing": False}] * 5,
+}
+TAROT = {
+    "cards": [
+        {"card": {"name": "愚者", "name_en": "The Fool"}, "is_upright": True, "meaning": "开始"},
+        {"card": {"name": "魔术师", "name_en": "The Magician"}, "is_upright": False, "meaning": "技巧"},
+        {
+            "card": {"name": "女祭司", "name_en": "The High Priestess"},
+            "is_upright": True,
+            "meaning": "直觉",
+        },
+    ]
+}
+
+# 预编译之前 interpretation._build_liuyao_prompt / _build_tarot_prompt 的输出
+LEGACY_LIUYAO_ZH = (
+    "【用户问题】\n我应该换工作吗？\n\n【占卜方式】\n六爻起卦 (AI生成)\n\n【卦象结果】\n"
+    "本卦: 乾 (䷀)\n元亨利贞\n\n变卦: 姤 (䷫)\n女壮\n\n动爻: 初爻动\n\n【六爻详情】\n"
+    "初 line: 老阳（动）\n二 line: 少阳\n三 line: 少阳\n四 line: 少阳\n五 line: 少阳\n"
+    "上 line: 少阳\n\n请根据以上信息，结合用户的问题，提供占卜解读。"
+)
+LEGACY_TAROT_EN = (
+    "【User Question】\n我应该换工作吗？\n\n【Divination Method】\n"
+    "Tarot Three-Card Spread (Manual Draw) - Past/Present/Future\n\n【Cards Drawn】\n"
+    "Position1 - Past: The Fool (Upright)\n  Keywords: 开始\n"
+    "Position2 - Present: The Magician (Reversed)\n  Keywords: 技巧\n"
+    "Position3 - Future: The High Priestess (Upright)\n  Keywords: 直觉\n\n"
+    "【Spread Interpretation Guide】\n"
+    "- Past: Background and root causes affecting the current issue\n"
+    "- Present: Current state and core issues being faced\n"
+    "- Future: Possible direction if current course is maintained\n\n"
+    "Based on the above information and the user's question, "
+    "please provide the divination interpretation in English."
+)
+
+
+def _lines(text):
+    return sorted(line for line in text.splitlines() if line.strip())
+
+
+@pytest.mark.parametrize(
+    "method,mode,result,lang,legacy",
+    [
+        ("liuyao", "ai", LIUYAO, "zh", LEGACY_LIUYAO_ZH),
+        ("tarot", "manual", TAROT, "en", LEGACY_TAROT_EN),
+    ],
+)
+def test_untrimmed_prompt_keeps_the_legacy_content(method, mode, result, lang, legacy):
+    prompt = compile_prompt(method, QUESTION, mode, result, lang, budget=10_000)
+    assert prompt.trimmed == ()
+    # 只调整了段落顺序（静态前缀在前），内容与旧实现逐行一致
+    assert _lines(prompt.user) == _lines(legacy)
+    assert prompt.system == get_template(method, lang, mode).system.text
+
+
+def _trims(section):
+    return PROMPT_TRIMS.labels(method="tarot", section=section)._value.get()
+
+
+def test_optional_sections_are_dropped_before_the_question():
+    question = "我" * 120
+    full = compile_prompt("tarot", question, "ai", TAROT, "zh", budget=10_000)
+    before = _trims("spread_direction"), _trims("question")
+
+    prompt = compile_prompt("tarot", question, "ai", TAROT, "zh", budget=full.total_tokens - 10)
+
+    assert prompt.trimmed == ("spread_direction",)
+    assert question in prompt.user
+    assert "【牌阵解读方向】" not in prompt.user
+    assert prompt.total_tokens <= full.total_tokens - 10
+    assert (_trims("spread_direction"), _trims("question")) == (before[0] + 1, before[1])
+
+
+def test_question_is_shortened_only_after_optional_sections_are_gone():
+    question = "我" * 120
+    full = compile_prompt("tarot", question, "ai", TAROT, "zh", budget=10_000)
+    guide = get_template("tarot", "zh", "ai").guide.tokens
+    budget = full.total_tokens - guide - 60
+    before = _trims("question")
+
+    prompt = compile_prompt("tarot", question, "ai", TAROT, "zh", budget=budget)
+
+    assert prompt.trimmed == ("spread_direction", "question")
+    assert question not in prompt.user and "我" * 40 + "…" in prompt.user
+    assert "【抽牌结果】" in prompt.user
+    assert _trims("question") == before + 1
+
+
+@pytest.mark.parametrize("method,result", [("liuyao", LIUYAO), ("tarot", TAROT)])
+def test_compiled_prompt_respects_the_budget(method, result):
+    question = "Should I take the job offer in another city? " * 20
+    full = compile_prompt(method, question, "ai", result, "en", budget=10_000)
+    # 问题只剩省略号时的大小：低于它的预算只靠删段落无法满足
+    floor = compile_prompt(method, "…", "ai", result, "en", budget=0).total_tokens
+    for budget in range(floor, full.total_tokens + 1, 3):
+        prompt = compile_prompt(method, question, "ai", result, "en", budget=budget)
+        assert prompt.total_tokens <= budget, (budget, prompt.trimmed)
+        assert estimate_tokens(prompt.system) + estimate_tokens(prompt.user) <= budget
+
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens("短问题", 10) == "短问题"
+    shortened = truncate_to_tokens("我" * 50, 10)
+    assert shortened.endswith("…") and estimate_tokens(shortened) <= 10
+    assert estimate_tokens(truncate_to_tokens("word " * 100, 20)) <= 20
@@ -0,0 +1,55 @@
+import asyncio
+import signal
+
+from fastapi.testclient import TestClient
+
+from app import redis_client
+from app.config import settings
+from app.main import create_app
+from app.readiness import install_drain_handler, is_draining, set_draining
+
+
+def test_ready_reports_dependencies_and_draining(storage, monkeypatch):
+    monkeypatch.setattr(settings, "redis_url", "redis://127.0.0.1:1")
+    monkeypatch.setattr(redis_client, "_redis_client", None)
+    monkeypatch.setattr(redis_client, "_redis_available", None)
+
+    with TestClient(create_app()) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        report = response.json()
+        assert report["status"] == "ready"
+        assert report["database"]["backend"] == storage.name
+        assert report["database"]["status"] == "ok"
+        # Redis 是可选的：不可用只报告，不影响就绪
+        assert report["redis"]["status"] == "unavailable"
+
+        monkeypatch.setattr(settings, "readiness_require_redis", True)
+        assert client.get("/ready").status_code == 503
+        monkeypatch.setattr(settings, "readiness_require_redis", False)
+
+        set_draining(True)
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "draining"
+        assert client.get("/health").status_code == 200
+
+
+def test_sigterm_marks_draining_before_the_server_shuts_down():
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+    async def run():
+        set_draining(False)
+        install_drain_handler(0.05)
+        signal.raise_signal(signal.SIGTERM)
+        # /ready 立即变成 503，服务器自己的处理函数要等延迟之后才调用
+        assert is_draining() and received == []
+        await asyncio.sleep(0.1)
+        return list(received)
+
+    try:
+        assert asyncio.run(run()) == [signal.SIGTERM]
+    finally:
+        signal.signal(signal.SIGTERM, original)
+        set_draining(False)
@@ -0,0 +1,134 @@
+import json
+import random
+
+import pytest
+from conftest import arun
+
+from app import interpretation
+from app.metrics import LLM_RESPONSE_DECODES
+from app.response_decoding import REQUIRED_FIELDS, decode_interpretation, decode_json
+
+READING = {
+    "summary": "时机未到，宜守不宜进",
+    "advice": "先把手头的事情做完",
+    "timing": "三个月内",
+    "confidence": "medium",
+    "reasoning_bullets": ["本卦主静", "动爻在五爻", "变卦转吉"],
+    "follow_up_questions": ["你最担心什么？", "有没有退路？"],
+    "ritual_ending": "愿你心安。",
+}
+CLEAN = json.dumps(READING, ensure_ascii=False)
+PRETTY = json.dumps(READING, ensure_ascii=False, indent=2)
+
+# 线上见过的各种畸形输出：(名称, 内容, 仍然缺少的字段)
+CORPUS = [
+    ("clean", CLEAN, []),
+    ("fenced", f"```json\n{PRETTY}\n```", []),
+    ("fenced_unclosed", f"```json\n{PRETTY}", []),
+    ("prose_around", f"好的，以下是解读：\n{PRETTY}\n希望对你有帮助。", []),
+    ("braces_in_prose", f"结果 {{本卦}} 如下：{CLEAN}", []),
+    ("trailing_comma", CLEAN[:-1] + ",}", []),
+    ("truncated_between_fields", CLEAN[: CLEAN.index(', "ritual_ending"')], ["ritual_ending"]),
+    ("truncated_mid_string", CLEAN[: CLEAN.index("愿你") + 1], ["ritual_ending"]),
+    (
+        "truncated_mid_list",
+        CLEAN[: CLEAN.index("动爻在五爻") + 2],
+        ["follow_up_questions", "ritual_ending"],
+    ),
+    (
+        "camel_case_and_strings",
+        json.dumps(
+            {
+                "Summary": "s",
+                "advice": ["a", "b"],
+                "timing": 3,
+                "confidence": "高",
+                "reasoning": "- 一\n- 二\n- 三",
+                "followUpQuestions": "1. 问题？",
+                "ritualEnding": "e",
+            },
+            ensure_ascii=False,
+        ),
+        [],
+    ),
+    ("missing_confidence", json.dumps({**READING, "confidence": None}), []),
+    ("empty_strings", json.dumps({**READING, "advice": " ", "timing": ""}), ["advice", "timing"]),
+    ("not_an_object", json.dumps(list(READING.values()), ensure_ascii=False), REQUIRED_FIELDS),
+    ("refusal", "抱歉，我无法给出这个问题的解读。", REQUIRED_FIELDS),
+    ("empty", "", REQUIRED_FIELDS),
+]
+
+
+@pytest.mark.parametrize("name,content,missing", CORPUS, ids=[case[0] for case in CORPUS])
+def test_corpus(name, content, missing):
+    decoded = decode_interpretation(content)
+    assert decoded.missing == list(missing)
+    if not missing:
+        reading = decoded.interpretation
+        assert reading.confidence.value in ("low", "medium", "high")
+        assert all(reading.reasoning_bullets) and len(reading.follow_up_questions) <= 3
+
+
+def test_fuzzed_outputs_never_raise_and_keep_complete_fields():
+    rng = random.Random(20261019)
+    for _ in range(2000):
+        text = rng.choice([CLEAN, PRETTY])
+        cut = rng.randrange(len(text) + 1)
+        mutation = rng.choice(["truncate", "fence", "prose", "noise", "drop"])
+        if mutation == "truncate":
+            text = text[:cut]
+        elif mutation == "fence":
+            text = f"```json\n{text[:cut]}"
+        elif mutation == "prose":
+            text = f"解读如下：{text[:cut]}"
+        elif mutation == "noise":
+            text = text[:cut] + rng.choice(["}", "]", '"', ",", "\\", "{"]) + text[cut:]
+        else:
+            text = text[:cut] + text[cut + rng.randrange(1, 20) :]
+
+        parsed = decode_json(text)
+        assert isinstance(parsed, dict)
+        decoded = decode_interpretation(text)
+        # 截断时，截断点之前已经完整出现的字段都应保留下来，且内容不变
+        if mutation in ("truncate", "fence", "prose"):
+            for key, value in READING.items():
+                if key == "confidence" or json.dumps(value, ensure_ascii=False) + "," not in text:
+                    continue
+                assert decoded.fields.get(key) == value, (mutation, text)
+
+
+def _counter(outcome):
+    return LLM_RESPONSE_DECODES.labels(caller="interpretation", outcome=outcome)._value.get()
+
+
+def test_missing_fields_are_repaired_with_a_targeted_follow_up(monkeypatch):
+    prompts = []
+    partial = {k: v for k, v in READING.items() if k not in ("timing", "ritual_ending")}
+
+    async def fake_llm(system, user, **kwargs):
+        prompts.append((kwargs.get("caller"), user))
+        if kwargs.get("caller") == "interpretation_repair":
+            return '```json\n{"timing": "下个月", "ritual_ending": "去吧。"}\n```'
+        return json.dumps(partial, ensure_ascii=False)
+
+    monkeypatch.setattr(interpretation, "_call_llm", fake_llm)
+    before = _counter("repaired")
+
+    result = {"primary_hexagram": {"id": 1, "name": "乾"}, "changing_lines": []}
+    reading = arun(
+        interpretation.generate_interpretation_v2("repair: q", "liuyao", "ai", result, "zh")
+    )
+
+    assert (reading.timing, reading.ritual_ending) == ("下个月", "去吧。")
+    assert reading.summary == READING["summary"]
+    assert _counter("repaired") == before + 1
+    caller, repair_prompt = prompts[1]
+    assert caller == "interpretation_repair"
+    assert '"timing"' in repair_prompt and '"summary"' in repair_prompt
+    assert len(repair_prompt) < 1000
+
+
+def test_mostly_empty_responses_are_not_repaired():
+    decoded = decode_interpretation('{"summary": "s"}')
+    assert not decoded.repairable(3)
+    assert decode_interpretation("{}").repairable(3) is False
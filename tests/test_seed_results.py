@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+
+from conftest import arun
+
+from app import db, seed_results
+from app.liuyao import ai_generate_liuyao
+from app.models.divination_v2 import DivinationSession, Question, SessionDetailResponse
+from app.routers import divination_v2
+from app.seed_results import SeedResultCache, compact_result, expand_result
+from app.tarot_v2 import ai_generate_tarot
+
+
+def test_expanded_results_match_generated_models():
+    for i in range(300):
+        for method, generate in (("liuyao", ai_generate_liuyao), ("tarot", ai_generate_tarot)):
+            expected = generate(f"seed-{i}").model_dump(mode="json")
+            compact = compact_result(method, expected)
+            assert expand_result(method, compact) == expected
+
+    result = seed_results.seed_result("liuyao", "seed-1")
+    assert len(compact_result("liuyao", result)) == 18
+    # 展开结果每次都是新对象
+    result["lines"][0]["position"] = 99
+    assert seed_results.seed_result("liuyao", "seed-1")["lines"][0]["position"] == 1
+
+
+def test_cache_is_bounded_and_persisted(tmp_path):
+    cache = SeedResultCache(maxsize=2)
+    cache.put("tarot", "a", "0u-1r-2u")
+    cache.put("tarot", "b", "3u-4r-5u")
+    assert cache.get("tarot", "a") == "0u-1r-2u"
+    cache.put("tarot", "c", "6u-7r-8u")
+    assert cache.get("tarot", "b") is None
+    assert len(cache) == 2
+
+    path = tmp_path / "seeds.jsonl"
+    cache.save(path)
+    restored = SeedResultCache(maxsize=1)
+    assert restored.load(path) == 1
+    assert restored.get("tarot", "c") == "6u-7r-8u"
+
+
+def test_replay_matches_validated_response(storage):
+    async def run():
+        created_at = datetime(2024, 1, 1, 12, 30).isoformat()
+        await db.create_divination_session_v2(
+            session_id="replay",
+            user_id=None,
+            question="q",
+            mode="ai",
+            method="tarot",
+            seed="seed-1",
+            created_at=created_at,
+        )
+        await db.update_divination_session_v2(
+            "replay",
+            status="completed",
+            result=seed_results.seed_result("tarot", "seed-1"),
+            completed_at=datetime(2024, 1, 1, 12, 31, 5, 250).isoformat(),
+        )
+        response = await divination_v2.get_session_detail("replay")
+        return json.loads(response.body), await db.get_divination_session_v2("replay")
+
+    body, session = arun(run())
+    expected = SessionDetailResponse(
+        session=DivinationSession(
+            **{**session, "question": Question(text="q", created_at=session["created_at"])}
+        )
+    )
+    assert body == expected.model_dump(mode="json")
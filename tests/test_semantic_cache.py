@@ -0,0 +1,62 @@
+from app.liuyao import ai_generate_liuyao
+from app.semantic_cache import SemanticCache, cosine, embed
+from app.tarot_v2 import ai_generate_tarot
+
+INTERPRETATION = {
+    "summary": "s",
+    "advice": "a",
+    "timing": "t",
+    "confidence": "high",
+    "reasoning_bullets": ["r"],
+    "follow_up_questions": ["f"],
+    "ritual_ending": "e",
+}
+
+
+def test_paraphrases_are_closer_than_different_questions():
+    assert cosine(embed("我应该换工作吗？"), embed("我要不要换工作")) > 0.85
+    assert cosine(embed("我应该换工作吗？"), embed("我应该换房子吗？")) < 0.5
+    assert cosine(embed("Should I change jobs?"), embed("should i change my job")) > 0.85
+    assert cosine(embed("転職すべきですか？"), embed("転職したほうがいいですか")) > 0.85
+
+
+def test_hits_only_for_same_outcome_and_similar_question(tmp_path):
+    cache = SemanticCache(threshold=0.85, per_key=2, max_keys=10)
+    liuyao = ai_generate_liuyao("a").model_dump()
+    cache.add("我应该换工作吗？", "liuyao", liuyao, "zh", INTERPRETATION)
+
+    assert cache.lookup("我要不要换工作", "liuyao", liuyao, "zh").summary == "s"
+    assert cache.lookup("他喜欢我吗", "liuyao", liuyao, "zh") is None
+    assert cache.lookup("我要不要换工作", "liuyao", liuyao, "en") is None
+    other = ai_generate_tarot("a").model_dump()
+    assert cache.lookup("我要不要换工作", "tarot", other, "zh") is None
+
+    # 每个桶最多 per_key 条，先淘汰最久未命中的
+    cache.add("今年能不能脱单", "liuyao", liuyao, "zh", INTERPRETATION)
+    cache.lookup("我要不要换工作", "liuyao", liuyao, "zh")
+    cache.add("要不要买房", "liuyao", liuyao, "zh", INTERPRETATION)
+    assert cache.lookup("今年会不会脱单", "liuyao", liuyao, "zh") is None
+    assert cache.lookup("我该换工作吗", "liuyao", liuyao, "zh") is not None
+
+    path = tmp_path / "semantic.jsonl"
+    cache.save(path)
+    restored = SemanticCache(threshold=0.85, per_key=2, max_keys=10)
+    assert restored.load(path) == 2
+    assert restored.lookup("我要不要换工作", "liuyao", liuyao, "zh") is not None
+
+
+def test_negated_question_is_not_a_hit():
+    # 只差一个"不"，相似度超过阈值，意思却相反
+    assert cosine(embed("我应该换工作吗"), embed("我不应该换工作吗")) > 0.85
+    cache = SemanticCache(threshold=0.85, per_key=4, max_keys=10)
+    liuyao = ai_generate_liuyao("a").model_dump()
+    cache.add("我应该换工作吗", "liuyao", liuyao, "zh", INTERPRETATION)
+    cache.add("Should I quit my job?", "liuyao", liuyao, "en", INTERPRETATION)
+
+    assert cache.lookup("我不应该换工作吗", "liuyao", liuyao, "zh") is None
+    assert cache.lookup("我没应该换工作吗", "liuyao", liuyao, "zh") is None
+    assert cache.lookup("Shouldn't I quit my job?", "liuyao", liuyao, "en") is None
+    assert cache.lookup("Should I not quit my job?", "liuyao", liuyao, "en") is None
+    # 正反问不算否定
+    assert cache.lookup("我要不要换工作", "liuyao", liuyao, "zh") is not None
+    assert cache.lookup("should i quit my jobs", "liuyao", liuyao, "en") is not None
@@ -0,0 +1,80 @@
+import time
+
+import httpx
+from conftest import arun
+
+from app import auth
+from app.session_cache import SessionCache
+
+
+def _cache(**overrides):
+    options = {"maxsize": 2, "ttl": 60, "negative_ttl": 60, "poll_interval": 3600}
+    options.update(overrides)
+    return SessionCache(**options)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.lookup("a") == (True, 1)
+    cache.put("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, 1)
+
+
+def test_entry_never_outlives_session_expiry():
+    cache = _cache()
+    cache.put("a", 1, expires_at="2000-01-01T00:00:00")
+    assert cache.lookup("a") == (False, None)
+
+    cache = _cache(ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.lookup("a") == (False, None)
+
+
+def test_invalid_tokens_are_negatively_cached():
+    cache = _cache()
+    cache.put("bogus", None)
+    assert cache.lookup("bogus") == (True, None)
+
+
+def test_lookup_started_before_revocation_is_not_cached():
+    cache = _cache()
+    generation = cache.generation
+    cache.revoke("a")
+    cache.put("a", 1, generation=generation)
+    assert cache.lookup("a") == (False, None)
+
+
+def test_me_and_profile_use_the_resolved_user_id(storage, monkeypatch):
+    from app.main import create_app
+
+    async def run():
+        user = await auth.create_user("me@example.com", "hash", "1990-01-01")
+        session = await auth.create_session(user["id"])
+
+        async def no_join(*args):
+            raise AssertionError("session lookup should go through the session cache")
+
+        monkeypatch.setattr(storage, "get_user_by_session", no_join)
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            client.cookies.set("session", session["token"])
+            updated = await client.patch("/api/auth/profile", json={"birthDate": "2000-02-02"})
+            me = await client.get("/api/auth/me")
+            client.cookies.clear()
+            anonymous = await client.get("/api/auth/me")
+            rejected = await client.patch("/api/auth/profile", json={"birthDate": None})
+        return user, updated, me, anonymous, rejected
+
+    user, updated, me, anonymous, rejected = arun(run())
+    assert updated.json() == {"ok": True}
+    assert me.json()["user"] == {
+        "id": user["id"],
+        "email": "me@example.com",
+        "birthDate": "2000-02-02",
+    }
+    assert anonymous.json() == {"user": None}
+    assert rejected.status_code == 401
@@ -1,7 +1,31 @@
-from ai_divination.app import main
+import asyncio
 
+from fastapi.testclient import TestClient
 
-def test_main_smoke(capsys):
-    assert main() == 0
-    captured = capsys.readouterr()
-    assert "AI Divination" in captured.out
+from app.main import create_app
+from bench.loadtest import local_stack, parse_mix, percentile, run_load
+
+
+def test_app_starts_and_serves_health(storage):
+    with TestClient(create_app()) as client:
+        assert client.get("/health").status_code == 200
+
+
+def test_percentile_and_mix_parsing():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0.0
+    assert parse_mix("ai_generate=3,aztro") == {"ai_generate": 3.0, "aztro": 1.0}
+
+
+def test_load_harness_against_local_stack():
+    mix = parse_mix("ai_generate=2,ai_interpret=1,manual=1,aztro=1")
+    with local_stack(["--llm-latency=0.05"], {}) as base_url:
+        report = asyncio.run(run_load(base_url, mix, duration=1.5, concurrency=3))
+
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == {}
+    assert report["flows"]["ai_generate"]["requests"] > 0
+    assert "GET /api/v2/divination/{session_id}" in report["endpoints"]
+    assert set(report["total"]["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
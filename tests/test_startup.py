@@ -0,0 +1,45 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+# 导入 app.main 的总耗时 / app 包自身模块耗时的上限（毫秒），慢机器上可用环境变量放宽
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+APP_IMPORT_BUDGET_MS = float(os.getenv("APP_IMPORT_TIME_BUDGET_MS", "300"))
+# 只在少数请求路径上用到、必须延迟导入的依赖
+LAZY_MODULES = ("redis", "passlib", "bcrypt", "httpx")
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def _import_app() -> tuple[dict[str, tuple[int, int]], list[str]]:
+    code = (
+        "import json, sys; import app.main; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_stays_within_budget_and_defers_optional_modules():
+    times, loaded = _import_app()
+
+    assert loaded == []
+    total_ms = times["app.main"][1] / 1000
+    app_ms = sum(own for name, (own, _) in times.items() if name.split(".")[0] == "app") / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"import app.main took {total_ms:.0f}ms"
+    assert app_ms < APP_IMPORT_BUDGET_MS, f"app modules took {app_ms:.0f}ms to import"
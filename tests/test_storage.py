@@ -0,0 +1,149 @@
+import sqlite3
+
+import pytest
+from conftest import arun
+
+from app import auth, db
+from app.storage import SQLiteStorage, set_storage
+from app.storage.base import USAGE_COUNTERS, USAGE_DIMENSIONS
+
+
+def test_user_session_and_record_roundtrip(storage):
+    async def run():
+        user = await auth.create_user("a@example.com", "hash", "1990-01-01")
+        assert (await auth.get_user_by_email("a@example.com"))["id"] == user["id"]
+        assert (await auth.get_user_by_id(user["id"]))["email"] == "a@example.com"
+        assert await auth.get_user_by_id(user["id"] + 1) is None
+        await auth.update_user_birth_date(user["id"], None)
+        assert (await auth.get_user_by_email("a@example.com"))["birth_date"] is None
+
+        session = await auth.create_session(user["id"])
+        assert (await auth.get_user_by_session(session["token"]))["email"] == "a@example.com"
+        assert (await auth.get_session_user(session["token"]))["user_id"] == user["id"]
+        await auth.delete_session(session["token"])
+        assert await auth.get_session_user(session["token"]) is None
+
+        await db.create_divination_record(
+            user_id=user["id"],
+            session_id=None,
+            question="q",
+            mode="ai",
+            method="liuyao",
+            raw_result={"lines": [1, 2]},
+            interpretation="text",
+        )
+        (record,) = await db.get_divination_records_by_user(user["id"])
+        assert record["raw_result"] == '{"lines": [1, 2]}'
+
+        await db.create_divination_session_v2(
+            session_id="v2", user_id=user["id"], question="q", mode="ai", method="tarot", seed="s"
+        )
+        assert await db.update_divination_session_v2("v2", manual_steps=[{"step": 1}])
+        assert not await db.update_divination_session_v2("missing", status="failed")
+        session_v2 = await db.get_divination_session_v2("v2")
+        assert session_v2["manual_steps"] == [{"step": 1}]
+        assert session_v2["result"] is None
+
+    arun(run())
+
+
+# 迁移是一次性的命令行工具，直接在事件循环里读 SQLite 可以接受
+@pytest.mark.allow_blocking
+def test_migrate_sqlite_to_postgres(tmp_path, postgres_url):
+    from app.storage.migrate import copy_sqlite_to_postgres
+    from app.storage.postgres import PostgresStorage
+
+    source = SQLiteStorage(tmp_path / "source.db")
+    set_storage(source)
+    counters = (2, 640, 360, 900)
+
+    async def seed():
+        await source.init()
+        user = await auth.create_user("m@example.com", "hash", None)
+        await auth.create_session(user["id"])
+        await db.create_divination_session_v2(
+            session_id="m1", user_id=user["id"], question="q", mode="ai", method="tarot", seed="s"
+        )
+        await db.update_divination_session_v2(
+            "m1", result={"cards": ["fool"]}, idempotency_key="generate-m1"
+        )
+        await source.put_base_interpretation(
+            "tarot", "0u-1u-2u", "zh", {"summary": "pooled"}, "2024-01-01T00:00:00"
+        )
+        dimensions = ("2024-01-02", "user:1", "m1", "tarot", "zh", "interpretation")
+        await source.add_llm_usage(
+            [{**dict(zip(USAGE_DIMENSIONS, dimensions)), **dict(zip(USAGE_COUNTERS, counters))}]
+        )
+
+    arun(seed())
+
+    target = PostgresStorage(postgres_url)
+    set_storage(target)
+    try:
+
+        async def migrate():
+            await target.init()
+            async with target.acquire() as conn:
+                await conn.execute(
+                    "TRUNCATE users, sessions, divination_records, divination_sessions_v2, "
+                    "base_interpretations, llm_usage RESTART IDENTITY CASCADE"
+                )
+            counts = await copy_sqlite_to_postgres(tmp_path / "source.db", target)
+            # 重复执行不会重复写入
+            again = await copy_sqlite_to_postgres(tmp_path / "source.db", target)
+            migrated = await db.get_divination_session_v2("m1")
+            # 序列已推进，新用户不会和迁移过来的 id 冲突
+            other = await auth.create_user("n@example.com", "hash", None)
+            pooled = await target.get_base_interpretation("tarot", "0u-1u-2u", "zh")
+            usage = await target.llm_usage_summary("2024-01-01", "caller", 10)
+            return counts, again, migrated, other, pooled, usage
+
+        counts, again, migrated, other, pooled, usage = arun(migrate())
+    finally:
+        set_storage(None)
+
+    assert counts == {
+        "users": 1,
+        "sessions": 1,
+        "divination_records": 0,
+        "divination_sessions_v2": 1,
+        "base_interpretations": 1,
+        "llm_usage": 1,
+    }
+    assert set(again.values()) == {0}
+    assert migrated["result"] == {"cards": ["fool"]}
+    assert migrated["idempotency_key"] == "generate-m1"
+    assert pooled == {"summary": "pooled"}
+    assert [(row["key"], row["calls"], row["prompt_tokens"]) for row in usage] == [
+        ("interpretation", 2, 640)
+    ]
+    assert other["id"] == 2
+    with sqlite3.connect(tmp_path / "source.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone() == (1,)
+
+
+def test_sqlite_migrations_run_once_and_upgrade_legacy_databases(tmp_path):
+    from app.storage.sqlite import SCHEMA_VERSION
+
+    legacy = tmp_path / "legacy.db"
+    conn = sqlite3.connect(legacy)
+    conn.execute(
+        "CREATE TABLE divination_sessions_v2 (id TEXT PRIMARY KEY, user_id INTEGER NULL, "
+        "question TEXT NOT NULL, mode TEXT NOT NULL, method TEXT NOT NULL, seed TEXT NOT NULL, "
+        "status TEXT NOT NULL DEFAULT 'pending', result TEXT NULL, interpretation TEXT NULL, "
+        "manual_steps TEXT NULL, created_at TEXT NOT NULL, completed_at TEXT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteStorage(legacy)
+    arun(backend.init())
+    arun(backend.init())
+
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(divination_sessions_v2)")}
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    conn.close()
+    assert "lang" in columns
+    assert "idx_sessions_v2_user_history" in indexes
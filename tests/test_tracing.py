@@ -0,0 +1,125 @@
+import json
+
+import httpx
+import pytest
+from conftest import arun
+
+from app import llm, tracing
+from app.config import settings
+from app.llm import CircuitBreaker, LLMRouter, Upstream
+
+
+@pytest.fixture
+def memory_tracer():
+    tracer = tracing.configure("memory")
+    yield tracer.exporter
+    tracing.configure("")
+
+
+def _ancestors(span, by_id):
+    names = []
+    while span.parent_id is not None:
+        span = by_id[span.parent_id]
+        names.append(span.name)
+    return names
+
+
+def test_generate_and_interpret_produce_nested_spans(
+    storage, stub_llm, memory_tracer, monkeypatch
+):
+    from app.main import create_app
+
+    stub_llm.reset()
+    monkeypatch.setattr(settings, "ai_builder_api_key", "test")
+    upstream = Upstream(
+        name="primary",
+        url=stub_llm.url,
+        model="primary",
+        api_key="test",
+        breaker=CircuitBreaker("primary", 3, 30.0),
+    )
+    llm.set_router(LLMRouter([upstream], latency_budget=5.0, hedge_enabled=False))
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post(
+                "/api/v2/divination/session",
+                json={"question": "tracing: learn piano?", "mode": "ai", "method": "tarot"},
+            )
+            body = {"session_id": created.json()["session_id"]}
+            memory_tracer.clear()
+            generated = await client.post("/api/v2/divination/generate", json=body)
+            interpreted = await client.post("/api/v2/divination/interpret", json=body)
+            return generated, interpreted
+
+    try:
+        generated, interpreted = arun(run())
+    finally:
+        llm.set_router(None)
+    assert generated.status_code == interpreted.status_code == 200
+
+    spans = memory_tracer.get_finished_spans()
+    by_id = {s.span_id: s for s in spans}
+    route = next(s for s in spans if s.name == "route.generate_divination")
+    generate_trace = [s for s in spans if s.trace_id == route.trace_id]
+    first, last = {}, {}
+    for s in sorted(generate_trace, key=lambda s: s.start_ns):
+        first.setdefault(s.name, s)
+        last[s.name] = s
+
+    prompt = first["prompt.build_tarot"]
+    call = first["llm.call"]
+    # 第一次 update 是 pending -> in_progress 的抢占，最后一次写入解读
+    save = last["db.update_divination_session_v2"]
+    assert _ancestors(prompt, by_id)[:2] == ["interpretation.generate", "route.generate_divination"]
+    assert _ancestors(call, by_id)[:2] == ["interpretation.generate", "route.generate_divination"]
+    assert "route.generate_divination" in _ancestors(save, by_id)
+    assert _ancestors(route, by_id) == ["http.request"]
+    assert prompt.start_ns < call.start_ns < save.start_ns
+
+    assert {k: route.attributes[k] for k in ("method", "mode", "lang")} == {
+        "method": "tarot",
+        "mode": "ai",
+        "lang": "zh",
+    }
+    assert first["interpretation.generate"].attributes["interpretation.source"] == "llm"
+    interpret_route = next(s for s in spans if s.name == "route.get_interpretation")
+    assert interpret_route.attributes["cache.hit"] is True
+
+
+def test_file_exporter_writes_parseable_records(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "tracing_file", str(path))
+    tracing.configure("file")
+    try:
+        with tracing.span("outer", method="liuyao") as outer:
+            with tracing.span("inner"):
+                pass
+            with pytest.raises(ValueError), tracing.span("failing"):
+                raise ValueError("boom")
+    finally:
+        tracing.configure("")
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["name"] for r in records] == ["inner", "failing", "outer"]
+    assert {r["trace_id"] for r in records} == {outer.trace_id}
+    assert records[0]["parent_id"] == records[1]["parent_id"] == outer.span_id
+    assert records[1]["status"] == "error"
+    assert records[1]["attributes"]["exception.type"] == "ValueError"
+    assert records[2]["attributes"] == {"method": "liuyao"}
+    assert records[2]["duration_ms"] >= 0
+
+
+def test_admin_traces_requires_debug_flag(memory_tracer, monkeypatch):
+    from app.main import create_app
+
+    async def get():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/admin/traces")
+
+    monkeypatch.setattr(settings, "allow_debug_users", False)
+    assert arun(get()).status_code == 403
+    monkeypatch.setattr(settings, "allow_debug_users", True)
+    assert arun(get()).status_code == 200
@@ -0,0 +1,171 @@
+import asyncio
+
+import httpx
+import pytest
+from conftest import arun
+
+from app import llm, usage
+from app.config import settings
+from app.llm import CircuitBreaker, LLMQuotaExceededError, LLMRouter, Upstream
+from app.metrics import INTERPRETATIONS, LLM_QUOTA_REJECTIONS
+from app.usage import UsageLedger, bind_usage, start_usage_scope
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _router(stub):
+    upstream = Upstream(
+        name="primary",
+        url=stub.url,
+        model="primary",
+        api_key="test",
+        breaker=CircuitBreaker("primary", 3, 30.0),
+    )
+    return LLMRouter([upstream], latency_budget=5.0, hedge_enabled=False)
+
+
+@pytest.fixture(autouse=True)
+def _reset(stub_llm):
+    stub_llm.reset()
+    yield
+    usage.set_ledger(None)
+    llm.set_router(None)
+
+
+def test_user_budget_rejects_calls_once_spent(stub_llm):
+    # 每次调用实际用量 320 + 180 = 500，预留 1 + 100
+    usage.set_ledger(UsageLedger(user_tokens_per_hour=1000, reserve_completion_tokens=100))
+    router = _router(stub_llm)
+
+    async def call(user_id):
+        start_usage_scope(user_id, None)
+        try:
+            await router.complete(MESSAGES, temperature=0.5, caller="test")
+        except LLMQuotaExceededError:
+            return False
+        return True
+
+    async def run():
+        return [await call(7) for _ in range(3)] + [await call(8)]
+
+    before = LLM_QUOTA_REJECTIONS.labels(scope="subject", caller="test")._value.get()
+    assert asyncio.run(run()) == [True, True, False, True]
+    assert stub_llm.calls["primary"] == 3
+    assert LLM_QUOTA_REJECTIONS.labels(scope="subject", caller="test")._value.get() == before + 1
+
+
+def test_global_budget_covers_background_calls(stub_llm):
+    usage.set_ledger(UsageLedger(global_tokens_per_minute=700, reserve_completion_tokens=100))
+    router = _router(stub_llm)
+
+    async def run():
+        results = []
+        for _ in range(3):
+            try:
+                await router.complete(MESSAGES, temperature=0.5, caller="test")
+                results.append(True)
+            except LLMQuotaExceededError:
+                results.append(False)
+        return results
+
+    assert asyncio.run(run()) == [True, True, False]
+
+
+def test_usage_is_aggregated_and_accumulated_in_storage(storage, stub_llm):
+    ledger = UsageLedger()
+    usage.set_ledger(ledger)
+    router = _router(stub_llm)
+
+    async def run():
+        start_usage_scope(None, "10.0.0.1")
+        bind_usage(session_id="s1", method="tarot", lang="zh")
+        for _ in range(2):
+            await router.complete(MESSAGES, temperature=0.5, caller="interpretation")
+        assert ledger.pending() == 1
+        assert await ledger.flush() == 1
+        await router.complete(MESSAGES, temperature=0.5, caller="translate")
+        await ledger.flush()
+        await router.aclose()
+        return (
+            await storage.llm_usage_summary("2000-01-01", "subject", 10),
+            await storage.llm_usage_summary("2000-01-01", "caller", 10),
+        )
+
+    by_subject, by_caller = arun(run())
+    assert ledger.pending() == 0
+    assert by_subject == [
+        {
+            "key": "ip:10.0.0.1",
+            "calls": 3,
+            "prompt_tokens": 960,
+            "completion_tokens": 540,
+            "latency_ms": by_subject[0]["latency_ms"],
+        }
+    ]
+    assert [(row["key"], row["calls"]) for row in by_caller] == [
+        ("interpretation", 2),
+        ("translate", 1),
+    ]
+
+
+def test_over_budget_client_gets_a_fallback_interpretation(storage, stub_llm, monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(settings, "ai_builder_api_key", "test")
+    llm.set_router(_router(stub_llm))
+    usage.set_ledger(UsageLedger(user_tokens_per_hour=10))
+    fallback = INTERPRETATIONS.labels(method="tarot", lang="zh", source="fallback")
+    before = fallback._value.get()
+
+    async def run():
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post(
+                "/api/v2/divination/session",
+                json={"question": "usage: will it rain tomorrow?", "mode": "ai", "method": "tarot"},
+            )
+            return await client.post(
+                "/api/v2/divination/generate", json={"session_id": created.json()["session_id"]}
+            )
+
+    response = arun(run())
+    assert response.status_code == 200
+    assert response.json()["interpretation"]["summary"]
+    assert stub_llm.calls["primary"] == 0
+    assert fallback._value.get() == before + 1
+
+
+def test_anonymous_clients_behind_the_proxy_get_separate_buckets(storage, stub_llm, monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(settings, "ai_builder_api_key", "test")
+    llm.set_router(_router(stub_llm))
+    # 一次解读实际用量 500，扣完之后剩余额度不够同一个 IP 的第二次预留
+    ledger = UsageLedger(user_tokens_per_hour=1000, reserve_completion_tokens=100)
+    usage.set_ledger(ledger)
+
+    async def divine(client, forwarded, question):
+        headers = {"x-forwarded-for": forwarded}
+        created = await client.post(
+            "/api/v2/divination/session",
+            json={"question": question, "mode": "ai", "method": "tarot"},
+            headers=headers,
+        )
+        response = await client.post(
+            "/api/v2/divination/generate",
+            json={"session_id": created.json()["session_id"]},
+            headers=headers,
+        )
+        assert response.status_code == 200
+
+    async def run():
+        # 所有请求的直连地址都是平台代理
+        transport = httpx.ASGITransport(app=create_app(), client=("10.0.0.5", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await divine(client, "198.51.100.1", "usage: should I learn to sail?")
+            await divine(client, "198.51.100.1", "usage: will my garden bloom in spring?")
+            await divine(client, "198.51.100.2", "usage: is this a good year to move abroad?")
+
+    arun(run())
+    assert list(ledger._subjects) == ["ip:198.51.100.1", "ip:198.51.100.2"]
+    assert stub_llm.calls["primary"] == 2
@@ -108,6 +108,7 @@ export const translations = {
       unknownError: "发生未知错误",
       interpreting: "正在为你解读...",
       connectingAI: "正在连接AI服务，请稍候...",
+      previewHint: "先看看这个结果的通用解读，针对你问题的解读马上就好",
       preparing: "准备中...",
       startDivination: "开始占卜",
       startHexagram: "开始起卦",
@@ -279,6 +280,7 @@ export const translations = {
       unknownError: "不明なエラーが発生しました",
       interpreting: "解読中...",
       connectingAI: "AIサービスに接続中...",
+      previewHint: "この結果の一般的な解読です。ご質問に合わせた解読はまもなく表示されます",
       preparing: "準備中...",
       startDivination: "占いを始める",
       startHexagram: "卦を立てる",
@@ -450,6 +452,7 @@ export const translations = {
       unknownError: "An unknown error occurred",
       interpreting: "Interpreting your reading...",
       connectingAI: "Connecting to AI service, please wait...",
+      previewHint: "A general reading of this result while your personal interpretation is prepared",
       preparing: "Preparing...",
       startDivination: "Start Divination",
       startHexagram: "Cast Hexagram",
@@ -46,6 +46,7 @@ export function DivinationView({
     startDivination,
     submitStep,
     requestInterpretation,
+    preview,
     reset,
     canStart,
   } = useDivination();
@@ -279,6 +280,13 @@ export function DivinationView({
             <div className="spinner" />
             <p className="loading-text">{td.interpreting}</p>
             <p className="loading-hint">{td.connectingAI}</p>
+            {preview && (
+              <div className="preview-card">
+                <p className="preview-hint">{td.previewHint}</p>
+                <p className="summary-text">{preview.summary}</p>
+                <p className="advice-text">{preview.advice}</p>
+              </div>
+            )}
           </div>
         </div>
       )}
@@ -574,6 +582,20 @@ export function DivinationView({
           padding: 3rem;
         }
 
+        .preview-card {
+          max-width: 32rem;
+          padding: 1rem 1.25rem;
+          border-radius: 12px;
+          background: rgba(0, 0, 0, 0.03);
+          opacity: 0.85;
+        }
+
+        .preview-hint {
+          font-size: 0.85rem;
+          color: var(--ink-soft, #7a736d);
+          margin: 0 0 0.5rem;
+        }
+
         .loading-indicator {
           display: flex;
           flex-direction: column;
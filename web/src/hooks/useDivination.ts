@@ -14,6 +14,7 @@ import {
   generateDivination,
   submitManualStep,
   getInterpretation,
+  getInterpretationPreview,
   saveDraft,
   loadDraft,
   clearDraft,
@@ -31,6 +32,8 @@ interface UseDivinationReturn {
   startDivination: (lang?: string) => Promise<void>;
   submitStep: (stepData: CoinToss | TarotDrawStep) => Promise<void>;
   requestInterpretation: (explicitSessionId?: string) => Promise<void>;
+  /** 个性化解读返回前先展示的预生成通用解读 */
+  preview: DivinationInterpretation | null;
   reset: () => void;
   canStart: boolean;
   resumeDraft: () => Promise<boolean>;
@@ -54,6 +57,7 @@ const INITIAL_STATE: DivinationFlowState = {
 export function useDivination(): UseDivinationReturn {
   const [state, setState] = useState<DivinationFlowState>(INITIAL_STATE);
   const [manualStepCount, setManualStepCount] = useState(0);
+  const [preview, setPreview] = useState<DivinationInterpretation | null>(null);
   
   // 使用 ref 来跟踪步骤计数，避免闭包问题
   const stepCountRef = useRef(0);
@@ -226,10 +230,20 @@ export function useDivination(): UseDivinationReturn {
     console.log("[requestInterpretation] Starting interpretation for session:", sessionId);
     setState((prev) => ({ ...prev, isLoading: true, stage: "interpreting" }));
 
+    // 同时请求预生成的通用解读，个性化解读返回前先展示；晚于个性化解读到达时丢弃
+    let settled = false;
+    setPreview(null);
+    getInterpretationPreview(sessionId).then((response) => {
+      if (response && !settled) {
+        setPreview(response.interpretation);
+      }
+    });
+
     try {
       const response = await getInterpretation({
         session_id: sessionId,
       });
+      settled = true;
 
       console.log("[requestInterpretation] Interpretation received:", response);
 
@@ -243,6 +257,7 @@ export function useDivination(): UseDivinationReturn {
         isLoading: false,
       }));
     } catch (error) {
+      settled = true;
       console.error("[requestInterpretation] Error:", error);
       setState((prev) => ({
         ...prev,
@@ -259,6 +274,7 @@ export function useDivination(): UseDivinationReturn {
       clearDraft(state.sessionId);
     }
     setState(INITIAL_STATE);
+    setPreview(null);
     setManualStepCount(0);
     stepCountRef.current = 0;
   }, [state.sessionId]);
@@ -290,6 +306,7 @@ export function useDivination(): UseDivinationReturn {
     startDivination,
     submitStep,
     requestInterpretation,
+    preview,
     reset,
     canStart,
     resumeDraft,
@@ -116,6 +116,8 @@ export async function generateDivination(
 ): Promise<GenerateResponse> {
   return request<GenerateResponse>(`${DIVINATION_V2_BASE}/generate`, {
     method: "POST",
+    // 每个会话只生成一次：重试（包括刷新页面后）带同一个幂等键，直接拿到第一次的结果
+    headers: { "Idempotency-Key": `generate-${data.session_id}` },
     body: JSON.stringify(data),
   });
 }
@@ -154,6 +156,21 @@ export async function getInterpretation(
   }
 }
 
+/**
+ * 获取预生成的通用解读（个性化解读返回前先展示），没有时返回 null
+ */
+export async function getInterpretationPreview(
+  sessionId: string
+): Promise<InterpretResponse | null> {
+  try {
+    return await request<InterpretResponse>(
+      `${DIVINATION_V2_BASE}/${sessionId}/preview`
+    );
+  } catch {
+    return null;
+  }
+}
+
 /**
  * 获取会话详情（回放）
  */
@@ -166,13 +183,19 @@ export async function getSessionDetail(
 }
 
 /**
- * 获取用户的占卜历史记录
+ * 获取用户的占卜历史记录（游标分页，传入上一页返回的 next_cursor 获取下一页）
  */
-export async function getDivinationRecords(): Promise<{
+export async function getDivinationRecords(
+  cursor?: string,
+  limit: number = 20
+): Promise<{
   records: DivinationSession[];
+  next_cursor: string | null;
 }> {
-  return request<{ records: DivinationSession[] }>(
-    `${DIVINATION_V2_BASE}/records`
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  return request<{ records: DivinationSession[]; next_cursor: string | null }>(
+    `${DIVINATION_V2_BASE}/records?${params.toString()}`
   );
 }
 